@@ -46,7 +46,7 @@ means the semantics are always "turn this feature off".
 
 Reversibility and drift
 -----------------------
-``apply`` records each key's original value in a sidecar next to the config, so
+``apply`` records each key's original value in the state store, so
 ``remove`` restores exactly what was there -- including keys that were already
 ``"0"``.
 
@@ -68,18 +68,17 @@ exit.
 from __future__ import annotations
 
 import datetime
-import json
 import logging
 import os
 import re
+import sqlite3
 
 import config_handler
 import root_persistence
+import state_store
 
 logger = logging.getLogger(__name__)
 
-_STATE_NAME = ".bsrgui_ad_settings.json"
-
 #: Concept patterns for switches worth turning off.  Matched case-insensitively
 #: against the whole key.  Deliberately about *concepts* ("programmatic ads",
 #: "stats upload") rather than exact names, so a renamed or newly added key in a
@@ -115,7 +114,6 @@ NEVER_TOUCH = (
 #: The value written to every managed key.
 OFF = "0"
 
-_KEY_RE = re.compile(r"^\s*([\w.]+)\s*=\s*\"?([^\"\r\n]*)\"?\s*$")
 _SWITCH_RE = re.compile("|".join(SWITCH_PATTERNS), re.IGNORECASE)
 _NEVER_RE = re.compile("|".join(NEVER_TOUCH), re.IGNORECASE)
 
@@ -134,40 +132,21 @@ def is_managed(key: str, value: str) -> bool:
     return value.strip() in ("0", "1")
 
 
-def _parse(text: str) -> dict[str, str]:
-    """All ``key -> value`` pairs in a bluestacks.conf."""
-    found: dict[str, str] = {}
-    for line in text.splitlines():
-        if not line.strip() or line.lstrip().startswith("#"):
-            continue
-        m = _KEY_RE.match(line)
-        if m:
-            found[m.group(1)] = m.group(2)
-    return found
-
-
-def _read(config_path: str) -> str:
-    with open(config_path, encoding="utf-8") as f:
-        return f.read()
-
-
 def discover(config_path: str) -> dict[str, str]:
     """The managed switches present in this config, mapped to current values.
 
-    Discovery runs against the real file every time, so a BlueStacks update that
-    adds or renames switches is picked up without a code change.
+    Discovery runs against the real file (through the shared parsed model,
+    re-read whenever the file changes), so a BlueStacks update that adds or
+    renames switches is picked up without a code change.
     """
-    return {k: v for k, v in _parse(_read(config_path)).items() if is_managed(k, v)}
-
-
-def _state_path(config_path: str) -> str:
-    return os.path.join(os.path.dirname(config_path), _STATE_NAME)
+    values = config_handler.load_config(config_path).values
+    return {k: v for k, v in values.items() if is_managed(k, v)}
 
 
 def status(config_path: str) -> dict | None:
     """Current state, or ``None`` if these switches have not been turned off.
 
-    On top of the stored sidecar this re-reads the live config and reports:
+    On top of the stored state this re-reads the live config and reports:
 
     ``off``
         managed keys currently sitting at ``"0"``.
@@ -179,9 +158,10 @@ def status(config_path: str) -> dict | None:
         BlueStacks update introduced since. Re-applying adopts them.
     """
     try:
-        with open(_state_path(config_path), encoding="utf-8") as f:
-            state = json.load(f)
-    except (OSError, ValueError):
+        state = state_store.store().ad_switches(config_path)
+    except (OSError, sqlite3.Error):
+        return None
+    if state is None:
         return None
 
     try:
@@ -200,21 +180,15 @@ def status(config_path: str) -> dict | None:
 
 
 def _write_state(config_path: str, originals: dict[str, str] | None) -> None:
-    path = _state_path(config_path)
-    if originals is None:
-        try:
-            os.unlink(path)
-        except OSError:
-            pass
-        return
-    payload = {
-        "ads_disabled": True,
-        "keys": len(originals),
-        "originals": originals,
-        "applied_at": datetime.datetime.now().replace(microsecond=0).isoformat(),
-    }
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(payload, f, indent=2)
+    payload = None
+    if originals is not None:
+        payload = {
+            "ads_disabled": True,
+            "keys": len(originals),
+            "originals": originals,
+            "applied_at": datetime.datetime.now().replace(microsecond=0).isoformat(),
+        }
+    state_store.store().set_ad_switches(config_path, payload)
 
 
 def apply(config_path: str, progress=None) -> list[str]:
@@ -246,10 +220,8 @@ def apply(config_path: str, progress=None) -> list[str]:
         originals.setdefault(key, value)
 
     _p("Turning off %d BlueStacks ad/telemetry switches..." % len(switches))
-    changed = 0
-    for key in sorted(switches):
-        if config_handler.modify_config_file(config_path, key, OFF):
-            changed += 1
+    changed = len(config_handler.modify_config_settings(
+        config_path, {key: OFF for key in sorted(switches)}))
 
     _write_state(config_path, originals)
     _p("Verifying...")
@@ -282,10 +254,8 @@ def remove(config_path: str, progress=None) -> list[str]:
         return ["Nothing recorded to restore."]
 
     _p("Restoring %d BlueStacks ad/telemetry switches..." % len(originals))
-    restored = 0
-    for key in sorted(originals):
-        if config_handler.modify_config_file(config_path, key, originals[key]):
-            restored += 1
+    restored = len(config_handler.modify_config_settings(
+        config_path, {key: originals[key] for key in sorted(originals)}))
 
     _write_state(config_path, None)
     return ["Restored %d BlueStacks ad/telemetry switches (%d changed back)."
@@ -8,24 +8,29 @@ own picker, which reads guest storage fine.
 
 This is the tool's one *online* operation: the target instance must be RUNNING
 so its ADB port is open. Everything else in the app works on shut-down disks.
+Commands go to the adb server in-process (``adb_wire``) by default; every
+function still takes a ``runner`` so tests and callers can swap that out.
 """
 from __future__ import annotations
 
+import concurrent.futures
 import logging
 import os
 import re
+import socket
 import subprocess
+from dataclasses import dataclass
 from typing import Callable, Optional
 
+import adb_wire
+import config_handler
+
 logger = logging.getLogger(__name__)
 
 # BlueStacks ships its own adb as HD-Adb.exe next to HD-Player.exe. Plain adb.exe
 # is a fallback for unusual layouts.
 _ADB_NAMES = ("HD-Adb.exe", "adb.exe")
 
-# bluestacks.conf: bst.instance.<name>.status.adb_port="5555"
-_ADB_PORT_KEY = ".status.adb_port"
-
 # The Magisk/Kitsune manager's package (applicationId). The full manager is a
 # normal user app installed via `adb install` after first boot -- it can't be
 # placed offline (see magisk_system.install_to_system). Used to uninstall for a
@@ -54,6 +59,13 @@ def _run_install(cmd: list) -> subprocess.CompletedProcess:
     return _run(cmd, timeout=180)
 
 
+# Default runners: speak the adb server protocol in-process (no HD-Adb.exe spawn
+# per step), falling back to the subprocess runners above whenever the server
+# isn't up yet -- the spawned adb starts it, and later calls go native.
+_wire_run = adb_wire.WireRunner(_run)
+_wire_run_install = adb_wire.WireRunner(_run_install, adb_wire.AdbWireClient(timeout=180))
+
+
 def find_adb(install_dirs) -> Optional[str]:
     """First HD-Adb.exe / adb.exe found in any of ``install_dirs``, else None."""
     for d in install_dirs:
@@ -74,18 +86,12 @@ def instance_adb_port(config_path: str, instance_name: str) -> Optional[int]:
     """
     if not config_path or not os.path.isfile(config_path):
         return None
-    key = re.compile(
-        r"^bst\.instance\." + re.escape(instance_name) + re.escape(_ADB_PORT_KEY)
-        + r'\s*=\s*"(\d+)"', re.IGNORECASE)
     try:
-        with open(config_path, encoding="utf-8") as fh:
-            for line in fh:
-                m = key.match(line.strip())
-                if m:
-                    return int(m.group(1))
+        inst = config_handler.load_config(config_path).instance(instance_name)
     except OSError:
         logger.debug("Could not read %s for adb port", config_path, exc_info=True)
-    return None
+        return None
+    return inst.adb_port if inst else None
 
 
 def _parse_devices(stdout: str) -> list:
@@ -159,7 +165,7 @@ def _shell_single_quote(s: str) -> str:
 
 def install_module(adb_exe: str, port: Optional[int], local_zip: str,
                    progress: Optional[Callable[[str], None]] = None,
-                   runner: Runner = _run) -> str:
+                   runner: Runner = _wire_run) -> str:
     """Push ``local_zip`` to a running instance and flash it via Magisk directly.
 
     Runs ``magisk --install-module`` over an ADB root shell (the same command we
@@ -213,9 +219,152 @@ def install_module(adb_exe: str, port: Optional[int], local_zip: str,
         "from storage -> Download." % (out or "unknown error"))
 
 
+# Marker echoed after each flash in a batched ``su -c`` script, carrying the
+# module's index and ``magisk --install-module``'s exit status, so one combined
+# output splits back into per-module results.
+_BATCH_MARK = "@@bsrgui-module"
+_BATCH_MARK_RE = re.compile(r"^%s (\d+) (\d+)\s*$" % re.escape(_BATCH_MARK), re.MULTILINE)
+
+
+@dataclass(frozen=True)
+class ModuleResult:
+    """Outcome of one zip in a batched flash (``install_modules``)."""
+    zip_path: str
+    ok: bool
+    message: str
+
+
+def _batch_script(remote: list) -> str:
+    """One ``su -c`` script flashing every pushed zip in order, marking each
+    result, then removing the pushed copies and syncing once.
+
+    adb joins the shell argv with spaces, so the caller must hand this to
+    ``su -c`` as one single-quoted word (:func:`_su_script_argv`); unquoted,
+    the guest shell would end ``su -c`` at the first ``;`` and run the rest
+    as the unprivileged shell user."""
+    lines = []
+    for i, path in enumerate(remote):
+        q = _shell_single_quote(path)
+        lines.append("magisk --install-module '%s' 2>&1; echo \"%s %d $?\"" % (q, _BATCH_MARK, i))
+    lines.append("rm -f %s" % " ".join("'%s'" % _shell_single_quote(p) for p in remote))
+    lines.append("sync")
+    return "; ".join(lines)
+
+
+def _su_script_argv(script: str) -> list:
+    """``su -c '<script>'`` as adb shell argv: the whole script one quoted word."""
+    return ["su", "-c", "'%s'" % _shell_single_quote(script)]
+
+
+def _split_batch_output(out: str, count: int) -> dict:
+    """{index: (exit_status, log)} from a batched flash's combined output."""
+    results = {}
+    start = 0
+    for m in _BATCH_MARK_RE.finditer(out):
+        idx = int(m.group(1))
+        if idx < count:
+            results[idx] = (int(m.group(2)), out[start:m.start()].strip())
+        start = m.end()
+    return results
+
+
+def install_modules(adb_exe: str, port: Optional[int], local_zips: list,
+                    progress: Optional[Callable[[str], None]] = None,
+                    runner: Runner = _wire_run_install) -> list:
+    """Flash several module zips into one running instance in a single session.
+
+    The batch form of :func:`install_module`: connects and re-affirms the shell
+    su policy once, pushes every zip in one ``adb push``, flashes them all in
+    one ``su -c`` script (in the given order -- ReZygisk before LSPosed), then
+    removes the pushed copies and syncs once. Returns a :class:`ModuleResult`
+    per zip, in input order. A module Magisk rejects is reported, not raised,
+    and copied to the guest's Download folder for a manual flash; a dead
+    connection or a missing root shell still raises, like ``install_module``.
+    """
+    def _p(msg):
+        logger.info(msg)
+        if progress:
+            progress(msg)
+
+    zips = list(local_zips)
+    if not zips:
+        return []
+    for z in zips:
+        if not os.path.isfile(z):
+            raise RuntimeError("Module file not found: %s" % z)
+    names = [os.path.basename(z) for z in zips]
+    if len(set(names)) != len(names):
+        raise RuntimeError("Two modules share a file name; rename one and retry.")
+
+    _p("Connecting to the instance...")
+    serial = _resolve_serial(adb_exe, port, runner)
+    _p("Confirming ADB root access...")
+    _ensure_su_policy(adb_exe, serial, runner)
+
+    remote = ["/data/local/tmp/" + n for n in names]
+    _p("Pushing %d module(s)..." % len(zips))
+    cp = runner([adb_exe, "-s", serial, "push"] + zips + ["/data/local/tmp/"])
+    if cp.returncode != 0:
+        raise RuntimeError("ADB push failed: %s"
+                           % ((cp.stdout or "") + (cp.stderr or "")).strip())
+
+    _p("Installing %s via Magisk..." % ", ".join(names))
+    cp = runner([adb_exe, "-s", serial, "shell"] + _su_script_argv(_batch_script(remote)))
+    out = (cp.stdout or "") + (cp.stderr or "")
+    flashed = _split_batch_output(out, len(zips))
+    if not flashed:
+        # The script never ran (no root shell / su denied): same manual fallback
+        # as install_module, for every zip at once.
+        runner([adb_exe, "-s", serial, "shell", "rm", "-f"] + remote)
+        _p("Direct install failed; copying to Download for manual flashing...")
+        runner([adb_exe, "-s", serial, "push"] + zips + ["/sdcard/Download/"])
+        raise RuntimeError(
+            "Couldn't install automatically (%s). If that's a root-permission "
+            "rejection, set Magisk/Kitsune -> Settings -> Superuser access -> "
+            "\"Apps and ADB\" and try again. The zips were also copied to the "
+            "instance's Download folder." % (out.strip() or "unknown error"))
+
+    results = []
+    failed = []
+    for i, (z, name) in enumerate(zip(zips, names)):
+        status, log = flashed.get(i, (None, "no result (the flash script stopped early)"))
+        if status == 0:
+            results.append(ModuleResult(z, True, "Installed \"%s\"." % name))
+        else:
+            failed.append(z)
+            tail = log.splitlines()[-1] if log else "unknown error"
+            results.append(ModuleResult(
+                z, False, "\"%s\" was not installed (%s); copied to Download for "
+                "manual flashing." % (name, tail)))
+    if failed:
+        runner([adb_exe, "-s", serial, "push"] + failed + ["/sdcard/Download/"])
+    return results
+
+
+def install_modules_many(adb_exe: str, ports, local_zips: list,
+                         progress: Optional[Callable[[str], None]] = None,
+                         runner: Runner = _wire_run_install) -> dict:
+    """:func:`install_modules` across several running instances.
+
+    ``ports`` maps a label (e.g. the instance id) to its ADB port. Returns
+    {label: [ModuleResult, ...]}; an instance that can't be reached gets one
+    failed result per zip rather than aborting the others.
+    """
+    outcome = {}
+    for label, port in dict(ports).items():
+        relay = (lambda m, _l=label: progress("%s: %s" % (_l, m))) if progress else None
+        try:
+            outcome[label] = install_modules(adb_exe, port, local_zips,
+                                             progress=relay, runner=runner)
+        except Exception as exc:  # noqa: BLE001 - one bad instance mustn't abort the rest
+            logger.warning("batched module flash failed for %s: %s", label, exc)
+            outcome[label] = [ModuleResult(z, False, str(exc)) for z in local_zips]
+    return outcome
+
+
 def install_manager(adb_exe: str, port: Optional[int], apk_path: str,
                     progress: Optional[Callable[[str], None]] = None,
-                    runner: Runner = _run_install) -> str:
+                    runner: Runner = _wire_run_install) -> str:
     """Install the Magisk/Kitsune manager APK into a *running* instance as a
     normal user app (``adb install -r``).
 
@@ -263,7 +412,7 @@ def install_manager(adb_exe: str, port: Optional[int], apk_path: str,
 
 def uninstall_manager(adb_exe: str, port: Optional[int],
                       progress: Optional[Callable[[str], None]] = None,
-                      runner: Runner = _run) -> str:
+                      runner: Runner = _wire_run) -> str:
     """Remove the Magisk/Kitsune manager from a running instance. Idempotent:
     "not installed" is reported as success, not an error."""
     def _p(msg):
@@ -283,24 +432,85 @@ def uninstall_manager(adb_exe: str, port: Optional[int],
     raise RuntimeError("Manager uninstall failed: %s" % (out or "unknown error"))
 
 
-def list_running_instances(adb_exe: str, instances, runner: Runner = _run) -> dict:
+# Running-instance probe: a TCP connect to a stopped instance's port is refused
+# immediately, so a short pre-check skips the adb round-trip for every instance
+# that isn't up. The pool bounds how many probes run at once.
+_PROBE_TIMEOUT_S = 0.3
+_PROBE_MAX_WORKERS = 8
+
+
+def instance_adb_ports(config_path: str) -> dict:
+    """{instance name (lower-cased): ADB port} for every instance recorded in
+    bluestacks.conf, from the shared parsed config. Names are lower-cased
+    because the config keys are matched case-insensitively (see
+    ``instance_adb_port``)."""
+    ports = {}
+    if not config_path or not os.path.isfile(config_path):
+        return ports
+    try:
+        model = config_handler.load_config(config_path)
+    except OSError:
+        logger.debug("Could not read %s for adb ports", config_path, exc_info=True)
+        return ports
+    for name, inst in model.instances.items():
+        if inst.adb_port is not None:
+            ports.setdefault(name.lower(), inst.adb_port)
+    return ports
+
+
+def _port_accepts(port: int, timeout: float = _PROBE_TIMEOUT_S) -> bool:
+    """True if something is listening on 127.0.0.1:``port`` (the instance's
+    adbd bridge is up). A stopped instance refuses at once; the timeout only
+    bounds a wedged one."""
+    try:
+        with socket.create_connection(("127.0.0.1", port), timeout=timeout):
+            return True
+    except OSError:
+        return False
+
+
+def list_running_instances(adb_exe: str, instances, runner: Runner = _wire_run,
+                           probe: Callable[[int], bool] = _port_accepts) -> dict:
     """Which of ``instances`` are currently reachable over ADB.
 
     ``instances`` is an iterable of (unique_id, config_path, original_name).
     Returns {unique_id: port} for every instance whose configured ADB port
-    is currently connected. Instances with no recorded port (never booted)
-    are skipped without spawning a process.
+    is currently connected. Ports come from one read per config file;
+    instances with no recorded port (never booted) or whose port refuses a TCP
+    ``probe`` are skipped without spawning a process. The rest are probed
+    concurrently, so a dozen stopped instances cost one short timeout, not a
+    dozen ``adb connect`` waits.
     """
-    running = {}
+    instances = list(instances)
+    ports_by_config = {}
+    targets = []
     for unique_id, config_path, name in instances:
-        port = instance_adb_port(config_path, name)
-        if port is None:
-            continue
-        try:
-            cp = runner([adb_exe, "connect", "127.0.0.1:%d" % port])
-            out = (cp.stdout or "") + (cp.stderr or "")
-            if "connected" in out.lower():
+        if config_path not in ports_by_config:
+            ports_by_config[config_path] = instance_adb_ports(config_path)
+        port = ports_by_config[config_path].get(name.lower())
+        if port is not None:
+            targets.append((unique_id, port))
+
+    def _check(unique_id, port):
+        if not probe(port):
+            return None
+        cp = runner([adb_exe, "connect", "127.0.0.1:%d" % port])
+        out = (cp.stdout or "") + (cp.stderr or "")
+        return port if "connected" in out.lower() else None
+
+    running = {}
+    if not targets:
+        return running
+    workers = min(_PROBE_MAX_WORKERS, len(targets))
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(_check, uid, port): uid for uid, port in targets}
+        for fut in concurrent.futures.as_completed(futures):
+            unique_id = futures[fut]
+            try:
+                port = fut.result()
+            except Exception as exc:  # noqa: BLE001 - one bad instance mustn't abort the rest
+                logger.warning("ADB probe failed for %s: %s", unique_id, exc)
+                continue
+            if port is not None:
                 running[unique_id] = port
-        except Exception as exc:  # noqa: BLE001 - one bad instance mustn't abort the rest
-            logger.warning("ADB probe failed for %s: %s", unique_id, exc)
     return running
@@ -0,0 +1,316 @@
+"""In-process client for the adb server's wire protocol (localhost:5037).
+
+Every ``adb_handler`` step used to spawn HD-Adb.exe, paying process startup and
+the client<->server handshake on each ``connect``/``push``/``shell``. The adb
+server already speaks a simple socket protocol, so this talks to it directly:
+
+- host services: ``host:connect``, ``host:devices``, ``host-serial:<s>:features``
+- ``host:transport:<serial>`` followed by a device service on the same socket
+- ``shell,v2`` (framed stdout/stderr + a real exit code), with the legacy raw
+  ``shell:`` stream as a fallback for devices without the feature
+- ``sync:`` ``STAT`` / ``SEND`` -- one sync session pushes any number of files
+
+It plugs in behind ``adb_handler``'s ``Runner`` seam: :class:`WireRunner`
+accepts the same argv lists the subprocess runner does and returns a
+``CompletedProcess``. The server itself is still HD-Adb's (we never start or
+own it): if nothing is listening on 5037 the runner hands that call to its
+subprocess ``fallback``, which starts the server, and later calls go native.
+
+Protocol reference: AOSP ``packages/modules/adb`` (``OVERVIEW.TXT``,
+``SERVICES.TXT``, ``SYNC.TXT``, ``shell_protocol.h``).
+"""
+from __future__ import annotations
+
+import logging
+import os
+import posixpath
+import socket
+import struct
+import subprocess
+import threading
+import time
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+ADB_HOST = "127.0.0.1"
+ADB_PORT = 5037
+
+_SYNC_CHUNK = 64 * 1024      # SYNC.TXT: DATA payloads are at most 64 KiB
+_PUSH_MODE = 0o100644        # a regular file, as ``adb push`` sends by default
+_S_IFMT, _S_IFDIR = 0o170000, 0o040000
+
+# shell_protocol.h packet ids.
+_ID_STDOUT, _ID_STDERR, _ID_EXIT = 1, 2, 3
+
+
+class AdbWireError(RuntimeError):
+    """The adb server answered FAIL, or the stream broke mid-protocol."""
+
+
+class AdbServerUnavailable(AdbWireError):
+    """Nothing is listening on the adb server port (server not started)."""
+
+
+def _recv_exact(sock: socket.socket, n: int) -> bytes:
+    buf = bytearray()
+    while len(buf) < n:
+        chunk = sock.recv(n - len(buf))
+        if not chunk:
+            raise AdbWireError("adb server closed the connection mid-reply")
+        buf += chunk
+    return bytes(buf)
+
+
+def _recv_all(sock: socket.socket) -> bytes:
+    buf = bytearray()
+    while True:
+        chunk = sock.recv(65536)
+        if not chunk:
+            return bytes(buf)
+        buf += chunk
+
+
+def _read_hex_block(sock: socket.socket) -> str:
+    """A ``<4 hex digits length><payload>`` block, as host services reply."""
+    n = int(_recv_exact(sock, 4), 16)
+    return _recv_exact(sock, n).decode("utf-8", errors="replace")
+
+
+class AdbWireClient:
+    """One adb server endpoint. Thread-safe: every request opens its own socket
+    (the protocol closes host-service sockets after one reply), and per-serial
+    device features are cached so ``shell,v2`` support is asked once."""
+
+    def __init__(self, host: str = ADB_HOST, port: int = ADB_PORT, timeout: float = 60.0):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self._features: dict = {}
+        self._lock = threading.Lock()
+
+    # --- framing -----------------------------------------------------------
+    def _open(self) -> socket.socket:
+        try:
+            return socket.create_connection((self.host, self.port), timeout=self.timeout)
+        except ConnectionRefusedError as exc:
+            raise AdbServerUnavailable(
+                "no adb server on %s:%d" % (self.host, self.port)) from exc
+
+    def _send_request(self, sock: socket.socket, request: str) -> None:
+        data = request.encode("utf-8")
+        sock.sendall(b"%04x" % len(data) + data)
+        status = _recv_exact(sock, 4)
+        if status == b"OKAY":
+            return
+        if status == b"FAIL":
+            raise AdbWireError(_read_hex_block(sock))
+        raise AdbWireError("unexpected adb server status %r" % status)
+
+    def _host_query(self, request: str) -> str:
+        sock = self._open()
+        with sock:
+            self._send_request(sock, request)
+            return _read_hex_block(sock)
+
+    def _transport(self, serial: str) -> socket.socket:
+        """A socket already switched to ``serial``; the caller sends one service."""
+        sock = self._open()
+        try:
+            self._send_request(sock, "host:transport:%s" % serial)
+        except Exception:
+            sock.close()
+            raise
+        return sock
+
+    # --- host services -----------------------------------------------------
+    def connect(self, serial: str) -> str:
+        """``adb connect`` -- the server's own message ("connected to ...",
+        "already connected to ...", "failed to connect ...")."""
+        self._features.pop(serial, None)  # a reconnect may be a different guest
+        return self._host_query("host:connect:%s" % serial)
+
+    def devices(self) -> str:
+        """``adb devices`` body: one ``serial<TAB>state`` line per device."""
+        return self._host_query("host:devices")
+
+    def features(self, serial: str) -> frozenset:
+        with self._lock:
+            cached = self._features.get(serial)
+        if cached is None:
+            try:
+                cached = frozenset(self._host_query("host-serial:%s:features" % serial).split(","))
+            except AdbWireError:
+                cached = frozenset()
+            with self._lock:
+                self._features[serial] = cached
+        return cached
+
+    # --- device services ---------------------------------------------------
+    def shell(self, serial: str, command: str) -> tuple:
+        """Run ``command`` in the guest shell; ``(exit_code, stdout, stderr)``.
+
+        Uses shell protocol v2 when the device has it (separate streams and the
+        real exit status); the legacy stream has neither, so its exit code is 0
+        and stderr arrives folded into stdout, as the adb client reports it.
+        """
+        if "shell_v2" not in self.features(serial):
+            sock = self._transport(serial)
+            with sock:
+                self._send_request(sock, "shell:%s" % command)
+                return 0, _recv_all(sock), b""
+        sock = self._transport(serial)
+        with sock:
+            self._send_request(sock, "shell,v2,raw:%s" % command)
+            out, err, code = bytearray(), bytearray(), None
+            while True:
+                head = sock.recv(1)
+                if not head:
+                    break
+                (length,) = struct.unpack("<I", _recv_exact(sock, 4))
+                payload = _recv_exact(sock, length)
+                if head[0] == _ID_STDOUT:
+                    out += payload
+                elif head[0] == _ID_STDERR:
+                    err += payload
+                elif head[0] == _ID_EXIT:
+                    code = payload[0] if payload else 0
+                    break
+        if code is None:
+            raise AdbWireError("shell closed without an exit status")
+        return code, bytes(out), bytes(err)
+
+    def stat(self, serial: str, remote: str) -> tuple:
+        """``(mode, size, mtime)`` of a guest path; mode 0 means it's absent."""
+        sock = self._transport(serial)
+        with sock:
+            self._send_request(sock, "sync:")
+            result = self._sync_stat(sock, remote)
+            sock.sendall(b"QUIT" + struct.pack("<I", 0))
+        return result
+
+    def push(self, serial: str, locals_: list, remote: str) -> list:
+        """``adb push`` of ``locals_`` to ``remote`` over one sync session.
+
+        Like the adb client, ``remote`` is a directory when it ends in ``/`` or
+        already is one (each file lands under its basename), otherwise the
+        single file's destination path. Returns the guest paths written.
+        """
+        sock = self._transport(serial)
+        written = []
+        with sock:
+            self._send_request(sock, "sync:")
+            mode = self._sync_stat(sock, remote.rstrip("/") or "/")[0]
+            as_dir = remote.endswith("/") or (mode & _S_IFMT) == _S_IFDIR
+            if len(locals_) > 1 and not as_dir:
+                raise AdbWireError("target '%s' is not a directory" % remote)
+            for local in locals_:
+                dest = (posixpath.join(remote, os.path.basename(local)) if as_dir
+                        else remote)
+                self._sync_send(sock, local, dest)
+                written.append(dest)
+            sock.sendall(b"QUIT" + struct.pack("<I", 0))
+        return written
+
+    def _sync_stat(self, sock: socket.socket, remote: str) -> tuple:
+        path = remote.encode("utf-8")
+        sock.sendall(b"STAT" + struct.pack("<I", len(path)) + path)
+        reply = _recv_exact(sock, 16)
+        if reply[:4] != b"STAT":
+            raise AdbWireError("bad sync STAT reply %r" % reply[:4])
+        return struct.unpack("<III", reply[4:])
+
+    def _sync_send(self, sock: socket.socket, local: str, dest: str) -> None:
+        spec = ("%s,%d" % (dest, _PUSH_MODE)).encode("utf-8")
+        sock.sendall(b"SEND" + struct.pack("<I", len(spec)) + spec)
+        with open(local, "rb") as f:
+            while True:
+                chunk = f.read(_SYNC_CHUNK)
+                if not chunk:
+                    break
+                sock.sendall(b"DATA" + struct.pack("<I", len(chunk)) + chunk)
+        sock.sendall(b"DONE" + struct.pack("<I", int(time.time())))
+        status = _recv_exact(sock, 4)
+        (length,) = struct.unpack("<I", _recv_exact(sock, 4))
+        if status == b"FAIL":
+            raise AdbWireError(_recv_exact(sock, length).decode("utf-8", errors="replace"))
+        if status != b"OKAY":
+            raise AdbWireError("bad sync SEND reply %r" % status)
+
+
+def _quote(arg: str) -> str:
+    return "'%s'" % arg.replace("'", "'\\''")
+
+
+class WireRunner:
+    """An ``adb_handler.Runner`` served by :class:`AdbWireClient`.
+
+    Understands the argv shapes ``adb_handler`` issues -- ``connect``,
+    ``devices``, ``-s S push``, ``-s S shell``, ``-s S install -r``,
+    ``-s S uninstall`` -- and returns a ``CompletedProcess`` with the same
+    stdout/returncode conventions as HD-Adb. Anything else, or every call
+    while no adb server is listening, goes to ``fallback``.
+    """
+
+    def __init__(self, fallback: Callable[[list], subprocess.CompletedProcess],
+                 client: Optional[AdbWireClient] = None):
+        self.fallback = fallback
+        self.client = client or AdbWireClient()
+
+    def __call__(self, cmd: list) -> subprocess.CompletedProcess:
+        try:
+            return self._dispatch(cmd)
+        except AdbServerUnavailable:
+            logger.debug("adb server not listening; spawning %s", cmd[:2])
+            return self.fallback(cmd)
+        except (AdbWireError, OSError) as exc:
+            # Mirror the subprocess runner: a failed adb call is a non-zero
+            # exit with the reason on stderr, not an exception.
+            return subprocess.CompletedProcess(cmd, 1, "", "adb: error: %s" % exc)
+
+    def _dispatch(self, cmd: list) -> subprocess.CompletedProcess:
+        c = self.client
+        args = list(cmd[1:])
+        serial = None
+        if args[:1] == ["-s"] and len(args) >= 2:
+            serial, args = args[1], args[2:]
+        verb, rest = (args[0], args[1:]) if args else ("", [])
+
+        if verb == "connect" and serial is None and len(rest) == 1:
+            return self._done(cmd, 0, c.connect(rest[0]) + "\n")
+        if verb == "devices" and serial is None:
+            return self._done(cmd, 0, "List of devices attached\n" + c.devices())
+        if serial is None:
+            return self.fallback(cmd)
+        if verb == "shell":
+            code, out, err = c.shell(serial, " ".join(rest))
+            return self._done(cmd, code, out.decode("utf-8", errors="replace"),
+                              err.decode("utf-8", errors="replace"))
+        if verb == "push" and len(rest) >= 2:
+            written = c.push(serial, rest[:-1], rest[-1])
+            return self._done(cmd, 0, "%d file(s) pushed.\n" % len(written))
+        if verb == "install" and rest and rest[-1].lower().endswith(".apk"):
+            return self._install(cmd, serial, rest[-1], [a for a in rest[:-1] if a.startswith("-")])
+        if verb == "uninstall" and len(rest) == 1:
+            code, out, err = c.shell(serial, "pm uninstall %s" % _quote(rest[0]))
+            return self._done(cmd, code, out.decode("utf-8", errors="replace"),
+                              err.decode("utf-8", errors="replace"))
+        return self.fallback(cmd)
+
+    def _install(self, cmd, serial, apk, flags) -> subprocess.CompletedProcess:
+        """``adb install``'s legacy path: push to /data/local/tmp, ``pm install``, tidy."""
+        tmp = "/data/local/tmp/" + os.path.basename(apk)
+        self.client.push(serial, [apk], tmp)
+        try:
+            code, out, err = self.client.shell(
+                serial, "pm install %s %s" % (" ".join(flags), _quote(tmp)))
+        finally:
+            self.client.shell(serial, "rm -f %s" % _quote(tmp))
+        text = out.decode("utf-8", errors="replace")
+        if code == 0 and "Success" not in text:
+            code = 1  # pm reports a failure on stdout with status 0 on old guests
+        return self._done(cmd, code, text, err.decode("utf-8", errors="replace"))
+
+    @staticmethod
+    def _done(cmd, code, stdout, stderr="") -> subprocess.CompletedProcess:
+        return subprocess.CompletedProcess(cmd, code, stdout, stderr)
@@ -0,0 +1,145 @@
+"""Content-addressed, compressed store for the original engine binaries.
+
+Patching an engine binary needs its original kept for "Undo". Instead of a full
+``.prepatch.bak`` copy next to every 20-60 MB executable (plus a ``.old`` copy
+per BlueStacks update), the original goes into one per-user store under the
+app data dir, keyed by its SHA-256 and zlib-compressed::
+
+    <app data>/backups/ab/ab12...ef.z
+
+The same build installed as NXT, CN and MSI is therefore stored once, a build
+that BlueStacks replaced simply stays in the store under its own hash, and a
+restore re-hashes while decompressing so a damaged object is never written over
+a binary.
+"""
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import tempfile
+import zlib
+
+import constants
+
+logger = logging.getLogger(__name__)
+
+STORE_DIRNAME = "backups"
+_OBJECT_SUFFIX = ".z"
+_CHUNK = 1 << 20
+_LEVEL = 6
+
+
+class BackupStore:
+    """A directory of ``<sha256>.z`` objects (fanned out by the first two hex digits)."""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def object_path(self, sha256: str) -> str:
+        sha256 = sha256.lower()
+        return os.path.join(self.root, sha256[:2], sha256 + _OBJECT_SUFFIX)
+
+    def has(self, sha256: str) -> bool:
+        return os.path.isfile(self.object_path(sha256))
+
+    def _commit(self, sha256: str, chunks) -> None:
+        """Compress ``chunks`` to a temp file in the object's dir, then rename
+        it into place -- a reader never sees a partial object, and two
+        concurrent writers of the same build just replace each other."""
+        final = self.object_path(sha256)
+        os.makedirs(os.path.dirname(final), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(final), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                comp = zlib.compressobj(_LEVEL)
+                for chunk in chunks:
+                    fh.write(comp.compress(chunk))
+                fh.write(comp.flush())
+                fh.flush()
+                os.fsync(fh.fileno())
+            os.replace(tmp, final)
+        except BaseException:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            raise
+
+    def put(self, data, sha256: str) -> bool:
+        """Store ``data`` (any buffer; its hash is ``sha256``). Returns False
+        when that build is already stored."""
+        if self.has(sha256):
+            return False
+        view = memoryview(data)
+        try:
+            self._commit(sha256, (view[i:i + _CHUNK] for i in range(0, len(view), _CHUNK)))
+        finally:
+            view.release()
+        return True
+
+    def put_file(self, path: str) -> str:
+        """Store the file at ``path`` (hashed while it is read); returns its SHA-256."""
+        h = hashlib.sha256()
+        with open(path, "rb") as fh:
+            for chunk in iter(lambda: fh.read(_CHUNK), b""):
+                h.update(chunk)
+        sha256 = h.hexdigest()
+        if not self.has(sha256):
+            with open(path, "rb") as fh:
+                self._commit(sha256, iter(lambda: fh.read(_CHUNK), b""))
+        return sha256
+
+    def _chunks(self, sha256: str):
+        decomp = zlib.decompressobj()
+        with open(self.object_path(sha256), "rb") as fh:
+            for chunk in iter(lambda: fh.read(_CHUNK), b""):
+                yield decomp.decompress(chunk)
+        yield decomp.flush()
+        if not decomp.eof:
+            raise zlib.error("truncated backup object")
+
+    def verify(self, sha256: str) -> bool:
+        """True if the stored object decompresses to exactly ``sha256``."""
+        h = hashlib.sha256()
+        try:
+            for chunk in self._chunks(sha256):
+                h.update(chunk)
+        except (OSError, zlib.error):
+            return False
+        return h.hexdigest() == sha256.lower()
+
+    def restore_to(self, sha256: str, dest: str) -> None:
+        """Write build ``sha256`` to ``dest``, verified by hash before it
+        replaces anything. Raises FileNotFoundError if the build isn't stored
+        and RuntimeError if the object is damaged (``dest`` left untouched)."""
+        if not self.has(sha256):
+            raise FileNotFoundError(self.object_path(sha256))
+        h = hashlib.sha256()
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(dest)),
+                                   prefix=os.path.basename(dest) + ".", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                try:
+                    for chunk in self._chunks(sha256):
+                        h.update(chunk)
+                        fh.write(chunk)
+                except zlib.error as exc:
+                    raise RuntimeError(f"backup {sha256[:12]} is damaged: {exc}") from exc
+                fh.flush()
+                os.fsync(fh.fileno())
+            if h.hexdigest() != sha256.lower():
+                raise RuntimeError(f"backup {sha256[:12]} is damaged: "
+                                   f"content hashes to {h.hexdigest()[:12]}")
+            os.replace(tmp, dest)
+        except BaseException:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            raise
+
+
+def store() -> BackupStore:
+    """The backup store in this user's app data dir."""
+    return BackupStore(os.path.join(constants.app_data_dir(), STORE_DIRNAME))
@@ -0,0 +1,117 @@
+"""Parsed model of an instance's ``.bstk`` files (its VirtualBox-style machine
+config), shared by everything that asks about the instance's disks.
+
+Each ``<HardDisk location=... format=... type=.../>`` element is parsed once
+into a :class:`HardDisk`, and the parse is kept until the file's (size, mtime)
+changes.  The R/W detection on the status timer, the R/W toggle and the
+Root.vhd resolution for clones all read from here instead of each re-reading
+and regex-scanning the files; an unchanged instance costs a directory stat
+plus one stat per ``.bstk``.
+"""
+from __future__ import annotations
+
+import ntpath
+import os
+import re
+import threading
+from dataclasses import dataclass
+
+import constants
+
+_HARDDISK_RE = re.compile(r"<HardDisk\b[^>]*?/?>")
+_ATTR_RE = re.compile(r'(\w+)\s*=\s*"([^"]*)"')
+
+
+@dataclass(frozen=True)
+class HardDisk:
+    location: str       # as written: a bare name, relative, or absolute Windows path
+    format: str         # "VHD" (Root.vhd), "VDI" (fastboot.vdi), "VHDX" (Data.vhdx)
+    type: str           # constants.MODE_READONLY / MODE_READWRITE, or "" if absent
+    span: tuple[int, int]   # the element's (start, end) in BstkFile.text
+
+    @property
+    def filename(self) -> str:
+        return ntpath.basename(self.location)
+
+    @property
+    def readonly(self) -> bool:
+        return self.type.lower() == constants.MODE_READONLY.lower()
+
+
+@dataclass(frozen=True)
+class BstkFile:
+    path: str
+    text: str
+    disks: tuple[HardDisk, ...]
+
+    def disks_named(self, names) -> list[HardDisk]:
+        """The disks whose file name is one of ``names`` (case-insensitive)."""
+        wanted = {n.lower() for n in names}
+        return [d for d in self.disks if d.filename.lower() in wanted]
+
+
+def parse(path: str, text: str) -> BstkFile:
+    disks = []
+    for m in _HARDDISK_RE.finditer(text):
+        attrs = {k.lower(): v for k, v in _ATTR_RE.findall(m.group(0))}
+        if "location" not in attrs:
+            continue
+        disks.append(HardDisk(attrs["location"], attrs.get("format", ""),
+                              attrs.get("type", ""), m.span()))
+    return BstkFile(path, text, tuple(disks))
+
+
+_lock = threading.Lock()
+_files: dict[str, tuple[tuple, BstkFile]] = {}
+_dirs: dict[str, tuple[int, list[str]]] = {}
+
+
+def _key(path: str) -> str:
+    return os.path.normcase(os.path.abspath(path))
+
+
+def load(path: str) -> BstkFile:
+    """The parsed ``path``, re-read only when its (size, mtime) changed.
+    Raises OSError if it can't be read and ValueError if it isn't UTF-8 (the
+    R/W toggle writes the text back, so nothing is decoded lossily)."""
+    st = os.stat(path)
+    fp = (st.st_size, st.st_mtime_ns)
+    key = _key(path)
+    with _lock:
+        hit = _files.get(key)
+    if hit is not None and hit[0] == fp:
+        return hit[1]
+    with open(path, encoding="utf-8") as f:
+        model = parse(path, f.read())
+    with _lock:
+        _files[key] = (fp, model)
+    return model
+
+
+def invalidate(path: str) -> None:
+    with _lock:
+        _files.pop(_key(path), None)
+
+
+def instance_bstk_paths(instance_dir: str) -> list[str]:
+    """``Android.bstk.in`` (if present) followed by the instance's ``*.bstk``
+    files; the listing is kept until the directory's mtime changes."""
+    st = os.stat(instance_dir)
+    key = _key(instance_dir)
+    with _lock:
+        hit = _dirs.get(key)
+    if hit is not None and hit[0] == st.st_mtime_ns:
+        return list(hit[1])
+    names = sorted(os.listdir(instance_dir))
+    paths = [os.path.join(instance_dir, n) for n in names if n == constants.ANDROID_BSTK_IN_FILE]
+    paths += [os.path.join(instance_dir, n) for n in names
+              if n.lower().endswith(".bstk") and n != constants.ANDROID_BSTK_IN_FILE]
+    with _lock:
+        _dirs[key] = (st.st_mtime_ns, paths)
+    return list(paths)
+
+
+def clear_cache() -> None:
+    with _lock:
+        _files.clear()
+        _dirs.clear()
@@ -0,0 +1,132 @@
+"""Cooperative cancellation for the long offline operations.
+
+Scanning a multi-GB Data.vhdx for su, staging Magisk or replaying a journal
+with ``e2fsck`` can each take minutes, and used to run to completion whatever
+the user did.  A :class:`CancelToken` is the "please stop" flag for one such
+operation: the code doing the work checks it between steps and raises
+:class:`Cancelled`, and :func:`run` -- which every e2fsprogs/diskpart call goes
+through -- kills its child process once the token is cancelled, so an abort
+takes effect within ``constants.CANCEL_POLL_S``.
+
+The token is set as the *current* one for a block with :func:`scope` (a
+``jobs.Batch`` does this around each job), so the subprocess helpers deep
+down pick it up without every ``debugfs`` wrapper taking a parameter; the
+public entry points also accept it explicitly as ``cancel=``.  Cleanup that
+must finish even after a cancel -- detaching a disk, rolling back a partial
+write -- runs under :func:`shielded`, and so does every ``debugfs -w`` script
+and ``e2fsck -fp`` repair: killing one midway could leave the image half
+written, so writers are refused before they start but never killed.
+
+Kept free of Qt.
+"""
+from __future__ import annotations
+
+import contextlib
+import contextvars
+import logging
+import subprocess
+import threading
+import time
+
+import constants
+
+logger = logging.getLogger(__name__)
+
+
+class Cancelled(Exception):
+    """Raised by an operation that noticed it was cancelled and stopped cleanly."""
+
+
+class CancelToken:
+    """A thread-safe, one-way "stop" flag."""
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self) -> None:
+        self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def check(self) -> None:
+        """Raise :class:`Cancelled` if the token has been cancelled."""
+        if self._event.is_set():
+            raise Cancelled("cancelled")
+
+    def wait(self, timeout: float) -> bool:
+        """Sleep up to ``timeout`` seconds; True if cancelled meanwhile."""
+        return self._event.wait(timeout)
+
+
+_current: contextvars.ContextVar[CancelToken | None] = contextvars.ContextVar(
+    "cancel_token", default=None)
+
+
+def current() -> CancelToken | None:
+    """The token of the operation running on this thread, if any."""
+    return _current.get()
+
+
+@contextlib.contextmanager
+def scope(token: CancelToken | None):
+    """Make ``token`` the current one for the block (None keeps the current)."""
+    if token is None:
+        yield current()
+        return
+    reset = _current.set(token)
+    try:
+        yield token
+    finally:
+        _current.reset(reset)
+
+
+@contextlib.contextmanager
+def shielded():
+    """Run the block with no current token: cleanup that must not be cut short."""
+    reset = _current.set(None)
+    try:
+        yield
+    finally:
+        _current.reset(reset)
+
+
+def check(token: CancelToken | None = None) -> None:
+    """Raise :class:`Cancelled` if ``token`` (default: the current one) was cancelled."""
+    token = token or current()
+    if token is not None:
+        token.check()
+
+
+def sleep(seconds: float) -> None:
+    """``time.sleep`` that ends early (raising :class:`Cancelled`) on a cancel."""
+    token = current()
+    if token is None:
+        time.sleep(seconds)
+    elif token.wait(seconds):
+        raise Cancelled("cancelled")
+
+
+def run(args: list[str], env: dict | None = None,
+        creationflags: int = 0) -> subprocess.CompletedProcess:
+    """``subprocess.run(args, capture_output=True, text=True)`` that kills the
+    child and raises :class:`Cancelled` once the current token is cancelled."""
+    token = current()
+    if token is None:
+        return subprocess.run(args, capture_output=True, text=True,
+                              creationflags=creationflags, env=env)
+    token.check()
+    proc = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                            text=True, creationflags=creationflags, env=env)
+    while True:
+        try:
+            stdout, stderr = proc.communicate(timeout=constants.CANCEL_POLL_S)
+            return subprocess.CompletedProcess(args, proc.returncode, stdout, stderr)
+        except subprocess.TimeoutExpired:
+            if not token.cancelled:
+                continue
+        logger.info("Cancelled: killing %s", args[0])
+        proc.kill()
+        proc.communicate()
+        raise Cancelled("cancelled")
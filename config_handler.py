@@ -4,6 +4,8 @@ from __future__ import annotations
 import os
 import logging
 import re
+import threading
+from dataclasses import dataclass
 from typing import Any
 
 
@@ -14,19 +16,50 @@ import win_retry
 logger = logging.getLogger(__name__)
 
 
+_KEY_LINE_RE = re.compile(r"^\s*([^\s=]+)\s*=")
+
+
 def modify_config_file(config_path: str, setting: str, new_value: str) -> bool:
     """
     Modifies a specific setting in the bluestacks.conf file.
     """
+    return bool(modify_config_settings(config_path, {setting: new_value}))
+
+
+def modify_config_settings(config_path: str, settings: dict[str, str]) -> list[str]:
+    """
+    Applies any number of setting edits to bluestacks.conf in one transaction:
+    one read, one atomic replace, one read-only unlock/relock cycle.
+
+    Settings not present are appended in the order given. Returns the keys whose
+    line actually changed (empty when the file already matched, and then the
+    file is not written at all).
+    """
     if not os.path.isfile(config_path):
         logger.error(f"Config file not found: {config_path}")
         raise FileNotFoundError(f"Config file not found: {config_path}")
+    if not settings:
+        return []
+    # Batched jobs edit the shared file from several worker threads; each
+    # read-modify-replace must see the previous one's result.
+    with _write_lock(config_path):
+        return _modify_config_settings(config_path, settings)
+
+
+_write_locks_guard = threading.Lock()
+_write_locks: dict[str, threading.Lock] = {}
 
-    logger.debug(
-        f"Attempting to modify setting '{setting}' to '{new_value}' in {config_path}"
-    )
 
-    new_line_content = f'{setting}="{new_value}"'
+def _write_lock(config_path: str) -> threading.Lock:
+    key = os.path.normcase(os.path.abspath(config_path))
+    with _write_locks_guard:
+        return _write_locks.setdefault(key, threading.Lock())
+
+
+def _modify_config_settings(config_path: str, settings: dict[str, str]) -> list[str]:
+    logger.debug(f"Attempting to modify {len(settings)} setting(s) in {config_path}")
+
+    wanted = {key: f'{key}="{value}"' for key, value in settings.items()}
     lines = []
     try:
         with open(config_path, encoding="utf-8") as file:
@@ -36,34 +69,38 @@ def modify_config_file(config_path: str, setting: str, new_value: str) -> bool:
         raise OSError(f"Error reading configuration file {config_path}: {e}") from e
 
     updated_lines = []
-    setting_found_and_updated = False
-    changed = False
-
-    setting_pattern = re.compile(r"^\s*" + re.escape(setting) + r"\s*=")
+    found: set[str] = set()
+    changed: list[str] = []
 
     for line in lines:
         stripped_line = line.strip()
-        if setting_pattern.match(stripped_line):
+        match = _KEY_LINE_RE.match(stripped_line)
+        setting = match.group(1) if match else None
+        if setting in wanted:
+            new_line_content = wanted[setting]
             if stripped_line != new_line_content:
                 logger.info(
                     f"Updating setting '{setting}'. Old line: '{stripped_line}', New line: '{new_line_content}'"
                 )
                 updated_lines.append(new_line_content + "\n")
-                changed = True
+                if setting not in changed:
+                    changed.append(setting)
             else:
                 updated_lines.append(line)
-            setting_found_and_updated = True
+            found.add(setting)
         else:
             updated_lines.append(line)
 
-    if not setting_found_and_updated:
+    for setting, new_line_content in wanted.items():
+        if setting in found:
+            continue
         logger.info(
-            f"Setting '{setting}' not found. Appending with value '{new_value}'."
+            f"Setting '{setting}' not found. Appending with value '{settings[setting]}'."
         )
         if updated_lines and not updated_lines[-1].endswith("\n"):
             updated_lines[-1] += "\n"
         updated_lines.append(new_line_content + "\n")
-        changed = True
+        changed.append(setting)
 
     if changed:
         try:
@@ -92,6 +129,7 @@ def modify_config_file(config_path: str, setting: str, new_value: str) -> bool:
                 finally:
                     if os.path.isfile(tmp_path):
                         os.unlink(tmp_path)
+            invalidate_config(config_path)
             logger.debug(f"Successfully wrote changes to {config_path}")
         except Exception as e:
             logger.exception(f"Error writing updated configuration file {config_path}")
@@ -102,6 +140,109 @@ def modify_config_file(config_path: str, setting: str, new_value: str) -> bool:
     return changed
 
 
+# --- Parsed config model -----------------------------------------------------
+# bluestacks.conf is read by the status refresh (root flags, display names),
+# the ADB probes (ports) and the ad-settings page, every few seconds and per
+# installation. Parse it once into a key -> value dict plus a per-instance
+# index, and keep that until the file's (size, mtime) changes -- so an
+# unchanged file costs one stat per reader per tick.
+_VALUE_LINE_RE = re.compile(r'^\s*([^\s=]+)\s*=\s*"?([^"\r\n]*)"?\s*$')
+
+
+@dataclass(frozen=True)
+class InstanceConfig:
+    """The per-instance keys the app reads; None when a key is absent."""
+
+    name: str
+    root_enabled: bool | None = None
+    display_name: str | None = None
+    adb_port: int | None = None
+
+
+@dataclass(frozen=True)
+class ConfigModel:
+    """One parse of a bluestacks.conf. Shared between readers: treat as read-only."""
+
+    values: dict[str, str]
+    instances: dict[str, InstanceConfig]     # engine name (as in the file) -> keys
+    global_rooting: bool
+
+    def instance(self, name: str) -> InstanceConfig | None:
+        """Case-insensitive lookup, the way BlueStacks matches instance keys."""
+        hit = self.instances.get(name)
+        if hit is not None:
+            return hit
+        lowered = name.lower()
+        return next((i for n, i in self.instances.items() if n.lower() == lowered), None)
+
+
+def _parse_config(lines) -> ConfigModel:
+    values: dict[str, str] = {}
+    fields: dict[str, dict[str, Any]] = {}
+    prefix = constants.INSTANCE_PREFIX.lower()
+    global_rooting = False
+    for line in lines:
+        stripped = line.strip()
+        if not stripped or stripped.startswith("#"):
+            continue
+        m = _VALUE_LINE_RE.match(stripped)
+        if not m:
+            continue
+        key, value = m.group(1), m.group(2)
+        values[key] = value
+        lowered = key.lower()
+        if lowered == constants.FEATURE_ROOTING_KEY.lower():
+            global_rooting = global_rooting or value == "1"
+            continue
+        if not lowered.startswith(prefix):
+            continue
+        name, dot, rest = key[len(prefix):].partition(".")
+        if not (name and dot):
+            continue
+        suffix = "." + rest.lower()
+        inst = fields.setdefault(name, {})
+        if suffix == constants.ENABLE_ROOT_KEY:
+            inst["root_enabled"] = value == "1"
+        elif suffix == constants.DISPLAY_NAME_KEY:
+            inst["display_name"] = value
+        elif suffix == constants.ADB_PORT_KEY and value.isdigit():
+            inst.setdefault("adb_port", int(value))      # first one wins
+    return ConfigModel(values=values,
+                       instances={n: InstanceConfig(n, **f) for n, f in fields.items()},
+                       global_rooting=global_rooting)
+
+
+_config_lock = threading.Lock()
+_config_cache: dict[str, tuple[tuple, ConfigModel]] = {}
+
+
+def _config_key(config_path: str) -> str:
+    return os.path.normcase(os.path.abspath(config_path))
+
+
+def invalidate_config(config_path: str) -> None:
+    """Drop the cached model of ``config_path`` (the next read re-parses)."""
+    with _config_lock:
+        _config_cache.pop(_config_key(config_path), None)
+
+
+def load_config(config_path: str) -> ConfigModel:
+    """The parsed model of ``config_path``, re-parsed only when the file's
+    (size, mtime) changed. Raises OSError if it can't be read."""
+    st = os.stat(config_path)
+    fp = (st.st_size, st.st_mtime_ns)
+    key = _config_key(config_path)
+    with _config_lock:
+        hit = _config_cache.get(key)
+    if hit is not None and hit[0] == fp:
+        return hit[1]
+    with open(config_path, encoding="utf-8") as file:
+        model = _parse_config(file)
+    with _config_lock:
+        _config_cache[key] = (fp, model)
+    return model
+
+
 def get_complete_root_statuses(config_path: str) -> dict[str, Any]:
     """
     Reads a config file and returns all instance root statuses AND the global rooting feature status.
@@ -113,9 +254,6 @@ def get_complete_root_statuses(config_path: str) -> dict[str, Any]:
         A dictionary like:
         {'global_status': bool, 'instance_statuses': {name: bool}, 'display_names': {name: str}}
     """
-    instance_statuses: dict[str, bool] = {}
-    display_names: dict[str, str] = {}
-    global_status: bool = False
     empty_result = {"global_status": False, "instance_statuses": {}, "display_names": {}}
 
     if not os.path.isfile(config_path):
@@ -124,55 +262,16 @@ def get_complete_root_statuses(config_path: str) -> dict[str, Any]:
         )
         return empty_result
 
-    # FIX: Regex for both instance-specific and global root keys
-    instance_pattern = re.compile(
-        r"^"
-        + re.escape(constants.INSTANCE_PREFIX)
-        + r"([^.]+)"
-        + re.escape(constants.ENABLE_ROOT_KEY)
-        + r'\s*=\s*"([^"]*)"',
-        re.IGNORECASE,
-    )
-    display_name_pattern = re.compile(
-        r"^"
-        + re.escape(constants.INSTANCE_PREFIX)
-        + r"([^.]+)"
-        + re.escape(constants.DISPLAY_NAME_KEY)
-        + r'\s*=\s*"([^"]*)"',
-        re.IGNORECASE,
-    )
-    global_pattern = re.compile(
-        r"^" + re.escape(constants.FEATURE_ROOTING_KEY) + r'\s*=\s*"1"', re.IGNORECASE
-    )
-
     try:
-        with open(config_path, encoding="utf-8") as file:
-            for line in file:
-                stripped_line = line.strip()
-
-                # Check for global key
-                if global_pattern.match(stripped_line):
-                    global_status = True
-                    logger.debug(f"Found global root status in {config_path}: Enabled")
-
-                # Check for instance key
-                match = instance_pattern.match(stripped_line)
-                if match:
-                    instance_name, value = match.group(1), match.group(2)
-                    is_enabled = value == "1"
-                    instance_statuses[instance_name] = is_enabled
-
-                # Check for instance display-name key
-                name_match = display_name_pattern.match(stripped_line)
-                if name_match:
-                    instance_name, value = name_match.group(1), name_match.group(2)
-                    display_names[instance_name] = value
+        model = load_config(config_path)
     except Exception:
         logger.exception(f"Error reading config file {config_path} for root statuses.")
         return empty_result
 
     return {
-        "global_status": global_status,
-        "instance_statuses": instance_statuses,
-        "display_names": display_names,
+        "global_status": model.global_rooting,
+        "instance_statuses": {n: i.root_enabled for n, i in model.instances.items()
+                              if i.root_enabled is not None},
+        "display_names": {n: i.display_name for n, i in model.instances.items()
+                          if i.display_name is not None},
     }
@@ -26,3 +26,11 @@ def _no_real_bluestacks_detection(monkeypatch):
         lambda: [],
         raising=True,
     )
+
+
+@pytest.fixture(autouse=True)
+def _isolated_app_data(monkeypatch, tmp_path):
+    """Point the per-user app data dir (constants.app_data_dir) at a temp dir,
+    so caches the code persists (e.g. the patch-offset DB) never touch -- or
+    leak state in from -- the real user profile."""
+    monkeypatch.setenv("LOCALAPPDATA", str(tmp_path / "localappdata"))
@@ -1,11 +1,14 @@
 """Application constants."""
 from __future__ import annotations
 
+import os
 import re
 
 INSTANCE_PREFIX = "bst.instance."
 ENABLE_ROOT_KEY = ".enable_root_access"
 DISPLAY_NAME_KEY = ".display_name"
+# bluestacks.conf: bst.instance.<name>.status.adb_port="5555"
+ADB_PORT_KEY = ".status.adb_port"
 # BlueStacks names every new instance this by default, so it does not identify
 # one: the engine name (Tiramisu64, Pie64) is what actually distinguishes them.
 # A display name is only worth showing when the user has changed it from this.
@@ -76,8 +79,9 @@ REGEX_BSTK_READONLY_PATTERN = re.compile(
 
 # modrm bytes for a RIP-relative `lea rXX, [rip+rel32]` (48/4C 8D <modrm> rel32),
 # one entry per general-purpose destination register (mod=00, rm=101, reg=0..7).
-# Shared by su_patch.py and integrity_patch.py so their two `lea`-scanners can't
-# drift into recognizing different register subsets (see issue #49: su_patch's
+# Decoded in one place (rip_xref.py) for every locator -- su_patch.py,
+# integrity_patch.py, root_persistence.py -- so they can't drift into
+# recognizing different register subsets (see issue #49: su_patch's
 # locator only accepted rax/rcx/rsi/rdi, silently missing an su binary whose
 # isDeveloperMode() lea happened to target rdx/rbx/rbp).
 RIP_LEA_MODRM = frozenset({0x05, 0x0D, 0x15, 0x1D, 0x25, 0x2D, 0x35, 0x3D})
@@ -99,7 +103,24 @@ BLUESTACKS_PROCESS_NAMES = [
 
 
 REFRESH_INTERVAL_MS = 5000
+# Status watcher (views/status_watcher.py): a burst of change events is folded
+# into one refresh after WATCH_DEBOUNCE_MS of quiet, but never held back longer
+# than REFRESH_INTERVAL_MS (a running instance writes its disk continuously).
+# The stat-snapshot poll starts at REFRESH_INTERVAL_MS when a path can't be
+# watched natively (WATCH_SAFETY_POLL_MS when all can) and backs off to
+# WATCH_POLL_MAX_MS while idle, WATCH_MINIMIZED_FACTOR times slower minimized.
+WATCH_DEBOUNCE_MS = 400
+WATCH_SAFETY_POLL_MS = 30000
+WATCH_POLL_MAX_MS = 60000
+WATCH_MINIMIZED_FACTOR = 4
 PROCESS_TERMINATION_WAIT_MS = 1500
+# Batched instance jobs (jobs.py): at most JOB_MAX_WORKERS run at once, and
+# only on disjoint disks -- two jobs writing the same (shared) Root.vhd or
+# Data.vhdx always run one after the other.
+JOB_MAX_WORKERS = 3
+# Cancelling a job (cancellation.py): a running e2fsck/debugfs child is polled
+# this often and killed once its job is cancelled, so an abort lands within it.
+CANCEL_POLL_S = 0.2
 PROCESS_KILL_TIMEOUT_S = 5
 PROCESS_POST_KILL_WAIT_S = 2
 
@@ -108,3 +129,13 @@ APP_VERSION = "3.7.0"
 APP_ID = f"RobThePCGuy.BlueStacksRootGUI.{APP_VERSION}"
 APP_NAME = "BlueStacks Root GUI"
 ICON_FILENAME = "favicon.ico"
+
+# Per-user data that outlives a session (patch-offset DB, caches). Under
+# %LOCALAPPDATA% so it never roams and never lands in the BlueStacks dirs.
+APP_DATA_DIRNAME = "BlueStacksRootGUI"
+
+
+def app_data_dir() -> str:
+    """This app's per-user data directory (not created here)."""
+    base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~")
+    return os.path.join(base, APP_DATA_DIRNAME)
@@ -0,0 +1,186 @@
+"""Which virtual disks each instance boots from, and which instances share them.
+
+BlueStacks clones don't own a ``Root.vhd``: their ``.bstk`` points the VHD disk
+at the master instance of that Android version, so one physical system image
+backs several instances.  :func:`resolve` maps an instance to its ``Root.vhd``,
+``Data.vhdx`` and ``fastboot.vdi`` (its own file, else the ``.bstk`` location
+of that disk format), and :func:`refresh` builds a :class:`Topology` over every
+instance that groups them by shared ``Root.vhd``.
+
+Resolutions are cached per instance and only redone when the instance folder
+or one of its ``.bstk`` files changed, or a disk it resolved to went away, so
+the status refresh rebuilds the whole graph for a few ``stat`` calls.  Status
+queries and batch operations use the groups to do per-disk work once per
+physical disk instead of once per instance.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import threading
+from dataclasses import dataclass
+
+import bstk
+import constants
+
+logger = logging.getLogger(__name__)
+
+# (own file name, .bstk format) of each disk an instance boots from
+_DISKS = {
+    "root_vhd": (constants.ROOT_VHD, "VHD"),
+    "data_vhdx": (constants.DATA_VHDX, "VHDX"),
+    "fastboot": (constants.FASTBOOT_VDI, "VDI"),
+}
+
+
+@dataclass(frozen=True)
+class InstanceDisks:
+    instance_dir: str
+    root_vhd: str | None
+    data_vhdx: str | None
+    fastboot: str | None
+
+    @property
+    def shared(self) -> bool:
+        """True if the Root.vhd lives outside the instance's own folder (a clone)."""
+        return self.root_vhd is not None and \
+            _norm(os.path.dirname(self.root_vhd)) != _norm(self.instance_dir)
+
+
+def _norm(path: str) -> str:
+    return os.path.normcase(os.path.normpath(os.path.abspath(path)))
+
+
+def _fingerprint(instance_dir: str) -> tuple:
+    st = os.stat(instance_dir)
+    files = []
+    for path in bstk.instance_bstk_paths(instance_dir):
+        try:
+            fst = os.stat(path)
+        except OSError:
+            continue
+        files.append((path, fst.st_size, fst.st_mtime_ns))
+    return (st.st_mtime_ns, tuple(files))
+
+
+def _resolve_uncached(instance_dir: str) -> InstanceDisks:
+    found: dict[str, str | None] = {}
+    bstk_disks = []
+    for path in bstk.instance_bstk_paths(instance_dir):
+        try:
+            bstk_disks.extend(bstk.load(path).disks)
+        except (OSError, ValueError):
+            continue
+    for field, (name, fmt) in _DISKS.items():
+        own = os.path.join(instance_dir, name)
+        found[field] = own if os.path.isfile(own) else None
+        if found[field]:
+            continue
+        for disk in bstk_disks:
+            if disk.format.upper() != fmt:
+                continue
+            loc = disk.location
+            resolved = loc if os.path.isabs(loc) else os.path.normpath(os.path.join(instance_dir, loc))
+            if os.path.isfile(resolved):
+                found[field] = resolved
+                break
+    return InstanceDisks(instance_dir, **found)
+
+
+_lock = threading.Lock()
+_cache: dict[str, tuple[tuple, InstanceDisks]] = {}
+
+
+def resolve(instance_dir: str) -> InstanceDisks:
+    """The disks ``instance_dir`` boots from (fields are None when not found).
+
+    Cached until the folder, one of its ``.bstk`` files or a resolved disk
+    changes; an instance with a missing disk is re-resolved every call so a
+    master that appears later is picked up.
+    """
+    key = _norm(instance_dir)
+    try:
+        fp = _fingerprint(instance_dir)
+    except OSError:
+        return InstanceDisks(instance_dir, None, None, None)
+    with _lock:
+        hit = _cache.get(key)
+    if hit is not None and hit[0] == fp:
+        disks = hit[1]
+        paths = (disks.root_vhd, disks.data_vhdx, disks.fastboot)
+        if all(p is not None and os.path.isfile(p) for p in paths):
+            return disks
+    disks = _resolve_uncached(instance_dir)
+    with _lock:
+        _cache[key] = (fp, disks)
+    return disks
+
+
+def clear_cache() -> None:
+    with _lock:
+        _cache.clear()
+
+
+@dataclass(frozen=True)
+class Topology:
+    """Every known instance's disks, plus instances grouped by shared Root.vhd."""
+
+    instances: dict[str, InstanceDisks]   # instance dir -> its disks (input order)
+    groups: dict[str, list[str]]          # normalised Root.vhd -> instance dirs
+
+    def disks(self, instance_dir: str) -> InstanceDisks:
+        """``instance_dir``'s disks, resolving it now if it isn't in the graph."""
+        found = self.instances.get(instance_dir)
+        return found if found is not None else resolve(instance_dir)
+
+    def group_of(self, instance_dir: str) -> list[str]:
+        """The instances sharing ``instance_dir``'s Root.vhd (itself included)."""
+        vhd = self.disks(instance_dir).root_vhd
+        return list(self.groups.get(_norm(vhd), [instance_dir])) if vhd else [instance_dir]
+
+    def group(self, instance_dirs) -> tuple[dict[str, list[str]], list[str]]:
+        """Group ``instance_dirs`` by Root.vhd (input order kept).
+
+        Returns ``(groups, unresolved)``: ``groups`` maps a normalised Root.vhd
+        to the given instances booting from it, ``unresolved`` lists the ones
+        without a Root.vhd.
+        """
+        groups: dict[str, list[str]] = {}
+        unresolved: list[str] = []
+        for d in dict.fromkeys(instance_dirs):
+            vhd = self.disks(d).root_vhd
+            if vhd is None:
+                unresolved.append(d)
+            else:
+                groups.setdefault(_norm(vhd), []).append(d)
+        return groups, unresolved
+
+
+def build(instance_dirs) -> Topology:
+    instances = {d: resolve(d) for d in dict.fromkeys(instance_dirs)}
+    groups: dict[str, list[str]] = {}
+    for d, disks in instances.items():
+        if disks.root_vhd is not None:
+            groups.setdefault(_norm(disks.root_vhd), []).append(d)
+    return Topology(instances, groups)
+
+
+_current = Topology({}, {})
+
+
+def refresh(instance_dirs) -> Topology:
+    """Rebuild the installation-wide graph over ``instance_dirs`` (unchanged
+    instances come from the cache) and make it the :func:`current` one."""
+    global _current
+    topo = build(instance_dirs)
+    with _lock:
+        _current = topo
+    logger.debug("Disk topology: %d instance(s) on %d Root.vhd(s)",
+                 len(topo.instances), len(topo.groups))
+    return topo
+
+
+def current() -> Topology:
+    """The graph from the last :func:`refresh` (empty before the first)."""
+    with _lock:
+        return _current
@@ -36,6 +36,7 @@ import sys
 import tempfile
 import time
 
+import cancellation
 import su_patch_offline  # reuse its dynamic-VHD reader for the MBR probe
 
 logger = logging.getLogger(__name__)
@@ -70,8 +71,8 @@ def tools_available() -> bool:
 
 
 def _run(args: list[str], env: dict | None = None) -> subprocess.CompletedProcess:
-    return subprocess.run(args, capture_output=True, text=True,
-                          creationflags=_NO_WINDOW, env=env)
+    # Killed (raising cancellation.Cancelled) if the current operation is cancelled.
+    return cancellation.run(args, env=env, creationflags=_NO_WINDOW)
 
 
 def _tool_env() -> dict:
@@ -87,12 +88,16 @@ def _run_script(device: str, lines: list[str], env: dict) -> str:
     combined stdout+stderr so callers can scan it for error markers.
 
     Shared by both offline-edit features (classic su symlink, Magisk staging).
+    A cancel is honoured before the script starts, never during it: killing
+    ``debugfs -w`` mid-script could leave the ext4 image half-written.
     """
+    cancellation.check()
     fd, path = tempfile.mkstemp(suffix=".txt")
     try:
         with os.fdopen(fd, "w") as f:
             f.write("\n".join(lines) + "\nquit\n")
-        r = _run([_debugfs(), "-w", "-f", path, device], env=env)
+        with cancellation.shielded():
+            r = _run([_debugfs(), "-w", "-f", path, device], env=env)
         return (r.stdout or "") + (r.stderr or "")
     finally:
         try:
@@ -154,13 +159,15 @@ def _detach(vhd_path: str) -> bool:
     A silent detach failure leaves the image mounted as a raw disk, which can
     block the next instance boot or race BlueStacks reopening the same file, so
     we retry and verify rather than fire-and-forget (a transient 'device busy'
-    right after debugfs closes is common).
+    right after debugfs closes is common).  Shielded from cancellation: a
+    cancelled operation still has to let go of its disk.
     """
-    for _ in range(4):
-        _diskpart('select vdisk file="%s"\ndetach vdisk\n' % vhd_path)
-        time.sleep(0.8)
-        if _disk_number(vhd_path) is None:
-            return True
+    with cancellation.shielded():
+        for _ in range(4):
+            _diskpart('select vdisk file="%s"\ndetach vdisk\n' % vhd_path)
+            time.sleep(0.8)
+            if _disk_number(vhd_path) is None:
+                return True
     return False
 
 
@@ -305,7 +312,8 @@ def _fsck_repair(device: str, env: dict) -> str | None:
     # exit code is informative only (12 even on success here, see above), so the
     # verdict comes from re-checking; log it either way or a failed repair would
     # look like filesystem damage.
-    result = _run([_e2fsck(), "-fp", part], env=env)
+    with cancellation.shielded():   # a killed preen is worse than none
+        result = _run([_e2fsck(), "-fp", part], env=env)
     logger.info("e2fsck -fp %s -> exit %s: %s", part, result.returncode,
                 ((result.stdout or "") + (result.stderr or "")).strip()[:500])
 
@@ -341,9 +349,10 @@ class _Attached:
         return _cyg_device(num, self.offset)
 
     def __enter__(self) -> _Attached:
-        _attach(self.vhd)
-        time.sleep(1.5)  # let Windows enumerate the disk
         try:
+            # A cancel can land mid-attach, so that is undone below as well.
+            _attach(self.vhd)
+            cancellation.sleep(1.5)  # let Windows enumerate the disk
             self.device = self._resolve_device()
             if self.repair:
                 self.repaired = _fsck_repair(self.device, _tool_env())
@@ -359,7 +368,7 @@ class _Attached:
                     # both caches and removes the aliasing entirely.
                     if _detach(self.vhd):
                         _attach(self.vhd)
-                        time.sleep(1.5)
+                        cancellation.sleep(1.5)
                         self.device = self._resolve_device()
                     else:
                         # Re-attaching something still attached would only make
@@ -402,11 +411,13 @@ class _Attached:
                 # behind this unrelated detach message. Log only.
                 logger.error(msg)
 
-def add_su_symlink(instance_dir: str, progress=None) -> list[str]:
+
+def add_su_symlink(instance_dir: str, progress=None, cancel=None) -> list[str]:
     """Create ``/system/xbin/su -> bstk/su`` in a shut-down instance's Root.vhd.
 
     Idempotent; returns human-readable status lines.  Raises on hard failure
-    (missing tools, unlocatable disk, verification failure).
+    (missing tools, unlocatable disk, verification failure), or
+    ``cancellation.Cancelled`` once ``cancel`` (default: the current token) is.
     """
     def _p(msg: str) -> None:
         logger.info(msg)
@@ -422,7 +433,7 @@ def add_su_symlink(instance_dir: str, progress=None) -> list[str]:
     env = _tool_env()
     results: list[str] = []
     _p("Attaching Root.vhd (app-root symlink)...")
-    with _Attached(vhd, progress=_p) as att:
+    with cancellation.scope(cancel), _Attached(vhd, progress=_p) as att:
         dev = att.device
         xbin = _find_xbin(dev, env)
         if not xbin:
@@ -444,7 +455,7 @@ def add_su_symlink(instance_dir: str, progress=None) -> list[str]:
     return results
 
 
-def remove_su_symlink(instance_dir: str, progress=None) -> list[str]:
+def remove_su_symlink(instance_dir: str, progress=None, cancel=None) -> list[str]:
     """Remove the injected ``/system/xbin/su`` symlink (if present)."""
     def _p(msg: str) -> None:
         logger.info(msg)
@@ -457,12 +468,12 @@ def remove_su_symlink(instance_dir: str, progress=None) -> list[str]:
     env = _tool_env()
     results: list[str] = []
     _p("Attaching Root.vhd (remove app-root symlink)...")
-    with _Attached(vhd, progress=_p) as att:
+    with cancellation.scope(cancel), _Attached(vhd, progress=_p) as att:
         dev = att.device
         xbin = _find_xbin(dev, env)
         if not xbin or "Type: symlink" not in _stat_su(dev, xbin, env):
             return ["%s/su not present" % (xbin or "/system/xbin")]
-        _run([_debugfs(), "-w", "-R", "rm %s/%s" % (xbin, _LINK_NAME), dev], env=env)
+        _run_script(dev, ["rm %s/%s" % (xbin, _LINK_NAME)], env)
         if "Type: symlink" in _stat_su(dev, xbin, env):
             raise RuntimeError("failed to remove %s/su" % xbin)
         _fsck_ok(dev, env)
@@ -0,0 +1,145 @@
+"""What the status refresh watches, and what a change to each path means.
+
+The dashboard used to rebuild every instance every 5 s whether or not anything
+changed.  Instead, a :class:`WatchPlan` lists the paths whose changes matter --
+each installation's data dir and ``bluestacks.conf``, every instance folder and
+the files in it (``.bstk``, ``Data.vhdx``, ``Root.vhd``...), and each install
+dir's ``HD-Player.exe`` -- and maps a changed path back to the :class:`Target`
+that needs refreshing:
+
+``instance``      one instance folder (its R/W, su or Magisk state may differ)
+``installation``  a whole installation (``bluestacks.conf`` rewritten, or an
+                  instance added/removed)
+``engine``        an install dir's engine binary (patched/unpatched)
+
+The native watcher (``QFileSystemWatcher``, which is inotify on Linux and the
+Win32 change notifications on Windows) reports paths; :meth:`WatchPlan.snapshot`
+and :func:`changed_paths` are the stat-snapshot fallback for anything it can't
+watch (network drives, exhausted watch limits) and for missed events.  Kept
+free of Qt so it can be unit-tested without a QApplication.
+"""
+from __future__ import annotations
+
+import logging
+import os
+from dataclasses import dataclass
+
+import constants
+
+logger = logging.getLogger(__name__)
+
+SCOPE_INSTANCE = "instance"
+SCOPE_INSTALLATION = "installation"
+SCOPE_ENGINE = "engine"
+
+ENGINE_BINARY = "HD-Player.exe"   # what installation_patched() reads
+
+
+@dataclass(frozen=True)
+class Target:
+    scope: str      # SCOPE_*
+    path: str       # the instance dir, the installation's data dir, or the install dir
+
+
+def _norm(path: str) -> str:
+    return os.path.normcase(os.path.normpath(os.path.abspath(path)))
+
+
+def _stat(path: str):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_size, st.st_mtime_ns)
+
+
+def _listdir(path: str) -> list[str]:
+    try:
+        return sorted(os.listdir(path))
+    except OSError:
+        return []
+
+
+class WatchPlan:
+    """The watched paths of a set of installations (``registry_handler``
+    dicts) and the target each belongs to."""
+
+    def __init__(self, installations):
+        self._dirs: dict[str, Target] = {}     # dirs whose listing matters
+        self._files: dict[str, Target] = {}    # files whose content matters
+        for inst in installations:
+            data_path = inst.get("data_path")
+            if data_path:
+                whole = Target(SCOPE_INSTALLATION, data_path)
+                self._dirs[_norm(data_path)] = whole
+                if inst.get("config_path"):
+                    self._files[_norm(inst["config_path"])] = whole
+                for name in _listdir(data_path):
+                    d = os.path.join(data_path, name)
+                    if os.path.isdir(d):
+                        self._dirs[_norm(d)] = Target(SCOPE_INSTANCE, d)
+            install = inst.get("install_path")
+            if install and inst.get("patch_mode"):
+                self._files[_norm(os.path.join(install, ENGINE_BINARY))] = \
+                    Target(SCOPE_ENGINE, install)
+
+    def paths(self) -> list[str]:
+        """Every dir and file to register with a native watcher."""
+        out = list(self._dirs) + list(self._files)
+        for d, target in self._dirs.items():
+            if target.scope == SCOPE_INSTANCE:
+                out += [os.path.join(d, n) for n in _listdir(d)]
+        return out
+
+    def target_of(self, path: str) -> Target | None:
+        """The target a change at ``path`` affects: the path itself if it is
+        watched, else the watched dir it sits in."""
+        p = _norm(path)
+        hit = self._files.get(p) or self._dirs.get(p)
+        if hit is None:
+            hit = self._dirs.get(os.path.dirname(p))
+        return hit
+
+    def snapshot(self) -> dict[str, object]:
+        """``{path: state}``: the listing of each watched dir, and (size,
+        mtime) of each watched file and of every file in an instance dir."""
+        snap: dict[str, object] = {}
+        for p in self._files:
+            snap[p] = _stat(p)
+        for d, target in self._dirs.items():
+            names = _listdir(d)
+            snap[d] = tuple(names)
+            if target.scope == SCOPE_INSTANCE:
+                for n in names:
+                    f = os.path.join(d, n)
+                    snap[f] = _stat(f)
+        return snap
+
+
+def changed_paths(old: dict, new: dict) -> set[str]:
+    """Paths whose state differs between two :meth:`WatchPlan.snapshot` calls."""
+    return {p for p in old.keys() | new.keys() if old.get(p) != new.get(p)}
+
+
+class Backoff:
+    """Poll interval that doubles while nothing changes, up to ``max_ms``
+    (times ``constants.WATCH_MINIMIZED_FACTOR`` while the window is minimized),
+    and snaps back to ``base_ms`` on a change."""
+
+    def __init__(self, base_ms: int, max_ms: int):
+        self.base_ms = base_ms
+        self.max_ms = max(base_ms, max_ms)
+        self.minimized = False
+        self._current = base_ms
+
+    def interval(self) -> int:
+        factor = constants.WATCH_MINIMIZED_FACTOR if self.minimized else 1
+        return self._current * factor
+
+    def idle(self) -> int:
+        self._current = min(self._current * 2, self.max_ms)
+        return self.interval()
+
+    def reset(self) -> int:
+        self._current = self.base_ms
+        return self.interval()
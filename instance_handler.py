@@ -2,13 +2,12 @@
 from __future__ import annotations
 
 import os
-import glob
 import logging
 import subprocess
 import time
 import psutil
 
-
+import bstk
 import constants
 
 logger = logging.getLogger(__name__)
@@ -67,44 +66,22 @@ def modify_instance_files(instance_path: str, new_mode: str) -> None:
     if not os.path.isdir(instance_path):
         raise FileNotFoundError(f"Instance directory not found: {instance_path}")
 
-    bstk_files_to_process: list[str] = []
     android_bstk_in_path = os.path.join(instance_path, constants.ANDROID_BSTK_IN_FILE)
-
-    if os.path.exists(android_bstk_in_path):
-        bstk_files_to_process.append(android_bstk_in_path)
-    else:
-
+    if not os.path.exists(android_bstk_in_path):
         logger.warning(
             f"'{constants.ANDROID_BSTK_IN_FILE}' not found in {instance_path}. R/W toggle might be incomplete."
         )
 
     try:
-        instance_bstk_files = glob.glob(
-            os.path.join(instance_path, constants.BSTK_FILE_PATTERN)
-        )
-
-        instance_bstk_files = [
-            f
-            for f in instance_bstk_files
-            if os.path.basename(f) != constants.ANDROID_BSTK_IN_FILE
-        ]
-        bstk_files_to_process.extend(instance_bstk_files)
-    except Exception as e:
+        bstk_files_to_process = bstk.instance_bstk_paths(instance_path)
+    except OSError as e:
         logger.error(f"Error finding .bstk files in {instance_path}: {e}")
-
         raise OSError(f"Error finding .bstk files in {instance_path}") from e
 
     if not bstk_files_to_process:
-
-        if not os.path.exists(android_bstk_in_path):
-            raise FileNotFoundError(
-                f"No .bstk files (including {constants.ANDROID_BSTK_IN_FILE}) found to modify in {instance_path}"
-            )
-        else:
-
-            logger.warning(
-                f"Only {constants.ANDROID_BSTK_IN_FILE} found in {instance_path}. Proceeding with modification."
-            )
+        raise FileNotFoundError(
+            f"No .bstk files (including {constants.ANDROID_BSTK_IN_FILE}) found to modify in {instance_path}"
+        )
 
     logger.debug(f"Found .bstk files to process: {bstk_files_to_process}")
 
@@ -112,49 +89,38 @@ def modify_instance_files(instance_path: str, new_mode: str) -> None:
 
     for bstk_file_path in bstk_files_to_process:
         logger.debug(f"Processing file: {bstk_file_path}")
+        name = os.path.basename(bstk_file_path)
         try:
-
-            with open(bstk_file_path, encoding="utf-8") as f:
-                content = f.readlines()
-
-            updated_content = []
+            model = bstk.load(bstk_file_path)
+            text = model.text
             file_changed = False
-            for line in content:
-                modified_line = line
-
-                if any(
-                    target_file in line for target_file in constants.FILES_TO_MODIFY_RW
-                ):
-
-                    match = type_pattern.search(line)
-                    if match:
-                        old_mode = match.group(2)
-
-                        if old_mode.lower() != new_mode.lower():
-
-                            modified_line = type_pattern.sub(
-                                r"\1" + new_mode + r"\3", line
-                            )
-                            logger.info(
-                                f"  In '{os.path.basename(bstk_file_path)}': Changed mode from '{old_mode}' to '{new_mode}' for line containing target file."
-                            )
-                            file_changed = True
-                        else:
-                            logger.debug(
-                                f"  In '{os.path.basename(bstk_file_path)}': Mode already '{new_mode}' for line containing target file. No change needed."
-                            )
-                    else:
-
-                        logger.warning(
-                            f"  In '{os.path.basename(bstk_file_path)}': Line contains target file but no standard 'Type=\"{constants.MODE_READONLY}|{constants.MODE_READWRITE}\"' attribute found. Line: {line.strip()}"
-                        )
-
-                updated_content.append(modified_line)
+            # Splice from the last disk back so earlier spans stay valid.
+            for disk in reversed(model.disks_named(constants.FILES_TO_MODIFY_RW)):
+                start, end = disk.span
+                tag = text[start:end]
+                match = type_pattern.search(tag)
+                if not match:
+                    logger.warning(
+                        f"  In '{name}': HardDisk '{disk.filename}' has no standard 'Type=\"{constants.MODE_READONLY}|{constants.MODE_READWRITE}\"' attribute. Element: {tag}"
+                    )
+                    continue
+                old_mode = match.group(2)
+                if old_mode.lower() == new_mode.lower():
+                    logger.debug(
+                        f"  In '{name}': Mode already '{new_mode}' for '{disk.filename}'. No change needed."
+                    )
+                    continue
+                text = text[:start] + type_pattern.sub(r"\1" + new_mode + r"\3", tag) + text[end:]
+                logger.info(
+                    f"  In '{name}': Changed mode from '{old_mode}' to '{new_mode}' for '{disk.filename}'."
+                )
+                file_changed = True
 
             if file_changed:
                 logger.debug(f"Writing changes back to {bstk_file_path}")
                 with open(bstk_file_path, "w", encoding="utf-8") as f:
-                    f.writelines(updated_content)
+                    f.write(text)
+                bstk.invalidate(bstk_file_path)
             else:
                 logger.debug(f"No changes needed for {bstk_file_path}")
 
@@ -191,22 +157,9 @@ def is_instance_readonly(instance_path: str) -> bool | None:
         )
         return None
 
-    bstk_files_to_check: list[str] = []
-    android_bstk_in_path = os.path.join(instance_path, constants.ANDROID_BSTK_IN_FILE)
-    if os.path.exists(android_bstk_in_path):
-        bstk_files_to_check.append(android_bstk_in_path)
-
     try:
-        instance_bstk_files = glob.glob(
-            os.path.join(instance_path, constants.BSTK_FILE_PATTERN)
-        )
-        instance_bstk_files = [
-            f
-            for f in instance_bstk_files
-            if os.path.basename(f) != constants.ANDROID_BSTK_IN_FILE
-        ]
-        bstk_files_to_check.extend(instance_bstk_files)
-    except Exception as e:
+        bstk_files_to_check = bstk.instance_bstk_paths(instance_path)
+    except OSError as e:
         logger.error(
             f"Error finding .bstk files in {instance_path} for readonly check: {e}"
         )
@@ -220,28 +173,11 @@ def is_instance_readonly(instance_path: str) -> bool | None:
         )
         return None
 
-    logger.debug(f"Checking readonly status in files: {bstk_files_to_check}")
-
-    readonly_pattern = constants.REGEX_BSTK_READONLY_PATTERN
-    found_relevant_line = False
+    found_relevant_disk = False
 
     for file_path in bstk_files_to_check:
-        logger.debug(f"Scanning file for readonly check: {file_path}")
         try:
-            with open(file_path, encoding="utf-8") as f:
-                for line_num, line in enumerate(f, 1):
-
-                    if any(
-                        target_file in line
-                        for target_file in constants.RW_DETECT_FILES
-                    ):
-                        found_relevant_line = True
-
-                        if readonly_pattern.search(line):
-                            logger.debug(
-                                f"Readonly status found in {os.path.basename(file_path)} (Line {line_num}) for a target disk file."
-                            )
-                            return True
+            disks = bstk.load(file_path).disks_named(constants.RW_DETECT_FILES)
         except FileNotFoundError:
             logger.warning(
                 f"File not found during readonly check (maybe deleted concurrently?): {file_path}. Skipping."
@@ -251,19 +187,28 @@ def is_instance_readonly(instance_path: str) -> bool | None:
             logger.exception(f"Error reading file {file_path} during readonly check.")
             return None
 
-    if found_relevant_line:
+        found_relevant_disk = found_relevant_disk or bool(disks)
+        for disk in disks:
+            if disk.readonly:
+                logger.debug(
+                    f"Readonly status found in {os.path.basename(file_path)} for '{disk.filename}'."
+                )
+                return True
+
+    if found_relevant_disk:
 
         logger.debug(
-            f"Relevant disk file lines found in instance {instance_path}, but none were explicitly 'Type=\"{constants.MODE_READONLY}\"'. Assuming Writable."
+            f"Relevant disks found in instance {instance_path}, but none were explicitly 'Type=\"{constants.MODE_READONLY}\"'. Assuming Writable."
         )
         return False
     else:
 
         logger.debug(
-            f"No configuration lines found for target disk files ({constants.RW_DETECT_FILES}) in instance {instance_path}. Cannot determine R/W status."
+            f"No HardDisk entries for target disk files ({constants.RW_DETECT_FILES}) in instance {instance_path}. Cannot determine R/W status."
         )
         return None
 
+
 def terminate_bluestacks() -> bool:
     """
     Attempts to terminate all known BlueStacks-related processes gracefully,
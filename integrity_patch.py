@@ -43,8 +43,8 @@ identical to a state BlueStacks already ships (``plrCheckDiskIntegrity`` returns
 patch; the primary is what the app relies on.
 
 Both are located by signature/locator (not a hard-coded offset) so they keep
-working across minor 5.22.x rebuilds, and both are fully reversible via the
-``.bak`` backup.
+working across minor 5.22.x rebuilds, and both are fully reversible: the
+original binary is kept in the shared backup store (``backup_store``).
 
 Usage (standalone)::
 
@@ -54,21 +54,32 @@ Usage (standalone)::
 from __future__ import annotations
 
 import argparse
+import bisect
+import concurrent.futures
+import contextlib
+import functools
 import hashlib
+import json
 import logging
+import mmap
 import os
-import shutil
+import re
 import struct
 import sys
+import threading
 from dataclasses import dataclass
-from typing import Callable
+from typing import Callable, Iterator
 
+import backup_store
 import constants
+import rip_xref
+import state_store
 
 logger = logging.getLogger(__name__)
 
-# Backup suffix appended next to the original executable before patching.
-BACKUP_SUFFIX = ".prepatch.bak"
+# Full-copy backups older versions kept next to the executable; migrated into
+# the backup store on first touch (see _migrate_legacy_backup).
+LEGACY_BACKUP_SUFFIX = ".prepatch.bak"
 
 # Binaries that embed the integrity check / its shared resources. We scan all of
 # them; only the ones that actually contain the runtime check (HD-Player.exe in
@@ -140,6 +151,127 @@ def file_offset_to_rva(sections, foff: int) -> int | None:
     return None
 
 
+# Section characteristics (winnt.h IMAGE_SCN_*).
+_SCN_CNT_CODE = 0x00000020
+_SCN_CNT_INITIALIZED_DATA = 0x00000040
+_SCN_MEM_EXECUTE = 0x20000000
+_SCN_MEM_WRITE = 0x80000000
+
+
+@dataclass(frozen=True)
+class PESection:
+    name: str
+    va: int              # RVA
+    vsize: int
+    praw: int            # file offset of raw data
+    sraw: int            # raw size
+    characteristics: int
+
+    @property
+    def executable(self) -> bool:
+        return bool(self.characteristics & (_SCN_MEM_EXECUTE | _SCN_CNT_CODE))
+
+    @property
+    def readonly_data(self) -> bool:
+        """Initialized, non-writable, non-executable data (``.rdata``), where
+        MSVC puts string literals."""
+        c = self.characteristics
+        return bool(c & _SCN_CNT_INITIALIZED_DATA) and not c & (_SCN_MEM_WRITE | _SCN_MEM_EXECUTE)
+
+
+class PEImage:
+    """A PE parsed once: sections with characteristics, bisect offset<->RVA
+    maps, string search limited to read-only data, and the RIP-relative lea
+    index over executable sections only.  Get one via :func:`pe_image`."""
+
+    def __init__(self, data: bytes):
+        self.data = data
+        self.image_base, raw = pe_image_base_and_sections(data)
+        e_lfanew = struct.unpack_from("<I", data, 0x3C)[0]
+        coff = e_lfanew + 4
+        sec_table = coff + 20 + struct.unpack_from("<H", data, coff + 16)[0]
+        self.sections: list[PESection] = []
+        for i, (va, vsize, praw, sraw) in enumerate(raw):
+            o = sec_table + i * 40
+            name = data[o:o + 8].rstrip(b"\x00").decode("ascii", errors="replace")
+            chars = struct.unpack_from("<I", data, o + 36)[0]
+            self.sections.append(PESection(name, va, vsize, praw, sraw, chars))
+        self._by_off = sorted((s for s in self.sections if s.sraw), key=lambda s: s.praw)
+        self._off_starts = [s.praw for s in self._by_off]
+        self._by_rva = sorted(self.sections, key=lambda s: s.va)
+        self._rva_starts = [s.va for s in self._by_rva]
+        self._xrefs: rip_xref.XrefIndex | None = None
+
+    def offset_to_rva(self, foff: int) -> int | None:
+        """RVA of a raw file offset, or None if outside every section's raw data."""
+        i = bisect.bisect_right(self._off_starts, foff) - 1
+        if i >= 0:
+            s = self._by_off[i]
+            if foff < s.praw + s.sraw:
+                return s.va + (foff - s.praw)
+        return None
+
+    def rva_to_offset(self, rva: int) -> int | None:
+        """File offset backing an RVA, or None (header, or zero-fill tail)."""
+        i = bisect.bisect_right(self._rva_starts, rva) - 1
+        if i >= 0:
+            s = self._by_rva[i]
+            if rva < s.va + (min(s.sraw, s.vsize) if s.vsize else s.sraw):
+                return s.praw + (rva - s.va)
+        return None
+
+    def offset_to_va(self, foff: int) -> int | None:
+        rva = self.offset_to_rva(foff)
+        return None if rva is None else self.image_base + rva
+
+    def find_string(self, needle: bytes) -> int:
+        """File offset of ``needle`` in read-only data, or -1.  Falls back to the
+        whole file only for an image with no such section flagged."""
+        ro = [s for s in self.sections if s.readonly_data and s.sraw]
+        if not ro:
+            return self.data.find(needle)
+        for s in ro:
+            at = self.data.find(needle, s.praw, s.praw + s.sraw)
+            if at != -1:
+                return at
+        return -1
+
+    def string_va(self, needle: bytes) -> int | None:
+        """VA of ``needle`` in read-only data, or None."""
+        at = self.find_string(needle)
+        return None if at < 0 else self.offset_to_va(at)
+
+    @property
+    def xrefs(self) -> rip_xref.XrefIndex:
+        """RIP-relative lea index over the executable sections only."""
+        if self._xrefs is None:
+            self._xrefs = rip_xref.XrefIndex(
+                self.data, [(s.praw, s.sraw, self.image_base + s.va)
+                            for s in self.sections if s.executable])
+        return self._xrefs
+
+
+# One-entry identity cache, same reasoning as rip_xref.index_for: every locator
+# of one patch pass gets the same immutable buffer, so parse it once.
+_pe_cache_lock = threading.Lock()
+_pe_cache: PEImage | None = None
+
+
+def pe_image(data: bytes) -> PEImage:
+    """The parsed :class:`PEImage` for ``data``.  Raises ValueError if not a PE."""
+    global _pe_cache
+    if not isinstance(data, bytes):
+        return PEImage(data)
+    with _pe_cache_lock:
+        hit = _pe_cache
+    if hit is not None and hit.data is data:
+        return hit
+    pe = PEImage(data)
+    with _pe_cache_lock:
+        _pe_cache = pe
+    return pe
+
+
 # xor bl,bl ; mov [rsp+40h],bl ; call rel32 ; test al,al ; jz
 #   32 DB    88 5C 24 40        E8 ?? ?? ?? ?? 84 C0       74
 # The 5 wildcarded bytes are the E8 opcode + rel32 of the call to
@@ -157,21 +289,32 @@ DISK_INTEGRITY_CALL = PatchSpec(
 )
 
 
+@functools.lru_cache(maxsize=64)
+def _signature_regex(sig: tuple[int | None, ...]) -> re.Pattern[bytes]:
+    """``sig`` as a compiled bytes regex: concrete bytes escaped, wildcards
+    ``.`` under DOTALL (so a wildcard matches 0x0A like any other byte)."""
+    return re.compile(b"".join(b"." if b is None else re.escape(bytes([b])) for b in sig),
+                      re.DOTALL)
+
+
 def _find_signature(data: bytes, sig: list[int | None]) -> list[int]:
-    """Return every start offset in ``data`` matching ``sig`` (None = wildcard)."""
+    """Return every start offset in ``data`` matching ``sig`` (None = wildcard).
+
+    The scan runs inside the regex engine, so the common first bytes (0x32,
+    0x4C -- everywhere in x64 code) are rejected at C speed instead of one
+    Python comparison each.  Searching again from ``start + 1`` after each hit
+    keeps overlapping matches, same as a byte-by-byte scan.
+    """
+    assert sig[0] is not None, "signature must start with a concrete byte"
+    pattern = _signature_regex(tuple(sig))
     hits: list[int] = []
-    first = sig[0]
-    assert first is not None, "signature must start with a concrete byte"
-    n = len(sig)
-    start = 0
+    pos = 0
     while True:
-        idx = data.find(bytes([first]), start)
-        if idx == -1 or idx + n > len(data):
-            break
-        if all(sig[k] is None or data[idx + k] == sig[k] for k in range(n)):
-            hits.append(idx)
-        start = idx + 1
-    return hits
+        m = pattern.search(data, pos)
+        if m is None:
+            return hits
+        hits.append(m.start())
+        pos = m.start() + 1
 
 
 # Standard MSVC prologue of _isDiskVerificationRequired:
@@ -195,35 +338,20 @@ def _locate_isdiskverify(data: bytes) -> list[int]:
     that references it, then walk back to the function's prologue.
     """
     try:
-        image_base, sections = pe_image_base_and_sections(data)
-    except ValueError:
-        return []
-    s = data.find(b"unlock_player.bin\x00")
-    if s < 0:
+        pe = pe_image(data)
+    except (ValueError, struct.error):
         return []
-    str_rva = file_offset_to_rva(sections, s)
-    if str_rva is None:
+    str_va = pe.string_va(b"unlock_player.bin\x00")
+    if str_va is None:
         return []
-    str_va = image_base + str_rva
 
-    i = 0
-    while True:
-        i = data.find(b"\x8D", i)
-        if i < 0 or i + 5 > len(data):
-            break
-        if i >= 1 and data[i - 1] in (0x48, 0x4C) and data[i + 1] in constants.RIP_LEA_MODRM:
-            lea_off = i - 1
-            lea_rva = file_offset_to_rva(sections, lea_off)
-            if lea_rva is not None:
-                rel = struct.unpack_from("<i", data, i + 2)[0]
-                if image_base + lea_rva + 7 + rel == str_va:
-                    # Walk back to the function entry. Anchor on the prologue's
-                    # tail (bytes 3..15) which the 3-byte patch leaves intact, so
-                    # an already-patched binary is still located (entry = tail-3).
-                    tail = data.rfind(_ISDVR_PROLOGUE[3:], max(0, lea_off - 0x800), lea_off)
-                    if tail != -1:
-                        return [tail - 3]
-        i += 1
+    for lea_off in pe.xrefs.sites(str_va):
+        # Walk back to the function entry. Anchor on the prologue's tail (bytes
+        # 3..15) which the 3-byte patch leaves intact, so an already-patched
+        # binary is still located (entry = tail-3).
+        tail = data.rfind(_ISDVR_PROLOGUE[3:], max(0, lea_off - 0x800), lea_off)
+        if tail != -1:
+            return [tail - 3]
     return []
 
 
@@ -239,14 +367,148 @@ UNLOCK_PLAYER = PatchSpec(
 )
 
 
-def _apply_to_buffer(data: bytearray, spec: PatchSpec) -> str:
-    """Apply ``spec`` to ``data`` in place. Returns a human-readable status."""
+# --- Per-build patch-offset database -----------------------------------------
+# A given BlueStacks build's binary always has its patch sites at the same
+# offsets, so once located they're recorded against the binary's SHA-256 and
+# every later patch/check of that exact build skips the locator entirely. The
+# DB is plain JSON in the app data dir and can be exported/imported, so a fleet
+# of hosts on one build can share it. An entry is only trusted when the spec's
+# bytes still match and the file's bytes at that offset are in a known state.
+OFFSET_DB_FILENAME = "patch_offsets.json"
+_OFFSET_DB_VERSION = 1
+
+
+class PatchOffsetDB:
+    """``{binary sha256: {spec name: {"offset", "expect", "patched"}}}`` on disk."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._builds: dict[str, dict[str, dict]] | None = None
+
+    def _load(self) -> dict[str, dict[str, dict]]:
+        if self._builds is None:
+            self._builds = self._read(self.path)
+        return self._builds
+
+    @staticmethod
+    def _read(path: str) -> dict[str, dict[str, dict]]:
+        try:
+            with open(path, encoding="utf-8") as fh:
+                doc = json.load(fh)
+        except (OSError, ValueError):
+            return {}
+        if not isinstance(doc, dict) or doc.get("version") != _OFFSET_DB_VERSION:
+            return {}
+        builds = doc.get("builds")
+        return builds if isinstance(builds, dict) else {}
+
+    def _save(self) -> None:
+        tmp = self.path + ".tmp"
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(tmp, "w", encoding="utf-8") as fh:
+                json.dump({"version": _OFFSET_DB_VERSION, "builds": self._builds},
+                          fh, indent=1, sort_keys=True)
+            os.replace(tmp, self.path)
+        except OSError as exc:  # a cache that can't persist must not fail a patch
+            logger.warning("could not save patch-offset DB %s: %s", self.path, exc)
+
+    def lookup(self, sha256: str, spec: PatchSpec) -> int | None:
+        """The recorded patch-site offset for ``spec`` in build ``sha256``."""
+        with self._lock:
+            entry = self._load().get(sha256, {}).get(spec.name)
+        if (not isinstance(entry, dict) or not isinstance(entry.get("offset"), int)
+                or entry.get("expect") != spec.expect_bytes.hex()
+                or entry.get("patched") != spec.patch_bytes.hex()):
+            return None
+        return entry["offset"]
+
+    def record(self, sha256: str, spec: PatchSpec, offset: int) -> None:
+        with self._lock:
+            builds = self._load()
+            entry = {"offset": offset, "expect": spec.expect_bytes.hex(),
+                     "patched": spec.patch_bytes.hex()}
+            if builds.get(sha256, {}).get(spec.name) == entry:
+                return
+            builds.setdefault(sha256, {})[spec.name] = entry
+            self._save()
+
+    def export_to(self, path: str) -> int:
+        """Write every known build to ``path``; returns the number of builds."""
+        with self._lock:
+            builds = dict(self._load())
+        with open(path, "w", encoding="utf-8") as fh:
+            json.dump({"version": _OFFSET_DB_VERSION, "builds": builds},
+                      fh, indent=1, sort_keys=True)
+        return len(builds)
+
+    def import_from(self, path: str) -> int:
+        """Merge an exported DB into this one; returns the entries added or
+        changed.  Malformed entries are skipped, not trusted."""
+        incoming = self._read(path)
+        changed = 0
+        with self._lock:
+            builds = self._load()
+            for sha, specs in incoming.items():
+                if not isinstance(specs, dict):
+                    continue
+                for name, entry in specs.items():
+                    if not (isinstance(entry, dict) and isinstance(entry.get("offset"), int)):
+                        continue
+                    if builds.get(sha, {}).get(name) != entry:
+                        builds.setdefault(sha, {})[name] = entry
+                        changed += 1
+            if changed:
+                self._save()
+        return changed
+
+
+_offset_dbs: dict[str, PatchOffsetDB] = {}
+_offset_dbs_lock = threading.Lock()
+
+
+def offset_db() -> PatchOffsetDB:
+    """The patch-offset DB in this user's app data dir."""
+    path = os.path.join(constants.app_data_dir(), OFFSET_DB_FILENAME)
+    with _offset_dbs_lock:
+        db = _offset_dbs.get(path)
+        if db is None:
+            db = _offset_dbs[path] = PatchOffsetDB(path)
+        return db
+
+
+def _site_state_known(data, spec: PatchSpec, at: int) -> bool:
+    current = bytes(data[at:at + len(spec.patch_bytes)])
+    return current == spec.patch_bytes or current[:len(spec.expect_bytes)] == spec.expect_bytes
+
+
+def _locate(data, spec: PatchSpec, sha256: str | None = None) -> list[int]:
+    """Match starts for ``spec`` in ``data``: from the offset DB when this build
+    (``sha256``) is known, else by signature/locator -- recording a unique hit."""
+    if sha256:
+        at = offset_db().lookup(sha256, spec)
+        if at is not None and _site_state_known(data, spec, at):
+            return [at - spec.patch_offset]
     if spec.locator is not None:
-        hits = spec.locator(bytes(data))
+        hits = spec.locator(data)
     else:
         hits = _find_signature(data, spec.signature)
+    if sha256 and len(hits) == 1:
+        offset_db().record(sha256, spec, hits[0] + spec.patch_offset)
+    return hits
+
+
+def _plan_patch(data, spec: PatchSpec, sha256: str | None = None
+                ) -> tuple[str, tuple[int, bytes, bytes] | None]:
+    """Decide what ``spec`` would change in ``data`` without touching it.
+
+    Returns ``(status, edit)``; ``edit`` is ``(offset, original, patched)`` when
+    bytes need writing, else None. ``sha256`` is the hash of the binary as
+    read, for the offset DB."""
+    hits = _locate(data, spec, sha256)
     if not hits:
-        return "match not found (binary does not contain this check)"
+        return "match not found (binary does not contain this check)", None
     if len(hits) > 1:
         raise RuntimeError(
             f"{spec.name}: signature matched {len(hits)} times "
@@ -256,70 +518,218 @@ def _apply_to_buffer(data: bytearray, spec: PatchSpec) -> str:
     at = hits[0] + spec.patch_offset
     current = bytes(data[at:at + len(spec.patch_bytes)])
     if current == spec.patch_bytes:
-        return f"already patched at 0x{at:X}"
+        return f"already patched at 0x{at:X}", None
     if current[: len(spec.expect_bytes)] != spec.expect_bytes:
         raise RuntimeError(
             f"{spec.name}: unexpected bytes at 0x{at:X}: {current.hex(' ')}"
         )
-    data[at:at + len(spec.patch_bytes)] = spec.patch_bytes
-    return f"patched at 0x{at:X}: {current.hex(' ')} -> {spec.patch_bytes.hex(' ')}"
+    return (f"patched at 0x{at:X}: {current.hex(' ')} -> {spec.patch_bytes.hex(' ')}",
+            (at, current, spec.patch_bytes))
 
 
-def patch_file(path: str, specs: list[PatchSpec] = (DISK_INTEGRITY_CALL,),
-               make_backup: bool = True) -> bool:
-    """Patch a single executable. Returns True if any change was written."""
+# --- In-place patch engine ---------------------------------------------------
+# A patch changes 3-5 bytes of a ~40 MB executable. The binary is located on a
+# read-only mapping (no heap copy), and only the changed ranges are written
+# back, through a writable mapping, flushed and fsync'd. Before the first byte
+# is touched, the original bytes of every range go to a small journal next to
+# the binary; it is removed once the write is durable. A journal still present
+# later means a patch was interrupted, and ``recover_journal`` puts the original
+# bytes back -- the state the backup and its hash record describe.
+JOURNAL_SUFFIX = ".patchjournal"
+
+
+@contextlib.contextmanager
+def _mapped(path: str) -> Iterator[mmap.mmap | bytes]:
+    """Read-only view of the file at ``path`` (``b""`` for an empty file)."""
     with open(path, "rb") as fh:
-        data = bytearray(fh.read())
+        try:
+            mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # an empty file cannot be mapped
+            yield b""
+            return
+        try:
+            yield mm
+        finally:
+            mm.close()
+
+
+def _write_journal(path: str, size: int, edits: list[tuple[int, bytes, bytes]]) -> None:
+    with open(path + JOURNAL_SUFFIX, "w", encoding="utf-8") as fh:
+        json.dump({"size": size,
+                   "edits": [[at, old.hex(), new.hex()] for at, old, new in edits]}, fh)
+        fh.flush()
+        os.fsync(fh.fileno())
 
-    changed = False
-    for spec in specs:
+
+def _write_ranges(path: str, edits: list[tuple[int, bytes, bytes]]) -> None:
+    """Write each ``(offset, old, new)`` range in place, durably.
+
+    Every site must hold ``old`` (or already ``new``) -- checked for all ranges
+    before any is written, so a binary swapped since it was located is left
+    alone (RuntimeError)."""
+    with open(path, "r+b") as fh:
+        mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_WRITE)
         try:
-            status = _apply_to_buffer(data, spec)
-        except RuntimeError as exc:
-            logger.error("%s: %s", os.path.basename(path), exc)
-            raise
-        logger.info("%s [%s]: %s", os.path.basename(path), spec.name, status)
-        if status.startswith("patched"):
-            changed = True
-
-    if not changed:
+            for at, old, new in edits:
+                current = mm[at:at + len(new)]
+                if current != new and current[:len(old)] != old:
+                    raise RuntimeError(
+                        f"{os.path.basename(path)} changed at 0x{at:X} since it was "
+                        f"located ({current.hex(' ')}); not writing")
+            for at, _old, new in edits:
+                mm[at:at + len(new)] = new
+            mm.flush()
+        finally:
+            mm.close()
+        os.fsync(fh.fileno())
+
+
+def recover_journal(path: str) -> bool:
+    """Roll back a patch of ``path`` that was interrupted mid-write.
+
+    Returns True if a journal was found and dealt with. A journal that can't be
+    read (torn before the binary was touched) or no longer matches the file
+    (BlueStacks replaced it since) is discarded without writing."""
+    journal = path + JOURNAL_SUFFIX
+    if not os.path.exists(journal):
         return False
+    try:
+        with open(journal, encoding="utf-8") as fh:
+            rec = json.load(fh)
+        undo = [(int(at), bytes.fromhex(new), bytes.fromhex(old))
+                for at, old, new in rec["edits"]]
+        if os.path.getsize(path) != rec["size"]:
+            raise RuntimeError(f"{os.path.basename(path)} was replaced since")
+        _write_ranges(path, undo)
+        logger.warning("Rolled back an interrupted patch of %s", os.path.basename(path))
+    except (OSError, ValueError, KeyError, TypeError, RuntimeError) as exc:
+        logger.warning("Discarding patch journal for %s: %s", os.path.basename(path), exc)
+    try:
+        os.remove(journal)
+    except OSError:
+        logger.debug("Could not remove %s", journal, exc_info=True)
+    return True
 
-    if make_backup:
-        backup = path + BACKUP_SUFFIX
-        # At this point `path` on disk is still the ORIGINAL, unpatched binary
-        # (we only patched the in-memory `data`); so it is safe to back up now.
-        if not os.path.exists(backup):
-            shutil.copy2(path, backup)
-            logger.info("Backed up original to %s", backup)
-        elif _sha256(path) != _sha256(backup):
-            # A backup exists but the current unpatched binary differs from it:
-            # BlueStacks replaced the binary with a newer build since we last
-            # patched. The old backup is stale (a different version), and keeping
-            # it would let a later "Undo" restore the WRONG build over this one.
-            # Archive the stale backup and take a fresh one of the current build.
-            stale = backup + ".old"
-            try:
-                shutil.copy2(backup, stale)
-                logger.info("BlueStacks updated %s since last patch; archived "
-                            "stale backup to %s", os.path.basename(path),
-                            os.path.basename(stale))
-            except OSError:
-                logger.debug("Could not archive stale backup %s", backup, exc_info=True)
-            shutil.copy2(path, backup)
-            logger.info("Refreshed backup for updated %s", os.path.basename(path))
-    with open(path, "wb") as fh:
-        fh.write(data)
-    # Record the hash of the file *as we just patched it*. restore_file() uses
-    # this to detect the case where BlueStacks auto-updated the binary to a new
-    # version after we patched: restoring the stale backup over a newer binary
-    # would mismatch the rest of the install and could break the player.
-    if make_backup:
+
+def _hash_with_edits(data, edits: list[tuple[int, bytes, bytes]]) -> str:
+    """SHA-256 of ``data`` as it will read once ``edits`` are written -- from
+    the bytes already in hand, so the patched build needs no re-read."""
+    h = hashlib.sha256()
+    view = memoryview(data)
+    pos = 0
+    try:
+        for at, _old, new in sorted(edits):
+            if at < pos:
+                raise RuntimeError(f"overlapping patch sites at 0x{at:X}")
+            h.update(view[pos:at])
+            h.update(new)
+            pos = at + len(new)
+        h.update(view[pos:])
+    finally:
+        view.release()
+    return h.hexdigest()
+
+
+def _read_backup_ref(path: str) -> dict:
+    """``{"original": sha256, "patched": sha256 | None}`` for ``path``, or {}:
+    which build in the backup store is its original, and the hash of the file
+    as we patched it (kept in the state store)."""
+    return state_store.store().engine_backup(path)
+
+
+def _write_backup_ref(path: str, original: str, patched: str | None) -> None:
+    state_store.store().set_engine_backup(path, original, patched)
+
+
+def _migrate_legacy_backup(path: str) -> None:
+    """Move an older version's ``.prepatch.bak`` (and its ``.sha256`` record and
+    ``.old`` archive) into the backup store, recording a ref in the state store."""
+    legacy = path + LEGACY_BACKUP_SUFFIX
+    if not os.path.exists(legacy) or _read_backup_ref(path):
+        return
+    store = backup_store.store()
+    original = store.put_file(legacy)
+    try:
+        with open(legacy + ".sha256", encoding="utf-8") as fh:
+            patched = fh.read().strip() or None
+    except OSError:
+        patched = None
+    if os.path.exists(legacy + ".old"):
+        store.put_file(legacy + ".old")
+    _write_backup_ref(path, original, patched)
+    for old in (legacy, legacy + ".sha256", legacy + ".old"):
         try:
-            with open(backup + ".sha256", "w", encoding="utf-8") as fh:
-                fh.write(_sha256(path))
+            if os.path.exists(old):
+                os.remove(old)
         except OSError:
-            logger.debug("Could not record patched-file hash for %s", path, exc_info=True)
+            logger.debug("Could not remove migrated backup %s", old, exc_info=True)
+    logger.info("Moved %s into the backup store", os.path.basename(legacy))
+
+
+def patch_file(path: str, specs: list[PatchSpec] = (DISK_INTEGRITY_CALL,),
+               make_backup: bool = True) -> bool:
+    """Patch a single executable. Returns True if any change was written.
+
+    The file is read once: that pass is the SHA-256 (the offset-DB key), every
+    spec is located on the same mapping, the backup is written from it and the
+    patched build's hash is computed from it with the edits spliced in. Only the
+    patched byte ranges are then written (see ``_write_ranges``); the rest of
+    the file is never rewritten."""
+    recover_journal(path)
+    _migrate_legacy_backup(path)
+    name = os.path.basename(path)
+    with _mapped(path) as data:
+        size = len(data)
+        build = hashlib.sha256(data).hexdigest()
+        edits: list[tuple[int, bytes, bytes]] = []
+        located: list[tuple[PatchSpec, int]] = []
+        for spec in specs:
+            try:
+                status, edit = _plan_patch(data, spec, build)
+            except RuntimeError as exc:
+                logger.error("%s: %s", name, exc)
+                raise
+            logger.info("%s [%s]: %s", name, spec.name, status)
+            if edit is not None:
+                edits.append(edit)
+            at = offset_db().lookup(build, spec)
+            if at is not None:
+                located.append((spec, at))
+
+        if not edits:
+            return False
+        patched_build = _hash_with_edits(data, edits)
+
+        if make_backup:
+            # At this point `path` on disk is still the ORIGINAL, unpatched
+            # binary (nothing has been written yet); so it is safe to back up now.
+            previous = _read_backup_ref(path).get("original")
+            if previous not in (None, build):
+                # BlueStacks replaced the binary with a newer build since we last
+                # patched. The old original stays in the store under its own
+                # hash; the ref moves to this build so a later "Undo" can never
+                # restore the WRONG build over this one.
+                logger.info("BlueStacks updated %s since last patch (was %s)",
+                            name, previous[:12])
+            if backup_store.store().put(data, build):
+                logger.info("Backed up original %s to the backup store (%s)", name, build[:12])
+            # Record the hash of the file *as we are about to patch it*.
+            # restore_file() uses this to detect the case where BlueStacks
+            # auto-updated the binary to a new version after we patched:
+            # restoring the stale original over a newer binary would mismatch
+            # the rest of the install and could break the player.
+            _write_backup_ref(path, build, patched_build)
+
+    _write_journal(path, size, edits)
+    _write_ranges(path, edits)
+    try:
+        os.remove(path + JOURNAL_SUFFIX)
+    except OSError:
+        logger.debug("Could not remove patch journal for %s", path, exc_info=True)
+    # The patched binary is a build of its own; record its sites too, so the
+    # next state check / restore of it skips the locate.
+    for spec, at in located:
+        offset_db().record(patched_build, spec, at)
     return True
 
 
@@ -332,42 +742,98 @@ def _sha256(path: str) -> str:
 
 
 def restore_file(path: str) -> bool:
-    """Restore a binary from its ``.prepatch.bak`` backup. Returns True if done.
+    """Restore a binary's original from the backup store. Returns True if done.
 
     Refuses to restore when the current on-disk binary is not the one we patched
     (its hash no longer matches what patch_file() recorded) -- that means
     BlueStacks replaced it with a newer build, and overwriting it with our stale
-    backup could leave the install inconsistent. In that case the fresh binary is
-    already unpatched, so there is nothing to restore anyway.
+    original could leave the install inconsistent. In that case the fresh binary
+    is already unpatched, so there is nothing to restore anyway. The stored
+    original is verified by hash before it replaces anything.
     """
-    backup = path + BACKUP_SUFFIX
-    if not os.path.exists(backup):
+    recover_journal(path)
+    _migrate_legacy_backup(path)
+    ref = _read_backup_ref(path)
+    original = ref.get("original")
+    if not original:
         logger.warning("No backup found for %s", path)
         return False
-    meta = backup + ".sha256"
-    if os.path.exists(meta) and os.path.exists(path):
-        try:
-            recorded = open(meta, encoding="utf-8").read().strip()
-        except OSError:
-            recorded = ""
-        if recorded:
-            current = _sha256(path)
-            if current != recorded:
-                logger.warning(
-                    "%s changed since it was patched (current %s != patched %s) -- "
-                    "BlueStacks likely updated it. Refusing to overwrite the newer "
-                    "binary with the stale backup.",
-                    os.path.basename(path), current[:12], recorded[:12])
-                return False
-    shutil.copy2(backup, path)
-    for stale in (meta,):  # patched-hash record is meaningless once restored
+    current = _sha256(path) if os.path.exists(path) else None
+    if current == original:
+        logger.info("%s is already the original build", os.path.basename(path))
+        return True
+    recorded = ref.get("patched")
+    if recorded and current is not None and current != recorded:
+        logger.warning(
+            "%s changed since it was patched (current %s != patched %s) -- "
+            "BlueStacks likely updated it. Refusing to overwrite the newer "
+            "binary with the stale backup.",
+            os.path.basename(path), current[:12], recorded[:12])
+        return False
+    backup_store.store().restore_to(original, path)
+    # The patched-hash record is meaningless once restored.
+    _write_backup_ref(path, original, None)
+    logger.info("Restored %s from the backup store", path)
+    return True
+
+
+# --- Engine-state memo -------------------------------------------------------
+# The dashboard asks "is the engine patched?" on every 5 s refresh. Locating the
+# patch site means reading and scanning the whole (~40 MB) binary, but the
+# answer only lives in a handful of bytes at a fixed offset for a given build.
+# So remember where the site is, keyed on the file's identity (size, mtime, file
+# id), and on a hit read just those bytes. Any identity change -- a patch, a
+# restore, a BlueStacks update -- misses and falls back to a full locate.
+class _OffsetMemo:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: dict[tuple[str, str], tuple[tuple, int]] = {}
+
+    @staticmethod
+    def identity(path: str) -> tuple | None:
         try:
-            if os.path.exists(stale):
-                os.remove(stale)
+            st = os.stat(path)
         except OSError:
-            pass
-    logger.info("Restored %s from backup", path)
-    return True
+            return None
+        return (st.st_size, st.st_mtime_ns, st.st_dev, st.st_ino)
+
+    @staticmethod
+    def _key(path: str, spec: PatchSpec) -> tuple[str, str]:
+        return (os.path.normcase(os.path.abspath(path)), spec.name)
+
+    def get(self, path: str, spec: PatchSpec, ident: tuple) -> int | None:
+        with self._lock:
+            entry = self._entries.get(self._key(path, spec))
+        if entry is None or entry[0] != ident:
+            return None
+        return entry[1]
+
+    def put(self, path: str, spec: PatchSpec, ident: tuple | None, at: int) -> None:
+        if ident is None:
+            return
+        with self._lock:
+            self._entries[self._key(path, spec)] = (ident, at)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+_offset_memo = _OffsetMemo()
+
+
+def clear_state_cache() -> None:
+    """Forget every memoized patch-site offset (the next check re-locates)."""
+    _offset_memo.clear()
+
+
+def _read_at(path: str, at: int, n: int) -> bytes | None:
+    try:
+        with open(path, "rb") as fh:
+            fh.seek(at)
+            return fh.read(n)
+    except OSError:
+        return None
 
 
 def is_file_patched(path: str, spec: PatchSpec) -> bool | None:
@@ -375,17 +841,33 @@ def is_file_patched(path: str, spec: PatchSpec) -> bool | None:
 
     Returns None when the state is indeterminate (file missing/unreadable, or the
     signature isn't found -- e.g. a build this patch doesn't apply to).
+
+    Memoized per file identity: once located, a repeat check of the same,
+    unchanged binary reads only the patch-site bytes.
     """
+    ident = _offset_memo.identity(path)
+    if ident is None:
+        return None
+    at = _offset_memo.get(path, spec, ident)
+    if at is not None:
+        current = _read_at(path, at, len(spec.patch_bytes))
+        if current == spec.patch_bytes:
+            return True
+        if current is not None and current[:len(spec.expect_bytes)] == spec.expect_bytes:
+            return False
+        # Neither state at the remembered site: the file changed under an
+        # identical stat (or was swapped mid-read). Fall through and re-locate.
     try:
-        with open(path, "rb") as fh:
-            data = bytearray(fh.read())
+        with _mapped(path) as data:
+            hits = _locate(data, spec, hashlib.sha256(data).hexdigest())
+            if len(hits) != 1:
+                return None
+            at = hits[0] + spec.patch_offset
+            patched = data[at:at + len(spec.patch_bytes)] == spec.patch_bytes
     except OSError:
         return None
-    hits = spec.locator(bytes(data)) if spec.locator is not None else _find_signature(data, spec.signature)
-    if len(hits) != 1:
-        return None
-    at = hits[0] + spec.patch_offset
-    return bytes(data[at:at + len(spec.patch_bytes)]) == spec.patch_bytes
+    _offset_memo.put(path, spec, ident, at)
+    return patched
 
 
 def installation_patched(install_dir: str) -> bool | None:
@@ -393,7 +875,8 @@ def installation_patched(install_dir: str) -> bool | None:
 
     True if ``HD-Player.exe`` carries the unlock patch, False if it doesn't, None
     if it can't be determined (binary missing, or an unrecognized build). Cheap
-    enough to call on a UI refresh -- it just reads and scans one binary.
+    enough to call on a UI refresh -- after the first scan of a given build it
+    is a stat plus a three-byte read (see ``is_file_patched``).
     """
     path = os.path.join(install_dir, "HD-Player.exe")
     if not os.path.isfile(path):
@@ -401,13 +884,25 @@ def installation_patched(install_dir: str) -> bool | None:
     return is_file_patched(path, UNLOCK_PLAYER)
 
 
-def patch_installation(install_dir: str, restore: bool = False) -> list[str]:
-    """Patch (or restore) every candidate binary found in ``install_dir``.
+# Candidate binaries are independent files, so a pass patches them
+# concurrently; hashing and page-ins release the GIL.
+PATCH_MAX_WORKERS = 4
 
-    Returns a list of status lines for display in a UI/log.
-    """
-    results: list[str] = []
-    for name in CANDIDATE_BINARIES:
+
+def installation_plan(install_dir: str,
+                      extra: dict[str, list[PatchSpec]] | None = None
+                      ) -> dict[str, list[PatchSpec]]:
+    """``{binary path: specs}`` for every candidate binary present in
+    ``install_dir``, in ``CANDIDATE_BINARIES`` order.
+
+    ``extra`` maps a binary name to further specs for it (e.g. root_persistence's
+    ``ROOT_RESET_NOP`` for HD-MultiInstanceManager.exe), so one pass applies
+    every patch a binary needs with a single read and a single write."""
+    extra = {k.lower(): v for k, v in (extra or {}).items()}
+    names = list(CANDIDATE_BINARIES)
+    names += [n for n in extra if n not in {c.lower() for c in names}]
+    plan: dict[str, list[PatchSpec]] = {}
+    for name in names:
         path = os.path.join(install_dir, name)
         if not os.path.isfile(path):
             continue
@@ -416,31 +911,79 @@ def patch_installation(install_dir: str, restore: bool = False) -> list[str]:
         # call-site integrity patch, which is kept as a harmless fallback.
         if name.lower() == "hd-player.exe":
             specs = [UNLOCK_PLAYER, DISK_INTEGRITY_CALL]
-        else:
+        elif name in CANDIDATE_BINARIES:
             specs = [DISK_INTEGRITY_CALL]
+        else:
+            specs = []
+        plan[path] = specs + list(extra.get(name.lower(), ()))
+    return plan
+
+
+def patch_many(plan: dict[str, list[PatchSpec]], restore: bool = False,
+               max_workers: int = PATCH_MAX_WORKERS) -> list[str]:
+    """Patch (or restore) every binary of ``plan`` concurrently.
+
+    Returns one status line per binary, in ``plan`` order; a failure of one
+    binary is reported in its line and never stops the others."""
+    def one(path: str, specs: list[PatchSpec]) -> str:
+        name = os.path.basename(path)
         try:
             if restore:
                 ok = restore_file(path)
-                results.append(f"{name}: {'restored' if ok else 'no backup'}")
-            else:
-                ok = patch_file(path, specs=specs)
-                results.append(f"{name}: {'patched' if ok else 'unchanged'}")
+                return f"{name}: {'restored' if ok else 'no backup'}"
+            ok = patch_file(path, specs=specs)
+            return f"{name}: {'patched' if ok else 'unchanged'}"
         except Exception as exc:  # noqa: BLE001 - surface to caller/UI
-            results.append(f"{name}: ERROR - {exc}")
-    return results
+            return f"{name}: ERROR - {exc}"
+
+    if not plan:
+        return []
+    workers = max(1, min(max_workers, len(plan)))
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(one, path, specs) for path, specs in plan.items()]
+        return [fut.result() for fut in futures]
+
+
+def patch_installation(install_dir: str, restore: bool = False,
+                       extra: dict[str, list[PatchSpec]] | None = None) -> list[str]:
+    """Patch (or restore) every candidate binary found in ``install_dir``.
+
+    ``extra`` adds specs per binary name (see ``installation_plan``).
+    Returns a list of status lines for display in a UI/log.
+    """
+    return patch_many(installation_plan(install_dir, extra), restore=restore)
 
 
 def _main(argv: list[str] | None = None) -> int:
     parser = argparse.ArgumentParser(description=__doc__,
                                      formatter_class=argparse.RawDescriptionHelpFormatter)
-    parser.add_argument("install_dir",
+    parser.add_argument("install_dir", nargs="?",
                         help='BlueStacks install dir, e.g. "C:\\Program Files\\BlueStacks_nxt"')
     parser.add_argument("--restore", action="store_true",
-                        help="restore originals from .prepatch.bak backups")
+                        help="restore originals from the backup store")
+    parser.add_argument("--export-offsets", metavar="FILE",
+                        help="write the per-build patch-offset DB to FILE and exit")
+    parser.add_argument("--import-offsets", metavar="FILE",
+                        help="merge a patch-offset DB exported on another host and exit")
     args = parser.parse_args(argv)
 
     logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
 
+    if args.export_offsets or args.import_offsets:
+        try:
+            if args.import_offsets:
+                n = offset_db().import_from(args.import_offsets)
+                print(f"Imported {n} patch offset(s) from {args.import_offsets}")
+            if args.export_offsets:
+                n = offset_db().export_to(args.export_offsets)
+                print(f"Exported {n} build(s) to {args.export_offsets}")
+        except OSError as exc:
+            logger.error("Offset DB transfer failed: %s", exc)
+            return 1
+        return 0
+    if not args.install_dir:
+        parser.error("install_dir is required")
+
     try:
         import admin
         if not args.restore and not admin.is_admin():
@@ -0,0 +1,211 @@
+"""Batches of per-instance background jobs, run with per-disk locking.
+
+Rooting 20 instances used to be 20 click-and-wait cycles, each closing
+BlueStacks and sleeping before touching one disk.  A :class:`Batch` takes a
+list of typed :class:`Job` s (root, unroot, R/W, Magisk, hosts block), closes
+BlueStacks once for all of them, and runs up to ``constants.JOB_MAX_WORKERS``
+at a time -- but never two that write the same disk: each job names the
+disk images it writes (:attr:`Job.locks`, see :func:`disk_locks`), and a job
+waits while an earlier one holding any of them is running or still queued,
+so jobs on one shared ``Root.vhd`` keep their order.
+
+Jobs can be cancelled (:meth:`Batch.cancel`): one that hasn't started is
+dropped, and one that has runs inside its own ``cancellation.CancelToken``'s
+scope, so its scans and e2fsprogs calls stop at the next check (raising
+:class:`Cancelled`) after rolling back.  :func:`summarize` turns the results into the one
+line the progress bar shows.  Kept free of Qt; ``MainWindow`` runs
+:meth:`Batch.run` on its operation thread.
+"""
+from __future__ import annotations
+
+import concurrent.futures
+import logging
+import os
+import threading
+from dataclasses import dataclass
+from typing import Callable
+
+import cancellation
+import constants
+import disk_topology
+
+logger = logging.getLogger(__name__)
+
+KIND_ROOT = "root"
+KIND_UNROOT = "unroot"
+KIND_RW = "rw"
+KIND_MAGISK_INSTALL = "magisk_install"
+KIND_MAGISK_UNINSTALL = "magisk_uninstall"
+KIND_HOSTS_BLOCK = "hosts_block"
+KIND_HOSTS_UNBLOCK = "hosts_unblock"
+
+KIND_LABELS = {
+    KIND_ROOT: "Root on",
+    KIND_UNROOT: "Root off",
+    KIND_RW: "R/W",
+    KIND_MAGISK_INSTALL: "Magisk install",
+    KIND_MAGISK_UNINSTALL: "Magisk uninstall",
+    KIND_HOSTS_BLOCK: "Tracker block",
+    KIND_HOSTS_UNBLOCK: "Tracker unblock",
+}
+
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+
+Cancelled = cancellation.Cancelled
+
+
+@dataclass(frozen=True)
+class Job:
+    kind: str              # KIND_*
+    target: str            # what it acts on, for progress and the summary (a unique_id)
+    # run(progress, cancelled) -> summary line; progress takes a message,
+    # cancelled() turns True once the job or the batch was cancelled.
+    run: Callable[[Callable[[str], None], Callable[[], bool]], str]
+    locks: frozenset = frozenset()   # normalised paths of the disks it writes
+    needs_shutdown: bool = True      # BlueStacks must be closed first
+
+
+@dataclass(frozen=True)
+class JobResult:
+    job: Job
+    status: str            # DONE, FAILED or CANCELLED
+    message: str
+
+
+def _norm(path: str) -> str:
+    return os.path.normcase(os.path.normpath(os.path.abspath(path)))
+
+
+def disk_locks(instance_dir: str, *disks: str) -> frozenset:
+    """The lock keys for the ``disks`` (``disk_topology.InstanceDisks`` field
+    names: "root_vhd", "data_vhdx", "fastboot") ``instance_dir`` boots from.
+
+    A clone's Root.vhd resolves to its master's, so two clones lock the same
+    key.  A disk that can't be resolved locks the instance folder instead.
+    """
+    resolved = disk_topology.resolve(instance_dir)
+    keys = set()
+    for field in disks:
+        path = getattr(resolved, field)
+        keys.add(_norm(path if path else instance_dir))
+    return frozenset(keys)
+
+
+def instance_lock(instance_dir: str) -> frozenset:
+    """The lock key for writes to the instance's own folder (its ``.bstk``)."""
+    return frozenset({_norm(instance_dir)})
+
+
+class Batch:
+    """A list of jobs run once by :meth:`run`; thread-safe to :meth:`cancel`."""
+
+    def __init__(self, jobs, max_workers: int = constants.JOB_MAX_WORKERS,
+                 shutdown: Callable[[], None] | None = None):
+        self.jobs: list[Job] = list(jobs)
+        self._max_workers = max(1, max_workers)
+        self._shutdown = shutdown
+        self._tokens = [cancellation.CancelToken() for _ in self.jobs]
+
+    def cancel(self, index: int | None = None) -> None:
+        """Cancel job ``index``, or every job not finished yet when None."""
+        for token in self._tokens if index is None else [self._tokens[index]]:
+            token.cancel()
+
+    def _is_cancelled(self, index: int) -> bool:
+        return self._tokens[index].cancelled
+
+    def run(self, progress: Callable[[str, int], None]) -> list[JobResult]:
+        """Run every job (blocking) and return their results in job order.
+
+        ``progress(message, percent)`` is called from the worker threads, so
+        it must be thread-safe (a Qt signal's ``emit`` is).
+        """
+        total = len(self.jobs)
+        results: list[JobResult | None] = [None] * total
+        finished = [0]
+        lock = threading.Lock()
+
+        def pct() -> int:
+            return int(finished[0] * 100 / total) if total else 100
+
+        if self._shutdown is not None and any(j.needs_shutdown for j in self.jobs):
+            progress("Closing BlueStacks...", 0)
+            self._shutdown()
+
+        def run_one(index: int) -> JobResult:
+            job = self.jobs[index]
+            label = "%s: %s" % (job.target, KIND_LABELS.get(job.kind, job.kind))
+
+            def job_progress(msg: str) -> None:
+                with lock:
+                    done = pct()
+                progress("%s: %s" % (label, msg), done)
+
+            logger.info("---- %s ----", label)
+            job_progress("starting...")
+            try:
+                with cancellation.scope(self._tokens[index]):
+                    message = job.run(job_progress, lambda: self._is_cancelled(index))
+                return JobResult(job, DONE, message or "done")
+            except Cancelled as exc:
+                return JobResult(job, CANCELLED, str(exc) or "cancelled")
+            except Exception as exc:  # noqa: BLE001 - one failed job must not sink the batch
+                logger.exception("%s failed", label)
+                return JobResult(job, FAILED, str(exc))
+
+        pending = list(range(total))
+        running: dict[concurrent.futures.Future, int] = {}
+        held: set[str] = set()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self._max_workers) as pool:
+            while pending or running:
+                reserved = set(held)
+                for index in list(pending):
+                    job = self.jobs[index]
+                    if self._is_cancelled(index):
+                        pending.remove(index)
+                        results[index] = JobResult(job, CANCELLED, "cancelled before it started")
+                        with lock:
+                            finished[0] += 1
+                        continue
+                    # An earlier job still queued on the same disk goes first.
+                    if len(running) >= self._max_workers or job.locks & reserved:
+                        reserved |= job.locks
+                        continue
+                    pending.remove(index)
+                    held |= job.locks
+                    reserved |= job.locks
+                    running[pool.submit(run_one, index)] = index
+                if not running:
+                    continue
+                done, _ = concurrent.futures.wait(
+                    running, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    index = running.pop(future)
+                    held -= self.jobs[index].locks
+                    results[index] = future.result()
+                    with lock:
+                        finished[0] += 1
+                    logger.info("%s (%s): %s", self.jobs[index].target,
+                                results[index].status, results[index].message)
+        return results
+
+
+def summarize(results) -> str:
+    """One line for the progress bar: counts per outcome plus what failed."""
+    if not results:
+        return "Nothing to do."
+    counts = {status: sum(1 for r in results if r.status == status)
+              for status in (DONE, FAILED, CANCELLED)}
+    kinds = sorted({KIND_LABELS.get(r.job.kind, r.job.kind) for r in results})
+    line = "%s: %d done" % (" / ".join(kinds), counts[DONE])
+    if counts[FAILED]:
+        line += ", %d failed" % counts[FAILED]
+    if counts[CANCELLED]:
+        line += ", %d cancelled" % counts[CANCELLED]
+    failures = ["%s (%s)" % (r.job.target, r.message) for r in results if r.status == FAILED]
+    if failures:
+        line += ". Failed: " + "; ".join(failures)
+    return line + "."
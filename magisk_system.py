@@ -26,11 +26,11 @@ Safety
 ------
 - Every tool is stat-verified after writing, not just busybox -- a partial stage
   never reports success.
-- On any failure the partial DATABIN is rolled back (removed), so a failed
-  install is not a one-way door.
+- On any failure -- or a cancel (``cancellation``) -- the partial DATABIN is
+  rolled back (removed), so a failed install is not a one-way door.
 - The cleanup enumerates the dir's *actual* contents, so a prior/foreign Magisk
   install is fully replaced rather than leaving orphans.
-- A host-side manifest (``.magisk_system.json`` next to Data.vhdx) records what
+- A host-side manifest (in the state store, keyed by instance) records what
   was staged (payload hash + tools) as a provenance/reversal stamp.
 
 Requirements: Windows, Administrator (raw-disk access + diskpart), instance shut
@@ -40,24 +40,29 @@ policy work is needed; we still set the ``adb_data_file`` context for correctnes
 from __future__ import annotations
 
 import datetime
-import glob
 import gzip
-import json
 import logging
 import os
 import re
+import sqlite3
 import sys
 import tempfile
+import zipfile
+from dataclasses import dataclass
 
+import bstk
+import cancellation
+import disk_topology
 import ext4_symlink as _es  # reuse attach/debugfs/e2fsck machinery
+import jobs
 import magisk_payload as _mp
+import state_store
 
 logger = logging.getLogger(__name__)
 
 # ext4 path of DATABIN inside Data.vhdx (fs root == guest /data).
 _DATABIN = "/adb/magisk"
 _SELINUX_CTX = "u:object_r:adb_data_file:s0"
-_MANIFEST_NAME = ".magisk_system.json"  # host sidecar next to Data.vhdx
 
 # Tools that must be executable in DATABIN. busybox is the daemon's hard gate.
 # Kyubi ships no magiskboot (system-mode only).
@@ -114,10 +119,6 @@ def _data_vhdx(instance_dir: str) -> str:
     return os.path.join(instance_dir, "Data.vhdx")
 
 
-def _manifest_path(instance_dir: str) -> str:
-    return os.path.join(instance_dir, _MANIFEST_NAME)
-
-
 def _bstk_vhd_location(bstk_path: str) -> str | None:
     """The ``location`` of the VHD (system) HardDisk in a ``.bstk``, or None.
 
@@ -125,40 +126,32 @@ def _bstk_vhd_location(bstk_path: str) -> str | None:
     disk at the instance that owns the shared system image.
     """
     try:
-        with open(bstk_path, encoding="utf-8", errors="replace") as f:
-            text = f.read()
-    except OSError:
+        disks = bstk.load(bstk_path).disks
+    except (OSError, ValueError):
         return None
-    for m in re.finditer(r"<HardDisk\b[^>]*?/?>", text):
-        tag = m.group(0)
-        if 'format="VHD"' in tag:  # Root.vhd is VHD; fastboot is VDI, Data is VHDX
-            loc = re.search(r'location="([^"]+)"', tag)
-            if loc:
-                return loc.group(1)
+    for disk in disks:
+        if disk.format.upper() == "VHD":  # Root.vhd is VHD; fastboot is VDI, Data is VHDX
+            return disk.location
     return None
 
 
+def _no_root_vhd(instance_dir: str) -> str:
+    return ("no Root.vhd for %s -- BlueStacks shares one system image across all "
+            "instances of an Android version, and this looks like a clone/fresh "
+            "instance that has none of its own. Installing to /system here would "
+            "affect every instance of that version." % instance_dir)
+
+
 def _resolve_root_vhd(instance_dir: str) -> str:
     """Path to the Root.vhd this instance boots from -- its own, or the shared
     master's if it's a clone/fresh instance (which have no own Root.vhd).
 
     Raises with an actionable message if none can be found.
     """
-    own = os.path.join(instance_dir, "Root.vhd")
-    if os.path.isfile(own):
-        return own
-    for bstk in glob.glob(os.path.join(instance_dir, "*.bstk")):
-        loc = _bstk_vhd_location(bstk)
-        if not loc:
-            continue
-        resolved = loc if os.path.isabs(loc) else os.path.normpath(os.path.join(instance_dir, loc))
-        if os.path.isfile(resolved):
-            return resolved
-    raise RuntimeError(
-        "no Root.vhd for %s -- BlueStacks shares one system image across all "
-        "instances of an Android version, and this looks like a clone/fresh "
-        "instance that has none of its own. Installing to /system here would "
-        "affect every instance of that version." % instance_dir)
+    root_vhd = disk_topology.resolve(instance_dir).root_vhd
+    if root_vhd is None:
+        raise RuntimeError(_no_root_vhd(instance_dir))
+    return root_vhd
 
 
 def _cygpath(win_path: str) -> str:
@@ -312,12 +305,13 @@ def _service_d_grant_commands(script_hostpath: str, dir_exists: bool) -> list[st
     return cmds
 
 
-def _stat_is_regular_root(st: str, want_mode: str) -> bool:
+def _stat_is_regular_root(st: str, want_mode: str, gid: int = 0) -> bool:
     """True if a debugfs stat shows a regular file, root-owned, at ``want_mode``
-    (e.g. ``"0755"``)."""
+    (e.g. ``"0755"``) and group ``gid`` (root unless a module bin dir says
+    otherwise)."""
     return bool("Inode:" in st and "Type: regular" in st
                 and re.search(r"Mode:\s+%s\b" % want_mode, st)
-                and re.search(r"User:\s+0\b", st) and re.search(r"Group:\s+0\b", st))
+                and re.search(r"User:\s+0\b", st) and re.search(r"Group:\s+%d\b" % gid, st))
 
 
 def _verify_staged(device: str, tools: dict[str, str], env: dict,
@@ -340,8 +334,8 @@ def _verify_staged(device: str, tools: dict[str, str], env: dict,
 
 
 def _write_manifest(instance_dir: str, components: list[str]) -> None:
-    """Stamp the install manifest (provenance + what was written) next to
-    Data.vhdx.  ``components`` is what's actually present, e.g. ["system",
+    """Stamp the install manifest (provenance + what was written) in the
+    state store.  ``components`` is what's actually present, e.g. ["system",
     "databin"] for an offline install ("manager" is added later, once the app
     is pm-installed post-boot) or ["databin"] for a DATABIN-only stage."""
     data = {
@@ -352,27 +346,28 @@ def _write_manifest(instance_dir: str, components: list[str]) -> None:
         "components": sorted(components),
         "installed_at": datetime.datetime.now().isoformat(timespec="seconds"),
     }
+    prior = magisk_status(instance_dir) or {}
+    if prior.get("modules"):  # offline-installed modules outlive a restamp
+        data["modules"] = prior["modules"]
     try:
-        with open(_manifest_path(instance_dir), "w", encoding="utf-8") as f:
-            json.dump(data, f, indent=2)
-    except OSError as exc:  # a missing stamp must not fail a good install
+        state_store.store().set_magisk(instance_dir, data)
+    except (OSError, sqlite3.Error) as exc:  # a missing stamp must not fail a good install
         logger.warning("could not write Magisk manifest: %s", exc)
 
 
 def _clear_manifest(instance_dir: str) -> None:
     try:
-        os.unlink(_manifest_path(instance_dir))
-    except OSError:
-        pass
+        state_store.store().set_magisk(instance_dir, None)
+    except (OSError, sqlite3.Error):
+        logger.warning("could not clear the Magisk manifest", exc_info=True)
 
 
 def magisk_status(instance_dir: str) -> dict | None:
     """The install manifest for this instance, or None if this tool hasn't
     installed Magisk here.  For the GUI to show install state."""
     try:
-        with open(_manifest_path(instance_dir), encoding="utf-8") as f:
-            return json.load(f)
-    except (OSError, ValueError):
+        return state_store.store().magisk(instance_dir)
+    except (OSError, sqlite3.Error):
         return None
 
 
@@ -398,8 +393,295 @@ def remove_component(instance_dir: str, component: str) -> None:
     _write_manifest(instance_dir, sorted(comps))
 
 
+# --------------------------------------------------------------------------
+# Offline module install: unpack a Magisk module zip into /data/adb/modules.
+# --------------------------------------------------------------------------
+
+_MODULES = "/adb/modules"  # ext4 path inside Data.vhdx (fs root == guest /data)
+_MODULE_CTX = "u:object_r:system_file:s0"  # set_perm's default context in util_functions.sh
+_MODULE_ID_RE = re.compile(r"^[a-zA-Z][a-zA-Z0-9._-]+$")  # Magisk's own id rule
+# Stripped by Magisk's installer after unzip (and META-INF is never extracted).
+_MODULE_SKIP = ("customize.sh", "README.md")
+# util_functions.sh install_module's default perms: everything 0755/0644 root,
+# except the bin dirs, which go 0755 root:shell (vendor/bin with vendor_file).
+_MODULE_BIN_DIRS = (("system/bin", _MODULE_CTX), ("system/xbin", _MODULE_CTX),
+                    ("system/system_ext/bin", _MODULE_CTX),
+                    ("system/vendor/bin", "u:object_r:vendor_file:s0"))
+_SHELL_GID = 2000
+
+# Modules whose customize.sh sets SKIPUNZIP=1 pick their own files (per-ABI libs,
+# checksums) and can't be laid out faithfully without running that script. Those
+# are parked as zips and flashed by a one-shot service.d script on first boot --
+# still no ADB, no su grant, no user action; just active one reboot later.
+_PENDING = "/adb/bsrgui-pending"
+_PENDING_SCRIPT = "01-bsrgui-modules.sh"
+_PENDING_BODY = (
+    "#!/system/bin/sh\n"
+    "# BlueStacks-Root-GUI: flash module zips staged offline whose installer must\n"
+    "# run in the guest (SKIPUNZIP). One-shot: removes itself once all are in.\n"
+    "D=/data/adb/bsrgui-pending\n"
+    'for z in "$D"/*.zip; do\n'
+    '  [ -f "$z" ] || continue\n'
+    '  magisk --install-module "$z" && rm -f "$z"\n'
+    "done\n"
+    'rmdir "$D" 2>/dev/null && rm -f "$0"\n'
+)
+
+
+@dataclass(frozen=True)
+class ModuleStage:
+    """One module zip unpacked host-side, ready for the debugfs script.
+
+    ``files`` maps module-relative path -> host path; ``dirs`` lists every
+    module-relative directory (parents first).  A ``deferred`` module carries
+    no files: its zip is parked for the first-boot flash instead.
+    """
+    module_id: str
+    version: str
+    zip_path: str
+    files: dict
+    dirs: tuple
+    deferred: bool = False
+
+
+def read_module_prop(zip_path: str) -> dict[str, str]:
+    """``module.prop`` of a Magisk module zip as a dict (``id``, ``version``...).
+
+    Raises ``RuntimeError`` if the zip has no module.prop or an invalid id --
+    the same checks Magisk's installer makes before touching the disk.
+    """
+    try:
+        with zipfile.ZipFile(zip_path) as z:
+            raw = z.read("module.prop").decode("utf-8", errors="replace")
+    except (OSError, KeyError, zipfile.BadZipFile) as exc:
+        raise RuntimeError("%s is not a Magisk module (%s)"
+                           % (os.path.basename(zip_path), exc)) from exc
+    prop: dict[str, str] = {}
+    for line in raw.splitlines():
+        key, sep, value = line.partition("=")
+        if sep and not key.lstrip().startswith("#"):
+            prop[key.strip()] = value.strip()
+    if not _MODULE_ID_RE.match(prop.get("id", "")):
+        raise RuntimeError("%s has an invalid module id %r"
+                           % (os.path.basename(zip_path), prop.get("id")))
+    return prop
+
+
+def _module_skips_unzip(z: zipfile.ZipFile) -> bool:
+    """True if the module's customize.sh takes over extraction (SKIPUNZIP=1)."""
+    try:
+        script = z.read("customize.sh").decode("utf-8", errors="replace")
+    except KeyError:
+        return False
+    return bool(re.search(r"^\s*SKIPUNZIP=1\b", script, re.MULTILINE))
+
+
+def _module_member(name: str) -> str | None:
+    """Module-relative path for a zip member, or None if Magisk wouldn't
+    extract it (META-INF, customize.sh, README, .git*) or it's unsafe."""
+    rel = name.replace("\\", "/").strip("/")
+    parts = rel.split("/")
+    if (not rel or rel.startswith("META-INF/") or rel in _MODULE_SKIP
+            or parts[0].startswith(".git")):
+        return None
+    if name.startswith("/") or ".." in parts or ":" in parts[0]:
+        raise RuntimeError("module zip has an unsafe path: %r" % name)
+    return rel
+
+
+def unpack_module(zip_path: str, work_dir: str) -> ModuleStage:
+    """Unpack a verified module zip (``rezygisk_payload``/``lsposed_payload``
+    ``fetch_module``) into ``work_dir`` the way Magisk's default installer would,
+    ready to be written into Data.vhdx by :func:`stage_databin`."""
+    prop = read_module_prop(zip_path)
+    mid = prop["id"]
+    with zipfile.ZipFile(zip_path) as z:
+        if _module_skips_unzip(z):
+            return ModuleStage(mid, prop.get("version", "?"), zip_path, {}, (), deferred=True)
+        dest = os.path.join(work_dir, mid)
+        files: dict[str, str] = {}
+        dirs: set[str] = set()
+        for info in z.infolist():
+            rel = _module_member(info.filename)
+            if rel is None:
+                continue
+            parent = rel.rpartition("/")[0] if not info.is_dir() else rel
+            while parent:
+                dirs.add(parent)
+                parent = parent.rpartition("/")[0]
+            if info.is_dir():
+                continue
+            host = os.path.join(dest, *rel.split("/"))
+            os.makedirs(os.path.dirname(host), exist_ok=True)
+            with z.open(info) as src, open(host, "wb") as dst:
+                dst.write(src.read())
+            files[rel] = host
+    return ModuleStage(mid, prop.get("version", "?"), zip_path, files,
+                       tuple(sorted(dirs, key=lambda d: (d.count("/"), d))))
+
+
+def _module_perm(rel: str, is_dir: bool) -> tuple[str, int, str]:
+    """``(debugfs mode, gid, selinux ctx)`` for a module-relative path, matching
+    util_functions.sh's default ``set_perm_recursive`` pass."""
+    for bindir, ctx in _MODULE_BIN_DIRS:
+        if rel == bindir or rel.startswith(bindir + "/"):
+            return ("040755" if is_dir else "0100755"), _SHELL_GID, ctx
+    return ("040755" if is_dir else "0100644"), 0, _MODULE_CTX
+
+
+def _module_commands(stage: ModuleStage) -> list[str]:
+    """Pure debugfs commands writing an unpacked module into
+    ``/adb/modules/<id>``.  Same ``write`` quirk as the DATABIN: ``cd`` into each
+    dir and write bare names.  The caller cleans any prior copy first."""
+    root = "%s/%s" % (_MODULES, stage.module_id)
+    cmds = ["mkdir %s" % root, "sif %s mode 040755" % root,
+            "sif %s uid 0" % root, "sif %s gid 0" % root,
+            "ea_set %s security.selinux %s" % (root, _MODULE_CTX)]
+    for rel in stage.dirs:
+        path = "%s/%s" % (root, rel)
+        mode, gid, ctx = _module_perm(rel, True)
+        cmds += ["mkdir %s" % path, "sif %s mode %s" % (path, mode),
+                 "sif %s uid 0" % path, "sif %s gid %d" % (path, gid),
+                 "ea_set %s security.selinux %s" % (path, ctx)]
+    by_dir: dict[str, list[str]] = {}
+    for rel in stage.files:
+        by_dir.setdefault(rel.rpartition("/")[0], []).append(rel)
+    for sub in sorted(by_dir):
+        cmds.append("cd %s" % ("%s/%s" % (root, sub) if sub else root))
+        for rel in sorted(by_dir[sub]):
+            dst = "%s/%s" % (root, rel)
+            mode, gid, ctx = _module_perm(rel, False)
+            cmds += ["write %s %s" % (_dq(_cygpath(stage.files[rel])), rel.rpartition("/")[2]),
+                     "sif %s mode %s" % (dst, mode),
+                     "sif %s uid 0" % dst, "sif %s gid %d" % (dst, gid),
+                     "ea_set %s security.selinux %s" % (dst, ctx)]
+    return cmds
+
+
+def _pending_script_tempfile() -> str:
+    """The first-boot module flash script in a temp file (LF endings)."""
+    fd, path = tempfile.mkstemp(suffix="-" + _PENDING_SCRIPT)
+    with os.fdopen(fd, "w", encoding="utf-8", newline="\n") as f:
+        f.write(_PENDING_BODY)
+    return path
+
+
+def _pending_commands(stages: list[ModuleStage], script_hostpath: str,
+                      pending_exists: bool) -> list[str]:
+    """Pure debugfs commands parking deferred module zips under
+    ``/adb/bsrgui-pending`` (root-only) plus the service.d script that flashes
+    them.  Assumes service.d exists (the DATABIN grant step creates it)."""
+    cmds: list[str] = []
+    if not pending_exists:
+        cmds += ["mkdir %s" % _PENDING, "sif %s mode 040700" % _PENDING,
+                 "sif %s uid 0" % _PENDING, "sif %s gid 0" % _PENDING,
+                 "ea_set %s security.selinux %s" % (_PENDING, _SELINUX_CTX)]
+    cmds.append("cd %s" % _PENDING)
+    for st in stages:
+        name = "%s.zip" % st.module_id
+        dst = "%s/%s" % (_PENDING, name)
+        cmds += ["rm %s" % name,  # write won't overwrite; harmless if absent
+                 "write %s %s" % (_dq(_cygpath(st.zip_path)), name),
+                 "sif %s mode 0100600" % dst, "sif %s uid 0" % dst, "sif %s gid 0" % dst,
+                 "ea_set %s security.selinux %s" % (dst, _SELINUX_CTX)]
+    dst = "%s/%s" % (_SERVICE_D, _PENDING_SCRIPT)
+    cmds += ["cd %s" % _SERVICE_D, "rm %s" % _PENDING_SCRIPT,
+             "write %s %s" % (_dq(_cygpath(script_hostpath)), _PENDING_SCRIPT),
+             "sif %s mode 0100755" % dst, "sif %s uid 0" % dst, "sif %s gid 0" % dst,
+             "ea_set %s security.selinux %s" % (dst, _SELINUX_CTX)]
+    return cmds
+
+
+def _verify_modules(device: str, stages: list[ModuleStage], env: dict) -> list[str]:
+    """Module files (or parked zips) NOT correctly written; empty == verified."""
+    bad: list[str] = []
+    for st in stages:
+        if st.deferred:
+            path = "%s/%s.zip" % (_PENDING, st.module_id)
+            if not _stat_is_regular_root(_es._stat_path(device, path, env), "0600"):
+                bad.append("%s.zip" % st.module_id)
+            continue
+        for rel in st.files:
+            mode, gid, _ = _module_perm(rel, False)
+            path = "%s/%s/%s" % (_MODULES, st.module_id, rel)
+            if not _stat_is_regular_root(_es._stat_path(device, path, env), mode[-4:], gid):
+                bad.append("%s/%s" % (st.module_id, rel))
+    return bad
+
+
+def _modules_script(device: str, stages: list[ModuleStage], env: dict,
+                    pending_script: str, svc_exists: bool) -> list[str]:
+    """Full debugfs script for ``stages``: clean + write each unpacked module,
+    then park the deferred ones.  Creates ``/adb/modules`` (and service.d, when
+    ``svc_exists`` is False and something is deferred) on a fresh instance."""
+    cmds: list[str] = []
+    unpacked = [st for st in stages if not st.deferred]
+    deferred = [st for st in stages if st.deferred]
+    if unpacked and "Inode:" not in _es._stat_path(device, _MODULES, env):
+        cmds += ["mkdir %s" % _MODULES, "sif %s mode 040755" % _MODULES,
+                 "sif %s uid 0" % _MODULES, "sif %s gid 0" % _MODULES,
+                 "ea_set %s security.selinux %s" % (_MODULES, _SELINUX_CTX)]
+    for st in unpacked:
+        root = "%s/%s" % (_MODULES, st.module_id)
+        if "Inode:" in _es._stat_path(device, root, env):
+            cmds += _clean_dir_commands(device, root, env)
+        cmds += _module_commands(st)
+    if deferred:
+        if not svc_exists:
+            cmds += ["mkdir %s" % _SERVICE_D, "sif %s mode 040700" % _SERVICE_D,
+                     "sif %s uid 0" % _SERVICE_D, "sif %s gid 0" % _SERVICE_D,
+                     "ea_set %s security.selinux %s" % (_SERVICE_D, _SELINUX_CTX)]
+        pending_exists = "Inode:" in _es._stat_path(device, _PENDING, env)
+        cmds += _pending_commands(deferred, pending_script, pending_exists)
+    return cmds
+
+
+def _modules_rollback(device: str, stages: list[ModuleStage], env: dict) -> list[str]:
+    """debugfs commands removing whatever ``stages`` wrote (rollback path).
+
+    The first-boot flash script and ``/adb/bsrgui-pending`` go too, unless
+    the dir still holds zips parked by an earlier install that they must flash.
+    """
+    cmds: list[str] = []
+    parked: list[str] = []
+    for st in stages:
+        if st.deferred:
+            parked.append("%s.zip" % st.module_id)
+            cmds.append("rm %s/%s.zip" % (_PENDING, st.module_id))
+        else:
+            cmds += _clean_dir_commands(device, "%s/%s" % (_MODULES, st.module_id), env)
+    if parked and not set(_list_dir(device, _PENDING, env)) - set(parked):
+        cmds += ["rm %s/%s" % (_SERVICE_D, _PENDING_SCRIPT), "rmdir %s" % _PENDING]
+    return cmds
+
+
+def _module_results(stages: list[ModuleStage]) -> list[str]:
+    return [("Parked %s %s for a one-shot flash on first boot (its installer must "
+             "run in the guest)" if st.deferred else
+             "Installed %s %s offline into /data/adb/modules")
+            % (st.module_id, st.version) for st in stages]
+
+
+def _record_modules(instance_dir: str, stages: list[ModuleStage]) -> None:
+    """Note offline-installed modules in the manifest (``modules`` key), so the
+    GUI can show them without booting.  No-op if Magisk isn't installed here."""
+    st = magisk_status(instance_dir)
+    if st is None or not stages:
+        return
+    mods = dict(st.get("modules") or {})
+    for stage in stages:
+        mods[stage.module_id] = {"version": stage.version,
+                                 "mode": "deferred" if stage.deferred else "offline"}
+    st["modules"] = mods
+    try:
+        state_store.store().set_magisk(instance_dir, st)
+    except (OSError, sqlite3.Error) as exc:
+        logger.warning("could not record modules in the Magisk manifest: %s", exc)
+
+
 def stage_databin(instance_dir: str, tools: dict[str, str],
-                  extras: dict[str, str] | None = None, progress=None) -> list[str]:
+                  extras: dict[str, str] | None = None, progress=None,
+                  modules: list[ModuleStage] | None = None, cancel=None) -> list[str]:
     """Write Magisk's DATABIN (``/data/adb/magisk``) into the instance's Data.vhdx.
 
     ``tools`` maps tool name -> host path (``magisk_payload.extract_tools``);
@@ -409,6 +691,16 @@ def stage_databin(instance_dir: str, tools: dict[str, str],
     present, so ``magisk --install-module`` no longer aborts "Incomplete Magisk
     install".  All-or-nothing: every file is verified, and a failure rolls back
     the partial DATABIN.  Returns status lines; raises on hard failure.
+
+    ``modules`` (from :func:`unpack_module`) are written into
+    ``/data/adb/modules/<id>`` in the same attach and verified the same way, so
+    a fully provisioned instance never has to boot for them; they roll back
+    with the DATABIN.
+
+    ``cancel`` (default: the current ``cancellation`` token) stops the run at
+    the next step (a running read is killed, a write script finishes);
+    whatever was written is rolled back and the disk detached before
+    ``Cancelled`` propagates.
     """
     def _p(msg: str) -> None:
         logger.info(msg)
@@ -424,21 +716,26 @@ def stage_databin(instance_dir: str, tools: dict[str, str],
     if "busybox" not in tools:
         raise RuntimeError("payload missing busybox (the daemon's environment gate)")
 
+    modules = modules or []
     env = _es._tool_env()
     total = len(tools) + len(extras)
     grant_script = _grant_script_tempfile()  # service.d ADB auto-grant; removed below
+    pending_script = _pending_script_tempfile() if any(m.deferred for m in modules) else ""
     _p("Attaching Data.vhdx (staging Magisk binaries)...")
     try:
-        with _es._Attached(vhdx, progress=_p) as att:
+        with cancellation.scope(cancel), _es._Attached(vhdx, progress=_p) as att:
             dev = att.device
             _p("Writing %d DATABIN files into %s..." % (total, _DATABIN))
             svc_exists = "Inode:" in _es._stat_path(dev, _SERVICE_D, env)
             script = (_clean_dir_commands(dev, _DATABIN, env)
                       + _write_commands(tools) + _databin_extra_commands(extras)
                       + _service_d_grant_commands(grant_script, svc_exists))
-            out = _es._run_script(dev, script, env)
+            if modules:
+                _p("Writing %d module(s) into /data/adb/modules..." % len(modules))
+                script += _modules_script(dev, modules, env, pending_script, True)
             try:
-                bad = _verify_staged(dev, tools, env, extras)
+                out = _es._run_script(dev, script, env)
+                bad = _verify_staged(dev, tools, env, extras) + _verify_modules(dev, modules, env)
                 grant_st = _es._stat_path(dev, "%s/%s" % (_SERVICE_D, _ADB_GRANT_SCRIPT), env)
                 if not _stat_is_regular_root(grant_st, "0755"):
                     bad.append("service.d/%s" % _ADB_GRANT_SCRIPT)
@@ -452,24 +749,34 @@ def stage_databin(instance_dir: str, tools: dict[str, str],
             except Exception:
                 _p("Staging failed -- rolling back /data/adb/magisk...")
                 try:
-                    _es._run_script(dev, _clean_dir_commands(dev, _DATABIN, env)
-                                    + ["rm %s/%s" % (_SERVICE_D, _ADB_GRANT_SCRIPT)], env)
+                    with cancellation.shielded():
+                        _es._run_script(dev, _clean_dir_commands(dev, _DATABIN, env)
+                                        + ["rm %s/%s" % (_SERVICE_D, _ADB_GRANT_SCRIPT)]
+                                        + _modules_rollback(dev, modules, env), env)
                 except Exception:
                     logger.exception("rollback cleanup also failed")
                 raise
     finally:
-        try:
-            os.unlink(grant_script)
-        except OSError:
-            pass
+        for tmp in (grant_script, pending_script):
+            try:
+                if tmp:
+                    os.unlink(tmp)
+            except OSError:
+                pass
     _write_manifest(instance_dir, ["databin"])
+    _record_modules(instance_dir, modules)
     gate = "busybox + util_functions.sh" if "util_functions.sh" in extras else "busybox gate"
-    return ["Staged %d DATABIN files into /data/adb/magisk (+ ADB auto-grant, all "
-            "verified, %s OK)" % (total, gate)]
+    results = ["Staged %d DATABIN files into /data/adb/magisk (+ ADB auto-grant, all "
+               "verified, %s OK)" % (total, gate)]
+    return results + _module_results(modules)
+
 
+def unstage_databin(instance_dir: str, progress=None, cancel=None) -> list[str]:
+    """Remove ``/data/adb/magisk`` (and its manifest) from a shut-down Data.vhdx.
 
-def unstage_databin(instance_dir: str, progress=None) -> list[str]:
-    """Remove ``/data/adb/magisk`` (and its manifest) from a shut-down Data.vhdx."""
+    ``cancel`` is honoured until the removal script starts; that one runs to
+    the end so a cancel never leaves a half-removed DATABIN.
+    """
     def _p(msg: str) -> None:
         logger.info(msg)
         if progress:
@@ -480,10 +787,11 @@ def unstage_databin(instance_dir: str, progress=None) -> list[str]:
         return ["e2fsprogs/Data.vhdx unavailable -- nothing to remove"]
     env = _es._tool_env()
     _p("Attaching Data.vhdx (removing Magisk binaries)...")
-    with _es._Attached(vhdx, progress=_p) as att:
+    with cancellation.scope(cancel), _es._Attached(vhdx, progress=_p) as att:
         dev = att.device
-        _es._run_script(dev, _clean_dir_commands(dev, _DATABIN, env)
-                        + ["rm %s/%s" % (_SERVICE_D, _ADB_GRANT_SCRIPT)], env)  # DATABIN + auto-grant
+        cmds = (_clean_dir_commands(dev, _DATABIN, env)
+                + ["rm %s/%s" % (_SERVICE_D, _ADB_GRANT_SCRIPT)])  # DATABIN + auto-grant
+        _es._run_script(dev, cmds, env)
         if "Inode:" in _es._stat_path(dev, _DATABIN, env):
             raise RuntimeError("failed to remove %s" % _DATABIN)
         if not _es._fsck_ok(dev, env):
@@ -492,6 +800,69 @@ def unstage_databin(instance_dir: str, progress=None) -> list[str]:
     return ["Removed /data/adb/magisk"]
 
 
+def install_modules_offline(instance_dir: str, zip_paths: list[str],
+                            work_dir: str | None = None, progress=None,
+                            cancel=None) -> list[str]:
+    """Install Magisk module zips into a shut-down instance's Data.vhdx, no boot.
+
+    The offline counterpart of ``adb_handler.install_module`` for an instance
+    that already has Magisk: each zip is unpacked host-side and written into
+    ``/data/adb/modules/<id>`` in one attach, all-or-nothing.  For a fresh
+    install pass the modules to :func:`install` instead, which batches them into
+    the DATABIN attach.  ``cancel`` (default: the current ``cancellation``
+    token) stops it between steps; a partial write is rolled back first.
+    """
+    def _p(msg: str) -> None:
+        logger.info(msg)
+        if progress:
+            progress(msg)
+
+    vhdx = _data_vhdx(instance_dir)
+    if not _es.tools_available():
+        raise RuntimeError("bundled e2fsprogs (debugfs) not found")
+    if not os.path.isfile(vhdx):
+        raise RuntimeError("Data.vhdx not found in %s" % instance_dir)
+    work = os.path.join(work_dir or _default_work_dir(), "modules")
+    stages = [unpack_module(z, work) for z in zip_paths]
+    if not stages:
+        return []
+
+    env = _es._tool_env()
+    pending_script = _pending_script_tempfile() if any(m.deferred for m in stages) else ""
+    _p("Attaching Data.vhdx (installing %d module(s))..." % len(stages))
+    try:
+        with cancellation.scope(cancel), _es._Attached(vhdx, progress=_p) as att:
+            dev = att.device
+            svc_exists = "Inode:" in _es._stat_path(dev, _SERVICE_D, env)
+            out = _es._run_script(
+                dev, _modules_script(dev, stages, env, pending_script, svc_exists), env)
+            try:
+                bad = _verify_modules(dev, stages, env)
+                if bad:
+                    raise RuntimeError(
+                        "module install incomplete -- not correctly written: %s (debugfs: %s)"
+                        % (", ".join(sorted(bad)), _errtail(out)))
+                _p("Verifying filesystem (e2fsck)...")
+                if not _es._fsck_ok(dev, env):
+                    raise RuntimeError("e2fsck reported errors after installing modules")
+            except Exception:
+                _p("Module install failed -- rolling back...")
+                try:
+                    with cancellation.shielded():
+                        _es._run_script(dev, _modules_rollback(dev, stages, env), env)
+                except Exception:
+                    logger.exception("rollback cleanup also failed")
+                raise
+    finally:
+        if pending_script:
+            try:
+                os.unlink(pending_script)
+            except OSError:
+                pass
+    _record_modules(instance_dir, stages)
+    return _module_results(stages)
+
+
 # --------------------------------------------------------------------------
 # System-mode install: write Magisk's /system footprint into Root.vhd offline.
 # --------------------------------------------------------------------------
@@ -551,7 +922,7 @@ def _system_write_commands(sysroot: str, srcs: dict[str, str]) -> list[str]:
 
 
 def install_to_system(instance_dir: str, tools: dict[str, str], stub_path: str,
-                      progress=None) -> list[str]:
+                      progress=None, cancel=None) -> list[str]:
     """Write Magisk's system-mode footprint into the instance's Root.vhd offline.
 
     ``tools`` provides the magisk binaries (magisk_payload.extract_tools);
@@ -566,6 +937,9 @@ def install_to_system(instance_dir: str, tools: dict[str, str], stub_path: str,
     app not supported"; and writing the full APK as stub.apk yields a broken,
     unselectable app.  Offline root works without any manager; the app is just a
     normal app installed via pm.
+
+    ``cancel`` behaves as in :func:`stage_databin`: the partial footprint is
+    rolled back before ``Cancelled`` propagates.
     """
     def _p(msg: str) -> None:
         logger.info(msg)
@@ -590,14 +964,14 @@ def install_to_system(instance_dir: str, tools: dict[str, str], stub_path: str,
 
     env = _es._tool_env()
     _p("Attaching Root.vhd (installing Magisk to /system)...")
-    with _es._Attached(root_vhd, progress=_p) as att:
+    with cancellation.scope(cancel), _es._Attached(root_vhd, progress=_p) as att:
         dev = att.device
         sysroot = _find_system_root(dev, env)
         magiskdir = "%s/etc/init/magisk" % sysroot
         _p("Writing Magisk system files under %s/etc/init ..." % sysroot)
         script = _clean_dir_commands(dev, magiskdir, env) + _system_write_commands(sysroot, srcs)
-        out = _es._run_script(dev, script, env)
         try:
+            out = _es._run_script(dev, script, env)
             for path in ("%s/config" % magiskdir, "%s/magisk64" % magiskdir,
                          "%s/stub.apk" % magiskdir, "%s/etc/init/bootanim.rc" % sysroot,
                          "%s/etc/init/bootanim.rc.gz" % sysroot):
@@ -610,16 +984,21 @@ def install_to_system(instance_dir: str, tools: dict[str, str], stub_path: str,
         except Exception:
             _p("System install failed -- rolling back...")
             try:
-                _es._run_script(dev, _clean_dir_commands(dev, magiskdir, env), env)
+                with cancellation.shielded():
+                    _es._run_script(dev, _clean_dir_commands(dev, magiskdir, env), env)
             except Exception:
                 logger.exception("rollback cleanup also failed")
             raise
     return ["Installed Magisk system files into %s/etc/init" % sysroot]
 
 
-def uninstall_from_system(instance_dir: str, progress=None) -> list[str]:
+def uninstall_from_system(instance_dir: str, progress=None, cancel=None) -> list[str]:
     """Remove Magisk's system-mode footprint from Root.vhd and restore the stock
-    bootanim.rc from the pinned original."""
+    bootanim.rc from the pinned original.
+
+    ``cancel`` is honoured until the removal script starts (as in
+    :func:`unstage_databin`): a half-removed footprint would not boot.
+    """
     def _p(msg: str) -> None:
         logger.info(msg)
         if progress:
@@ -644,7 +1023,7 @@ def uninstall_from_system(instance_dir: str, progress=None) -> list[str]:
     env = _es._tool_env()
     _p("Attaching Root.vhd (removing Magisk system files)...")
     try:
-        with _es._Attached(root_vhd, progress=_p) as att:
+        with cancellation.scope(cancel), _es._Attached(root_vhd, progress=_p) as att:
             dev = att.device
             sysroot = _find_system_root(dev, env)
             initdir = "%s/etc/init" % sysroot
@@ -697,7 +1076,8 @@ class RollbackFailedError(RuntimeError):
             "also failed (%s)" % (stage_error, rollback_error))
 
 
-def install(instance_dir: str, work_dir: str | None = None, progress=None) -> list[str]:
+def install(instance_dir: str, work_dir: str | None = None, progress=None,
+            modules: list[str] | None = None, cancel=None) -> list[str]:
     """Full offline Magisk-to-system install for one instance.
 
     Fetches the pinned payload, writes the /system footprint into Root.vhd,
@@ -712,6 +1092,14 @@ def install(instance_dir: str, work_dir: str | None = None, progress=None) -> li
     All-or-nothing across the two disks: if DATABIN staging fails after the
     /system footprint is written, the /system side is rolled back so the instance
     boots stock rather than into a Magisk init with no DATABIN.
+
+    ``modules`` are verified module zips (``rezygisk_payload`` /
+    ``lsposed_payload`` ``fetch_module``) to install in the same Data.vhdx
+    attach as the DATABIN -- see :func:`stage_databin`.
+
+    ``cancel`` (default: the current ``cancellation`` token) is checked between
+    the steps and passed to both disk writes; a cancel after /system was
+    written rolls it back like any other staging failure.
     """
     def _p(msg: str) -> None:
         logger.info(msg)
@@ -724,15 +1112,19 @@ def install(instance_dir: str, work_dir: str | None = None, progress=None) -> li
     tools = _mp.extract_tools(apk, os.path.join(work, "tools"), progress=progress)
     stub = _mp.extract_stub_apk(apk, os.path.join(work, "tools"))
     extras = _mp.extract_databin_extras(apk, os.path.join(work, "databin"), progress=progress)
+    stages = [unpack_module(z, os.path.join(work, "modules")) for z in modules or ()]
+    cancellation.check(cancel)
 
     results: list[str] = []
-    results += install_to_system(instance_dir, tools, stub, progress=progress)
+    results += install_to_system(instance_dir, tools, stub, progress=progress, cancel=cancel)
     try:
-        results += stage_databin(instance_dir, tools, extras=extras, progress=progress)
+        results += stage_databin(instance_dir, tools, extras=extras, progress=progress,
+                                 modules=stages, cancel=cancel)
     except Exception as stage_exc:
         _p("DATABIN staging failed -- rolling back the /system footprint...")
         try:
-            uninstall_from_system(instance_dir, progress=progress)
+            with cancellation.shielded():
+                uninstall_from_system(instance_dir, progress=progress)
         except Exception as rollback_exc:
             logger.exception("cross-step rollback of the /system footprint also failed")
             raise RollbackFailedError(stage_exc, rollback_exc) from stage_exc
@@ -748,7 +1140,8 @@ def install(instance_dir: str, work_dir: str | None = None, progress=None) -> li
     return results
 
 
-def update(instance_dir: str, work_dir: str | None = None, progress=None) -> list[str]:
+def update(instance_dir: str, work_dir: str | None = None, progress=None,
+           cancel=None) -> list[str]:
     """Refresh an existing Magisk install to the current payload, in place.
 
     Re-runs :func:`install`, which is overwrite-safe: ``install_to_system`` and
@@ -768,7 +1161,7 @@ def update(instance_dir: str, work_dir: str | None = None, progress=None) -> lis
     old_version = prior.get("version", "?")
     had_manager = "manager" in (prior.get("components") or [])
 
-    results = install(instance_dir, work_dir=work_dir, progress=progress)
+    results = install(instance_dir, work_dir=work_dir, progress=progress, cancel=cancel)
     if had_manager:
         add_component(instance_dir, "manager")
 
@@ -780,11 +1173,163 @@ def update(instance_dir: str, work_dir: str | None = None, progress=None) -> lis
     return results
 
 
-def uninstall(instance_dir: str, progress=None) -> list[str]:
+def uninstall(instance_dir: str, progress=None, cancel=None) -> list[str]:
     """Reverse a full install: remove the /system footprint + manager, the
     DATABIN, and the manifest.  Instance must be shut down."""
     results: list[str] = []
-    results += uninstall_from_system(instance_dir, progress=progress)
-    results += unstage_databin(instance_dir, progress=progress)
+    results += uninstall_from_system(instance_dir, progress=progress, cancel=cancel)
+    # Past this point a cancel would leave the manifest claiming an install
+    # whose /system side is gone, so the DATABIN removal always completes.
+    with cancellation.shielded():
+        results += unstage_databin(instance_dir, progress=progress)
     _clear_manifest(instance_dir)
     return results
+
+
+# --------------------------------------------------------------------------
+# Fleet install: many instances, deduplicated per shared Root.vhd.
+# --------------------------------------------------------------------------
+
+# Data.vhdx staging runs as a jobs.Batch across instances (locked per disk),
+# capped so a large farm doesn't attach dozens of VHDX files at once.
+FLEET_MAX_WORKERS = 4
+
+
+@dataclass(frozen=True)
+class FleetOutcome:
+    """What :func:`install_fleet` did for one instance."""
+
+    instance_dir: str
+    ok: bool
+    message: str
+    root_vhd: str | None = None
+
+
+def group_by_root_vhd(instance_dirs) -> tuple[dict[str, list[str]], dict[str, str]]:
+    """Resolve each instance's Root.vhd and group instances that share one.
+
+    Returns ``(groups, unresolved)``: ``groups`` maps a normalised Root.vhd path
+    to the instances booting from it (input order kept), ``unresolved`` maps an
+    instance to the reason its Root.vhd couldn't be found.
+    """
+    groups, missing = disk_topology.current().group(instance_dirs)
+    unresolved = {d: _no_root_vhd(d) for d in missing}
+    return groups, unresolved
+
+
+def install_fleet(instance_dirs, work_dir: str | None = None, progress=None,
+                  max_workers: int = FLEET_MAX_WORKERS,
+                  modules: list[str] | None = None, cancel=None) -> list[FleetOutcome]:
+    """Offline Magisk install across many instances, one write per shared disk.
+
+    Clones share their master's Root.vhd, so installing instance by instance
+    rewrites the same /system footprint N times and re-fetches the payload N
+    times.  This resolves the disk topology first, fetches + extracts the
+    payload once, writes each *distinct* Root.vhd exactly once, then stages
+    every instance's Data.vhdx DATABIN as a :class:`jobs.Batch` -- concurrent,
+    but never two attaches of the same Data.vhdx.
+
+    Rollback mirrors :func:`install`, per shared disk: if no instance of a group
+    got its DATABIN, that group's /system footprint is removed again so its
+    clones boot stock.  Once any instance of a group is staged the footprint is
+    kept (it's what that instance boots from) and the failures are reported for
+    a retry.  ``modules`` zips are unpacked once and written into every
+    instance's Data.vhdx alongside its DATABIN.  Returns one
+    :class:`FleetOutcome` per instance, in input order.  Every instance must be
+    shut down.  ``cancel`` (default: the current ``cancellation`` token) is
+    checked between disk writes, including the batched ones; on a cancel every
+    group without a staged DATABIN is rolled back and :class:`Cancelled` raised.
+    """
+    def _p(msg: str) -> None:
+        logger.info(msg)
+        if progress:
+            progress(msg)
+
+    cancel = cancel or cancellation.current()   # batch threads don't inherit it
+    order = list(dict.fromkeys(instance_dirs))
+    outcomes: dict[str, FleetOutcome] = {}
+    groups, unresolved = group_by_root_vhd(order)
+    for d, reason in unresolved.items():
+        outcomes[d] = FleetOutcome(d, False, reason)
+    if not groups:
+        return [outcomes[d] for d in order]
+
+    _p("%d instance(s) share %d system image(s)." % (len(order) - len(unresolved), len(groups)))
+    work = work_dir or _default_work_dir()
+    _p("Fetching Magisk payload (%s)..." % _mp.PAYLOAD_VERSION)
+    apk = _mp.fetch_apk(os.path.join(work, "cache"), progress=progress)
+    tools = _mp.extract_tools(apk, os.path.join(work, "tools"), progress=progress)
+    stub = _mp.extract_stub_apk(apk, os.path.join(work, "tools"))
+    extras = _mp.extract_databin_extras(apk, os.path.join(work, "databin"), progress=progress)
+    stages = [unpack_module(z, os.path.join(work, "modules")) for z in modules or ()]
+
+    # /system first, serially: one attach per distinct Root.vhd.
+    staged_groups: dict[str, list[str]] = {}
+    for i, (vhd, members) in enumerate(groups.items(), 1):
+        _p("System image %d/%d: %s (%d instance(s))..."
+           % (i, len(groups), vhd, len(members)))
+        try:
+            install_to_system(members[0], tools, stub, progress=progress, cancel=cancel)
+        except cancellation.Cancelled:
+            for done_vhd, done in staged_groups.items():
+                _roll_back_group(done_vhd, done, outcomes, progress)
+            raise
+        except Exception as exc:  # noqa: BLE001 - one bad master mustn't stop the rest
+            logger.exception("system install failed for %s", vhd)
+            for d in members:
+                outcomes[d] = FleetOutcome(d, False, "system install failed: %s" % exc, vhd)
+            continue
+        staged_groups[vhd] = members
+
+    # Then every Data.vhdx, as one batch: each instance has its own, but a
+    # Data.vhdx listed twice (or shared) is never attached twice at once.
+    vhd_of = {d: vhd for vhd, members in staged_groups.items() for d in members}
+
+    def _stage_job(d: str) -> jobs.Job:
+        def run(job_progress, _cancelled):
+            stage_databin(d, tools, extras=extras, progress=job_progress,
+                          modules=stages, cancel=cancel)
+            return "DATABIN staged"
+        return jobs.Job(jobs.KIND_MAGISK_INSTALL, os.path.basename(os.path.normpath(d)),
+                        run, jobs.disk_locks(d, "data_vhdx"), needs_shutdown=False)
+
+    if vhd_of:
+        _p("Staging DATABIN into %d instance(s)..." % len(vhd_of))
+        batch = jobs.Batch([_stage_job(d) for d in vhd_of], max_workers=max_workers)
+        results = batch.run((lambda m, _pct: progress(m)) if progress else (lambda m, _pct: None))
+        for d, result in zip(vhd_of, results):
+            if result.status != jobs.DONE:
+                outcomes[d] = FleetOutcome(
+                    d, False, "DATABIN staging %s: %s" % (result.status, result.message),
+                    vhd_of[d])
+                continue
+            _write_manifest(d, ["system", "databin"])
+            outcomes[d] = FleetOutcome(
+                d, True, "Magisk %s installed offline." % _mp.PAYLOAD_VERSION, vhd_of[d])
+
+    for vhd, members in staged_groups.items():
+        if not any(outcomes[d].ok for d in members):
+            _roll_back_group(vhd, members, outcomes, progress)
+    cancellation.check(cancel)
+    return [outcomes[d] for d in order]
+
+
+def _roll_back_group(vhd: str, members: list[str], outcomes: dict, progress=None) -> None:
+    """Remove the /system footprint a fleet install wrote to ``vhd`` (shielded)."""
+    msg = "No instance on %s was staged -- rolling back its /system footprint..." % vhd
+    logger.info(msg)
+    if progress:
+        progress(msg)
+    try:
+        with cancellation.shielded():
+            uninstall_from_system(members[0], progress=progress)
+    except Exception as exc:  # noqa: BLE001 - surfaced on every member
+        logger.exception("fleet rollback of the /system footprint failed for %s", vhd)
+        for d in members:
+            prior = outcomes[d].message if d in outcomes else "cancelled"
+            outcomes[d] = FleetOutcome(
+                d, False, "%s; the /system rollback also failed (%s) -- run "
+                "Uninstall Magisk on it" % (prior, exc), vhd)
+        return
+    for d in members:
+        _clear_manifest(d)
@@ -43,7 +43,8 @@ def fetch_module(cache_dir: str, progress=None) -> str:
 
     Re-verifies SHA-256 on every call; a cached file with the wrong hash is
     re-downloaded.  Raises ``RuntimeError`` on a hash mismatch after download.
-    Hand the returned path to ``adb_handler.install_module``.
+    Hand the returned path to ``adb_handler.install_module`` (running instance)
+    or ``magisk_system.install_modules_offline`` (shut down, no boot).
     """
     os.makedirs(cache_dir, exist_ok=True)
     dest = os.path.join(cache_dir, MODULE_NAME)
@@ -0,0 +1,75 @@
+"""RIP-relative ``lea`` cross-reference index for x86-64 PE and ELF images.
+
+Every string-anchored locator in this project asks the same question: *which
+instruction loads the address of this string?*  On x86-64 that's a
+``lea r64, [rip+rel32]`` (``48``/``4C`` ``8D`` <modrm> rel32, the modrm forms in
+``constants.RIP_LEA_MODRM``).  Instead of each locator walking every ``0x8D``
+byte and decoding as it goes, :class:`XrefIndex` decodes every such ``lea`` in
+the given regions once into a ``target VA -> [site file offsets]`` map, so a
+locator is a dictionary lookup and adding another string-anchored patch costs
+nothing extra at runtime.
+
+Regions are ``(file_offset, size, va)`` triples -- PE sections or ELF
+``PT_LOAD`` segments; the callers own the container parsing.
+"""
+from __future__ import annotations
+
+import re
+import struct
+import threading
+
+import constants
+
+# (?=...) so overlapping candidates are all seen: a rel32 that happens to
+# contain ``48 8D 05`` must not hide a real lea starting inside it.
+_RIP_LEA_RE = re.compile(
+    b"(?=[\x48\x4C]\x8D[" + b"".join(re.escape(bytes([m])) for m in sorted(constants.RIP_LEA_MODRM))
+    + b"])", re.DOTALL)
+_LEA_LEN = 7  # REX + 8D + modrm + rel32
+
+
+class XrefIndex:
+    """``target VA -> sorted file offsets of the lea`` (offset of the REX byte)."""
+
+    def __init__(self, data: bytes, regions):
+        self._targets: dict[int, list[int]] = {}
+        unpack = struct.unpack_from
+        for foff, size, va in regions:
+            end = min(len(data), foff + size)
+            if end - foff < _LEA_LEN:
+                continue
+            delta = va - foff + _LEA_LEN  # target = off + delta + rel
+            for m in _RIP_LEA_RE.finditer(data, foff, end - _LEA_LEN + 1):
+                off = m.start()
+                target = off + delta + unpack("<i", data, off + 3)[0]
+                self._targets.setdefault(target, []).append(off)
+
+    def sites(self, target_va: int) -> list[int]:
+        """File offsets of every ``lea`` whose target is ``target_va``."""
+        return list(self._targets.get(target_va, ()))
+
+    def __len__(self) -> int:
+        return sum(len(v) for v in self._targets.values())
+
+
+# One-entry cache: the locators of one patch pass all see the same ``data``
+# object, so the index is built once per binary per pass.  Identity (``is``),
+# not equality, so a different buffer with equal length can never alias.
+_cache_lock = threading.Lock()
+_cache: tuple[object, tuple, XrefIndex] | None = None
+
+
+def index_for(data: bytes, regions) -> XrefIndex:
+    """The (cached) :class:`XrefIndex` of ``data`` over ``regions``."""
+    global _cache
+    key = tuple(regions)
+    if not isinstance(data, bytes):  # a mutable buffer may change under the cache
+        return XrefIndex(data, key)
+    with _cache_lock:
+        hit = _cache
+    if hit is not None and hit[0] is data and hit[1] == key:
+        return hit[2]
+    index = XrefIndex(data, key)
+    with _cache_lock:
+        _cache = (data, key, index)
+    return index
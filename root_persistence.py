@@ -142,27 +142,16 @@ _ROOT_WRITE_CALL_OFFSET = 28                                     # the E8 to NOP
 def _locate_enable_root_write(data: bytes) -> list[int]:
     """Find the lea that loads ".enable_root_access" and feeds the write call."""
     try:
-        image_base, sections = integrity_patch.pe_image_base_and_sections(data)
-    except ValueError:
+        pe = integrity_patch.pe_image(data)
+    except (ValueError, struct.error):
         return []
-    s = data.find(b".enable_root_access\x00")
-    if s < 0:
+    str_va = pe.string_va(b".enable_root_access\x00")
+    if str_va is None:
         return []
-    str_rva = integrity_patch.file_offset_to_rva(sections, s)
-    if str_rva is None:
-        return []
-    str_va = image_base + str_rva
-
-    hits: list[int] = []
-    for cand in integrity_patch._find_signature(bytearray(data), _ROOT_WRITE_SHAPE):
-        lea_rva = integrity_patch.file_offset_to_rva(sections, cand)
-        if lea_rva is None:
-            continue
-        rel = struct.unpack_from("<i", data, cand + 3)[0]
-        # lea r8, [rip + rel32]: target = VA of next instruction (lea is 7 bytes) + rel
-        if image_base + lea_rva + 7 + rel == str_va:
-            hits.append(cand)
-    return hits
+    # Every lea that loads the string, kept only where the full write-call shape
+    # follows it (other readers of the same key load it too).
+    shape = integrity_patch._signature_regex(tuple(_ROOT_WRITE_SHAPE))
+    return [site for site in pe.xrefs.sites(str_va) if shape.match(data, site)]
 
 
 ROOT_RESET_NOP = integrity_patch.PatchSpec(
@@ -196,6 +185,18 @@ def patch_root_persistence(install_dir: str, restore: bool = False) -> list[str]
         return [f"{ROOT_PATCH_BINARY}: ERROR - {exc}"]
 
 
+
+def patch_engine(install_dir: str, restore: bool = False) -> list[str]:
+    """The whole engine patch in one pass: the integrity/unlock patches
+    (``integrity_patch.patch_installation``) plus ``ROOT_RESET_NOP``.
+
+    HD-MultiInstanceManager.exe is a candidate of both, so going through one
+    plan reads, hashes, backs up and writes it once instead of twice; the
+    binaries are processed concurrently. Returns one status line per binary.
+    """
+    return integrity_patch.patch_installation(
+        install_dir, restore=restore, extra={ROOT_PATCH_BINARY: [ROOT_RESET_NOP]})
+
 @contextlib.contextmanager
 def unlocked(config_path: str) -> Iterator[None]:
     """Context manager: temporarily clear read-only for a write, then restore.
@@ -228,7 +229,7 @@ def _main(argv=None) -> int:
     parser.add_argument("install_dir",
                         help='BlueStacks install dir, e.g. "C:\\Program Files\\BlueStacks_nxt"')
     parser.add_argument("--restore", action="store_true",
-                        help="restore HD-MultiInstanceManager.exe from its .prepatch.bak backup")
+                        help="restore HD-MultiInstanceManager.exe from the backup store")
     args = parser.parse_args(argv)
 
     logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
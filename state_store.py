@@ -0,0 +1,310 @@
+"""One SQLite store for the state this tool keeps about each installation.
+
+Earlier versions kept that state in JSON sidecars scattered over three
+directory trees -- ``<disk>.suroot.jsonl`` su originals and
+``.magisk_system.json`` / ``.telemetry_block.json`` next to the instance disks,
+``.bsrgui_ad_settings.json`` next to ``bluestacks.conf`` and
+``<exe>.prepatch.ref`` next to each engine binary -- so every status refresh
+opened a handful of files per instance and every writer rewrote its whole file.
+
+Now it is one database under the app data dir (next to the backup store the
+engine rows point into), in WAL mode so the status refresh reads while a job
+writes, and with ``synchronous=FULL`` so a committed su original survives a
+crash before the su it belongs to is patched.  Rows are keyed by normalised
+path and carry the installation they belong to -- the engine data dir that
+holds the instance folders, or the install dir of an engine binary -- and
+:meth:`StateStore.instance_states` answers "su / Magisk / hosts-block state of
+these N instances" with one indexed query.
+
+A legacy sidecar is imported the first time its key is asked about and then
+deleted; after that nothing but the database is read.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+from dataclasses import dataclass
+
+import constants
+
+logger = logging.getLogger(__name__)
+
+STATE_DB_NAME = "state.db"
+
+# Sidecars of earlier versions, imported on first touch (see StateStore._migrate_*).
+LEGACY_SU_JOURNAL = ".suroot.jsonl"           # <disk> + suffix
+LEGACY_SU_SIDECAR = ".suroot.json"            # <disk> + suffix (pre-journal)
+LEGACY_MAGISK_MANIFEST = ".magisk_system.json"    # in the instance dir
+LEGACY_HOSTS_STATE = ".telemetry_block.json"      # in the shared Root.vhd's dir
+LEGACY_AD_STATE = ".bsrgui_ad_settings.json"      # next to bluestacks.conf
+LEGACY_BACKUP_REF = ".prepatch.ref"               # <binary> + suffix
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS su_patch (
+    disk TEXT NOT NULL, instance TEXT NOT NULL, installation TEXT NOT NULL,
+    offset INTEGER NOT NULL, orig TEXT NOT NULL,
+    PRIMARY KEY (disk, offset));
+CREATE INDEX IF NOT EXISTS su_patch_installation ON su_patch (installation);
+CREATE TABLE IF NOT EXISTS magisk (
+    instance TEXT PRIMARY KEY, installation TEXT NOT NULL, manifest TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS magisk_installation ON magisk (installation);
+CREATE TABLE IF NOT EXISTS hosts_block (
+    instance TEXT PRIMARY KEY, installation TEXT NOT NULL, state TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS hosts_block_installation ON hosts_block (installation);
+CREATE TABLE IF NOT EXISTS ad_switches (
+    config TEXT PRIMARY KEY, state TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS engine_backup (
+    binary TEXT PRIMARY KEY, installation TEXT NOT NULL,
+    original TEXT NOT NULL, patched TEXT);
+CREATE INDEX IF NOT EXISTS engine_backup_installation ON engine_backup (installation);
+"""
+
+
+def _key(path: str) -> str:
+    return os.path.normcase(os.path.abspath(path))
+
+
+def _parent(path: str) -> str:
+    return _key(os.path.dirname(os.path.abspath(path)))
+
+
+@dataclass(frozen=True)
+class InstanceState:
+    su_recorded: bool           # su originals are recorded for one of its disks
+    magisk: dict | None         # the Magisk install manifest
+    hosts_block: dict | None    # the tracker-block state (keyed by the shared disk's dir)
+
+
+class StateStore:
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.RLock()
+        self._migrated: set[tuple[str, str]] = set()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, timeout=10, isolation_level=None,
+                                   check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=FULL")
+        self._db.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    def _write(self, statements) -> None:
+        """Run ``(sql, params)`` pairs as one transaction."""
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                for sql, params in statements:
+                    self._db.execute(sql, params)
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+
+    def _rows(self, sql: str, params=()) -> list[tuple]:
+        with self._lock:
+            return self._db.execute(sql, params).fetchall()
+
+    def _once(self, kind: str, key: str) -> bool:
+        """True the first time (kind, key) is seen by this process."""
+        with self._lock:
+            if (kind, key) in self._migrated:
+                return False
+            self._migrated.add((kind, key))
+            return True
+
+    @staticmethod
+    def _discard(*paths: str) -> None:
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError:
+                logger.debug("Could not remove migrated sidecar %s", path, exc_info=True)
+
+    @staticmethod
+    def _load_json(path: str):
+        try:
+            with open(path, encoding="utf-8") as fh:
+                return json.load(fh)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError):
+            logger.warning("Ignoring unreadable sidecar %s", path)
+            return None
+
+    # --- su originals (su_patch_offline) ------------------------------------
+    def _migrate_su(self, disk: str) -> None:
+        if not self._once("su", _key(disk)):
+            return
+        journal, legacy = disk + LEGACY_SU_JOURNAL, disk + LEGACY_SU_SIDECAR
+        if not (os.path.isfile(journal) or os.path.isfile(legacy)):
+            return
+        records: dict[int, str] = {}
+        doc = self._load_json(legacy)
+        if isinstance(doc, dict):
+            for p in doc.get("patches", []):
+                try:
+                    if p.get("orig"):
+                        records.setdefault(int(p["offset"]), p["orig"])
+                except (KeyError, TypeError, ValueError, AttributeError):
+                    continue
+        try:
+            with open(journal, encoding="utf-8") as fh:
+                for line in fh:
+                    try:
+                        rec = json.loads(line)
+                        records.setdefault(int(rec["offset"]), rec["orig"])
+                    except (ValueError, KeyError, TypeError):
+                        continue   # a torn append from an interrupted run
+        except FileNotFoundError:
+            pass
+        self.record_su_originals(disk, records)
+        self._discard(journal, legacy)
+        logger.info("Moved the su backup of %s into the state store", os.path.basename(disk))
+
+    def su_originals(self, disk: str) -> dict[int, str]:
+        """``{flat offset: original bytes hex}`` recorded for ``disk``."""
+        self._migrate_su(disk)
+        return dict(self._rows("SELECT offset, orig FROM su_patch WHERE disk = ? "
+                               "ORDER BY offset", (_key(disk),)))
+
+    def record_su_originals(self, disk: str, records: dict[int, str]) -> None:
+        """Record ``records`` in one durable transaction. An offset already
+        recorded keeps its first original (the true one)."""
+        if not records:
+            return
+        disk_key, instance = _key(disk), _parent(disk)
+        installation = _parent(instance)
+        self._write(("INSERT OR IGNORE INTO su_patch VALUES (?, ?, ?, ?, ?)",
+                     (disk_key, instance, installation, off, orig))
+                    for off, orig in records.items())
+
+    def forget_su(self, disk: str) -> None:
+        self._write([("DELETE FROM su_patch WHERE disk = ?", (_key(disk),))])
+
+    # --- JSON documents: Magisk manifest, hosts block, ad switches ----------
+    def _get_doc(self, table: str, column: str, key_col: str, key: str):
+        rows = self._rows("SELECT %s FROM %s WHERE %s = ?" % (column, table, key_col), (key,))
+        return json.loads(rows[0][0]) if rows else None
+
+    def _migrate_doc(self, table: str, key: str, legacy: str, put) -> None:
+        if not self._once(table, key) or not os.path.isfile(legacy):
+            return
+        doc = self._load_json(legacy)
+        if isinstance(doc, dict):
+            put(doc)
+        self._discard(legacy)
+        logger.info("Moved %s into the state store", legacy)
+
+    def magisk(self, instance_dir: str) -> dict | None:
+        key = _key(instance_dir)
+        self._migrate_doc("magisk", key, os.path.join(instance_dir, LEGACY_MAGISK_MANIFEST),
+                          lambda doc: self.set_magisk(instance_dir, doc))
+        return self._get_doc("magisk", "manifest", "instance", key)
+
+    def set_magisk(self, instance_dir: str, manifest: dict | None) -> None:
+        key = _key(instance_dir)
+        if manifest is None:
+            self._write([("DELETE FROM magisk WHERE instance = ?", (key,))])
+        else:
+            self._write([("INSERT OR REPLACE INTO magisk VALUES (?, ?, ?)",
+                          (key, _parent(instance_dir), json.dumps(manifest)))])
+
+    def hosts_block(self, instance_dir: str) -> dict | None:
+        key = _key(instance_dir)
+        self._migrate_doc("hosts_block", key, os.path.join(instance_dir, LEGACY_HOSTS_STATE),
+                          lambda doc: self.set_hosts_block(instance_dir, doc))
+        return self._get_doc("hosts_block", "state", "instance", key)
+
+    def set_hosts_block(self, instance_dir: str, state: dict | None) -> None:
+        key = _key(instance_dir)
+        if state is None:
+            self._write([("DELETE FROM hosts_block WHERE instance = ?", (key,))])
+        else:
+            self._write([("INSERT OR REPLACE INTO hosts_block VALUES (?, ?, ?)",
+                          (key, _parent(instance_dir), json.dumps(state)))])
+
+    def ad_switches(self, config_path: str) -> dict | None:
+        key = _key(config_path)
+        legacy = os.path.join(os.path.dirname(config_path), LEGACY_AD_STATE)
+        self._migrate_doc("ad_switches", key, legacy,
+                          lambda doc: self.set_ad_switches(config_path, doc))
+        return self._get_doc("ad_switches", "state", "config", key)
+
+    def set_ad_switches(self, config_path: str, state: dict | None) -> None:
+        key = _key(config_path)
+        if state is None:
+            self._write([("DELETE FROM ad_switches WHERE config = ?", (key,))])
+        else:
+            self._write([("INSERT OR REPLACE INTO ad_switches VALUES (?, ?)",
+                          (key, json.dumps(state)))])
+
+    # --- engine backups (integrity_patch) -----------------------------------
+    def engine_backup(self, binary: str) -> dict:
+        """``{"original": sha256, "patched": sha256 | None}`` for ``binary``, or {}."""
+        key = _key(binary)
+        legacy = binary + LEGACY_BACKUP_REF
+        if self._once("engine_backup", key) and os.path.isfile(legacy):
+            ref = self._load_json(legacy)
+            if isinstance(ref, dict) and isinstance(ref.get("original"), str):
+                self.set_engine_backup(binary, ref["original"], ref.get("patched"))
+            self._discard(legacy)
+        rows = self._rows("SELECT original, patched FROM engine_backup WHERE binary = ?", (key,))
+        return {"original": rows[0][0], "patched": rows[0][1]} if rows else {}
+
+    def set_engine_backup(self, binary: str, original: str, patched: str | None) -> None:
+        self._write([("INSERT OR REPLACE INTO engine_backup VALUES (?, ?, ?, ?)",
+                      (_key(binary), _parent(binary), original, patched))])
+
+    # --- bulk ---------------------------------------------------------------
+    def instance_states(self, instance_dirs) -> dict[str, InstanceState]:
+        """su / Magisk / hosts-block state of every dir in ``instance_dirs``
+        (keys as given), from one query over their installations."""
+        dirs = list(dict.fromkeys(instance_dirs))
+        for d in dirs:
+            for disk in (constants.DATA_VHDX, constants.ROOT_VHD):
+                self._migrate_su(os.path.join(d, disk))
+            self.magisk(d)
+            self.hosts_block(d)
+        installations = sorted({_parent(d) for d in dirs})
+        if not installations:
+            return {}
+        marks = ",".join("?" * len(installations))
+        rows = self._rows(
+            "SELECT 'su', instance, NULL FROM su_patch WHERE installation IN (%s) "
+            "GROUP BY instance "
+            "UNION ALL SELECT 'magisk', instance, manifest FROM magisk WHERE installation IN (%s) "
+            "UNION ALL SELECT 'hosts', instance, state FROM hosts_block WHERE installation IN (%s)"
+            % (marks, marks, marks), installations * 3)
+        found: dict[tuple[str, str], str | None] = {(kind, inst): doc for kind, inst, doc in rows}
+        out = {}
+        for d in dirs:
+            key = _key(d)
+            magisk, hosts = found.get(("magisk", key)), found.get(("hosts", key))
+            out[d] = InstanceState(("su", key) in found,
+                                   json.loads(magisk) if magisk else None,
+                                   json.loads(hosts) if hosts else None)
+        return out
+
+
+_store_lock = threading.Lock()
+_store: StateStore | None = None
+
+
+def store() -> StateStore:
+    """The state store in this user's app data dir (opened once per path)."""
+    global _store
+    path = os.path.join(constants.app_data_dir(), STATE_DB_NAME)
+    with _store_lock:
+        if _store is None or _store.path != path:
+            if _store is not None:
+                _store.close()
+            _store = StateStore(path)
+        return _store
@@ -0,0 +1,206 @@
+"""Immutable snapshots of the instance/engine status the window shows, and diffs.
+
+Rebuilding ``MainWindow.instance_data`` means reading every installation's
+``bluestacks.conf``, each instance's ``.bstk`` files and state rows, and -- for
+the engine state -- scanning the patched PE bytes of ``HD-Player.exe``.  On a
+slow or network-backed data dir that is enough I/O to stall the window, so
+:func:`collect` does it on a worker thread and hands back a :class:`Snapshot`
+nothing can mutate.  :func:`diff` compares it with the one on screen, and the
+window repaints only the rows and fields that changed.
+
+Kept free of Qt so it can be unit-tested without a QApplication.
+"""
+from __future__ import annotations
+
+import logging
+import os
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Any, Mapping
+
+import config_handler
+import constants
+import disk_topology
+import instance_handler
+import integrity_patch
+import state_store
+import su_patch_offline
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Snapshot:
+    instances: Mapping[str, Mapping[str, Any]]   # unique_id -> row, grid order
+    engine_state: str | None                     # "patched", "unpatched", ... or None
+
+    def instance_data(self) -> dict[str, dict[str, Any]]:
+        """A mutable copy in the shape of ``MainWindow.instance_data``."""
+        return {uid: dict(row) for uid, row in self.instances.items()}
+
+
+EMPTY = Snapshot(MappingProxyType({}), None)
+
+
+@dataclass(frozen=True)
+class Delta:
+    added: tuple[str, ...]
+    removed: tuple[str, ...]
+    changed: Mapping[str, frozenset[str]]   # unique_id -> names of the changed fields
+    engine_changed: bool
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.removed or self.changed or self.engine_changed)
+
+    @property
+    def rows_changed(self) -> bool:
+        return bool(self.added or self.removed or self.changed)
+
+
+def _norm(path: str) -> str:
+    return os.path.normcase(os.path.abspath(path))
+
+
+def engine_state(installations) -> str:
+    """Roll the patch state of every patch-mode install dir up into one word."""
+    states = [integrity_patch.installation_patched(i["install_path"])
+              for i in installations
+              if i.get("patch_mode") and i.get("install_path")
+              and os.path.isdir(i["install_path"])]
+    if states and all(s is True for s in states):
+        return "patched"
+    if states and all(s is False for s in states):
+        return "unpatched"
+    if any(s is True for s in states):
+        return "partial"
+    return "unknown"
+
+
+def _read_installation(inst: dict, wanted: set[str] | None) -> dict[str, dict[str, Any]]:
+    """The rows of one installation's instances (only ``wanted`` dirs if given)."""
+    source_id, config_path, data_path = inst["source"], inst["config_path"], inst["data_path"]
+    install_path = inst.get("install_path")
+    patch_mode = inst.get("patch_mode", False)
+    root_info = config_handler.get_complete_root_statuses(config_path)
+    instance_root_statuses = root_info['instance_statuses']
+    display_names = root_info.get('display_names', {})
+
+    disk_instances = set()
+    if os.path.isdir(data_path):
+        try:
+            disk_instances = {
+                entry for entry in os.listdir(data_path)
+                if os.path.isdir(os.path.join(data_path, entry))
+            }
+        except OSError:
+            # A PermissionError here must not take down the status refresh.
+            logger.warning("Could not list %s", data_path, exc_info=True)
+    names = set(instance_root_statuses.keys()) | disk_instances
+    if wanted is not None:
+        names = {n for n in names if _norm(os.path.join(data_path, n)) in wanted}
+    # su / Magisk state of every instance of this installation, one query.
+    stored = state_store.store().instance_states(
+        os.path.join(data_path, name) for name in names)
+
+    rows: dict[str, dict[str, Any]] = {}
+    for name in sorted(names):
+        instance_dir_path = os.path.join(data_path, name)
+
+        rw_mode = constants.MODE_UNKNOWN
+        if os.path.isdir(instance_dir_path):
+            is_readonly = instance_handler.is_instance_readonly(instance_dir_path)
+            if is_readonly is True:
+                rw_mode = constants.MODE_READONLY
+            elif is_readonly is False:
+                rw_mode = constants.MODE_READWRITE
+
+        individual_root_on = instance_root_statuses.get(name, False)
+        state = stored[instance_dir_path]
+        su_state = None
+        if patch_mode:
+            effective_root_status = False
+            if state.su_recorded:
+                # Verified against the bytes on disk (cached on the disk's
+                # size/mtime), so a reverted su doesn't still read "rooted".
+                su_state = su_patch_offline.instance_su_state(instance_dir_path)
+                effective_root_status = su_patch_offline.instance_root_state(instance_dir_path)
+        else:
+            effective_root_status = individual_root_on
+        # A Magisk system-mode install roots via /system -- it never sets
+        # the bluestacks.conf root flag or the su-patch marker, so without
+        # this the dashboard reads "0 rooted" for a Magisk-rooted instance.
+        if not effective_root_status and state.magisk is not None:
+            effective_root_status = True
+
+        rows[f"{name} ({source_id})"] = {
+            "original_name": name,
+            "config_path": config_path,
+            "data_path": instance_dir_path,
+            "install_path": install_path,
+            "rw_mode": rw_mode,
+            "root_enabled": effective_root_status,
+            "individual_root_status": individual_root_on,
+            "display_name": display_names.get(name, name),
+            "patch_mode": patch_mode,
+            "su_state": su_state,
+        }
+    return rows
+
+
+def collect(installations, previous: Snapshot = EMPTY, only=None,
+            engine: bool = True) -> Snapshot:
+    """Read the current status of ``installations``.
+
+    With ``only`` (instance dirs), just those instances are re-read and every
+    other row is carried over from ``previous`` in its place.  ``engine=False``
+    carries ``previous.engine_state`` over instead of re-scanning the binaries.
+    Blocking; meant for a worker thread.
+    """
+    wanted = None if only is None else {_norm(d) for d in only}
+    found: dict[str, dict[str, Any]] = {}
+    for inst in installations:
+        if wanted is None or wanted:
+            found.update(_read_installation(inst, wanted))
+    found = {uid: row for uid, row in found.items()
+             if row["rw_mode"] != constants.MODE_UNKNOWN}
+
+    if wanted is None:
+        rows = found
+    else:
+        # Keep the grid order: changed rows in place, new ones at the end,
+        # and a re-read instance that no longer resolves dropped.
+        rows = {}
+        for uid, row in previous.instances.items():
+            if uid in found:
+                rows[uid] = found.pop(uid)
+            elif _norm(row["data_path"]) not in wanted:
+                rows[uid] = dict(row)
+        rows.update(found)
+
+    # One graph for the whole installation: which Root.vhd each instance
+    # boots from, so per-disk work runs once per shared master image.
+    topology = disk_topology.refresh(row["data_path"] for row in rows.values())
+    for row in rows.values():
+        row["root_vhd"] = topology.disks(row["data_path"]).root_vhd
+
+    state = engine_state(installations) if engine else previous.engine_state
+    logger.debug("Status collected: %d instance(s), engine %s", len(rows), state)
+    return Snapshot(
+        MappingProxyType({uid: MappingProxyType(row) for uid, row in rows.items()}),
+        state)
+
+
+def diff(old: Snapshot, new: Snapshot) -> Delta:
+    """What a page has to repaint to go from ``old`` to ``new``."""
+    changed = {}
+    for uid, row in new.instances.items():
+        before = old.instances.get(uid)
+        if before is not None and before != row:
+            changed[uid] = frozenset(k for k in before.keys() | row.keys()
+                                     if before.get(k) != row.get(k))
+    return Delta(
+        added=tuple(uid for uid in new.instances if uid not in old.instances),
+        removed=tuple(uid for uid in old.instances if uid not in new.instances),
+        changed=MappingProxyType(changed),
+        engine_changed=old.engine_state != new.engine_state,
+    )
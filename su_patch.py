@@ -50,7 +50,7 @@ import shutil
 import struct
 import sys
 
-import constants
+import rip_xref
 
 logger = logging.getLogger(__name__)
 
@@ -113,23 +113,14 @@ def _find_isdevmode_entry(data: bytes) -> int | None:
 
     if is64:
         # x86-64 (PIE *and* statically-linked): the function loads the string with
-        # `lea rXX, [rip+rel32]` (48/4C 8D 05/0D/3D/35 rel32). Find the one whose
+        # `lea rXX, [rip+rel32]` (48/4C 8D <modrm> rel32). Take the first one whose
         # target == str_vaddr; the entry is the `push rbx` (53) right before it.
-        i = 0
-        while True:
-            i = data.find(b"\x8d", i)
-            if i < 0 or i + 5 > len(data):
-                break
-            if i >= 1 and data[i - 1] in (0x48, 0x4C) and data[i + 1] in constants.RIP_LEA_MODRM:
-                rel = struct.unpack_from("<i", data, i + 2)[0]
-                lea_off = i - 1
-                lea_vaddr = _off_to_vaddr(segs, lea_off)
-                if lea_vaddr is not None and lea_vaddr + 7 + rel == str_vaddr:
-                    entry = lea_off - 1
-                    if data[entry:entry + 3] == PROLOGUE:
-                        return entry
-                    return lea_off if data[lea_off:lea_off + 2] in (b"\x48\x8d", b"\x4c\x8d") else None
-            i += 1
+        regions = [(foff, fsz, vaddr) for vaddr, foff, fsz in segs]
+        for lea_off in rip_xref.index_for(data, regions).sites(str_vaddr):
+            entry = lea_off - 1
+            if data[entry:entry + 3] == PROLOGUE:
+                return entry
+            return lea_off
         return None
 
     # 32-bit PIE (A7 32-bit): the string is loaded GOT-relative via get_pc_thunk:
@@ -12,21 +12,24 @@ started.") -- handling the 64-bit (PIE + static) and 32-bit variants -- and flip
 its isDeveloperMode() to always-true (3-byte patch), which makes su grant root
 to every app, independent of enable_root_access.
 
-Enable  = patch each su, recording the original bytes to a <vhd>.suroot.json
-          backup sidecar.
-Disable = restore the original bytes from the sidecar (un-root).
+Enable  = patch each su, recording the original bytes in the state store
+          (one row per su, committed before the first write).
+Disable = restore the recorded original bytes (un-root).
 
 The instance MUST be shut down (the .vhd must not be open by BlueStacks).
 """
 from __future__ import annotations
 
 import argparse
-import json
 import logging
 import os
 import struct
 import sys
+import threading
+from dataclasses import dataclass
 
+import cancellation
+import state_store
 import su_patch  # DEVMODE_STRING, PATCH, _find_isdevmode_entry
 
 logger = logging.getLogger(__name__)
@@ -368,9 +371,12 @@ def _classify_elf_su(elf: bytes, marker: bytes):
     return None
 
 
-def _scan_su_entries(vhd, pct=None) -> list[tuple[int, bool, bool]]:
+def _scan_su_entries(vhd, pct=None, cancel=None) -> list[tuple[int, bool, bool]]:
     """Every gated su's isDeveloperMode entry as (flat_off, patched, is64).
 
+    Checks ``cancel`` (default: the current ``cancellation`` token) before every
+    block and raises ``cancellation.Cancelled`` once it is set.
+
     String-driven: locate each "isDeveloperMode" string, find the owning ELF, and
     classify it (patched or not) -- so enable() can patch the un-patched ones and
     record originals for the already-patched ones, and disable() can restore all.
@@ -383,7 +389,9 @@ def _scan_su_entries(vhd, pct=None) -> list[tuple[int, bool, bool]]:
     prev_tail = b""
     tail_len = max(len(marker), max((len(s) for s in _FALLBACK_SIGS), default=0)) + 8
     nblk = vhd.max_entries
+    token = cancel or cancellation.current()
     for blk in range(nblk):
+        cancellation.check(token)
         if pct is not None and (blk & 0x1F) == 0:
             pct(int(100 * blk / nblk))
         if not vhd.is_present(blk):
@@ -446,26 +454,32 @@ def _find_su_entries(vhd, pct=None) -> list[int]:
     return [off for off, patched, _is64 in _scan_su_entries(vhd, pct) if not patched]
 
 
-def _sidecar(vhd_path: str) -> str:
-    return vhd_path + ".suroot.json"
+# --- su originals -------------------------------------------------------------
+# The original bytes of every su we patch live in the state store (one row per
+# entry), committed durably as one batch *before* any su is written -- so an
+# interrupted run can never leave a patched su without its recovery record. The
+# first original recorded for an offset is kept. The <disk>.suroot.jsonl /
+# .suroot.json sidecars older versions wrote are imported on first touch.
+def _read_originals(vhd_path: str) -> dict[int, str]:
+    """``{flat offset: original bytes hex}`` recorded for ``vhd_path``."""
+    return state_store.store().su_originals(vhd_path)
 
 
-def _write_sidecar(sc: str, merged: dict[int, str]) -> None:
-    """Persist ``merged`` (flat offset -> original bytes) to the sidecar now.
+def _record_originals(vhd_path: str, records: dict[int, str]) -> None:
+    state_store.store().record_su_originals(vhd_path, records)
 
-    Called after every entry in :func:`enable`'s patch loop, not just once at
-    the end, so a later entry's write failure can't orphan the recovery
-    record for entries already patched earlier in the same run.
-    """
-    if merged:
-        json.dump({"patches": [{"offset": o, "orig": h} for o, h in merged.items()]},
-                  open(sc, "w"), indent=2)
+
+def _forget_originals(vhd_path: str) -> None:
+    state_store.store().forget_su(vhd_path)
 
 
-def enable(vhd_path: str, progress=None) -> list[str]:
-    """Patch every gated su to grant app root; back up originals to the sidecar.
+def enable(vhd_path: str, progress=None, cancel=None) -> list[str]:
+    """Patch every gated su to grant app root; record originals in the state store.
 
     ``progress`` (optional) is called with a status string for each step.
+    ``cancel`` (default: the current ``cancellation`` token) stops the scan;
+    once the first su is written the few 3-byte patches are all finished, so
+    a cancel never leaves the disk half-rooted.
     """
     def _p(msg):
         logger.info(msg)
@@ -473,12 +487,7 @@ def enable(vhd_path: str, progress=None) -> list[str]:
             progress(msg)
 
     results: list[str] = []
-    merged: dict[int, str] = {}
-    sc = _sidecar(vhd_path)
-    if os.path.isfile(sc):
-        for p in json.load(open(sc)).get("patches", []):
-            if p.get("orig"):
-                merged[p["offset"]] = p["orig"]
+    merged = _read_originals(vhd_path)
     # Progress-only percentage reporter: updates the GUI status label, deduped so
     # it fires only when the integer %% changes, and NEVER goes to the logger --
     # the per-block scan ticks thousands of times and would flood the console.
@@ -496,28 +505,36 @@ def enable(vhd_path: str, progress=None) -> list[str]:
            "may be lost on next launch.")
     try:
         _p("Scanning /system for su binaries...")
-        entries = _scan_su_entries(vhd, _pct)
+        entries = _scan_su_entries(vhd, _pct, cancel)
         logger.info("Found %d gated su entr%s", len(entries), "y" if len(entries) == 1 else "ies")
-        n = len(entries)
-        for i, (off, patched, is64) in enumerate(entries, 1):
-            orig_hex = "53 48 8d" if is64 else "55 89 e5"
+        plan = []
+        new: dict[int, str] = {}
+        for off, patched, is64 in entries:
             cur = vhd.read(off, 3)
-            if patched or cur == su_patch.PATCH:
-                merged.setdefault(off, orig_hex)         # track the already-rooted copy
+            rooted = patched or cur == su_patch.PATCH
+            if off not in merged:
+                # The already-rooted copy is tracked with its known original.
+                new.setdefault(off, ("53 48 8d" if is64 else "55 89 e5") if rooted
+                               else cur.hex(" "))
+            plan.append((off, rooted, cur))
+        cancellation.check(cancel)
+        # Record every original first, as one committed batch: if a write
+        # below raises or the run is killed, the store already covers every su
+        # this run may have patched, so disable() can restore them.
+        _record_originals(vhd_path, new)
+        merged.update(new)
+        n = len(plan)
+        for i, (off, rooted, cur) in enumerate(plan, 1):
+            if rooted:
                 results.append("su@0x%X already rooted" % off)
-            else:
-                _p("Patching su %d/%d (offset 0x%X)..." % (i, n, off))
-                merged.setdefault(off, cur.hex(" "))         # remember the original bytes
-                vhd.write(off, su_patch.PATCH)
-                ok = vhd.read(off, 3) == su_patch.PATCH
-                line = "su@0x%X %s (%s -> %s)" % (off, "rooted" if ok else "write-verify FAILED",
-                                                  cur.hex(" "), su_patch.PATCH.hex(" "))
-                logger.info(line)
-                results.append(line)
-            # Persist after every entry, not just once at the end: if a later
-            # entry's vhd.write() raises, the sidecar must already hold every
-            # binary patched so far, or disable() can never restore them.
-            _write_sidecar(sc, merged)
+                continue
+            _p("Patching su %d/%d (offset 0x%X)..." % (i, n, off))
+            vhd.write(off, su_patch.PATCH)
+            ok = vhd.read(off, 3) == su_patch.PATCH
+            line = "su@0x%X %s (%s -> %s)" % (off, "rooted" if ok else "write-verify FAILED",
+                                              cur.hex(" "), su_patch.PATCH.hex(" "))
+            logger.info(line)
+            results.append(line)
     finally:
         vhd.close()
     if not merged and not results:
@@ -527,17 +544,19 @@ def enable(vhd_path: str, progress=None) -> list[str]:
     return results
 
 
-def disable(vhd_path: str, progress=None) -> list[str]:
-    """Restore original su bytes from the sidecar (un-root)."""
+def disable(vhd_path: str, progress=None, cancel=None) -> list[str]:
+    """Restore the recorded original su bytes (un-root).
+
+    ``cancel`` is honoured up to the first write; see :func:`enable`.
+    """
     def _p(msg):
         logger.info(msg)
         if progress:
             progress(msg)
 
-    sc = _sidecar(vhd_path)
-    if not os.path.isfile(sc):
-        return ["no backup sidecar -- nothing to restore"]
-    patches = json.load(open(sc)).get("patches", [])
+    patches = sorted(_read_originals(vhd_path).items())
+    if not patches:
+        return ["no su backup recorded -- nothing to restore"]
     results: list[str] = []
     _p("Opening %s" % os.path.basename(vhd_path))
     vhd = open_disk(vhd_path, writable=True)
@@ -545,10 +564,10 @@ def disable(vhd_path: str, progress=None) -> list[str]:
         _p("WARNING: this instance's disk was not shut down cleanly (dirty VHDX "
            "log). Boot it once and fully close it before un-rooting.")
     try:
-        for i, p in enumerate(patches, 1):
+        cancellation.check(cancel)
+        for i, (off, orig_hex) in enumerate(patches, 1):
             _p("Restoring su %d/%d..." % (i, len(patches)))
-            off = p["offset"]
-            orig = bytes(int(x, 16) for x in p["orig"].split())
+            orig = bytes(int(x, 16) for x in orig_hex.split())
             cur = vhd.read(off, 3)
             if cur == orig:
                 results.append("su@0x%X already original" % off)
@@ -565,10 +584,7 @@ def disable(vhd_path: str, progress=None) -> list[str]:
             results.append("su@0x%X restored (%s -> %s)" % (off, cur.hex(" "), orig.hex(" ")))
     finally:
         vhd.close()
-    try:
-        os.remove(sc)
-    except OSError:
-        pass
+    _forget_originals(vhd_path)
     return results
 
 
@@ -584,23 +600,134 @@ def _su_disk(instance_dir: str) -> str | None:
     return vhd if os.path.isfile(vhd) else None
 
 
+# --- live state verification -----------------------------------------------
+# The records only say we patched these su entries once. A BlueStacks update or
+# a guest rewrite of /system/xbin can put the original su back (or move it)
+# without touching them, so the real state is the 3 bytes at each
+# recorded offset: our patch, the recorded original, or something else. Reading
+# them is a header parse plus one tiny read per entry, and the result is cached
+# on the disk's (size, mtime) and the recorded originals, so the dashboard timer can
+# afford it on every refresh.
+PROBE_PATCHED = "patched"
+PROBE_ORIGINAL = "original"
+PROBE_FOREIGN = "foreign"
+
+
+@dataclass(frozen=True)
+class SuProbe:
+    offset: int
+    state: str          # PROBE_PATCHED / PROBE_ORIGINAL / PROBE_FOREIGN
+    current: bytes
+
+
+def _fingerprint(*paths: str) -> tuple:
+    """(size, mtime) per path; None for a path that doesn't exist."""
+    out = []
+    for p in paths:
+        try:
+            st = os.stat(p)
+        except OSError:
+            out.append(None)
+        else:
+            out.append((st.st_size, st.st_mtime_ns))
+    return tuple(out)
+
+
+_probe_lock = threading.Lock()
+_probe_cache: dict[str, tuple[tuple, list[SuProbe]]] = {}
+
+
+def clear_probe_cache() -> None:
+    """Forget every cached probe (the next one re-reads the disk)."""
+    with _probe_lock:
+        _probe_cache.clear()
+
+
+def probe_su_state(vhd_path: str) -> list[SuProbe] | None:
+    """Classify every su entry recorded for ``vhd_path`` by the bytes on disk
+    now. Opens the disk read-only.
+
+    Returns None when nothing is recorded (nothing was ever patched here) or
+    the disk can't be read -- e.g. a running instance holding it open."""
+    patches = _read_originals(vhd_path)
+    fp = (_fingerprint(vhd_path)[0], tuple(sorted(patches.items())))
+    if fp[0] is None or not patches:
+        return None
+    key = os.path.normcase(os.path.abspath(vhd_path))
+    with _probe_lock:
+        hit = _probe_cache.get(key)
+    if hit is not None and hit[0] == fp:
+        return list(hit[1])
+    try:
+        vhd = open_disk(vhd_path)
+    except (OSError, ValueError, struct.error):
+        return None
+    probes: list[SuProbe] = []
+    try:
+        for off, orig_hex in sorted(patches.items()):
+            orig = bytes.fromhex(orig_hex)
+            cur = vhd.read(off, len(su_patch.PATCH))
+            state = (PROBE_PATCHED if cur == su_patch.PATCH
+                     else PROBE_ORIGINAL if orig and cur == orig
+                     else PROBE_FOREIGN)
+            probes.append(SuProbe(off, state, cur))
+    except (OSError, ValueError, KeyError, TypeError, struct.error):
+        return None
+    finally:
+        vhd.close()
+    with _probe_lock:
+        _probe_cache[key] = (fp, probes)
+    return list(probes)
+
+
+def summarize_probes(probes: list[SuProbe] | None) -> str | None:
+    """One word for a probe: ``patched`` (all entries), ``original`` (all
+    reverted), ``mixed`` (some reverted), ``foreign`` (any entry holds neither),
+    or None when there is nothing to judge."""
+    if not probes:
+        return None
+    states = {p.state for p in probes}
+    if PROBE_FOREIGN in states:
+        return PROBE_FOREIGN
+    if states == {PROBE_PATCHED}:
+        return PROBE_PATCHED
+    if states == {PROBE_ORIGINAL}:
+        return PROBE_ORIGINAL
+    return "mixed"
+
+
 # --- instance-level helpers for the GUI -----------------------------------
+def instance_su_state(instance_dir: str) -> str | None:
+    """``summarize_probes`` of this instance's su disk (see ``probe_su_state``)."""
+    vhd = _su_disk(instance_dir)
+    return summarize_probes(probe_su_state(vhd)) if vhd else None
+
+
 def instance_root_state(instance_dir: str) -> bool:
-    """True if this instance's su is patched (rooted), tracked by the backup sidecar."""
+    """True if this instance's su is patched (rooted).
+
+    Verified against the disk: every su recorded in the state store must still
+    hold the patch. When the disk can't be read (instance running), having
+    records at all is taken as the answer."""
     vhd = _su_disk(instance_dir)
-    return bool(vhd and os.path.isfile(_sidecar(vhd)))
+    if not (vhd and _read_originals(vhd)):
+        return False
+    state = summarize_probes(probe_su_state(vhd))
+    return state is None or state == PROBE_PATCHED
 
 
-def set_instance_root(instance_dir: str, on: bool, progress=None) -> list[str]:
+def set_instance_root(instance_dir: str, on: bool, progress=None,
+                      cancel=None) -> list[str]:
     """Root (patch su + back up) or un-root (restore su) a single instance.
 
     The instance must be shut down. Returns human-readable status lines.
+    ``cancel`` is passed on to :func:`enable` / :func:`disable`.
     """
     vhd = _su_disk(instance_dir)
     if not vhd:
         return ["Data.vhdx not found in %s -- boot the instance once, then shut "
                 "it down and retry." % instance_dir]
-    return enable(vhd, progress) if on else disable(vhd, progress)
+    return enable(vhd, progress, cancel) if on else disable(vhd, progress, cancel)
 
 
 def _collect(targets: list[str], all_instances: bool) -> list[str]:
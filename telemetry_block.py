@@ -51,20 +51,21 @@ to trip that check, any modification does it.
 from __future__ import annotations
 
 import datetime
-import json
 import logging
 import os
+import sqlite3
 import tempfile
 
+import cancellation
 import ext4_symlink as _es
 import magisk_system as _ms
+import state_store
 
 logger = logging.getLogger(__name__)
 
 _BLOCK_BEGIN = "# >>> BlueStacksRootGUI ad/telemetry block >>>"
 _BLOCK_END = "# <<< BlueStacksRootGUI ad/telemetry block <<<"
 _BACKUP_NAME = ".hosts_prelock.bak"       # host-side: original hosts before first block
-_STATE_NAME = ".telemetry_block.json"     # host-side: applied? + provenance
 
 # Null-routed domains. Conservative on purpose -- clear third-party ad networks,
 # mobile-attribution SDKs, and the exchanges caught in a live capture. NOT
@@ -144,11 +145,11 @@ HOST_BLOCKLIST = (
 
 
 def _sidecar_dir(instance_dir: str) -> str:
-    """Where the block's backup + state sidecar live.
+    """Where the block's backup lives, and the dir its state is keyed by.
 
     The block is written into ``Root.vhd``, which BlueStacks shares across every
     instance of one Android version, so there is really one block per version,
-    not one per instance. The sidecar therefore lives next to that shared
+    not one per instance. The backup and state therefore belong to that shared
     ``Root.vhd`` rather than in a single instance's folder: every instance that
     boots from the same image then reports the same block state, instead of a
     clone claiming "not blocked" while it is in fact blocked. Falls back to the
@@ -161,10 +162,8 @@ def _sidecar_dir(instance_dir: str) -> str:
         return instance_dir
 
 
-def _instance_paths(instance_dir: str) -> tuple[str, str]:
-    base = _sidecar_dir(instance_dir)
-    return (os.path.join(base, _BACKUP_NAME),
-            os.path.join(base, _STATE_NAME))
+def _backup_path(instance_dir: str) -> str:
+    return os.path.join(_sidecar_dir(instance_dir), _BACKUP_NAME)
 
 
 def blocked_hosts() -> tuple[str, ...]:
@@ -240,7 +239,9 @@ def _dump_hosts(device: str, sysroot: str, env: dict) -> str:
 def _write_hosts(device: str, sysroot: str, content: str, env: dict) -> str:
     """Write ``content`` to the guest hosts (0644 root:root). Returns debugfs
     output. Rewrites in place: rm then write a bare name in the CWD (debugfs
-    quirk), matching magisk_system's writer."""
+    quirk), matching magisk_system's writer.  Like every debugfs write script
+    it is never cut short by a cancel (between its ``rm`` and ``write`` the
+    guest has no hosts file at all)."""
     fd, tmp = tempfile.mkstemp(suffix="-hosts")
     with os.fdopen(fd, "w", encoding="utf-8", newline="\n") as f:
         f.write(content)
@@ -260,36 +261,41 @@ def _write_hosts(device: str, sysroot: str, content: str, env: dict) -> str:
 
 
 def _write_state(instance_dir: str, applied: bool) -> None:
-    _, state = _instance_paths(instance_dir)
-    if not applied:
-        try:
-            os.unlink(state)
-        except OSError:
-            pass
-        return
-    data = {"telemetry_block": True,
-            "domains": len(blocked_hosts()),
-            "applied_at": datetime.datetime.now().isoformat(timespec="seconds")}
+    data = None
+    if applied:
+        data = {"telemetry_block": True,
+                "domains": len(blocked_hosts()),
+                "applied_at": datetime.datetime.now().isoformat(timespec="seconds")}
     try:
-        with open(state, "w", encoding="utf-8") as f:
-            json.dump(data, f, indent=2)
-    except OSError as exc:
+        state_store.store().set_hosts_block(_sidecar_dir(instance_dir), data)
+    except (OSError, sqlite3.Error) as exc:
         logger.warning("could not write telemetry-block state: %s", exc)
 
 
 def status(instance_dir: str) -> dict | None:
-    """The block state sidecar, or None if not applied. For the GUI."""
-    _, state = _instance_paths(instance_dir)
+    """The block state, or None if not applied. For the GUI."""
     try:
-        with open(state, encoding="utf-8") as f:
-            return json.load(f)
-    except (OSError, ValueError):
+        return state_store.store().hosts_block(_sidecar_dir(instance_dir))
+    except (OSError, sqlite3.Error):
         return None
 
 
-def apply(instance_dir: str, progress=None) -> list[str]:
+def statuses(instance_dirs) -> dict[str, dict | None]:
+    """:func:`status` of every instance in ``instance_dirs``, from one state
+    store query (clones of one master share that master's row)."""
+    dirs = {d: _sidecar_dir(d) for d in dict.fromkeys(instance_dirs)}
+    try:
+        stored = state_store.store().instance_states(dirs.values())
+    except (OSError, sqlite3.Error):
+        return dict.fromkeys(dirs)
+    return {d: stored[disk_dir].hosts_block for d, disk_dir in dirs.items()}
+
+
+def apply(instance_dir: str, progress=None, cancel=None) -> list[str]:
     """Null-route the ad/telemetry domains in the instance's guest hosts.
-    Backs up the original once, is idempotent, and verifies the filesystem."""
+    Backs up the original once, is idempotent, and verifies the filesystem.
+    ``cancel`` (default: the current ``cancellation`` token) stops it at the
+    next step; the disk is always detached."""
     def _p(msg: str) -> None:
         logger.info(msg)
         if progress:
@@ -298,11 +304,11 @@ def apply(instance_dir: str, progress=None) -> list[str]:
     if not _es.tools_available():
         raise RuntimeError("bundled e2fsprogs (debugfs) not found")
     root_vhd = _ms._resolve_root_vhd(instance_dir)
-    backup, _ = _instance_paths(instance_dir)
+    backup = _backup_path(instance_dir)
     env = _es._tool_env()
 
     _p("Attaching Root.vhd (blocking ad/telemetry hosts)...")
-    with _es._Attached(root_vhd, progress=_p) as att:
+    with cancellation.scope(cancel), _es._Attached(root_vhd, progress=_p) as att:
         dev = att.device
         sysroot = _ms._find_system_root(dev, env)
         current = _dump_hosts(dev, sysroot, env)
@@ -317,19 +323,25 @@ def apply(instance_dir: str, progress=None) -> list[str]:
         new = base + _block_text()
         _p("Writing %d blocked hostnames into guest hosts..." % len(blocked_hosts()))
         out = _write_hosts(dev, sysroot, new, env)
-        written = _dump_hosts(dev, sysroot, env)
-        if not has_block(written):
-            raise RuntimeError("hosts block not written (debugfs: %s)" % _ms._errtail(out))
-        _p("Verifying filesystem (e2fsck)...")
-        if not _es._fsck_ok(dev, env):
-            raise RuntimeError("e2fsck reported errors after writing hosts")
+        try:
+            written = _dump_hosts(dev, sysroot, env)
+            if not has_block(written):
+                raise RuntimeError("hosts block not written (debugfs: %s)" % _ms._errtail(out))
+            _p("Verifying filesystem (e2fsck)...")
+            if not _es._fsck_ok(dev, env):
+                raise RuntimeError("e2fsck reported errors after writing hosts")
+        except cancellation.Cancelled:
+            # Unverified and unrecorded: put the previous hosts back.
+            _p("Cancelled -- restoring the previous hosts file...")
+            _write_hosts(dev, sysroot, current, env)
+            raise
     _write_state(instance_dir, True)
     return ["Blocked %d ad/tracker hostnames in the guest hosts file."
             % len(blocked_hosts())]
 
 
-def remove(instance_dir: str, progress=None) -> list[str]:
-    """Restore the guest hosts to its pre-block state."""
+def remove(instance_dir: str, progress=None, cancel=None) -> list[str]:
+    """Restore the guest hosts to its pre-block state (``cancel`` as in :func:`apply`)."""
     def _p(msg: str) -> None:
         logger.info(msg)
         if progress:
@@ -341,11 +353,11 @@ def remove(instance_dir: str, progress=None) -> list[str]:
         root_vhd = _ms._resolve_root_vhd(instance_dir)
     except RuntimeError:
         return ["Root.vhd not found -- nothing to remove"]
-    backup, _ = _instance_paths(instance_dir)
+    backup = _backup_path(instance_dir)
     env = _es._tool_env()
 
     _p("Attaching Root.vhd (restoring guest hosts)...")
-    with _es._Attached(root_vhd, progress=_p) as att:
+    with cancellation.scope(cancel), _es._Attached(root_vhd, progress=_p) as att:
         dev = att.device
         sysroot = _ms._find_system_root(dev, env)
         if os.path.isfile(backup):
@@ -1,6 +1,8 @@
+import socket
 from types import SimpleNamespace
 
-from adb_handler import list_running_instances
+import adb_handler
+from adb_handler import instance_adb_ports, list_running_instances
 
 
 def _fake_runner(responses):
@@ -32,7 +34,8 @@ def test_list_running_instances_returns_connected_ports(tmp_path):
         ("Idle (Normal)", str(config_path), "Idle"),
     ]
 
-    result = list_running_instances("HD-Adb.exe", instances, runner=runner)
+    result = list_running_instances("HD-Adb.exe", instances, runner=runner,
+                                    probe=lambda port: True)
 
     assert result == {"Pie64 (Normal)": 5555}
 
@@ -47,3 +50,56 @@ def test_list_running_instances_skips_instances_with_no_recorded_port(tmp_path):
 
     assert result == {}
     assert runner.calls == []  # never attempted an adb connect
+
+
+def test_list_running_instances_skips_adb_for_ports_that_refuse(tmp_path):
+    config_path = tmp_path / "bluestacks.conf"
+    config_path.write_text(
+        'bst.instance.Pie64.status.adb_port="5555"\n'
+        'bst.instance.Stopped.status.adb_port="5565"\n'
+    )
+    runner = _fake_runner({"127.0.0.1:5555": "connected to 127.0.0.1:5555"})
+    instances = [("Pie64", str(config_path), "Pie64"),
+                 ("Stopped", str(config_path), "Stopped")]
+
+    result = list_running_instances("HD-Adb.exe", instances, runner=runner,
+                                    probe=lambda port: port == 5555)
+
+    assert result == {"Pie64": 5555}
+    assert runner.calls == [["HD-Adb.exe", "connect", "127.0.0.1:5555"]]
+
+
+def test_list_running_instances_reads_each_config_once(tmp_path, monkeypatch):
+    config_path = tmp_path / "bluestacks.conf"
+    config_path.write_text("".join(
+        'bst.instance.I%d.status.adb_port="%d"\n' % (i, 5555 + 10 * i) for i in range(5)))
+    reads = []
+    real = adb_handler.instance_adb_ports
+    monkeypatch.setattr(adb_handler, "instance_adb_ports",
+                        lambda path: reads.append(path) or real(path))
+    instances = [("I%d" % i, str(config_path), "I%d" % i) for i in range(5)]
+
+    list_running_instances("HD-Adb.exe", instances, runner=_fake_runner({}),
+                           probe=lambda port: False)
+
+    assert reads == [str(config_path)]
+
+
+def test_instance_adb_ports_matches_names_case_insensitively(tmp_path):
+    config_path = tmp_path / "bluestacks.conf"
+    config_path.write_text('bst.instance.Pie64_1.status.adb_port="5565"\n'
+                           'bst.instance.Pie64_1.status.other="1"\n')
+    assert instance_adb_ports(str(config_path)) == {"pie64_1": 5565}
+    assert instance_adb_ports(str(tmp_path / "missing.conf")) == {}
+
+
+def test_port_accepts_detects_a_listener():
+    srv = socket.socket()
+    srv.bind(("127.0.0.1", 0))
+    srv.listen(1)
+    port = srv.getsockname()[1]
+    try:
+        assert adb_handler._port_accepts(port)
+    finally:
+        srv.close()
+    assert not adb_handler._port_accepts(port)
@@ -5,12 +5,14 @@ as a user app after first boot. These lock in the command shape and the
 user-facing error handling; the real install is validated live against a booted
 instance.
 """
+import shlex
 from types import SimpleNamespace
 
 import pytest
 
 from adb_handler import (
-    MANAGER_PACKAGE, install_manager, install_module, uninstall_manager,
+    _batch_script, MANAGER_PACKAGE, install_manager, install_module, install_modules,
+    install_modules_many, uninstall_manager,
 )
 
 
@@ -135,3 +137,117 @@ def test_uninstall_manager_not_installed_is_success(tmp_path):
 
     msg = uninstall_manager("adb", 5555, runner=_runner(handle))
     assert "not installed" in msg.lower()
+
+
+def _zips(tmp_path, *names):
+    paths = []
+    for n in names:
+        p = tmp_path / n
+        p.write_bytes(b"PK\x03\x04" + n.encode())
+        paths.append(str(p))
+    return paths
+
+
+def _batch_handle(statuses, connected=True):
+    """Fake adb: the batched su -c script reports ``statuses[i]`` per module."""
+    def handle(cmd):
+        if cmd[1] == "connect":
+            return _cp("connected to 127.0.0.1:5555" if connected else "failed")
+        if cmd[1] == "devices":
+            return _cp("List of devices attached\n")
+        if "su" in cmd and "install-module" in cmd[-1]:
+            return _cp("".join("- log %d\n@@bsrgui-module %d %d\n" % (i, i, rc)
+                               for i, rc in enumerate(statuses)))
+        return _cp()
+    return handle
+
+
+def test_install_modules_uses_one_session_for_the_whole_batch(tmp_path):
+    zips = _zips(tmp_path, "rezygisk.zip", "lsposed.zip")
+    runner = _runner(_batch_handle([0, 0]))
+
+    results = install_modules("adb", 5555, zips, runner=runner)
+
+    assert [r.ok for r in results] == [True, True]
+    joined = [" ".join(c) for c in runner.calls]
+    assert sum(c.startswith("adb connect") for c in joined) == 1
+    assert sum("magisk --sqlite" in c for c in joined) == 1
+    pushes = [c for c in runner.calls if c[3:4] == ["push"]]
+    assert pushes == [["adb", "-s", "127.0.0.1:5555", "push"] + zips + ["/data/local/tmp/"]]
+    (flash,) = [c for c in joined if "install-module" in c]
+    assert flash.index("rezygisk.zip") < flash.index("lsposed.zip")  # order kept
+    assert flash.count("sync") == 1 and "rm -f" in flash
+
+
+def test_install_modules_reports_a_rejected_module_without_failing_the_rest(tmp_path):
+    zips = _zips(tmp_path, "good.zip", "bad.zip")
+    runner = _runner(_batch_handle([0, 1]))
+
+    good, bad = install_modules("adb", 5555, zips, runner=runner)
+
+    assert good.ok and not bad.ok
+    assert "log 1" in bad.message
+    rescue = [c for c in runner.calls if c[-1] == "/sdcard/Download/"]
+    assert rescue and rescue[0][4:-1] == [zips[1]]
+
+
+def test_install_modules_raises_when_su_never_ran(tmp_path):
+    zips = _zips(tmp_path, "a.zip")
+
+    def handle(cmd):
+        if cmd[1] == "connect":
+            return _cp("connected to 127.0.0.1:5555")
+        if "su" in cmd:
+            return _cp("", "su: permission denied", rc=1)
+        return _cp()
+
+    with pytest.raises(RuntimeError, match="permission denied"):
+        install_modules("adb", 5555, zips, runner=_runner(handle))
+
+
+def test_batched_script_reaches_su_as_one_quoted_word(tmp_path):
+    # adb joins the shell argv with spaces and the guest sh re-splits it, so
+    # the whole script must be one single-quoted word after ``su -c`` -- else
+    # only the first flash runs as root. A zip name with a quote stays inside.
+    zips = _zips(tmp_path, "rezygisk.zip", "it's.zip")
+    runner = _runner(_batch_handle([0, 0]))
+
+    install_modules("adb", 5555, zips, runner=runner)
+
+    (flash,) = [c for c in runner.calls if "install-module" in c[-1]]
+    script = _batch_script(["/data/local/tmp/rezygisk.zip", "/data/local/tmp/it's.zip"])
+    assert flash == ["adb", "-s", "127.0.0.1:5555", "shell", "su", "-c",
+                     "'%s'" % script.replace("'", "'\\''")]
+    assert shlex.split(" ".join(flash[4:])) == ["su", "-c", script]
+
+
+def test_denied_su_prints_no_markers_so_the_zips_go_to_download(tmp_path):
+    zips = _zips(tmp_path, "a.zip", "b.zip")
+
+    def handle(cmd):
+        if cmd[1] == "connect":
+            return _cp("connected to 127.0.0.1:5555")
+        if cmd[4:6] == ["su", "-c"]:
+            # su refused: the quoted script never runs, so no marker is echoed.
+            return _cp("", "Permission denied", rc=1)
+        return _cp()
+
+    runner = _runner(handle)
+    with pytest.raises(RuntimeError, match="Permission denied"):
+        install_modules("adb", 5555, zips, runner=runner)
+    assert ["adb", "-s", "127.0.0.1:5555", "push"] + zips + ["/sdcard/Download/"] in runner.calls
+
+
+def test_install_modules_many_isolates_an_unreachable_instance(tmp_path):
+    zips = _zips(tmp_path, "a.zip")
+
+    def handle(cmd):
+        if cmd[1] == "connect":
+            ok = cmd[2].endswith(":5555")
+            return _cp("connected" if ok else "cannot connect")
+        return _batch_handle([0])(cmd)
+
+    out = install_modules_many("adb", {"Pie64": 5555, "Pie64_1": 5565}, zips,
+                               runner=_runner(handle))
+    assert [r.ok for r in out["Pie64"]] == [True]
+    assert [r.ok for r in out["Pie64_1"]] == [False]
@@ -0,0 +1,224 @@
+"""Tests for the in-process adb server client (adb_wire).
+
+A small fake adb server on an ephemeral localhost port speaks the host, shell v2
+and sync protocols, so the client is exercised byte-for-byte without a device or
+HD-Adb. The shell "device" answers a few canned commands.
+"""
+import socket
+import struct
+import subprocess
+import threading
+
+import pytest
+
+import adb_wire
+
+
+class _FakeAdbServer:
+    def __init__(self, features="shell_v2,cmd"):
+        self.features = features
+        self.files = {"/data/local/tmp": None}  # path -> bytes (None = a dir)
+        self.requests = []
+        self._sock = socket.socket()
+        self._sock.bind(("127.0.0.1", 0))
+        self._sock.listen(8)
+        self.port = self._sock.getsockname()[1]
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    def close(self):
+        self._sock.close()
+
+    def _serve(self):
+        while True:
+            try:
+                conn, _ = self._sock.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    @staticmethod
+    def _recv(conn, n):
+        buf = b""
+        while len(buf) < n:
+            chunk = conn.recv(n - len(buf))
+            if not chunk:
+                raise EOFError
+            buf += chunk
+        return buf
+
+    def _request(self, conn):
+        n = int(self._recv(conn, 4), 16)
+        req = self._recv(conn, n).decode()
+        self.requests.append(req)
+        return req
+
+    @staticmethod
+    def _block(text):
+        data = text.encode()
+        return b"%04x" % len(data) + data
+
+    def _handle(self, conn):
+        with conn:
+            try:
+                req = self._request(conn)
+                if req == "host:devices":
+                    conn.sendall(b"OKAY" + self._block("127.0.0.1:5555\tdevice\n"))
+                elif req.startswith("host:connect:"):
+                    target = req.split(":", 2)[2]
+                    msg = ("connected to %s" % target if target.endswith("5555")
+                           else "failed to connect to '%s'" % target)
+                    conn.sendall(b"OKAY" + self._block(msg))
+                elif req.endswith(":features"):
+                    conn.sendall(b"OKAY" + self._block(self.features))
+                elif req.startswith("host:transport:"):
+                    if not req.endswith("5555"):
+                        conn.sendall(b"FAIL" + self._block("device '%s' not found" % req[15:]))
+                        return
+                    conn.sendall(b"OKAY")
+                    self._device(conn, self._request(conn))
+                else:
+                    conn.sendall(b"FAIL" + self._block("unknown host service"))
+            except EOFError:
+                pass
+
+    def _device(self, conn, service):
+        conn.sendall(b"OKAY")
+        if service.startswith("shell,v2,raw:"):
+            code, out, err = self._run(service[len("shell,v2,raw:"):])
+            for pid, data in ((1, out), (2, err)):
+                if data:
+                    conn.sendall(bytes([pid]) + struct.pack("<I", len(data)) + data)
+            conn.sendall(bytes([3]) + struct.pack("<I", 1) + bytes([code]))
+        elif service.startswith("shell:"):
+            _, out, err = self._run(service[len("shell:"):])
+            conn.sendall(out + err)
+        elif service == "sync:":
+            self._sync(conn)
+
+    def _run(self, command):
+        if command.startswith("echo "):
+            return 0, command[5:].encode() + b"\n", b""
+        if command.startswith("pm install"):
+            return 0, b"Success\n", b""
+        if command.startswith("rm -f"):
+            return 0, b"", b""
+        return 7, b"", b"sh: %s: not found\n" % command.encode()
+
+    def _sync(self, conn):
+        while True:
+            sid = self._recv(conn, 4)
+            (n,) = struct.unpack("<I", self._recv(conn, 4))
+            arg = self._recv(conn, n) if sid in (b"STAT", b"SEND") else b""
+            if sid == b"QUIT":
+                return
+            if sid == b"STAT":
+                path = arg.decode()
+                mode = 0
+                if path in self.files:
+                    mode = 0o040755 if self.files[path] is None else 0o100644
+                conn.sendall(b"STAT" + struct.pack("<III", mode, 0, 0))
+            elif sid == b"SEND":
+                path = arg.decode().rsplit(",", 1)[0]
+                data = b""
+                while True:
+                    cid = self._recv(conn, 4)
+                    (m,) = struct.unpack("<I", self._recv(conn, 4))
+                    if cid == b"DONE":
+                        break
+                    data += self._recv(conn, m)
+                self.files[path] = data
+                conn.sendall(b"OKAY" + struct.pack("<I", 0))
+
+
+@pytest.fixture
+def server():
+    srv = _FakeAdbServer()
+    yield srv
+    srv.close()
+
+
+def _client(server):
+    return adb_wire.AdbWireClient(port=server.port, timeout=5)
+
+
+def test_host_services_connect_and_devices(server):
+    c = _client(server)
+    assert c.connect("127.0.0.1:5555") == "connected to 127.0.0.1:5555"
+    assert "failed" in c.connect("127.0.0.1:5565")
+    assert c.devices() == "127.0.0.1:5555\tdevice\n"
+
+
+def test_shell_v2_separates_streams_and_returns_the_exit_code(server):
+    c = _client(server)
+    assert c.shell("127.0.0.1:5555", "echo hi") == (0, b"hi\n", b"")
+    code, out, err = c.shell("127.0.0.1:5555", "bogus")
+    assert code == 7 and out == b"" and b"not found" in err
+
+
+def test_features_are_cached_per_serial(server):
+    c = _client(server)
+    c.shell("127.0.0.1:5555", "echo a")
+    c.shell("127.0.0.1:5555", "echo b")
+    assert sum(r.endswith(":features") for r in server.requests) == 1
+
+
+def test_legacy_shell_used_without_shell_v2(server):
+    server.features = "cmd"
+    code, out, _ = _client(server).shell("127.0.0.1:5555", "echo old")
+    assert (code, out) == (0, b"old\n")
+    assert "shell:echo old" in server.requests
+
+
+def test_push_sends_many_files_over_one_sync_session(server, tmp_path):
+    a, b = tmp_path / "a.zip", tmp_path / "b.zip"
+    a.write_bytes(b"A" * 70000)  # spans two DATA chunks
+    b.write_bytes(b"B")
+    written = _client(server).push("127.0.0.1:5555", [str(a), str(b)], "/data/local/tmp/")
+    assert written == ["/data/local/tmp/a.zip", "/data/local/tmp/b.zip"]
+    assert server.files["/data/local/tmp/a.zip"] == b"A" * 70000
+    assert server.requests.count("sync:") == 1
+
+
+def test_push_onto_an_existing_dir_uses_the_basename(server, tmp_path):
+    a = tmp_path / "m.zip"
+    a.write_bytes(b"x")
+    assert _client(server).push("127.0.0.1:5555", [str(a)], "/data/local/tmp") == \
+        ["/data/local/tmp/m.zip"]
+
+
+def test_transport_failure_surfaces_the_server_message(server):
+    with pytest.raises(adb_wire.AdbWireError, match="not found"):
+        _client(server).shell("emulator-5554", "echo x")
+
+
+def test_runner_maps_adb_argv_to_completed_processes(server, tmp_path):
+    apk = tmp_path / "app.apk"
+    apk.write_bytes(b"APK")
+    run = adb_wire.WireRunner(fallback=lambda cmd: pytest.fail("spawned %r" % cmd),
+                              client=_client(server))
+
+    assert "connected to" in run(["adb", "connect", "127.0.0.1:5555"]).stdout
+    assert "\tdevice" in run(["adb", "devices"]).stdout
+    sh = run(["adb", "-s", "127.0.0.1:5555", "shell", "echo", "hi"])
+    assert (sh.returncode, sh.stdout) == (0, "hi\n")
+    inst = run(["adb", "-s", "127.0.0.1:5555", "install", "-r", str(apk)])
+    assert inst.returncode == 0 and "Success" in inst.stdout
+    assert server.files["/data/local/tmp/app.apk"] == b"APK"
+    bad = run(["adb", "-s", "emulator-5554", "shell", "id"])
+    assert bad.returncode == 1 and "not found" in bad.stderr
+
+
+def test_runner_falls_back_to_the_subprocess_when_no_server_listens():
+    s = socket.socket()
+    s.bind(("127.0.0.1", 0))
+    port = s.getsockname()[1]
+    s.close()  # nothing listening here now
+    spawned = []
+
+    def fallback(cmd):
+        spawned.append(cmd)
+        return subprocess.CompletedProcess(cmd, 0, "connected to x\n", "")
+
+    run = adb_wire.WireRunner(fallback, adb_wire.AdbWireClient(port=port, timeout=2))
+    assert run(["adb", "connect", "x"]).stdout == "connected to x\n"
+    assert spawned == [["adb", "connect", "x"]]
@@ -0,0 +1,54 @@
+"""Tests for the content-addressed backup store (backup_store)."""
+import hashlib
+import os
+
+import pytest
+
+import backup_store
+
+
+def _store(tmp_path):
+    return backup_store.BackupStore(str(tmp_path / "store"))
+
+
+def test_put_dedups_by_hash_and_compresses(tmp_path):
+    store = _store(tmp_path)
+    data = b"MZ" + b"\x00" * 500000
+    sha = hashlib.sha256(data).hexdigest()
+    assert store.put(data, sha) is True
+    assert store.put(memoryview(data), sha) is False
+    assert store.object_path(sha).endswith(os.path.join(sha[:2], sha + ".z"))
+    assert os.path.getsize(store.object_path(sha)) < len(data) // 10
+    assert store.verify(sha)
+
+
+def test_put_file_hashes_while_reading(tmp_path):
+    src = tmp_path / "HD-Player.exe"
+    src.write_bytes(os.urandom(3 << 20))
+    store = _store(tmp_path)
+    sha = store.put_file(str(src))
+    assert sha == hashlib.sha256(src.read_bytes()).hexdigest()
+    dest = tmp_path / "restored.exe"
+    store.restore_to(sha, str(dest))
+    assert dest.read_bytes() == src.read_bytes()
+    assert [p for p in os.listdir(tmp_path) if p.endswith(".tmp")] == []
+
+
+def test_restore_of_a_missing_or_truncated_object_fails_without_writing(tmp_path):
+    store = _store(tmp_path)
+    dest = tmp_path / "bin.exe"
+    dest.write_bytes(b"current")
+    with pytest.raises(FileNotFoundError):
+        store.restore_to("ab" * 32, str(dest))
+
+    data = os.urandom(100000)
+    sha = hashlib.sha256(data).hexdigest()
+    store.put(data, sha)
+    obj = store.object_path(sha)
+    with open(obj, "r+b") as fh:
+        fh.truncate(os.path.getsize(obj) // 2)
+    assert not store.verify(sha)
+    with pytest.raises(RuntimeError, match="damaged"):
+        store.restore_to(sha, str(dest))
+    assert dest.read_bytes() == b"current"
+    assert sorted(os.listdir(tmp_path)) == ["bin.exe", "store"]
@@ -0,0 +1,81 @@
+"""Tests for the shared .bstk HardDisk model (bstk) and its three consumers:
+R/W detection, the R/W toggle and Root.vhd resolution for clones."""
+import os
+
+import bstk
+import constants
+import instance_handler
+import magisk_system
+
+_BSTK = """<?xml version="1.0"?>
+<VirtualBox>
+  <Machine name="Pie64">
+    <MediaRegistry>
+      <HardDisks>
+        <HardDisk uuid="{a}" location="fastboot.vdi" format="VDI" type="%s"/>
+        <HardDisk uuid="{b}" location="%s" format="VHD" type="%s"/>
+        <HardDisk uuid="{c}" location="Data.vhdx" format="VHDX" type="Normal"/>
+      </HardDisks>
+    </MediaRegistry>
+  </Machine>
+</VirtualBox>
+"""
+
+
+def _instance(tmp_path, name="Pie64", mode="Readonly", root="Root.vhd"):
+    d = tmp_path / name
+    d.mkdir()
+    (d / ("%s.bstk" % name)).write_text(_BSTK % (mode, root, mode), encoding="utf-8")
+    return d
+
+
+def test_parse_reads_each_harddisk_element():
+    model = bstk.parse("x.bstk", _BSTK % ("Readonly", r"..\Pie64\Root.vhd", "Readonly"))
+    assert [(d.filename, d.format, d.type) for d in model.disks] == [
+        ("fastboot.vdi", "VDI", "Readonly"),
+        ("Root.vhd", "VHD", "Readonly"),
+        ("Data.vhdx", "VHDX", "Normal"),
+    ]
+    assert [d.filename for d in model.disks_named(["root.VHD"])] == ["Root.vhd"]
+
+
+def test_load_reuses_the_parse_until_the_file_changes(tmp_path):
+    path = _instance(tmp_path) / "Pie64.bstk"
+    first = bstk.load(str(path))
+    assert bstk.load(str(path)) is first
+    path.write_text(_BSTK % ("Normal", "Root.vhd", "Normal") + "\n", encoding="utf-8")
+    assert bstk.load(str(path)).disks[0].type == "Normal"
+
+
+def test_instance_paths_list_the_template_first(tmp_path):
+    d = _instance(tmp_path)
+    (d / constants.ANDROID_BSTK_IN_FILE).write_text(_BSTK % ("Readonly", "Root.vhd", "Readonly"))
+    names = [os.path.basename(p) for p in bstk.instance_bstk_paths(str(d))]
+    assert names == [constants.ANDROID_BSTK_IN_FILE, "Pie64.bstk"]
+
+
+def test_readonly_detection_uses_the_model(tmp_path):
+    assert instance_handler.is_instance_readonly(str(_instance(tmp_path))) is True
+    rw = _instance(tmp_path, "Rvc64", mode="Normal")
+    assert instance_handler.is_instance_readonly(str(rw)) is False
+    empty = tmp_path / "Manager"
+    empty.mkdir()
+    assert instance_handler.is_instance_readonly(str(empty)) is None
+
+
+def test_toggle_rewrites_only_the_target_disks_and_detection_follows(tmp_path):
+    d = _instance(tmp_path)
+    assert instance_handler.is_instance_readonly(str(d)) is True
+
+    instance_handler.modify_instance_files(str(d), constants.MODE_READWRITE)
+
+    text = (d / "Pie64.bstk").read_text(encoding="utf-8")
+    assert text == _BSTK % ("Normal", "Root.vhd", "Normal")
+    assert instance_handler.is_instance_readonly(str(d)) is False
+
+
+def test_clone_resolves_root_vhd_through_the_model(tmp_path):
+    master = _instance(tmp_path)
+    (master / "Root.vhd").write_bytes(b"vhd")
+    clone = _instance(tmp_path, "Pie64_1", root=r"..\Pie64\Root.vhd".replace("\\", os.sep))
+    assert magisk_system._resolve_root_vhd(str(clone)) == str(master / "Root.vhd")
@@ -0,0 +1,138 @@
+"""Tests for cooperative cancellation (cancellation): the current-token scope,
+shielded cleanup, and killing a child process once its operation is cancelled."""
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+import cancellation
+import ext4_symlink
+import jobs
+import su_patch_offline
+
+
+def test_scope_sets_and_restores_the_current_token():
+    outer, inner = cancellation.CancelToken(), cancellation.CancelToken()
+    assert cancellation.current() is None
+    with cancellation.scope(outer):
+        with cancellation.scope(None):          # None keeps the current one
+            assert cancellation.current() is outer
+        with cancellation.scope(inner):
+            assert cancellation.current() is inner
+        with cancellation.shielded():
+            assert cancellation.current() is None
+        assert cancellation.current() is outer
+    assert cancellation.current() is None
+
+
+def test_check_raises_only_once_cancelled():
+    token = cancellation.CancelToken()
+    cancellation.check(token)
+    with cancellation.scope(token):
+        cancellation.check()
+        token.cancel()
+        with pytest.raises(cancellation.Cancelled):
+            cancellation.check()
+        with cancellation.shielded():
+            cancellation.check()                # cleanup runs regardless
+
+
+def test_run_returns_output_like_subprocess_run():
+    with cancellation.scope(cancellation.CancelToken()):
+        r = cancellation.run([sys.executable, "-c", "print('hi')"])
+    assert r.returncode == 0 and r.stdout.strip() == "hi"
+
+
+def test_run_kills_the_child_within_a_second_of_the_cancel():
+    token = cancellation.CancelToken()
+    threading.Timer(0.3, token.cancel).start()
+    start = time.monotonic()
+    with cancellation.scope(token), pytest.raises(cancellation.Cancelled):
+        cancellation.run([sys.executable, "-c", "import time; time.sleep(30)"])
+    assert time.monotonic() - start < 1.3
+
+
+def test_a_batch_job_runs_under_its_own_token():
+    seen = []
+    batch = None
+
+    def run(progress, cancelled):
+        seen.append(cancellation.current())
+        batch.cancel()
+        cancellation.check()
+        return "not reached"
+
+    batch = jobs.Batch([jobs.Job(jobs.KIND_ROOT, "A", run)], max_workers=1)
+    results = batch.run(lambda m, p: None)
+    assert isinstance(seen[0], cancellation.CancelToken) and seen[0].cancelled
+    assert results[0].status == jobs.CANCELLED
+
+
+class _Disk:
+    """Just enough of a DynamicVHD for the su scan: every block present, zeros."""
+    block_size = 4096
+    max_entries = 64
+
+    def __init__(self, on_read=None):
+        self.reads = 0
+        self.on_read = on_read
+        self.writes = []
+        self.closed = False
+
+    def is_present(self, blk):
+        return True
+
+    def read(self, off, n):
+        self.reads += 1
+        if self.on_read:
+            self.on_read(self.reads)
+        return bytes(n)
+
+    def write(self, off, data):
+        self.writes.append(off)
+
+    def close(self):
+        self.closed = True
+
+
+def test_su_scan_stops_at_the_next_block_once_cancelled():
+    token = cancellation.CancelToken()
+    disk = _Disk(on_read=lambda n: token.cancel() if n == 3 else None)
+    with pytest.raises(cancellation.Cancelled):
+        su_patch_offline._scan_su_entries(disk, cancel=token)
+    assert disk.reads == 3
+
+
+def test_cancelled_enable_closes_the_disk_without_writing(monkeypatch):
+    token = cancellation.CancelToken()
+    disk = _Disk(on_read=lambda n: token.cancel())
+    recorded = []
+    monkeypatch.setattr(su_patch_offline, "open_disk", lambda path, writable=False: disk)
+    monkeypatch.setattr(su_patch_offline, "_read_originals", lambda path: {})
+    monkeypatch.setattr(su_patch_offline, "_record_originals",
+                        lambda path, records: recorded.append(records))
+
+    with pytest.raises(cancellation.Cancelled):
+        su_patch_offline.enable("Data.vhdx", cancel=token)
+    assert disk.closed and not disk.writes and not recorded
+
+
+def test_a_debugfs_write_script_is_never_killed_only_refused(monkeypatch):
+    # Killing `debugfs -w` mid-script leaves the ext4 image half-written, so a
+    # cancel stops the *next* script; the one already running completes.
+    token = cancellation.CancelToken()
+    seen = []
+
+    def run(args, env=None):
+        seen.append(cancellation.current())
+        token.cancel()                          # lands while the script runs
+        return subprocess.CompletedProcess(args, 0, "", "")
+    monkeypatch.setattr(ext4_symlink, "_run", run)
+
+    with cancellation.scope(token):
+        ext4_symlink._run_script("/dev/sdx", ["rm /a"], {})
+        with pytest.raises(cancellation.Cancelled):
+            ext4_symlink._run_script("/dev/sdx", ["rm /b"], {})
+    assert seen == [None]
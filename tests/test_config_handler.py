@@ -125,3 +125,89 @@ def test_modify_config_file_unchanged_setting_skips_write_entirely(tmp_path, mon
     changed = config_handler.modify_config_file(conf, "bst.feature.rooting", "1")
 
     assert changed is False
+
+
+def test_modify_config_settings_applies_every_edit_in_one_write(tmp_path, monkeypatch):
+    conf = _write_conf(tmp_path, 'bst.feature.rooting="0"\n'
+                                 'bst.instance.Pie64.enable_root_access="0"\n'
+                                 'bst.instance.Pie64.display_name="Pie"\n')
+    unlocks = []
+    real_unlocked = config_handler.root_persistence.unlocked
+    monkeypatch.setattr(config_handler.root_persistence, "unlocked",
+                        lambda path: unlocks.append(path) or real_unlocked(path))
+
+    changed = config_handler.modify_config_settings(conf, {
+        "bst.instance.Pie64.enable_root_access": "1",
+        "bst.feature.rooting": "1",
+        "bst.instance.Pie64.display_name": "Pie",        # already matches
+        "bst.instance.Pie64.adb_port": "5555",           # missing: appended
+    })
+
+    assert changed == ["bst.feature.rooting", "bst.instance.Pie64.enable_root_access",
+                       "bst.instance.Pie64.adb_port"]
+    assert len(unlocks) == 1
+    with open(conf, encoding="utf-8") as f:
+        assert f.read().splitlines() == [
+            'bst.feature.rooting="1"',
+            'bst.instance.Pie64.enable_root_access="1"',
+            'bst.instance.Pie64.display_name="Pie"',
+            'bst.instance.Pie64.adb_port="5555"',
+        ]
+
+
+def test_modify_config_settings_does_not_match_a_key_prefix(tmp_path):
+    conf = _write_conf(tmp_path, 'bst.feature.rooting_extra="0"\n')
+    assert config_handler.modify_config_settings(conf, {"bst.feature.rooting": "1"}) == \
+        ["bst.feature.rooting"]
+    with open(conf, encoding="utf-8") as f:
+        assert f.read() == 'bst.feature.rooting_extra="0"\nbst.feature.rooting="1"\n'
+
+
+def test_load_config_indexes_instances_in_one_pass(tmp_path):
+    conf = _write_conf(tmp_path, '\n'.join([
+        '# comment',
+        'bst.feature.rooting="1"',
+        'bst.instance.Pie64.enable_root_access="1"',
+        'bst.instance.Pie64.display_name="Farm"',
+        'bst.instance.Pie64.status.adb_port="5555"',
+        'BST.INSTANCE.Rvc64.status.adb_port="5565"',
+        'bst.feature.programmatic_ads="1"',
+    ]))
+    model = config_handler.load_config(conf)
+    assert model.global_rooting is True
+    assert model.values["bst.feature.programmatic_ads"] == "1"
+    assert model.instance("pie64") == config_handler.InstanceConfig(
+        "Pie64", root_enabled=True, display_name="Farm", adb_port=5555)
+    assert model.instance("Rvc64").adb_port == 5565
+    assert model.instance("Nougat64") is None
+
+
+def test_load_config_reparses_only_when_the_file_changes(tmp_path, monkeypatch):
+    conf = _write_conf(tmp_path, 'bst.instance.Pie64.enable_root_access="0"\n')
+    parses = []
+    real = config_handler._parse_config
+    monkeypatch.setattr(config_handler, "_parse_config", lambda lines: parses.append(1) or real(lines))
+
+    first = config_handler.load_config(conf)
+    assert config_handler.load_config(conf) is first
+    assert len(parses) == 1
+
+    config_handler.modify_config_file(conf, "bst.instance.Pie64.enable_root_access", "1")
+    assert config_handler.load_config(conf).instance("Pie64").root_enabled is True
+    assert len(parses) == 2
+
+
+def test_concurrent_edits_from_batch_jobs_are_all_kept(tmp_path):
+    import threading
+    conf = tmp_path / "bluestacks.conf"
+    conf.write_text('bst.feature.rooting="0"\n')
+    names = ["Pie64_%d" % i for i in range(12)]
+    threads = [threading.Thread(target=config_handler.modify_config_settings,
+                                args=(str(conf), {"bst.instance.%s.enable_root_access" % n: "1"}))
+               for n in names]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    text = conf.read_text()
+    assert all('bst.instance.%s.enable_root_access="1"' % n in text for n in names)
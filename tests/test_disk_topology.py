@@ -0,0 +1,61 @@
+"""Tests for the installation-wide disk topology (disk_topology)."""
+import os
+
+import disk_topology
+
+_BSTK = (
+    '<HardDisk uuid="{a}" location="fastboot.vdi" format="VDI" type="Readonly"/>\n'
+    '<HardDisk uuid="{b}" location="%s" format="VHD" type="Readonly"/>\n'
+    '<HardDisk uuid="{c}" location="Data.vhdx" format="VHDX" type="Normal"/>\n'
+)
+
+
+def _instance(tmp_path, name, root="Root.vhd", own_root=False):
+    d = tmp_path / name
+    d.mkdir()
+    (d / ("%s.bstk" % name)).write_text(_BSTK % root)
+    (d / "Data.vhdx").write_bytes(b"d")
+    if own_root:
+        (d / "Root.vhd").write_bytes(b"r")
+        (d / "fastboot.vdi").write_bytes(b"f")
+    return str(d)
+
+
+def test_clones_resolve_to_the_masters_root_vhd(tmp_path):
+    master = _instance(tmp_path, "Pie64", own_root=True)
+    clone = _instance(tmp_path, "Pie64_1", root="../Pie64/Root.vhd")
+
+    disks = disk_topology.resolve(clone)
+    assert os.path.normpath(disks.root_vhd) == os.path.join(master, "Root.vhd")
+    assert disks.data_vhdx == os.path.join(clone, "Data.vhdx")
+    assert disks.shared and not disk_topology.resolve(master).shared
+
+
+def test_refresh_groups_instances_by_shared_disk(tmp_path):
+    master = _instance(tmp_path, "Pie64", own_root=True)
+    c1 = _instance(tmp_path, "Pie64_1", root="../Pie64/Root.vhd")
+    solo = _instance(tmp_path, "Rvc64", own_root=True)
+    orphan = _instance(tmp_path, "Nougat64_1", root="../Nougat64/Root.vhd")
+
+    topo = disk_topology.refresh([master, c1, solo, orphan])
+    assert disk_topology.current() is topo
+    assert sorted(len(v) for v in topo.groups.values()) == [1, 2]
+    assert topo.group_of(c1) == [master, c1]
+    groups, unresolved = topo.group([c1, solo, orphan])
+    assert sorted(len(v) for v in groups.values()) == [1, 1]
+    assert unresolved == [orphan]
+
+
+def test_unchanged_instances_are_served_from_the_cache(tmp_path, monkeypatch):
+    master = _instance(tmp_path, "Pie64", own_root=True)
+    first = disk_topology.resolve(master)
+    monkeypatch.setattr(disk_topology, "_resolve_uncached",
+                        lambda d: (_ for _ in ()).throw(AssertionError("re-resolved")))
+    assert disk_topology.resolve(master) is first
+
+
+def test_a_master_that_appears_later_is_picked_up(tmp_path):
+    clone = _instance(tmp_path, "Pie64_1", root="../Pie64/Root.vhd")
+    assert disk_topology.resolve(clone).root_vhd is None
+    _instance(tmp_path, "Pie64", own_root=True)
+    assert disk_topology.resolve(clone).root_vhd is not None
@@ -0,0 +1,97 @@
+"""Tests for the change-driven status refresh: what fs_watch maps a changed path
+to, the stat-snapshot fallback, the idle back-off, and StatusWatcher's debounce."""
+import os
+
+import constants
+import fs_watch
+from views.status_watcher import StatusWatcher
+
+
+def _installation(tmp_path, *instances):
+    data = tmp_path / "Engine"
+    for name in instances:
+        (data / name).mkdir(parents=True)
+        (data / name / "Android.bstk").write_text("<bstk/>")
+    conf = tmp_path / "bluestacks.conf"
+    conf.write_text('bst.instance.Pie64.enable_root_access="0"\n')
+    install = tmp_path / "Program"
+    install.mkdir()
+    (install / fs_watch.ENGINE_BINARY).write_bytes(b"MZ")
+    return {"source": "Normal", "data_path": str(data), "config_path": str(conf),
+            "install_path": str(install), "patch_mode": True}
+
+
+def test_paths_map_back_to_their_target(tmp_path):
+    inst = _installation(tmp_path, "Pie64")
+    plan = fs_watch.WatchPlan([inst])
+    pie = os.path.join(inst["data_path"], "Pie64")
+
+    assert plan.target_of(os.path.join(pie, "Android.bstk")) == \
+        fs_watch.Target(fs_watch.SCOPE_INSTANCE, pie)
+    assert plan.target_of(inst["config_path"]).scope == fs_watch.SCOPE_INSTALLATION
+    assert plan.target_of(inst["data_path"]).scope == fs_watch.SCOPE_INSTALLATION
+    assert plan.target_of(os.path.join(inst["install_path"], fs_watch.ENGINE_BINARY)) == \
+        fs_watch.Target(fs_watch.SCOPE_ENGINE, inst["install_path"])
+    assert plan.target_of(str(tmp_path / "elsewhere.txt")) is None
+
+
+def test_engine_binary_is_only_watched_for_patch_mode_builds(tmp_path):
+    inst = dict(_installation(tmp_path, "Pie64"), patch_mode=False)
+    plan = fs_watch.WatchPlan([inst])
+    assert not any(p.endswith(fs_watch.ENGINE_BINARY) for p in plan.paths())
+
+
+def test_snapshot_diff_names_the_changed_instance(tmp_path):
+    inst = _installation(tmp_path, "Pie64", "Rvc64")
+    plan = fs_watch.WatchPlan([inst])
+    before = plan.snapshot()
+    bstk = os.path.join(inst["data_path"], "Rvc64", "Android.bstk")
+    with open(bstk, "a") as fh:
+        fh.write("<!-- Type=Readonly -->")
+
+    changed = fs_watch.changed_paths(before, plan.snapshot())
+    assert {plan.target_of(p) for p in changed} == {
+        fs_watch.Target(fs_watch.SCOPE_INSTANCE, os.path.join(inst["data_path"], "Rvc64"))}
+
+
+def test_new_instance_is_an_installation_change(tmp_path):
+    inst = _installation(tmp_path, "Pie64")
+    plan = fs_watch.WatchPlan([inst])
+    before = plan.snapshot()
+    (tmp_path / "Engine" / "Pie64_1").mkdir()
+
+    changed = fs_watch.changed_paths(before, plan.snapshot())
+    assert {plan.target_of(p).scope for p in changed} == {fs_watch.SCOPE_INSTALLATION}
+
+
+def test_unchanged_tree_has_no_changes(tmp_path):
+    plan = fs_watch.WatchPlan([_installation(tmp_path, "Pie64")])
+    assert fs_watch.changed_paths(plan.snapshot(), plan.snapshot()) == set()
+
+
+def test_backoff_doubles_to_the_cap_and_stretches_when_minimized():
+    b = fs_watch.Backoff(1000, 5000)
+    assert [b.idle(), b.idle(), b.idle(), b.idle()] == [2000, 4000, 5000, 5000]
+    b.minimized = True
+    assert b.interval() == 5000 * constants.WATCH_MINIMIZED_FACTOR
+    assert b.reset() == 1000 * constants.WATCH_MINIMIZED_FACTOR
+
+
+def test_watcher_debounces_a_burst_into_one_signal(qtbot, tmp_path):
+    inst = _installation(tmp_path, "Pie64")
+    watcher = StatusWatcher()
+    watcher.watch([inst])
+    watcher.start()
+    pie = os.path.join(inst["data_path"], "Pie64")
+    seen = []
+    watcher.changed.connect(seen.append)
+
+    for _ in range(3):
+        watcher._on_native(os.path.join(pie, "Android.bstk"))
+    watcher._on_native(inst["config_path"])
+    qtbot.waitUntil(lambda: bool(seen), timeout=constants.WATCH_DEBOUNCE_MS * 5)
+    qtbot.wait(constants.WATCH_DEBOUNCE_MS * 2)
+
+    assert seen == [{fs_watch.Target(fs_watch.SCOPE_INSTANCE, pie),
+                     fs_watch.Target(fs_watch.SCOPE_INSTALLATION, inst["data_path"])}]
+    watcher.stop()
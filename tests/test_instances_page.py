@@ -1,10 +1,14 @@
 from PyQt5.QtCore import Qt
-from PyQt5.QtWidgets import QLabel
 
 import constants
+from views.instances_model import COL_MAGISK, COL_NAME, COL_ROOT, COL_RW, STATE_ROLE
 from views.instances_page import InstancesPage
 
 
+def _cell(page, uid, col, role=Qt.DisplayRole):
+    return page.model.index(page.model.row_of(uid), col).data(role)
+
+
 def test_banner_hidden_by_default(qtbot):
     page = InstancesPage()
     qtbot.addWidget(page)
@@ -30,7 +34,7 @@ def test_set_instances_creates_one_row_per_instance(qtbot):
         "MSI_Pie (MSI)": {"root_enabled": False, "rw_mode": constants.MODE_READONLY},
     }
     page.set_instances(data)
-    assert set(page.checkboxes.keys()) == {"Pie64 (Normal)", "MSI_Pie (MSI)"}
+    assert set(page.model.ids()) == {"Pie64 (Normal)", "MSI_Pie (MSI)"}
 
 
 def test_selected_ids_reflects_checked_boxes(qtbot):
@@ -39,7 +43,7 @@ def test_selected_ids_reflects_checked_boxes(qtbot):
     page.show()
     data = {"Pie64 (Normal)": {"root_enabled": True, "rw_mode": constants.MODE_READWRITE}}
     page.set_instances(data)
-    page.checkboxes["Pie64 (Normal)"].setChecked(True)
+    page.set_ticked("Pie64 (Normal)")
     assert page.selected_ids() == ["Pie64 (Normal)"]
 
 
@@ -49,10 +53,10 @@ def test_set_instances_preserves_selection_across_refresh(qtbot):
     page.show()
     data = {"Pie64 (Normal)": {"root_enabled": True, "rw_mode": constants.MODE_READWRITE}}
     page.set_instances(data)
-    page.checkboxes["Pie64 (Normal)"].setChecked(True)
+    page.set_ticked("Pie64 (Normal)")
 
     page.set_instances(data, preserve_selection=True)
-    assert page.checkboxes["Pie64 (Normal)"].isChecked() is True
+    assert page.selected_ids() == ["Pie64 (Normal)"]
 
 
 def test_set_instances_can_clear_selection(qtbot):
@@ -61,10 +65,10 @@ def test_set_instances_can_clear_selection(qtbot):
     page.show()
     data = {"Pie64 (Normal)": {"root_enabled": True, "rw_mode": constants.MODE_READWRITE}}
     page.set_instances(data)
-    page.checkboxes["Pie64 (Normal)"].setChecked(True)
+    page.set_ticked("Pie64 (Normal)")
 
     page.set_instances(data, preserve_selection=False)
-    assert page.checkboxes["Pie64 (Normal)"].isChecked() is False
+    assert page.selected_ids() == []
 
 
 def test_clicking_toggle_root_emits_signal(qtbot):
@@ -73,7 +77,7 @@ def test_clicking_toggle_root_emits_signal(qtbot):
     page.show()
     page.set_instances({"Pie64 (Normal)": {"root_enabled": False,
                                            "rw_mode": constants.MODE_READONLY}})
-    page.checkboxes["Pie64 (Normal)"].setChecked(True)
+    page.set_ticked("Pie64 (Normal)")
     with qtbot.waitSignal(page.toggle_root_requested, timeout=1000):
         qtbot.mouseClick(page.root_toggle_button, Qt.LeftButton)
 
@@ -106,13 +110,13 @@ def test_row_leads_with_the_engine_name_not_the_display_name(qtbot):
     }
     page.set_instances(data)
 
-    assert "Nougat64" in page.checkboxes["Nougat64 (Normal)"].text()
-    assert "Main Farm Bot" in page.checkboxes["Nougat64 (Normal)"].text()
-    assert page.checkboxes["Tiramisu64 (Normal)"].text() == "Tiramisu64"
-    assert "BlueStacks App Player" not in page.checkboxes["Tiramisu64 (Normal)"].text()
-    assert page.checkboxes["Pie64 (Normal)"].text() == "Pie64"
+    assert "Nougat64" in _cell(page, "Nougat64 (Normal)", COL_NAME)
+    assert "Main Farm Bot" in _cell(page, "Nougat64 (Normal)", COL_NAME)
+    assert _cell(page, "Tiramisu64 (Normal)", COL_NAME) == "Tiramisu64"
+    assert "BlueStacks App Player" not in _cell(page, "Tiramisu64 (Normal)", COL_NAME)
+    assert _cell(page, "Pie64 (Normal)", COL_NAME) == "Pie64"
     # the technical id stays reachable on hover
-    assert page.checkboxes["Pie64 (Normal)"].toolTip() == "Pie64 (Normal)"
+    assert _cell(page, "Pie64 (Normal)", COL_NAME, Qt.ToolTipRole) == "Pie64 (Normal)"
 
 
 def test_the_name_is_not_printed_twice(qtbot):
@@ -123,8 +127,7 @@ def test_the_name_is_not_printed_twice(qtbot):
     page.set_instances({"Tiramisu64 (Normal)": {
         "root_enabled": True, "rw_mode": constants.MODE_READWRITE,
         "display_name": "Tiramisu64"}})
-    texts = [w.text() for i in range(page.instance_layout.count())
-             if isinstance((w := page.instance_layout.itemAt(i).widget()), QLabel)]
+    texts = [_cell(page, "Tiramisu64 (Normal)", col) for col in (COL_ROOT, COL_RW, COL_MAGISK)]
     assert not any("Tiramisu64" in t for t in texts), texts
 
 
@@ -139,41 +142,48 @@ def test_root_state_is_themed_by_object_name_not_a_hardcoded_colour(qtbot):
     }
     page.set_instances(data)
 
-    names = {
-        w.objectName() for i in range(page.instance_layout.count())
-        if isinstance((w := page.instance_layout.itemAt(i).widget()), QLabel)
-    }
-    assert {"RootOn", "RootOff", "InstanceHeader"} <= names
-    styled = [w for i in range(page.instance_layout.count())
-              if isinstance((w := page.instance_layout.itemAt(i).widget()), QLabel)
-              and w.styleSheet()]
-    assert styled == [], "state colours belong in the theme QSS, not inline"
+    states = {_cell(page, uid, col, STATE_ROLE)
+              for uid in data for col in (COL_ROOT, COL_RW, COL_MAGISK)}
+    assert states == {"RootOn", "RootOff", "RwState"}
+    # The colours themselves come from the theme QSS via the view's properties.
+    assert page.table.styleSheet() == ""
 
 
 def test_both_themes_style_the_root_state(qtbot):
     from views import theme
     for name in (theme.LIGHT, theme.DARK):
         qss = theme.stylesheet_for(name)
-        for obj in ("InstanceHeader", "RootOn", "RootOff", "RwState"):
-            assert obj in qss, (name, obj)
+        for part in ("InstanceGrid", "QHeaderView::section",
+                     "qproperty-rootOnColor", "qproperty-mutedColor"):
+            assert part in qss, (name, part)
 
 
-def test_set_instances_refresh_does_not_leak_widgets(qtbot):
+def test_set_instances_refresh_keeps_rows_that_did_not_change(qtbot):
     page = InstancesPage()
     qtbot.addWidget(page)
     page.show()
-    data = {"Pie64 (Normal)": {"root_enabled": True, "rw_mode": constants.MODE_READWRITE}}
+    data = {"Pie64 (Normal)": {"root_enabled": True, "rw_mode": constants.MODE_READWRITE},
+            "Rvc64 (Normal)": {"root_enabled": True, "rw_mode": constants.MODE_READWRITE}}
     page.set_instances(data)
-    count_after_first = page.instance_layout.count()
+    events = []
+    page.model.rowsInserted.connect(lambda *a: events.append("insert"))
+    page.model.rowsRemoved.connect(lambda *a: events.append("remove"))
+    page.model.modelReset.connect(lambda: events.append("reset"))
+    page.model.dataChanged.connect(lambda tl, br: events.append(tl.row()))
 
     page.set_instances(data)
-    assert page.instance_layout.count() == count_after_first
+    assert events == []
+    page.set_instances({**data, "Rvc64 (Normal)": {"root_enabled": False,
+                                                   "rw_mode": constants.MODE_READWRITE}})
+    assert events == [page.model.row_of("Rvc64 (Normal)")]
+    page.set_instances({"Rvc64 (Normal)": data["Rvc64 (Normal)"]})
+    assert events[1:] == ["remove", 0]
 
 
 def _one_ticked(page, uid="Pie64 (Normal)"):
     page.set_instances({uid: {"root_enabled": False,
                               "rw_mode": constants.MODE_READONLY}})
-    page.checkboxes[uid].setChecked(True)
+    page.set_ticked(uid)
 
 
 def test_launch_and_restart_buttons_emit_signals(qtbot):
@@ -199,11 +209,28 @@ def test_actions_are_disabled_until_something_is_ticked(qtbot):
     assert page.launch_button.isEnabled() is False
     assert "tick one instance" in page.hint_label.text().lower()
 
-    page.checkboxes["Pie64 (Normal)"].setChecked(True)
+    page.set_ticked("Pie64 (Normal)")
     assert page.root_toggle_button.isEnabled() is True
     assert page.launch_button.isEnabled() is True
 
 
+def test_several_ticks_offer_one_fleet_install_and_nothing_else(qtbot):
+    page = InstancesPage()
+    qtbot.addWidget(page)
+    page.show()
+    rows = {uid: {"root_enabled": False, "rw_mode": constants.MODE_READONLY}
+            for uid in ("Pie64 (Normal)", "Pie64_1 (Normal)")}
+    page.set_instances(rows)
+    for uid in rows:
+        page.set_ticked(uid)
+    assert page.install_button.isVisible() and page.install_button.isEnabled()
+    assert not page.uninstall_button.isVisible() and not page.launch_button.isEnabled()
+    assert "every ticked instance" in page.hint_label.text()
+
+    page.set_magisk_statuses({"Pie64_1 (Normal)": {"components": ["system"]}})
+    assert not page.install_button.isVisible(), "one of them already has Magisk"
+
+
 def test_root_column_names_the_method_in_use(qtbot):
     """The whole reason the pages merged: app root and Magisk are alternatives,
     so a single column has to say which one an instance is using."""
@@ -220,8 +247,7 @@ def test_root_column_names_the_method_in_use(qtbot):
         "MagiskRooted (Normal)": {"magisk": True, "components": ["system"]},
         "Both (Normal)": {"magisk": True, "components": ["system"]},
     })
-    texts = [w.text() for i in range(page.instance_layout.count())
-             if isinstance((w := page.instance_layout.itemAt(i).widget()), QLabel)]
+    texts = [_cell(page, uid, COL_ROOT) for uid in page.model.ids()]
     assert "App" in texts
     assert "Magisk" in texts
     assert "App + Magisk" in texts      # the conflicting state is named
@@ -236,6 +262,59 @@ def test_conflicting_root_methods_are_called_out(qtbot):
                                           "rw_mode": constants.MODE_READONLY}})
     page.set_magisk_statuses({"Both (Normal)": {"magisk": True,
                                                 "components": ["system"]}})
-    page.checkboxes["Both (Normal)"].setChecked(True)
+    page.set_ticked("Both (Normal)")
     hint = page.hint_label.text().lower()
     assert "both provide su" in hint and "turn app root off" in hint
+
+
+def test_reverted_su_is_shown_instead_of_plain_off(qtbot):
+    page = InstancesPage()
+    qtbot.addWidget(page)
+    page.show()
+    page.set_instances({"Pie64 (Normal)": {"root_enabled": False, "su_state": "original",
+                                           "rw_mode": constants.MODE_READONLY}})
+    assert _cell(page, "Pie64 (Normal)", COL_ROOT) == "Reverted"
+    page.set_ticked("Pie64 (Normal)")
+    assert "no longer patched" in page.hint_label.text()
+
+
+def test_update_rows_repaints_in_place_and_keeps_ticks(qtbot):
+    page = InstancesPage()
+    qtbot.addWidget(page)
+    page.show()
+    page.set_instances({"Pie64 (Normal)": {"root_enabled": False,
+                                           "rw_mode": constants.MODE_READONLY}})
+    page.set_ticked("Pie64 (Normal)")
+
+    page.update_rows({"Pie64 (Normal)": {"root_enabled": True,
+                                         "rw_mode": constants.MODE_READWRITE}})
+    assert page.selected_ids() == ["Pie64 (Normal)"]
+    assert _cell(page, "Pie64 (Normal)", COL_ROOT) == "App"
+    assert _cell(page, "Pie64 (Normal)", COL_ROOT, STATE_ROLE) == "RootOn"
+    assert _cell(page, "Pie64 (Normal)", COL_RW) == "On"
+
+
+def test_clicking_a_name_ticks_the_instance(qtbot):
+    page = InstancesPage()
+    qtbot.addWidget(page)
+    page.show()
+    page.set_instances({"Pie64 (Normal)": {"root_enabled": False,
+                                           "rw_mode": constants.MODE_READONLY}})
+    rect = page.table.visualRect(page.model.index(0, COL_NAME))
+    qtbot.mouseClick(page.table.viewport(), Qt.LeftButton, pos=rect.center())
+    assert page.selected_ids() == ["Pie64 (Normal)"]
+    qtbot.mouseClick(page.table.viewport(), Qt.LeftButton, pos=rect.center())
+    assert page.selected_ids() == []
+
+
+def test_theme_colours_reach_the_view(qtbot, qapp):
+    from views import theme
+    page = InstancesPage()
+    qtbot.addWidget(page)
+    qapp.setStyleSheet(theme.stylesheet_for(theme.DARK))
+    try:
+        page.show()
+        page.table.ensurePolished()
+        assert page.table.rootOnColor.name() == "#6ccb5f"
+    finally:
+        qapp.setStyleSheet("")
@@ -0,0 +1,388 @@
+"""Tests for the engine patch locators and the patch-state checks (integrity_patch).
+
+``_build_pe`` makes a minimal PE32+ with a ``.text`` holding the
+_isDiskVerificationRequired prologue + a ``lea rcx, [rip+rel32]`` to an
+``unlock_player.bin`` string in ``.rdata`` -- exactly what ``UNLOCK_PLAYER``'s
+locator walks -- padded to any size so scans cost what they do on a real binary.
+"""
+import hashlib
+import os
+import struct
+
+import pytest
+
+import integrity_patch as ip
+
+_TEXT_RAW, _TEXT_VA = 0x400, 0x1000
+_FUNC = 0x40                      # prologue offset inside .text
+_IMAGE_BASE = 0x140000000
+
+
+def _build_pe(pad_to: int = 0x4000, filler: bytes = b"\xCC") -> bytearray:
+    rdata_raw = max(0x2000, pad_to - 0x1000)
+    rdata_va = 0x1000 + ((rdata_raw - _TEXT_RAW + 0xFFF) & ~0xFFF)
+    total = rdata_raw + 0x1000
+    b = bytearray(filler * total)
+    b[0:2] = b"MZ"
+    struct.pack_into("<I", b, 0x3C, 0x40)
+    b[0x40:0x44] = b"PE\x00\x00"
+    coff = 0x44
+    struct.pack_into("<HH", b, coff, 0x8664, 2)           # machine, sections
+    struct.pack_into("<H", b, coff + 16, 0xF0)            # SizeOfOptionalHeader
+    opt = coff + 20
+    struct.pack_into("<H", b, opt, 0x20B)                 # PE32+
+    struct.pack_into("<Q", b, opt + 24, _IMAGE_BASE)
+    sec = opt + 0xF0
+    b[sec:sec + 80] = bytes(80)
+    b[sec:sec + 8] = b".text\x00\x00\x00"
+    struct.pack_into("<IIII", b, sec + 8, rdata_raw - _TEXT_RAW, _TEXT_VA,
+                     rdata_raw - _TEXT_RAW, _TEXT_RAW)
+    struct.pack_into("<I", b, sec + 36, 0x60000020)       # code | exec | read
+    b[sec + 40:sec + 48] = b".rdata\x00\x00"
+    struct.pack_into("<IIII", b, sec + 48, 0x1000, rdata_va, 0x1000, rdata_raw)
+    struct.pack_into("<I", b, sec + 76, 0x40000040)       # initialized data | read
+
+    s_off = rdata_raw + 0x10
+    b[s_off:s_off + 18] = b"unlock_player.bin\x00"
+    f = _TEXT_RAW + _FUNC
+    b[f:f + 15] = ip._ISDVR_PROLOGUE
+    lea = f + 0x20
+    rel = (rdata_va + 0x10) - (_TEXT_VA + (lea - _TEXT_RAW) + 7)
+    b[lea:lea + 3] = b"\x48\x8D\x0D"
+    struct.pack_into("<i", b, lea + 3, rel)
+    return b
+
+
+def _write(tmp_path, data, name="HD-Player.exe"):
+    p = tmp_path / name
+    p.write_bytes(bytes(data))
+    return str(p)
+
+
+@pytest.fixture(autouse=True)
+def _fresh_memo():
+    ip.clear_state_cache()
+    yield
+    ip.clear_state_cache()
+
+
+def test_locate_isdiskverify_finds_the_prologue_on_patched_and_clean():
+    data = _build_pe()
+    assert ip._locate_isdiskverify(bytes(data)) == [_TEXT_RAW + _FUNC]
+    data[_TEXT_RAW + _FUNC:_TEXT_RAW + _FUNC + 3] = ip.UNLOCK_PLAYER.patch_bytes
+    assert ip._locate_isdiskverify(bytes(data)) == [_TEXT_RAW + _FUNC]
+
+
+def test_is_file_patched_reports_both_states(tmp_path):
+    path = _write(tmp_path, _build_pe())
+    assert ip.is_file_patched(path, ip.UNLOCK_PLAYER) is False
+    assert ip.patch_file(path, specs=[ip.UNLOCK_PLAYER], make_backup=False)
+    assert ip.is_file_patched(path, ip.UNLOCK_PLAYER) is True
+
+
+def test_repeat_check_of_an_unchanged_binary_skips_the_locate(tmp_path):
+    path = _write(tmp_path, _build_pe())
+    calls = []
+    spec = ip.PatchSpec(name="counted", locator=lambda d: calls.append(1) or ip._locate_isdiskverify(d),
+                        patch_offset=0, expect_bytes=ip.UNLOCK_PLAYER.expect_bytes,
+                        patch_bytes=ip.UNLOCK_PLAYER.patch_bytes)
+    for _ in range(3):
+        assert ip.is_file_patched(path, spec) is False
+    assert calls == [1]
+
+
+def test_memo_misses_when_the_file_identity_changes(tmp_path):
+    path = _write(tmp_path, _build_pe())
+    assert ip.is_file_patched(path, ip.UNLOCK_PLAYER) is False
+    ip.patch_file(path, specs=[ip.UNLOCK_PLAYER], make_backup=False)
+    assert ip.is_file_patched(path, ip.UNLOCK_PLAYER) is True
+    # A "BlueStacks update": a different build, the function moved.
+    moved = _build_pe(pad_to=0x8000)
+    moved[_TEXT_RAW + _FUNC:_TEXT_RAW + _FUNC + 15] = b"\xCC" * 15
+    moved[_TEXT_RAW + 0x200:_TEXT_RAW + 0x200 + 15] = ip._ISDVR_PROLOGUE
+    _write(tmp_path, moved)
+    assert ip.is_file_patched(path, ip.UNLOCK_PLAYER) is None  # lea no longer in range
+
+
+def test_memo_hit_with_foreign_bytes_relocates(tmp_path):
+    path = _write(tmp_path, _build_pe())
+    assert ip.is_file_patched(path, ip.UNLOCK_PLAYER) is False
+    ident = ip._offset_memo.identity(path)
+    ip._offset_memo.put(path, ip.UNLOCK_PLAYER, ident, 0x10)   # a stale, wrong site
+    assert ip.is_file_patched(path, ip.UNLOCK_PLAYER) is False
+    assert ip._offset_memo.get(path, ip.UNLOCK_PLAYER, ident) == _TEXT_RAW + _FUNC
+
+
+def test_missing_file_is_indeterminate(tmp_path):
+    assert ip.is_file_patched(str(tmp_path / "nope.exe"), ip.UNLOCK_PLAYER) is None
+
+
+
+def test_patch_file_writes_only_the_site_and_keeps_a_backup(tmp_path):
+    original = bytes(_build_pe())
+    path = _write(tmp_path, original)
+    ino = ip._offset_memo.identity(path)[3]
+    assert ip.patch_file(path, specs=[ip.UNLOCK_PLAYER])
+    site = _TEXT_RAW + _FUNC
+    after = open(path, "rb").read()
+    assert after[site:site + 3] == ip.UNLOCK_PLAYER.patch_bytes
+    assert after[:site] == original[:site] and after[site + 3:] == original[site + 3:]
+    assert ip._offset_memo.identity(path)[3] == ino          # same file, not rewritten
+    assert ip._read_backup_ref(path)["original"] == hashlib.sha256(original).hexdigest()
+    assert not (tmp_path / ("HD-Player.exe" + ip.JOURNAL_SUFFIX)).exists()
+    assert ip.patch_file(path, specs=[ip.UNLOCK_PLAYER]) is False
+
+
+def test_interrupted_patch_is_rolled_back_from_the_journal(tmp_path):
+    original = bytes(_build_pe())
+    path = _write(tmp_path, original)
+    site = _TEXT_RAW + _FUNC
+    edit = (site, original[site:site + 3], ip.UNLOCK_PLAYER.patch_bytes)
+    ip._write_journal(path, len(original), [edit])
+    ip._write_ranges(path, [edit])                            # "crash" before cleanup
+    assert ip.recover_journal(path)
+    assert open(path, "rb").read() == original
+    assert ip.recover_journal(path) is False                  # journal consumed
+    assert ip.patch_file(path, specs=[ip.UNLOCK_PLAYER], make_backup=False)
+
+
+def test_journal_for_a_replaced_binary_is_discarded(tmp_path):
+    path = _write(tmp_path, _build_pe())
+    ip._write_journal(path, 123, [(0x10, b"\x00", b"\x01")])
+    replaced = open(path, "rb").read()
+    assert ip.recover_journal(path)
+    assert open(path, "rb").read() == replaced
+
+
+def test_write_ranges_refuses_foreign_bytes(tmp_path):
+    path = _write(tmp_path, _build_pe())
+    site = _TEXT_RAW + _FUNC
+    with pytest.raises(RuntimeError, match="changed at"):
+        ip._write_ranges(path, [(site + 3, b"\xE8", b"\x90")])
+    assert open(path, "rb").read() == bytes(_build_pe())
+
+
+_EXTRA = ip.PatchSpec(name="extra", signature=[0x4D, 0x5A], patch_offset=0,
+                      expect_bytes=b"MZ", patch_bytes=b"MX")
+
+
+def test_installation_plan_merges_extra_specs_per_binary(tmp_path):
+    _write(tmp_path, _build_pe(), "HD-Player.exe")
+    _write(tmp_path, _build_pe(), "HD-MultiInstanceManager.exe")
+    plan = ip.installation_plan(str(tmp_path), extra={"HD-MultiInstanceManager.exe": [_EXTRA]})
+    assert [os.path.basename(p) for p in plan] == ["HD-Player.exe", "HD-MultiInstanceManager.exe"]
+    player, mim = plan.values()
+    assert player == [ip.UNLOCK_PLAYER, ip.DISK_INTEGRITY_CALL]
+    assert mim == [ip.DISK_INTEGRITY_CALL, _EXTRA]
+
+
+def test_one_pass_applies_every_spec_of_a_binary_with_one_write(tmp_path, monkeypatch):
+    original = bytes(_build_pe())
+    path = _write(tmp_path, original)
+    writes = []
+    real = ip._write_ranges
+    monkeypatch.setattr(ip, "_write_ranges",
+                        lambda p, edits: writes.append(len(edits)) or real(p, edits))
+    lines = ip.patch_many({path: [ip.UNLOCK_PLAYER, _EXTRA]})
+    assert lines == ["HD-Player.exe: patched"] and writes == [2]
+    after = open(path, "rb").read()
+    assert after[:2] == b"MX" and after[_TEXT_RAW + _FUNC:_TEXT_RAW + _FUNC + 3] == b"\x31\xC0\xC3"
+    # The recorded patched-build hash (spliced, not re-read) matches the file.
+    assert ip._read_backup_ref(path) == {"original": hashlib.sha256(original).hexdigest(),
+                                         "patched": ip._sha256(path)}
+
+
+def test_patch_many_reports_every_binary_in_order_and_isolates_errors(tmp_path):
+    good = [_write(tmp_path, _build_pe(), "b%d.exe" % i) for i in range(3)]
+    bad = _write(tmp_path, bytes(_build_pe()) * 2, "dup.exe")   # ambiguous signature
+    plan = {p: [_EXTRA] for p in good[:2] + [bad] + good[2:]}
+    lines = ip.patch_many(plan, max_workers=4)
+    assert lines[:2] == ["b0.exe: patched", "b1.exe: patched"]
+    assert lines[2].startswith("dup.exe: ERROR") and "refusing" in lines[2]
+    assert lines[3] == "b2.exe: patched"
+    assert ip.patch_many(plan, restore=True)[0] == "b0.exe: restored"
+
+
+def test_installs_of_one_build_share_a_backup_and_restore_verifies(tmp_path):
+    original = bytes(_build_pe())
+    sha = hashlib.sha256(original).hexdigest()
+    (tmp_path / "nxt").mkdir()
+    (tmp_path / "msi").mkdir()
+    nxt, msi = _write(tmp_path / "nxt", original), _write(tmp_path / "msi", original)
+    assert ip.patch_many({nxt: [ip.UNLOCK_PLAYER], msi: [ip.UNLOCK_PLAYER]}) == \
+        ["HD-Player.exe: patched", "HD-Player.exe: patched"]
+    store = ip.backup_store.store()
+    assert os.listdir(os.path.dirname(store.object_path(sha))) == [sha + ".z"]
+    assert os.path.getsize(store.object_path(sha)) < len(original)
+    assert ip.restore_file(nxt) and open(nxt, "rb").read() == original
+    assert ip.restore_file(nxt)                               # already original: no-op
+
+    with open(store.object_path(sha), "r+b") as fh:          # damage the object
+        fh.seek(20)
+        fh.write(b"\x00" * 8)
+    patched = open(msi, "rb").read()
+    with pytest.raises(RuntimeError, match="damaged"):
+        ip.restore_file(msi)
+    assert open(msi, "rb").read() == patched                  # left untouched
+
+
+def test_restore_refuses_a_binary_updated_since_the_patch(tmp_path):
+    path = _write(tmp_path, _build_pe())
+    assert ip.patch_file(path, specs=[ip.UNLOCK_PLAYER])
+    newer = _build_pe(pad_to=0x8000)
+    _write(tmp_path, newer)
+    assert ip.restore_file(path) is False
+    assert open(path, "rb").read() == bytes(newer)
+
+
+def test_legacy_prepatch_bak_is_migrated_into_the_store(tmp_path):
+    original = bytes(_build_pe())
+    path = _write(tmp_path, original)
+    ip.patch_file(path, specs=[ip.UNLOCK_PLAYER], make_backup=False)
+    (tmp_path / "HD-Player.exe.prepatch.bak").write_bytes(original)
+    (tmp_path / "HD-Player.exe.prepatch.bak.sha256").write_text(ip._sha256(path))
+    assert ip.restore_file(path)
+    assert open(path, "rb").read() == original
+    assert not (tmp_path / "HD-Player.exe.prepatch.bak").exists()
+    assert ip.backup_store.store().has(hashlib.sha256(original).hexdigest())
+
+def _counting(spec, calls):
+    return ip.PatchSpec(name=spec.name, patch_offset=spec.patch_offset,
+                        expect_bytes=spec.expect_bytes, patch_bytes=spec.patch_bytes,
+                        locator=lambda d: calls.append(1) or spec.locator(d))
+
+
+def test_offset_db_lets_a_known_build_skip_the_locator(tmp_path):
+    calls = []
+    spec = _counting(ip.UNLOCK_PLAYER, calls)
+    a = _write(tmp_path, _build_pe(), "a.exe")
+    b = _write(tmp_path, _build_pe(), "b.exe")   # same build, another file
+    assert ip.is_file_patched(a, spec) is False
+    assert ip.is_file_patched(b, spec) is False
+    assert calls == [1]
+
+
+def test_patch_file_records_the_patched_build_too(tmp_path):
+    calls = []
+    spec = _counting(ip.UNLOCK_PLAYER, calls)
+    path = _write(tmp_path, _build_pe())
+    assert ip.patch_file(path, specs=[spec], make_backup=False)
+    ip.clear_state_cache()
+    assert ip.is_file_patched(path, spec) is True
+    assert calls == [1]
+
+
+def test_offset_db_entry_for_changed_spec_bytes_is_ignored(tmp_path):
+    path = _write(tmp_path, _build_pe())
+    ip.is_file_patched(path, ip.UNLOCK_PLAYER)
+    sha = ip._sha256(path)
+    other = ip.PatchSpec(name=ip.UNLOCK_PLAYER.name, patch_offset=0,
+                         expect_bytes=b"\x48", patch_bytes=b"\xC3")
+    assert ip.offset_db().lookup(sha, ip.UNLOCK_PLAYER) == _TEXT_RAW + _FUNC
+    assert ip.offset_db().lookup(sha, other) is None
+
+
+def test_offset_db_export_import_roundtrip(tmp_path):
+    path = _write(tmp_path, _build_pe())
+    ip.is_file_patched(path, ip.UNLOCK_PLAYER)
+    exported = tmp_path / "offsets.json"
+    assert ip.offset_db().export_to(str(exported)) == 1
+
+    fresh = ip.PatchOffsetDB(str(tmp_path / "other-host" / "patch_offsets.json"))
+    assert fresh.import_from(str(exported)) == 1
+    assert fresh.import_from(str(exported)) == 0      # idempotent
+    again = ip.PatchOffsetDB(fresh.path)              # persisted
+    assert again.lookup(ip._sha256(path), ip.UNLOCK_PLAYER) == _TEXT_RAW + _FUNC
+
+
+def test_offset_db_tolerates_a_corrupt_file(tmp_path):
+    db_path = tmp_path / "db.json"
+    db_path.write_text("{not json")
+    db = ip.PatchOffsetDB(str(db_path))
+    assert db.lookup("00" * 32, ip.UNLOCK_PLAYER) is None
+    db.record("00" * 32, ip.UNLOCK_PLAYER, 0x40)
+    assert ip.PatchOffsetDB(str(db_path)).lookup("00" * 32, ip.UNLOCK_PLAYER) == 0x40
+
+
+def _naive_find(data, sig):
+    n = len(sig)
+    return [i for i in range(len(data) - n + 1)
+            if all(b is None or data[i + k] == b for k, b in enumerate(sig))]
+
+
+@pytest.mark.parametrize("sig", [
+    ip.DISK_INTEGRITY_CALL.signature,
+    [0x4C, 0x8D, None, 0x4C],                 # self-overlapping
+    [0x0A, None, 0x0A],                       # newline bytes + wildcard (DOTALL)
+    [0x5C, 0x2E, None, 0x2A],                 # regex metacharacters '\\', '.', '*'
+])
+def test_find_signature_matches_a_byte_by_byte_scan(sig):
+    import random
+    rng = random.Random(1)
+    data = bytearray(rng.choice(b"\x0A\x2A\x2E\x32\x4C\x5C\x8D\xDB") for _ in range(20000))
+    for at in (0, 5000, 5003, len(data) - len(sig)):
+        data[at:at + len(sig)] = bytes(b if b is not None else 0x0A for b in sig)
+    assert ip._find_signature(bytes(data), sig) == _naive_find(data, sig)
+
+
+def test_find_signature_scans_a_real_size_pe_at_c_speed():
+    """Benchmark shape: a 40 MB image dense in the signature's first byte (0x32,
+    as in real x64 code) with two planted call sites."""
+    import time
+    sig = ip.DISK_INTEGRITY_CALL.signature
+    data = bytearray(b"\x32\xDB\x88\x5C\x24\x41" * (40 * 1024 * 1024 // 6))
+    site = bytes([0x32, 0xDB, 0x88, 0x5C, 0x24, 0x40, 0xE8, 1, 2, 3, 4, 0x84, 0xC0, 0x74])
+    data[1_000_002:1_000_016] = site
+    data[30_000_000:30_000_014] = site
+    t0 = time.perf_counter()
+    hits = ip._find_signature(bytes(data), sig)
+    elapsed = time.perf_counter() - t0
+    assert hits == [1_000_002, 30_000_000]
+    # The old per-candidate Python loop took tens of seconds here; allow a very
+    # generous ceiling so only a regression to Python-speed scanning trips it.
+    assert elapsed < 10, "signature scan took %.1fs" % elapsed
+
+
+def test_pe_image_sections_and_bisect_maps_agree_with_the_linear_map():
+    data = bytes(_build_pe(pad_to=0x9000))
+    pe = ip.PEImage(data)
+    assert [s.name for s in pe.sections] == [".text", ".rdata"]
+    text, rdata = pe.sections
+    assert text.executable and not text.readonly_data
+    assert rdata.readonly_data and not rdata.executable
+    _, raw = ip.pe_image_base_and_sections(data)
+    for off in (0, 0x3FF, 0x400, 0x1234, rdata.praw - 1, rdata.praw, rdata.praw + 0xFFF,
+                rdata.praw + 0x1000, len(data) + 5):
+        assert pe.offset_to_rva(off) == ip.file_offset_to_rva(raw, off)
+        rva = pe.offset_to_rva(off)
+        if rva is not None:
+            assert pe.rva_to_offset(rva) == off
+
+
+def test_pe_image_string_search_is_limited_to_readonly_data():
+    data = _build_pe()
+    # A decoy copy of the anchor string inside .text (code bytes that merely
+    # look like it) must not be taken as the string.
+    data[0x600:0x612] = b"unlock_player.bin\x00"
+    pe = ip.PEImage(bytes(data))
+    at = pe.find_string(b"unlock_player.bin\x00")
+    assert pe.sections[1].praw <= at < pe.sections[1].praw + pe.sections[1].sraw
+
+
+def test_pe_image_xrefs_cover_executable_sections_only():
+    data = _build_pe()
+    pe = ip.PEImage(bytes(data))
+    str_va = pe.string_va(b"unlock_player.bin\x00")
+    assert pe.xrefs.sites(str_va) == [_TEXT_RAW + _FUNC + 0x20]
+    # A lea-shaped byte run inside .rdata is data, not code.
+    rdata = pe.sections[1]
+    at = rdata.praw + 0x200
+    rel = str_va - (_IMAGE_BASE + rdata.va + 0x200 + 7)
+    data[at:at + 7] = b"\x48\x8D\x05" + struct.pack("<i", rel)
+    assert ip.PEImage(bytes(data)).xrefs.sites(str_va) == [_TEXT_RAW + _FUNC + 0x20]
+
+
+def test_pe_image_is_parsed_once_per_buffer():
+    data = bytes(_build_pe())
+    assert ip.pe_image(data) is ip.pe_image(data)
+    assert ip.pe_image(bytes(bytearray(data))) is not ip.pe_image(data)
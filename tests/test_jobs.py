@@ -0,0 +1,119 @@
+"""Tests for the batch job scheduler (jobs): per-disk locking, the shared
+BlueStacks shutdown, cancellation, and the results summary."""
+import threading
+
+import disk_topology
+import jobs
+
+
+def _job(target, locks=(), run=None, kind=jobs.KIND_ROOT, needs_shutdown=True):
+    return jobs.Job(kind, target, run or (lambda progress, cancelled: "ok"),
+                    frozenset(locks), needs_shutdown)
+
+
+def test_jobs_on_different_disks_run_side_by_side():
+    barrier = threading.Barrier(2, timeout=5)
+
+    def run(progress, cancelled):
+        barrier.wait()     # only returns once both jobs are running at once
+        return "ok"
+
+    batch = jobs.Batch([_job("A", {"a.vhd"}, run), _job("B", {"b.vhd"}, run)], max_workers=2)
+    assert [r.status for r in batch.run(lambda m, p: None)] == [jobs.DONE, jobs.DONE]
+
+
+def test_jobs_on_one_disk_run_one_at_a_time_in_order():
+    events = []
+    lock = threading.Lock()
+
+    def run_as(name):
+        def run(progress, cancelled):
+            with lock:
+                events.append(name + "+")
+            with lock:
+                events.append(name + "-")
+            return name
+        return run
+
+    batch = jobs.Batch([_job(n, {"root.vhd"}, run_as(n)) for n in "ABC"]
+                       + [_job("D", {"other.vhd"}, run_as("D"))], max_workers=3)
+    results = batch.run(lambda m, p: None)
+
+    shared = [e for e in events if e[0] in "ABC"]
+    assert shared == ["A+", "A-", "B+", "B-", "C+", "C-"]
+    assert [r.message for r in results] == ["A", "B", "C", "D"]
+
+
+def test_bluestacks_is_closed_once_per_batch():
+    closed = []
+    batch = jobs.Batch([_job(n, {n}) for n in "ABC"], shutdown=lambda: closed.append(1))
+    batch.run(lambda m, p: None)
+    assert closed == [1]
+
+    closed.clear()
+    jobs.Batch([_job("A", needs_shutdown=False)], shutdown=lambda: closed.append(1)).run(
+        lambda m, p: None)
+    assert closed == []
+
+
+def test_a_failed_job_does_not_stop_the_rest():
+    def boom(progress, cancelled):
+        raise OSError("disk is locked")
+
+    results = jobs.Batch([_job("A", {"x"}, boom), _job("B", {"x"})]).run(lambda m, p: None)
+    assert [r.status for r in results] == [jobs.FAILED, jobs.DONE]
+    summary = jobs.summarize(results)
+    assert "1 done" in summary and "1 failed" in summary and "A (disk is locked)" in summary
+
+
+def test_cancel_drops_the_jobs_that_have_not_started():
+    batch = None
+
+    def first(progress, cancelled):
+        batch.cancel()
+        assert cancelled()
+        raise jobs.Cancelled("stopped")
+
+    batch = jobs.Batch([_job("A", run=first), _job("B"), _job("C")], max_workers=1)
+    results = batch.run(lambda m, p: None)
+    assert [r.status for r in results] == [jobs.CANCELLED] * 3
+    assert results[0].message == "stopped"
+    assert "3 cancelled" in jobs.summarize(results)
+
+
+def test_cancelling_one_job_leaves_the_others():
+    batch = jobs.Batch([_job("A"), _job("B")], max_workers=1)
+    batch.cancel(1)
+    assert [r.status for r in batch.run(lambda m, p: None)] == [jobs.DONE, jobs.CANCELLED]
+
+
+def test_progress_names_the_job_and_counts_finished_ones():
+    seen = []
+    lock = threading.Lock()
+
+    def run(progress, cancelled):
+        progress("patching")
+        return "ok"
+
+    def progress(msg, pct):
+        with lock:
+            seen.append((msg, pct))
+
+    jobs.Batch([_job("Pie64 (Normal)", {"a"}, run), _job("Rvc64 (Normal)", {"a"}, run)],
+               shutdown=lambda: None).run(progress)
+    assert seen[0] == ("Closing BlueStacks...", 0)
+    assert ("Pie64 (Normal): Root on: patching", 0) in seen
+    assert ("Rvc64 (Normal): Root on: patching", 50) in seen
+
+
+def test_clones_lock_their_masters_root_vhd(tmp_path, monkeypatch):
+    master = str(tmp_path / "Pie64")
+    disks = {
+        master: disk_topology.InstanceDisks(master, master + "/Root.vhd", master + "/Data.vhdx", None),
+        "clone": disk_topology.InstanceDisks("clone", master + "/Root.vhd", "clone/Data.vhdx", None),
+    }
+    monkeypatch.setattr(disk_topology, "resolve", disks.__getitem__)
+    assert jobs.disk_locks(master, "root_vhd") == jobs.disk_locks("clone", "root_vhd")
+    assert jobs.disk_locks(master, "data_vhdx") != jobs.disk_locks("clone", "data_vhdx")
+    # No fastboot.vdi resolved: fall back to the instance folder.
+    assert jobs.disk_locks("clone", "fastboot") == jobs.instance_lock("clone")
@@ -11,6 +11,7 @@ from types import SimpleNamespace
 
 import pytest
 
+import cancellation
 import magisk_system as ms
 
 
@@ -302,7 +303,7 @@ def _stub_install(monkeypatch):
     """Make install() a no-op that just stamps the system+databin manifest, so
     update() can be tested without touching a real disk."""
     monkeypatch.setattr(ms, "install",
-                        lambda instance_dir, work_dir=None, progress=None:
+                        lambda instance_dir, work_dir=None, progress=None, cancel=None:
                         (ms._write_manifest(instance_dir, ["system", "databin"]),
                          ["installed"])[1])
 
@@ -373,6 +374,33 @@ def test_failed_rollback_keeps_the_manifest_for_the_half_installed_warning(tmp_p
     assert ms.magisk_status(str(tmp_path)) is not None
 
 
+def test_cancelled_staging_rolls_back_system_unshielded_from_the_cancel(tmp_path, monkeypatch):
+    """A cancel during DATABIN staging is a staging failure like any other: the
+    /system footprint is removed again -- with the cancel shielded, so the
+    rollback's own debugfs calls aren't killed -- and Cancelled propagates."""
+    ms._write_manifest(str(tmp_path), ["system", "databin"])
+    monkeypatch.setattr(ms._mp, "fetch_apk", lambda *a, **k: "apk")
+    monkeypatch.setattr(ms._mp, "extract_tools", lambda *a, **k: {"busybox": "b"})
+    monkeypatch.setattr(ms._mp, "extract_stub_apk", lambda *a, **k: "stub")
+    monkeypatch.setattr(ms._mp, "extract_databin_extras", lambda *a, **k: {})
+    monkeypatch.setattr(ms, "install_to_system", lambda *a, **k: ["sys ok"])
+    token = cancellation.CancelToken()
+
+    def stage(*a, cancel=None, **k):
+        assert cancel is token
+        token.cancel()
+        cancellation.check(cancel)
+    monkeypatch.setattr(ms, "stage_databin", stage)
+    rollback_tokens = []
+    monkeypatch.setattr(ms, "uninstall_from_system",
+                        lambda *a, **k: rollback_tokens.append(cancellation.current()) or [])
+
+    with cancellation.scope(token), pytest.raises(cancellation.Cancelled):
+        ms.install(str(tmp_path), cancel=token)
+    assert rollback_tokens == [None]
+    assert ms.magisk_status(str(tmp_path)) is None
+
+
 def test_system_write_commands_rm_gz_before_rewrite():
     # debugfs `write` won't overwrite an existing file, so a reinstall over a
     # leftover bootanim.rc.gz must rm it first.
@@ -408,3 +436,216 @@ def test_install_rolls_back_system_when_databin_fails(tmp_path, monkeypatch):
     # /system was rolled back, and no manifest was stamped on the failed install
     assert calls == ["sys", "databin", "rollback"]
     assert wrote == []
+
+
+def _fleet(tmp_path, *, shared, own=()):
+    """A master holding Root.vhd, ``shared`` clones pointing at it via .bstk,
+    and ``own`` instances with a Root.vhd of their own."""
+    master = tmp_path / "Master"
+    master.mkdir()
+    (master / "Root.vhd").write_bytes(b"x")
+    dirs = [str(master)]
+    for name in shared:
+        d = tmp_path / name
+        d.mkdir()
+        (d / ("%s.bstk" % name)).write_text(_BSTK.replace("{ROOTLOC}", "../Master/Root.vhd"))
+        dirs.append(str(d))
+    for name in own:
+        d = tmp_path / name
+        d.mkdir()
+        (d / "Root.vhd").write_bytes(b"y")
+        dirs.append(str(d))
+    return dirs
+
+
+def _stub_payload(monkeypatch):
+    fetched = []
+    monkeypatch.setattr(ms._mp, "fetch_apk", lambda *a, **k: fetched.append(1) or "apk")
+    monkeypatch.setattr(ms._mp, "extract_tools", lambda *a, **k: {"busybox": "b"})
+    monkeypatch.setattr(ms._mp, "extract_stub_apk", lambda *a, **k: "stub")
+    monkeypatch.setattr(ms._mp, "extract_databin_extras", lambda *a, **k: {})
+    return fetched
+
+
+def test_group_by_root_vhd_groups_clones_with_their_master(tmp_path):
+    dirs = _fleet(tmp_path, shared=("C1", "C2"), own=("Solo",))
+    (tmp_path / "Orphan").mkdir()
+    groups, unresolved = ms.group_by_root_vhd(dirs + [str(tmp_path / "Orphan")])
+    assert sorted(len(m) for m in groups.values()) == [1, 3]
+    assert list(unresolved) == [str(tmp_path / "Orphan")]
+
+
+def test_install_fleet_writes_each_shared_root_vhd_once(tmp_path, monkeypatch):
+    dirs = _fleet(tmp_path, shared=("C1", "C2"), own=("Solo",))
+    fetched = _stub_payload(monkeypatch)
+    system_writes, staged = [], []
+    monkeypatch.setattr(ms, "install_to_system",
+                        lambda d, *a, **k: system_writes.append(ms._resolve_root_vhd(d)) or ["ok"])
+    monkeypatch.setattr(ms, "stage_databin", lambda d, *a, **k: staged.append(d) or ["ok"])
+
+    outcomes = ms.install_fleet(dirs, work_dir=str(tmp_path / "w"), max_workers=3)
+
+    assert fetched == [1], "payload fetched once for the whole fleet"
+    assert len(system_writes) == 2, "one /system write per distinct Root.vhd"
+    assert sorted(staged) == sorted(dirs), "every instance gets its own DATABIN"
+    assert [o.instance_dir for o in outcomes] == dirs
+    assert all(o.ok for o in outcomes)
+    assert ms.magisk_status(dirs[1])["components"] == ["databin", "system"]
+
+
+def test_install_fleet_keeps_shared_system_when_one_clone_fails(tmp_path, monkeypatch):
+    dirs = _fleet(tmp_path, shared=("C1",))
+    _stub_payload(monkeypatch)
+    monkeypatch.setattr(ms, "install_to_system", lambda *a, **k: ["ok"])
+    rollbacks = []
+    monkeypatch.setattr(ms, "uninstall_from_system", lambda *a, **k: rollbacks.append(a) or [])
+
+    def stage(d, *a, **k):
+        if d.endswith("C1"):
+            raise RuntimeError("locked")
+        return ["ok"]
+    monkeypatch.setattr(ms, "stage_databin", stage)
+
+    master, clone = ms.install_fleet(dirs, work_dir=str(tmp_path / "w"))
+    assert master.ok and not clone.ok
+    assert "locked" in clone.message
+    assert rollbacks == [], "the master still boots from the shared footprint"
+
+
+def test_install_fleet_rolls_back_a_group_nobody_was_staged_on(tmp_path, monkeypatch):
+    dirs = _fleet(tmp_path, shared=("C1",))
+    _stub_payload(monkeypatch)
+    monkeypatch.setattr(ms, "install_to_system", lambda *a, **k: ["ok"])
+    monkeypatch.setattr(ms, "stage_databin",
+                        lambda *a, **k: (_ for _ in ()).throw(RuntimeError("stage")))
+    rollbacks = []
+    monkeypatch.setattr(ms, "uninstall_from_system", lambda *a, **k: rollbacks.append(a) or [])
+
+    outcomes = ms.install_fleet(dirs, work_dir=str(tmp_path / "w"))
+    assert not any(o.ok for o in outcomes)
+    assert len(rollbacks) == 1
+
+
+def test_install_fleet_stages_as_a_batch_locked_per_data_vhdx(tmp_path, monkeypatch):
+    dirs = _fleet(tmp_path, shared=("C1",))
+    _stub_payload(monkeypatch)
+    monkeypatch.setattr(ms, "install_to_system", lambda *a, **k: ["ok"])
+    monkeypatch.setattr(ms, "stage_databin", lambda *a, **k: ["ok"])
+    batched = []
+    real_batch = ms.jobs.Batch
+    monkeypatch.setattr(ms.jobs, "Batch",
+                        lambda batch_jobs, **k: batched.extend(batch_jobs) or real_batch(batch_jobs, **k))
+
+    assert all(o.ok for o in ms.install_fleet(dirs, work_dir=str(tmp_path / "w")))
+    assert [j.locks for j in batched] == [ms.jobs.disk_locks(d, "data_vhdx") for d in dirs]
+    assert not any(j.needs_shutdown for j in batched)
+
+
+def test_cancelled_fleet_rolls_back_written_system_images_and_reraises(tmp_path, monkeypatch):
+    dirs = _fleet(tmp_path, shared=(), own=("Solo",))
+    _stub_payload(monkeypatch)
+    token = cancellation.CancelToken()
+    written = []
+
+    def system(d, *a, **k):
+        if written:
+            token.cancel()
+            cancellation.check(token)
+        written.append(d)
+        return ["ok"]
+    monkeypatch.setattr(ms, "install_to_system", system)
+    monkeypatch.setattr(ms, "stage_databin", lambda *a, **k: pytest.fail("staged after cancel"))
+    rollbacks = []
+    monkeypatch.setattr(ms, "uninstall_from_system",
+                        lambda d, **k: rollbacks.append((d, cancellation.current())) or [])
+
+    with cancellation.scope(token), pytest.raises(cancellation.Cancelled):
+        ms.install_fleet(dirs, work_dir=str(tmp_path / "w"))
+    assert rollbacks == [(written[0], None)], "rolled back, shielded from the cancel"
+
+
+def test_install_fleet_reports_unresolvable_instances_without_fetching(tmp_path, monkeypatch):
+    (tmp_path / "Orphan").mkdir()
+    fetched = _stub_payload(monkeypatch)
+    (outcome,) = ms.install_fleet([str(tmp_path / "Orphan")])
+    assert not outcome.ok and "no Root.vhd" in outcome.message
+    assert fetched == []
+
+
+def _module_zip(path, files):
+    import zipfile
+    with zipfile.ZipFile(path, "w") as z:
+        for name, body in files.items():
+            z.writestr(name, body)
+    return str(path)
+
+
+_PROP = "id=demo_mod\nname=Demo\nversion=v2\nversionCode=2\n"
+
+
+def test_unpack_module_mirrors_magisks_default_unzip(tmp_path):
+    zp = _module_zip(tmp_path / "m.zip", {
+        "module.prop": _PROP, "service.sh": "#!/bin/sh\n",
+        "customize.sh": "ui_print hi\n", "META-INF/com/google/android/update-binary": "x",
+        "system/bin/tool": "\x7fELF", "README.md": "doc"})
+    st = ms.unpack_module(zp, str(tmp_path / "work"))
+    assert (st.module_id, st.version, st.deferred) == ("demo_mod", "v2", False)
+    assert sorted(st.files) == ["module.prop", "service.sh", "system/bin/tool"]
+    assert st.dirs == ("system", "system/bin")
+    with open(st.files["system/bin/tool"], encoding="utf-8") as f:
+        assert f.read() == "\x7fELF"
+
+
+def test_unpack_module_defers_skipunzip_installers(tmp_path):
+    zp = _module_zip(tmp_path / "m.zip", {"module.prop": _PROP,
+                                          "customize.sh": "SKIPUNZIP=1\nunzip ...\n"})
+    st = ms.unpack_module(zp, str(tmp_path / "work"))
+    assert st.deferred and st.files == {}
+    assert not (tmp_path / "work").exists()
+
+
+@pytest.mark.parametrize("files, match", [
+    ({"module.prop": "id=1bad\n"}, "invalid module id"),
+    ({"service.sh": "x"}, "not a Magisk module"),
+    ({"module.prop": _PROP, "../evil": "x"}, "unsafe path"),
+])
+def test_unpack_module_rejects_bad_zips(tmp_path, files, match):
+    zp = _module_zip(tmp_path / "m.zip", files)
+    with pytest.raises(RuntimeError, match=match):
+        ms.unpack_module(zp, str(tmp_path / "work"))
+
+
+def test_module_commands_apply_default_perms_and_contexts(tmp_path):
+    st = ms.ModuleStage("demo_mod", "v2", "m.zip",
+                        {"module.prop": str(tmp_path / "p"),
+                         "system/vendor/bin/vtool": str(tmp_path / "v")},
+                        ("system", "system/vendor", "system/vendor/bin"))
+    cmds = ms._module_commands(st)
+    root = "/adb/modules/demo_mod"
+    assert cmds[0] == "mkdir %s" % root
+    assert "sif %s/module.prop mode 0100644" % root in cmds
+    vtool = "%s/system/vendor/bin/vtool" % root
+    assert "sif %s mode 0100755" % vtool in cmds and "sif %s gid 2000" % vtool in cmds
+    assert "ea_set %s security.selinux u:object_r:vendor_file:s0" % vtool in cmds
+    assert "ea_set %s/module.prop security.selinux u:object_r:system_file:s0" % root in cmds
+    w = next(i for i, c in enumerate(cmds) if c.startswith("write ") and c.endswith(" vtool"))
+    assert cmds[w - 1] == "cd %s/system/vendor/bin" % root  # bare-name write in its dir
+
+
+def test_modules_rollback_removes_the_flash_script_unless_older_zips_wait(monkeypatch):
+    st = ms.ModuleStage("zygisksu", "v1", "z.zip", {}, (), True)
+    monkeypatch.setattr(ms, "_list_dir", lambda dev, path, env: ["zygisksu.zip"])
+    assert ms._modules_rollback("/dev/sdx", [st], {}) == [
+        "rm /adb/bsrgui-pending/zygisksu.zip",
+        "rm /adb/service.d/01-bsrgui-modules.sh", "rmdir /adb/bsrgui-pending"]
+
+    monkeypatch.setattr(ms, "_list_dir", lambda dev, path, env: ["zygisksu.zip", "old.zip"])
+    assert ms._modules_rollback("/dev/sdx", [st], {}) == ["rm /adb/bsrgui-pending/zygisksu.zip"]
+
+
+def test_recorded_modules_survive_a_manifest_restamp(tmp_path):
+    ms._write_manifest(str(tmp_path), ["databin"])
+    ms._record_modules(str(tmp_path), [ms.ModuleStage("zygisksu", "v1", "z", {}, (), True)])
+    ms._write_manifest(str(tmp_path), ["system", "databin"])
+    mods = ms.magisk_status(str(tmp_path))["modules"]
+    assert mods == {"zygisksu": {"version": "v1", "mode": "deferred"}}
@@ -1,25 +1,40 @@
 from unittest.mock import MagicMock
 
-from PyQt5.QtWidgets import QMessageBox
+from PyQt5.QtCore import QThread
 
+import cancellation
 from views.main_window import MainWindow
 
 
-def test_close_blocked_while_operation_running(qtbot, monkeypatch):
+def test_close_cancels_the_running_operation_and_waits_for_it(qtbot):
     # Closing mid-operation would kill a thread writing real binaries/disk
-    # images. closeEvent must warn and refuse instead of tearing down.
+    # images. closeEvent must cancel it and only close once it has unwound.
     window = MainWindow()
     qtbot.addWidget(window)
-    window._op_thread = object()  # stand-in for an in-flight operation
-    warned = MagicMock()
-    monkeypatch.setattr(QMessageBox, "warning", warned)
+    window.show()
+    unwound = []
+
+    def job(progress):
+        for _ in range(500):            # give up after 5 s if the cancel never lands
+            QThread.msleep(10)
+            try:
+                cancellation.check()
+            except cancellation.Cancelled:
+                unwound.append(1)       # stands in for rollback + detach
+                raise
+        return "ran to the end"
+
+    window._run_async(job, "Working...")
     event = MagicMock()
 
     window.closeEvent(event)
 
-    warned.assert_called_once()
     event.ignore.assert_called_once()
     event.accept.assert_not_called()
+    assert window.isVisible()
+    qtbot.waitUntil(lambda: not window.isVisible(), timeout=5000)
+    assert unwound == [1]
+    assert window._op_thread is None
 
 
 def test_close_allowed_when_idle(qtbot):
@@ -15,10 +15,10 @@ def test_toggle_root_blocked_when_patch_mode_unpatched(qtbot, monkeypatch):
     qtbot.addWidget(window)
     window.instance_data = {
         "Pie64 (Normal)": {"patch_mode": True, "root_enabled": False,
-                           "config_path": "c", "original_name": "Pie64"},
+                           "config_path": "c", "data_path": "d", "original_name": "Pie64"},
     }
     window.instances_page.set_instances(window.instance_data)
-    window.instances_page.checkboxes["Pie64 (Normal)"].setChecked(True)
+    window.instances_page.set_ticked("Pie64 (Normal)")
     monkeypatch.setattr(window, "_engine_state", lambda: "unpatched")
 
     warned = MagicMock()
@@ -37,10 +37,10 @@ def test_toggle_root_proceeds_when_engine_patched(qtbot, monkeypatch):
     qtbot.addWidget(window)
     window.instance_data = {
         "Pie64 (Normal)": {"patch_mode": True, "root_enabled": False,
-                           "config_path": "c", "original_name": "Pie64"},
+                           "config_path": "c", "data_path": "d", "original_name": "Pie64"},
     }
     window.instances_page.set_instances(window.instance_data)
-    window.instances_page.checkboxes["Pie64 (Normal)"].setChecked(True)
+    window.instances_page.set_ticked("Pie64 (Normal)")
     monkeypatch.setattr(window, "_engine_state", lambda: "patched")
 
     ran = MagicMock()
@@ -59,10 +59,10 @@ def test_toggle_root_off_allowed_when_engine_unpatched(qtbot, monkeypatch):
     qtbot.addWidget(window)
     window.instance_data = {
         "Pie64 (Normal)": {"patch_mode": True, "root_enabled": True,
-                           "config_path": "c", "original_name": "Pie64"},
+                           "config_path": "c", "data_path": "d", "original_name": "Pie64"},
     }
     window.instances_page.set_instances(window.instance_data)
-    window.instances_page.checkboxes["Pie64 (Normal)"].setChecked(True)
+    window.instances_page.set_ticked("Pie64 (Normal)")
     monkeypatch.setattr(window, "_engine_state", lambda: "unpatched")
 
     warned = MagicMock()
@@ -81,10 +81,10 @@ def test_toggle_root_unaffected_for_classic_instance(qtbot, monkeypatch):
     qtbot.addWidget(window)
     window.instance_data = {
         "MSI_Pie (MSI)": {"patch_mode": False, "root_enabled": False,
-                          "config_path": "c", "original_name": "MSI_Pie"},
+                          "config_path": "c", "data_path": "d", "original_name": "MSI_Pie"},
     }
     window.instances_page.set_instances(window.instance_data)
-    window.instances_page.checkboxes["MSI_Pie (MSI)"].setChecked(True)
+    window.instances_page.set_ticked("MSI_Pie (MSI)")
     monkeypatch.setattr(window, "_engine_state", lambda: "unpatched")
 
     ran = MagicMock()
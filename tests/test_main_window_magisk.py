@@ -1,5 +1,7 @@
 from unittest.mock import MagicMock
 
+import pytest
+
 from PyQt5.QtWidgets import QMessageBox
 
 from views.main_window import MainWindow
@@ -37,7 +39,7 @@ def _select(window, uid="Tiramisu64 (Normal)", status=None):
     Instances and Magisk are one page."""
     window.instances_page.set_instances(window.instance_data)
     window.instances_page.set_magisk_statuses({uid: status})
-    window.instances_page.checkboxes[uid].setChecked(True)
+    window.instances_page.set_ticked(uid)
 
 
 def test_navigate_to_instances_populates_magisk_statuses(qtbot, monkeypatch):
@@ -51,13 +53,14 @@ def test_navigate_to_instances_populates_magisk_statuses(qtbot, monkeypatch):
     window.nav_rail.select(NAV_INSTANCES)
     # Nothing ticked yet, so no single instance is targeted.
     assert window.instances_page.selected_instance_id() is None
-    assert "Tiramisu64 (Normal)" in window.instances_page.checkboxes
-    window.instances_page.checkboxes["Tiramisu64 (Normal)"].setChecked(True)
+    assert "Tiramisu64 (Normal)" in window.instances_page.model.ids()
+    window.instances_page.set_ticked("Tiramisu64 (Normal)")
     assert window.instances_page.uninstall_button.isEnabled() is True
 
 
-def test_magisk_actions_need_exactly_one_instance(qtbot):
-    """Ticking several is how bulk root works; Magisk acts on one at a time."""
+def test_magisk_actions_need_exactly_one_instance_except_install(qtbot):
+    """Ticking several is how bulk root works; Magisk acts on one at a time,
+    apart from a fresh install, which runs as one fleet install."""
     window = MainWindow()
     qtbot.addWidget(window)
     window.instance_data = _one_instance()
@@ -66,10 +69,11 @@ def test_magisk_actions_need_exactly_one_instance(qtbot):
     window.instances_page.set_instances(window.instance_data)
     window.instances_page.set_magisk_statuses(
         {"Tiramisu64 (Normal)": None, "Pie64 (Normal)": None})
-    for cb in window.instances_page.checkboxes.values():
-        cb.setChecked(True)
+    for uid in window.instances_page.model.ids():
+        window.instances_page.set_ticked(uid)
     assert window.instances_page.selected_instance_id() is None
-    assert window.instances_page.install_button.isEnabled() is False
+    assert window.instances_page.install_button.isEnabled() is True
+    assert window.instances_page.uninstall_button.isEnabled() is False
     # bulk actions stay available with several ticked
     assert window.instances_page.root_toggle_button.isEnabled() is True
 
@@ -106,6 +110,34 @@ def test_install_proceeds_when_engine_patched(qtbot, monkeypatch):
     ran.assert_called_once()
 
 
+def test_install_with_several_ticked_runs_one_fleet_job(qtbot, monkeypatch):
+    window = MainWindow()
+    qtbot.addWidget(window)
+    window.instance_data = _one_instance(patch_mode=False)
+    window.instance_data["Pie64 (Normal)"] = dict(
+        window.instance_data["Tiramisu64 (Normal)"], data_path=r"C:\inst\Pie64")
+    window.instances_page.set_instances(window.instance_data)
+    for uid in window.instance_data:
+        window.instances_page.set_ticked(uid)
+    monkeypatch.setattr(window, "_confirm", lambda *a, **k: True)
+    batches = []
+    monkeypatch.setattr(window, "_run_batch", lambda batch_jobs, text: batches.append(batch_jobs))
+    import magisk_system
+    fleets = []
+
+    def fleet(dirs, progress=None):
+        fleets.append(dirs)
+        return [magisk_system.FleetOutcome(d, True, "ok") for d in dirs]
+    monkeypatch.setattr(magisk_system, "install_fleet", fleet)
+
+    window.magisk_controller.handle_install()
+
+    (job,) = batches[0]
+    assert job.needs_shutdown and job.run(lambda m: None, lambda: False).startswith(
+        "Magisk installed into 2 instances")
+    assert sorted(fleets[0]) == [r"C:\inst\Pie64", r"C:\inst\Tiramisu64"]
+
+
 def test_install_aborts_when_user_declines_confirm(qtbot, monkeypatch):
     window = MainWindow()
     qtbot.addWidget(window)
@@ -202,7 +234,7 @@ def test_update_check_reports_up_to_date_only_on_a_real_hash_match(qtbot, monkey
                             "components": ["system"], "payload_sha256": "DEADBEEF"})
     captured = {}
 
-    def fake_run(job, text):
+    def fake_run(job, text, cancellable=False):
         captured["msg"] = job(lambda *a, **k: None)
     monkeypatch.setattr(window, "_confirm", lambda *a, **k: True)
     monkeypatch.setattr(window, "_run_async", fake_run)
@@ -314,6 +346,31 @@ def test_install_lsposed_runs_when_adb_present(qtbot, monkeypatch):
     ran.assert_called_once()
 
 
+def test_install_module_goes_offline_when_the_instance_is_shut_down(qtbot, monkeypatch):
+    window = MainWindow()
+    qtbot.addWidget(window)
+    window.instance_data = _one_instance()
+    _select(window, status=_MGR)
+    monkeypatch.setattr("adb_handler.find_adb", lambda dirs: r"C:\bs\HD-Adb.exe")
+    monkeypatch.setattr("adb_handler.instance_adb_port", lambda c, n: 5555)
+    monkeypatch.setattr("adb_handler.list_running_instances", lambda adb, targets: {})
+    monkeypatch.setattr("adb_handler.install_module",
+                        lambda *a, **k: pytest.fail("no ADB install for a stopped instance"))
+    monkeypatch.setattr("rezygisk_payload.fetch_module", lambda cache, progress=None: "rz.zip")
+    offline = []
+    monkeypatch.setattr("magisk_system.install_modules_offline",
+                        lambda d, zips, progress=None: offline.append((d, zips))
+                        or ["Installed zygisksu v1 offline into /data/adb/modules"])
+    ran = []
+    monkeypatch.setattr(window, "_run_async", lambda job, text, cancellable=False: ran.append(job))
+
+    window.magisk_controller.handle_install_rezygisk()
+    msg = ran[0](lambda m, pct: None)
+
+    assert offline == [(r"C:\inst\Tiramisu64", ["rz.zip"])]
+    assert msg.endswith("Start the instance to activate Zygisk.")
+
+
 def _inst_with(uid, **extra):
     d = {"patch_mode": True, "root_enabled": False, "config_path": "c",
          "original_name": uid.split(" ")[0], "data_path": r"C:\i", "install_path": r"C:\bs"}
@@ -341,7 +398,7 @@ def test_launch_instance_runs_for_single_selection(qtbot, monkeypatch):
     qtbot.addWidget(window)
     window.instance_data = _inst_with("Tiramisu64 (Normal)")
     window.instances_page.set_instances(window.instance_data)
-    window.instances_page.checkboxes["Tiramisu64 (Normal)"].setChecked(True)
+    window.instances_page.set_ticked("Tiramisu64 (Normal)")
     launched = MagicMock()
     monkeypatch.setattr("instance_handler.launch_instance", launched)
     window._handle_launch_instance()
@@ -353,7 +410,7 @@ def test_restart_instance_runs_async(qtbot, monkeypatch):
     qtbot.addWidget(window)
     window.instance_data = _inst_with("Tiramisu64 (Normal)")
     window.instances_page.set_instances(window.instance_data)
-    window.instances_page.checkboxes["Tiramisu64 (Normal)"].setChecked(True)
+    window.instances_page.set_ticked("Tiramisu64 (Normal)")
     ran = MagicMock()
     monkeypatch.setattr(window, "_run_async", ran)
     window._handle_restart_instance()
@@ -1,3 +1,5 @@
+from PyQt5.QtCore import QThread
+
 from views.main_window import MainWindow
 
 
@@ -15,3 +17,29 @@ def test_on_async_progress_sets_determinate_value(qtbot):
     window._on_async_progress("Step 2", 50)
     assert window.progress_bar._bar.maximum() == 100
     assert window.progress_bar._bar.value() == 50
+
+
+def test_cancel_button_stops_the_running_job(qtbot, monkeypatch):
+    import jobs
+    window = MainWindow()
+    qtbot.addWidget(window)
+    window.show()
+    monkeypatch.setattr(window, "_close_bluestacks", lambda: None)
+    started = []
+
+    def run(progress, cancelled):
+        started.append(1)
+        for _ in range(500):            # give up after 5 s if the cancel never lands
+            if cancelled():
+                raise jobs.Cancelled("stopped")
+            QThread.msleep(10)
+        return "ran to the end"
+
+    window._run_batch([jobs.Job(jobs.KIND_RW, "Pie64 (Normal)", run)], "Toggling R/W...")
+    assert window.progress_bar._cancel.isVisible()
+    qtbot.waitUntil(lambda: bool(started))
+
+    window.progress_bar._cancel.click()
+    assert window.progress_bar._cancel.isEnabled() is False
+    qtbot.waitUntil(lambda: window._op_thread is None, timeout=5000)
+    assert "1 cancelled" in window.progress_bar._label.text()
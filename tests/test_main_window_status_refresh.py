@@ -0,0 +1,47 @@
+"""MainWindow's background status refresh: one collection in flight, queued
+requests merged, and only changed rows pushed to the Instances page."""
+from types import MappingProxyType
+
+import constants
+import status_snapshot
+from views.main_window import MainWindow
+
+
+def _snap(rw_mode, engine="unknown"):
+    row = {"data_path": "/e/Pie64", "root_enabled": False, "rw_mode": rw_mode}
+    return status_snapshot.Snapshot(
+        MappingProxyType({"Pie64 (Normal)": MappingProxyType(row)}), engine)
+
+
+def test_requests_during_a_refresh_are_merged_into_one(qtbot, monkeypatch):
+    window = MainWindow()
+    qtbot.addWidget(window)
+    calls = []
+
+    def collect(installations, previous, only, engine):
+        calls.append((only, engine))
+        return _snap(constants.MODE_READONLY)
+    monkeypatch.setattr(status_snapshot, "collect", collect)
+
+    window._request_status_refresh(only={"/e/Pie64"})
+    window._request_status_refresh(only={"/e/Rvc64"})
+    window._request_status_refresh(only={"/e/Nougat64"}, engine=True)
+    qtbot.waitUntil(lambda: len(calls) == 2 and window._status_thread is None)
+
+    assert calls == [({"/e/Pie64"}, False), ({"/e/Rvc64", "/e/Nougat64"}, True)]
+    assert set(window.instance_data) == {"Pie64 (Normal)"}
+
+
+def test_a_changed_field_repaints_only_that_row(qtbot, monkeypatch):
+    window = MainWindow()
+    qtbot.addWidget(window)
+    window._on_status_collected(_snap(constants.MODE_READONLY))
+    rebuilt, repainted = [], []
+    monkeypatch.setattr(window.instances_page, "set_instances",
+                        lambda *a, **k: rebuilt.append(a))
+    monkeypatch.setattr(window.instances_page, "update_rows", repainted.append)
+
+    window._on_status_collected(_snap(constants.MODE_READWRITE))
+    assert not rebuilt
+    assert list(repainted[0]) == ["Pie64 (Normal)"]
+    assert window.instance_data["Pie64 (Normal)"]["rw_mode"] == constants.MODE_READWRITE
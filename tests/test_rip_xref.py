@@ -0,0 +1,79 @@
+"""Tests for the RIP-relative lea xref index (rip_xref)."""
+import struct
+
+import pytest
+
+import constants
+import rip_xref
+
+
+def _lea(rex, modrm, site_va, target_va):
+    return bytes([rex, 0x8D, modrm]) + struct.pack("<i", target_va - (site_va + 7))
+
+
+@pytest.mark.parametrize("modrm", sorted(constants.RIP_LEA_MODRM))
+@pytest.mark.parametrize("rex", [0x48, 0x4C])
+def test_every_rip_lea_form_is_indexed(rex, modrm):
+    data = bytearray(b"\x90" * 0x100)
+    data[0x20:0x27] = _lea(rex, modrm, 0x1020, 0x5000)
+    index = rip_xref.XrefIndex(bytes(data), [(0, len(data), 0x1000)])
+    assert index.sites(0x5000) == [0x20]
+
+
+def test_non_rip_modrm_and_outside_regions_are_ignored():
+    data = bytearray(b"\x90" * 0x200)
+    data[0x10:0x17] = bytes([0x48, 0x8D, 0x45]) + b"\x00" * 4         # lea rax,[rbp+..]
+    data[0x150:0x157] = _lea(0x48, 0x05, 0x150, 0x9000)               # not in a region
+    index = rip_xref.XrefIndex(bytes(data), [(0, 0x100, 0)])
+    assert len(index) == 0
+
+
+def test_overlapping_candidate_does_not_hide_a_real_lea():
+    # The first "lea"'s rel32 bytes contain 48 8D 05: a spurious decode must not
+    # swallow the real instruction that starts inside it.
+    real = _lea(0x48, 0x05, 0x1004, 0x7000)
+    data = bytes([0x48, 0x8D, 0x05, 0x00]) + real + b"\x90" * 16
+    index = rip_xref.XrefIndex(data, [(0, len(data), 0x1000)])
+    assert index.sites(0x7000) == [4]
+
+
+def test_sites_map_through_each_regions_own_va():
+    data = bytearray(b"\x90" * 0x400)
+    data[0x010:0x017] = _lea(0x4C, 0x0D, 0x10010, 0x30000)
+    data[0x210:0x217] = _lea(0x48, 0x3D, 0x20010, 0x30000)
+    regions = [(0, 0x200, 0x10000), (0x200, 0x200, 0x20000)]
+    assert rip_xref.XrefIndex(bytes(data), regions).sites(0x30000) == [0x010, 0x210]
+
+
+def test_index_for_reuses_the_index_for_the_same_buffer_only():
+    data = bytes(_lea(0x48, 0x05, 0, 0x100) + b"\x90" * 8)
+    regions = [(0, len(data), 0)]
+    first = rip_xref.index_for(data, regions)
+    assert rip_xref.index_for(data, regions) is first
+    assert rip_xref.index_for(bytes(bytearray(data)), regions) is not first
+    mutable = bytearray(data)
+    assert rip_xref.index_for(mutable, regions) is not rip_xref.index_for(mutable, regions)
+
+
+def test_root_persistence_locator_keeps_only_the_write_call_shape():
+    import integrity_patch
+    import root_persistence as rp
+    from tests.test_integrity_patch import _IMAGE_BASE, _TEXT_RAW, _TEXT_VA, _build_pe
+
+    data = _build_pe()
+    rdata_va, _, rdata_raw, _ = integrity_patch.pe_image_base_and_sections(bytes(data))[1][1]
+    s = rdata_raw + 0x100
+    data[s:s + 20] = b".enable_root_access\x00"
+    target = _IMAGE_BASE + rdata_va + 0x100
+
+    def lea_r8(site):
+        return _lea(0x4C, 0x05, _IMAGE_BASE + _TEXT_VA + (site - _TEXT_RAW), target)
+
+    write = 0x800                                  # the full write shape
+    data[write:write + 7] = lea_r8(write)
+    data[write + 7:write + 31] = bytes([0x48, 0x8B, 0xD0, 0x48, 0x8D, 0x8D, 1, 2, 3, 4,
+                                        0xE8, 5, 6, 7, 8, 0x90, 0x33, 0xD2, 0x48, 0x8B,
+                                        0xC8, 0xE8, 9, 9])
+    reader = 0x900                                 # same string, different use
+    data[reader:reader + 7] = lea_r8(reader)
+    assert rp._locate_enable_root_write(bytes(data)) == [write]
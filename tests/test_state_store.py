@@ -0,0 +1,83 @@
+"""Tests for the per-user SQLite state store (state_store): the per-kind rows,
+the one-query instance roll-up, and the import of the legacy JSON sidecars."""
+import json
+
+import ad_settings
+import integrity_patch
+import magisk_system
+import state_store
+import telemetry_block
+
+
+def _engine(tmp_path, *names):
+    dirs = []
+    for name in names:
+        d = tmp_path / "Engine" / name
+        d.mkdir(parents=True)
+        dirs.append(str(d))
+    return dirs
+
+
+def test_store_is_a_wal_database_in_the_app_data_dir():
+    st = state_store.store()
+    assert st is state_store.store()
+    assert st.path.endswith(state_store.STATE_DB_NAME)
+    assert st._rows("PRAGMA journal_mode")[0][0] == "wal"
+
+
+def test_instance_states_rolls_up_an_installation_in_one_call(tmp_path):
+    pie, rvc, tira = _engine(tmp_path, "Pie64", "Rvc64", "Tiramisu64")
+    st = state_store.store()
+    st.record_su_originals(pie + "/Data.vhdx", {0x10: "53 48 8d"})
+    st.set_magisk(rvc, {"magisk": True, "components": ["system"]})
+    st.set_hosts_block(pie, {"telemetry_block": True})
+
+    states = st.instance_states([pie, rvc, tira])
+    assert states[pie] == state_store.InstanceState(True, None, {"telemetry_block": True})
+    assert states[rvc].magisk == {"magisk": True, "components": ["system"]}
+    assert states[tira] == state_store.InstanceState(False, None, None)
+
+
+def test_legacy_sidecars_are_imported_once_and_removed(tmp_path):
+    (pie,) = _engine(tmp_path, "Pie64")
+    manifest = tmp_path / "Engine" / "Pie64" / ".magisk_system.json"
+    manifest.write_text(json.dumps({"magisk": True, "components": ["databin"]}))
+    hosts = tmp_path / "Engine" / "Pie64" / ".telemetry_block.json"
+    hosts.write_text(json.dumps({"telemetry_block": True, "domains": 3}))
+    journal = tmp_path / "Engine" / "Pie64" / "Data.vhdx.suroot.jsonl"
+    journal.write_text('{"offset": 16, "orig": "53 48 8d"}\n')
+
+    states = state_store.store().instance_states([pie])
+
+    assert states[pie].su_recorded
+    assert states[pie].magisk["components"] == ["databin"]
+    assert states[pie].hosts_block["domains"] == 3
+    assert not (manifest.exists() or hosts.exists() or journal.exists())
+    assert magisk_system.magisk_status(pie)["components"] == ["databin"]
+
+
+def test_ad_switch_and_engine_ref_sidecars_are_imported(tmp_path):
+    conf = tmp_path / "bluestacks.conf"
+    conf.write_text('bst.enable_programmatic_ads="0"\n')
+    legacy_ad = tmp_path / ".bsrgui_ad_settings.json"
+    legacy_ad.write_text(json.dumps({"ads_disabled": True,
+                                     "originals": {"bst.enable_programmatic_ads": "1"}}))
+    assert ad_settings.status(str(conf))["originals"] == {"bst.enable_programmatic_ads": "1"}
+    assert not legacy_ad.exists()
+
+    exe = tmp_path / "HD-Player.exe"
+    exe.write_bytes(b"MZ")
+    ref = tmp_path / "HD-Player.exe.prepatch.ref"
+    ref.write_text(json.dumps({"original": "ab" * 32, "patched": None}))
+    assert integrity_patch._read_backup_ref(str(exe)) == {"original": "ab" * 32,
+                                                          "patched": None}
+    assert not ref.exists()
+
+
+def test_telemetry_statuses_share_the_masters_row(tmp_path, monkeypatch):
+    master, clone = _engine(tmp_path, "Pie64", "Pie64_1")
+    monkeypatch.setattr(telemetry_block._ms, "_resolve_root_vhd",
+                        lambda _dir: master + "/Root.vhd")
+    telemetry_block._write_state(clone, True)
+    got = telemetry_block.statuses([master, clone])
+    assert got[master]["telemetry_block"] is True and got[clone] == got[master]
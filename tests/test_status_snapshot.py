@@ -0,0 +1,80 @@
+"""Tests for the background status refresh (status_snapshot): collecting an
+immutable snapshot, re-reading only some instances, and diffing two snapshots."""
+import pytest
+
+import bstk
+import constants
+import status_snapshot
+
+_BSTK = """<?xml version="1.0"?>
+<VirtualBox><Machine><MediaRegistry><HardDisks>
+  <HardDisk uuid="{b}" location="Root.vhd" format="VHD" type="%s"/>
+</HardDisks></MediaRegistry></Machine></VirtualBox>
+"""
+
+
+def _installation(tmp_path, **modes):
+    data = tmp_path / "Engine"
+    for name, mode in modes.items():
+        (data / name).mkdir(parents=True)
+        (data / name / "Root.vhd").write_bytes(b"")
+        (data / name / ("%s.bstk" % name)).write_text(_BSTK % mode, encoding="utf-8")
+    conf = tmp_path / "bluestacks.conf"
+    conf.write_text("".join('bst.instance.%s.enable_root_access="1"\n' % n for n in modes))
+    return {"source": "MSI", "data_path": str(data), "config_path": str(conf),
+            "install_path": None, "patch_mode": False}
+
+
+def _set_mode(inst, name, mode):
+    path = "%s/%s/%s.bstk" % (inst["data_path"], name, name)
+    with open(path, "w", encoding="utf-8") as fh:
+        fh.write(_BSTK % mode)
+    bstk.invalidate(path)
+
+
+def test_collect_returns_read_only_rows(tmp_path):
+    snap = status_snapshot.collect([_installation(tmp_path, Pie64="Readonly")])
+    row = snap.instances["Pie64 (MSI)"]
+    assert row["rw_mode"] == constants.MODE_READONLY and row["root_enabled"] is True
+    assert row["root_vhd"].endswith("Root.vhd")
+    assert snap.engine_state == "unknown"
+    with pytest.raises(TypeError):
+        row["rw_mode"] = constants.MODE_READWRITE
+    # The window gets its own mutable copy.
+    copy = snap.instance_data()
+    copy["Pie64 (MSI)"]["rw_mode"] = constants.MODE_READWRITE
+    assert row["rw_mode"] == constants.MODE_READONLY
+
+
+def test_only_rereads_the_given_instances(tmp_path):
+    inst = _installation(tmp_path, Pie64="Readonly", Rvc64="Readonly")
+    before = status_snapshot.collect([inst])
+    _set_mode(inst, "Pie64", "Normal")
+    _set_mode(inst, "Rvc64", "Normal")
+
+    after = status_snapshot.collect([inst], before, only=[inst["data_path"] + "/Rvc64"],
+                                    engine=False)
+    assert list(after.instances) == list(before.instances)
+    assert after.instances["Pie64 (MSI)"]["rw_mode"] == constants.MODE_READONLY
+    assert after.instances["Rvc64 (MSI)"]["rw_mode"] == constants.MODE_READWRITE
+    assert after.engine_state == before.engine_state
+
+
+def test_diff_names_only_the_changed_fields(tmp_path):
+    inst = _installation(tmp_path, Pie64="Readonly", Rvc64="Readonly")
+    before = status_snapshot.collect([inst])
+    assert not status_snapshot.diff(before, status_snapshot.collect([inst]))
+
+    _set_mode(inst, "Rvc64", "Normal")
+    delta = status_snapshot.diff(before, status_snapshot.collect([inst]))
+    assert dict(delta.changed) == {"Rvc64 (MSI)": frozenset({"rw_mode"})}
+    assert not (delta.added or delta.removed or delta.engine_changed)
+
+
+def test_diff_reports_added_and_removed_instances(tmp_path):
+    inst = _installation(tmp_path, Pie64="Readonly")
+    delta = status_snapshot.diff(status_snapshot.EMPTY, status_snapshot.collect([inst]))
+    assert delta.added == ("Pie64 (MSI)",) and delta.engine_changed
+    delta = status_snapshot.diff(status_snapshot.collect([inst]),
+                                 status_snapshot.Snapshot({}, "unknown"))
+    assert delta.removed == ("Pie64 (MSI)",) and not delta.engine_changed
@@ -0,0 +1,147 @@
+"""Tests for the su root-state probe (``su_patch_offline.probe_su_state``).
+
+A synthetic dynamic VHD (``_build_vhd`` from the reader tests) carries a few
+"su entries" at known flat offsets; the state store records their originals the
+way ``enable()`` does, and the probe must classify each from the disk bytes alone.
+"""
+import json
+import os
+
+import pytest
+
+import su_patch
+import su_patch_offline as spo
+from tests.test_su_patch_offline_vhd import _build_vhd
+
+_ORIG64 = bytes.fromhex("53488d")
+
+
+def _disk(tmp_path, at=(0x10, 0x40), current=None):
+    block = bytearray(512)
+    for off, cur in zip(at, current or [su_patch.PATCH] * len(at)):
+        block[off:off + 3] = cur
+    path = _build_vhd(tmp_path, {0: bytes(block)})
+    spo._record_originals(path, {o: _ORIG64.hex(" ") for o in at})
+    return path
+
+
+def setup_function(_):
+    spo.clear_probe_cache()
+
+
+def test_probe_classifies_each_entry(tmp_path):
+    path = _disk(tmp_path, current=[su_patch.PATCH, _ORIG64])
+    probes = spo.probe_su_state(path)
+    assert [(p.offset, p.state) for p in probes] == [(0x10, "patched"), (0x40, "original")]
+    assert spo.summarize_probes(probes) == "mixed"
+
+
+def test_foreign_bytes_win_the_summary(tmp_path):
+    path = _disk(tmp_path, current=[su_patch.PATCH, b"\xAA\xBB\xCC"])
+    probes = spo.probe_su_state(path)
+    assert probes[1].state == "foreign" and probes[1].current == b"\xAA\xBB\xCC"
+    assert spo.summarize_probes(probes) == "foreign"
+
+
+def test_nothing_recorded_is_indeterminate(tmp_path):
+    path = _disk(tmp_path)
+    spo._forget_originals(path)
+    assert spo.probe_su_state(path) is None
+    assert spo.summarize_probes(None) is None
+
+
+def test_probe_is_cached_until_the_disk_changes(tmp_path, monkeypatch):
+    path = _disk(tmp_path)
+    opened = []
+    real = spo.open_disk
+    monkeypatch.setattr(spo, "open_disk", lambda p, *a: opened.append(p) or real(p, *a))
+    assert spo.summarize_probes(spo.probe_su_state(path)) == "patched"
+    assert spo.summarize_probes(spo.probe_su_state(path)) == "patched"
+    assert len(opened) == 1
+
+    # A guest rewrite reverts su: the disk's size/mtime change, so it re-reads.
+    vhd = real(path, writable=True)
+    vhd.write(0x10, _ORIG64)
+    vhd.write(0x40, _ORIG64)
+    vhd.close()
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+    assert spo.summarize_probes(spo.probe_su_state(path)) == "original"
+    assert len(opened) == 2
+
+
+def test_instance_root_state_follows_the_disk(tmp_path):
+    inst = tmp_path / "Pie64"
+    inst.mkdir()
+    path = _disk(inst)
+    assert spo.instance_root_state(str(inst)) is True
+    vhd = spo.open_disk(path, writable=True)
+    vhd.write(0x10, _ORIG64)
+    vhd.close()
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+    assert spo.instance_root_state(str(inst)) is False
+    assert spo.instance_su_state(str(inst)) == "mixed"
+
+
+def test_legacy_json_sidecar_is_imported_and_probed(tmp_path):
+    path = _disk(tmp_path, current=[_ORIG64, _ORIG64])
+    spo._forget_originals(path)
+    with open(path + ".suroot.json", "w", encoding="utf-8") as fh:
+        json.dump({"patches": [{"offset": 0x10, "orig": "53 48 8d"},
+                               {"offset": 0x40, "orig": "53 48 8d"}]}, fh)
+    assert spo.summarize_probes(spo.probe_su_state(path)) == "original"
+    assert not os.path.exists(path + ".suroot.json")
+
+
+# --- recorded originals -----------------------------------------------------
+
+def _unpatched(tmp_path, monkeypatch, at=(0x10, 0x40, 0x80)):
+    path = _disk(tmp_path, at=at, current=[_ORIG64] * len(at))
+    spo._forget_originals(path)
+    monkeypatch.setattr(spo, "_scan_su_entries",
+                        lambda vhd, pct=None, cancel=None: [(o, False, True) for o in at])
+    return path
+
+
+def test_enable_records_every_original_before_the_first_write(tmp_path, monkeypatch):
+    path = _unpatched(tmp_path, monkeypatch)
+    real_write = spo.DynamicVHD.write
+    writes = []
+
+    def failing_write(self, flat, data):
+        if writes:
+            raise OSError("disk went away")
+        assert len(spo._read_originals(path)) == 3   # all recorded already
+        writes.append(flat)
+        real_write(self, flat, data)
+
+    monkeypatch.setattr(spo.DynamicVHD, "write", failing_write)
+    with pytest.raises(OSError):
+        spo.enable(path)
+    monkeypatch.setattr(spo.DynamicVHD, "write", real_write)
+    lines = spo.disable(path)
+    assert lines[0] == "su@0x10 restored (b0 01 c3 -> 53 48 8d)"
+    assert spo._read_originals(path) == {}
+
+
+def test_first_recorded_original_wins(tmp_path, monkeypatch):
+    path = _unpatched(tmp_path, monkeypatch)
+    spo.enable(path)
+    spo._record_originals(path, {0x10: "00 00 00"})
+    assert spo._read_originals(path)[0x10] == "53 48 8d"
+    assert sorted(spo._read_originals(path)) == [0x10, 0x40, 0x80]
+
+
+def test_legacy_journal_is_imported_skipping_a_torn_tail(tmp_path, monkeypatch):
+    path = _unpatched(tmp_path, monkeypatch)
+    with open(path + ".suroot.json", "w", encoding="utf-8") as fh:
+        json.dump({"patches": [{"offset": 0x10, "orig": "53 48 8d"}]}, fh)
+    with open(path + ".suroot.jsonl", "w", encoding="utf-8") as fh:
+        fh.write('{"offset": 64, "orig": "53 48 8d"}\n'
+                 '{"offset": 16, "orig": "00 00 00"}\n{"offset": 6')   # dup + torn
+    spo.enable(path)
+    assert spo._read_originals(path) == {0x10: "53 48 8d", 0x40: "53 48 8d",
+                                         0x80: "53 48 8d"}
+    assert not os.path.exists(path + ".suroot.json")
+    assert not os.path.exists(path + ".suroot.jsonl")
@@ -0,0 +1,291 @@
+"""Table model and view behind the Instances page's instance list.
+
+The list used to be a grid of one QCheckBox and three QLabels per instance,
+torn down and rebuilt on every status refresh and Magisk update: O(instances)
+widget churn per refresh that flickered once a farm passed ~50 instances.
+:class:`InstancesModel` keeps one row per ``unique_id`` instead -- rows are
+only inserted/removed when instances come and go, field changes are a
+``dataChanged`` on the affected cells, and the ticks live in the model keyed
+by id, so they survive any refresh.  The view only paints the rows on screen.
+
+Colours stay in the theme QSS: :class:`InstanceGridView` exposes them as
+``qproperty-`` colours, and the delegate picks one by each cell's
+:data:`STATE_ROLE` (the names the old labels were styled by).
+"""
+from __future__ import annotations
+
+import bisect
+
+from PyQt5.QtCore import (
+    Qt, QAbstractTableModel, QEvent, QModelIndex, pyqtProperty, pyqtSignal,
+)
+from PyQt5.QtGui import QColor, QPalette
+from PyQt5.QtWidgets import QAbstractItemView, QHeaderView, QStyledItemDelegate, QTableView
+
+import constants
+
+COL_NAME, COL_ROOT, COL_RW, COL_MAGISK = range(4)
+HEADERS = ("Instance", "Root", "R/W", "Magisk")
+
+UID_ROLE = Qt.UserRole
+STATE_ROLE = Qt.UserRole + 1   # "RootOn" / "RootOff" / "RwState": how the cell is styled
+
+# su_patch_offline.summarize_probes() states that mean root silently went away.
+SU_DRIFT = ("original", "mixed", "foreign")
+
+HINT_CONFLICT = ("App root and Magisk are both on. They both provide su and "
+                 "will fight; turn app root off.")
+HINT_SU_REVERTED = ("App root was on, but the su on this instance's disk is no "
+                    "longer patched (a BlueStacks update or the guest replaced "
+                    "it). Toggle Root to patch it again.")
+
+
+def row_label(unique_id: str, data: dict) -> str:
+    # Lead with the engine name, which is unique and stable. A display name
+    # only earns a place when the user renamed it from BlueStacks' generic
+    # default; otherwise every instance would read the same.
+    name = data.get("original_name") or unique_id
+    display = (data.get("display_name") or "").strip()
+    if display and display != name and display not in constants.GENERIC_DISPLAY_NAMES:
+        return "%s  ·  %s" % (name, display)   # "Tiramisu64 · My Bot"
+    return name
+
+
+def root_text(app_root: bool, magisk: dict | None) -> str:
+    if app_root and magisk:
+        return "App + Magisk"
+    if magisk:
+        return "Magisk"
+    return "App" if app_root else "Off"
+
+
+def magisk_text(magisk: dict | None) -> str:
+    if not magisk:
+        return "-"
+    return "yes" if "manager" in (magisk.get("components") or []) else "no app"
+
+
+class InstancesModel(QAbstractTableModel):
+    """One row per instance (sorted by ``unique_id``), with a tick in column 0."""
+
+    checked_changed = pyqtSignal()
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._ids: list[str] = []
+        self._data: dict[str, dict] = {}
+        self._magisk: dict[str, dict | None] = {}
+        self._checked: set[str] = set()
+
+    # --- Qt model interface ------------------------------------------------
+
+    def rowCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self._ids)
+
+    def columnCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return HEADERS[section]
+        return None
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.NoItemFlags
+        flags = Qt.ItemIsEnabled
+        if index.column() == COL_NAME:
+            flags |= Qt.ItemIsUserCheckable
+        return flags
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        uid = self._ids[index.row()]
+        data = self._data[uid]
+        col = index.column()
+        if role == UID_ROLE:
+            return uid
+        if col == COL_NAME:
+            if role == Qt.DisplayRole:
+                return row_label(uid, data)
+            if role == Qt.CheckStateRole:
+                return Qt.Checked if uid in self._checked else Qt.Unchecked
+            if role == Qt.ToolTipRole:
+                return uid
+            return None
+
+        app_root = bool(data.get("root_enabled"))
+        magisk = self._magisk.get(uid)
+        if col == COL_ROOT:
+            drifted = not (app_root or magisk) and data.get("su_state") in SU_DRIFT
+            if role == Qt.DisplayRole:
+                return "Reverted" if drifted else root_text(app_root, magisk)
+            if role == STATE_ROLE:
+                return "RootOn" if (app_root or magisk) else "RootOff"
+            if role == Qt.ToolTipRole:
+                if app_root and magisk:
+                    return HINT_CONFLICT
+                return HINT_SU_REVERTED if drifted else None
+            return None
+        if role == STATE_ROLE:
+            return "RwState"
+        if col == COL_RW and role == Qt.DisplayRole:
+            return "On" if data.get("rw_mode") == constants.MODE_READWRITE else "Off"
+        if col == COL_MAGISK:
+            if role == Qt.DisplayRole:
+                return magisk_text(magisk)
+            if role == Qt.ToolTipRole and magisk:
+                return "Magisk %s (%s)" % (magisk.get("version", "?"),
+                                           ", ".join(magisk.get("components") or []) or "?")
+        return None
+
+    def setData(self, index, value, role=Qt.EditRole) -> bool:
+        if not index.isValid() or index.column() != COL_NAME or role != Qt.CheckStateRole:
+            return False
+        self.set_checked(self._ids[index.row()], value == Qt.Checked)
+        return True
+
+    # --- state in ------------------------------------------------------------
+
+    def set_instances(self, instance_data: dict, preserve_selection: bool = True) -> None:
+        """Make the rows match ``instance_data`` (unique_id -> dict): rows for
+        vanished ids are removed, new ids inserted in order, and changed rows
+        repainted; an unchanged row isn't touched."""
+        if not preserve_selection and self._checked:
+            self._checked.clear()
+            self._emit_rows(range(len(self._ids)), COL_NAME, COL_NAME)
+            self.checked_changed.emit()
+        for uid in [u for u in self._ids if u not in instance_data]:
+            row = self.row_of(uid)
+            self.beginRemoveRows(QModelIndex(), row, row)
+            del self._ids[row]
+            del self._data[uid]
+            self.endRemoveRows()
+            if uid in self._checked:
+                self._checked.discard(uid)
+                self.checked_changed.emit()
+        changed = {uid: data for uid, data in instance_data.items()
+                   if uid in self._data and self._data[uid] != data}
+        for uid in sorted(u for u in instance_data if u not in self._data):
+            row = bisect.bisect_left(self._ids, uid)
+            self.beginInsertRows(QModelIndex(), row, row)
+            self._ids.insert(row, uid)
+            self._data[uid] = dict(instance_data[uid])
+            self.endInsertRows()
+        self.update_rows(changed)
+
+    def update_rows(self, rows: dict) -> None:
+        """Replace the data of existing ``rows`` and repaint just those."""
+        known = {uid: dict(data) for uid, data in rows.items() if uid in self._data}
+        self._data.update(known)
+        self._emit_rows((self.row_of(uid) for uid in known), COL_NAME, COL_MAGISK)
+
+    def set_magisk(self, statuses: dict) -> None:
+        """``statuses`` maps unique_id -> ``magisk_status()`` dict (or None)."""
+        old, self._magisk = self._magisk, dict(statuses)
+        self._emit_rows((row for row, uid in enumerate(self._ids)
+                         if old.get(uid) != self._magisk.get(uid)), COL_ROOT, COL_MAGISK)
+
+    def set_checked(self, unique_id: str, checked: bool = True) -> None:
+        if unique_id not in self._data or (unique_id in self._checked) == checked:
+            return
+        if checked:
+            self._checked.add(unique_id)
+        else:
+            self._checked.discard(unique_id)
+        self._emit_rows([self.row_of(unique_id)], COL_NAME, COL_NAME)
+        self.checked_changed.emit()
+
+    def _emit_rows(self, rows, first_col: int, last_col: int) -> None:
+        for row in rows:
+            self.dataChanged.emit(self.index(row, first_col), self.index(row, last_col))
+
+    # --- state out -----------------------------------------------------------
+
+    def ids(self) -> list[str]:
+        return list(self._ids)
+
+    def checked_ids(self) -> list[str]:
+        return [uid for uid in self._ids if uid in self._checked]
+
+    def row_data(self, unique_id: str) -> dict | None:
+        return self._data.get(unique_id)
+
+    def magisk(self, unique_id: str) -> dict | None:
+        return self._magisk.get(unique_id)
+
+    def row_of(self, unique_id: str) -> int:
+        return bisect.bisect_left(self._ids, unique_id)   # rows stay sorted by id
+
+
+class _StateDelegate(QStyledItemDelegate):
+    """Colours a cell by its :data:`STATE_ROLE` using the view's themed colours,
+    and ticks column 0 on a click anywhere in the cell, like the checkbox
+    label used to."""
+
+    def initStyleOption(self, option, index):
+        super().initStyleOption(option, index)
+        state = index.data(STATE_ROLE)
+        view = self.parent()
+        if state == "RootOn":
+            option.palette.setColor(QPalette.Text, view.rootOnColor)
+            option.font.setBold(True)
+        elif state:
+            option.palette.setColor(QPalette.Text, view.mutedColor)
+
+    def editorEvent(self, event, model, option, index):
+        if (index.column() == COL_NAME and event.type() == QEvent.MouseButtonRelease
+                and event.button() == Qt.LeftButton):
+            checked = index.data(Qt.CheckStateRole) == Qt.Checked
+            return model.setData(index, Qt.Unchecked if checked else Qt.Checked,
+                                 Qt.CheckStateRole)
+        return super().editorEvent(event, model, option, index)
+
+
+class InstanceGridView(QTableView):
+    """The instance table: one wide name column plus three narrow state
+    columns, fixed-height rows, no cell selection (the ticks are the selection)."""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setObjectName("InstanceGrid")
+        self._root_on = QColor("#0f7b0f")
+        self._muted = QColor(0, 0, 0, 140)
+        self.setItemDelegate(_StateDelegate(self))
+        self.setSelectionMode(QAbstractItemView.NoSelection)
+        self.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.setFocusPolicy(Qt.NoFocus)
+        self.setShowGrid(False)
+        self.setWordWrap(False)
+        self.setVerticalScrollMode(QAbstractItemView.ScrollPerPixel)
+        self.verticalHeader().hide()
+        # Fixed row heights: the view never has to measure rows off screen.
+        self.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.horizontalHeader().setHighlightSections(False)
+        self.horizontalHeader().setDefaultAlignment(Qt.AlignLeft | Qt.AlignVCenter)
+
+    def setModel(self, model) -> None:
+        super().setModel(model)
+        header = self.horizontalHeader()
+        header.setSectionResizeMode(COL_NAME, QHeaderView.Stretch)
+        for col in (COL_ROOT, COL_RW, COL_MAGISK):
+            header.setSectionResizeMode(col, QHeaderView.ResizeToContents)
+
+    def _get_root_on(self) -> QColor:
+        return self._root_on
+
+    def _set_root_on(self, color: QColor) -> None:
+        self._root_on = QColor(color)
+        self.viewport().update()
+
+    def _get_muted(self) -> QColor:
+        return self._muted
+
+    def _set_muted(self, color: QColor) -> None:
+        self._muted = QColor(color)
+        self.viewport().update()
+
+    # Set from the theme QSS (qproperty-rootOnColor / qproperty-mutedColor).
+    rootOnColor = pyqtProperty(QColor, _get_root_on, _set_root_on)
+    mutedColor = pyqtProperty(QColor, _get_muted, _set_muted)
@@ -14,13 +14,14 @@ instance (Launch, Restart, and everything Magisk) require exactly one tick.
 """
 from __future__ import annotations
 
-from PyQt5.QtCore import Qt, pyqtSignal
+from PyQt5.QtCore import pyqtSignal
 from PyQt5.QtWidgets import (
-    QWidget, QVBoxLayout, QGridLayout, QGroupBox, QCheckBox, QLabel,
-    QPushButton, QHBoxLayout, QScrollArea,
+    QWidget, QVBoxLayout, QGroupBox, QLabel, QPushButton, QHBoxLayout,
 )
 
-import constants
+from views.instances_model import (
+    HINT_CONFLICT, HINT_SU_REVERTED, SU_DRIFT, InstanceGridView, InstancesModel,
+)
 
 
 class InstancesPage(QWidget):
@@ -40,14 +41,14 @@ class InstancesPage(QWidget):
     install_lsposed_requested = pyqtSignal()
 
     _PICK_ONE = "Tick one instance to see what you can do with it."
+    _HINT_FLEET = ("Install Magisk into every ticked instance at once, or tick "
+                   "one instance to see everything you can do with it.")
     _HINT_APP = ("App root is on. It gives root to apps but no modules; install "
                  "Magisk instead if you want Zygisk or Xposed.")
     _HINT_INSTALL = "Install Magisk for managed root with modules, or use app root for a quick su."
     _HINT_MANAGER = "Next: start the instance, then install the manager app."
     _HINT_MODULES = ("Next: install ReZygisk, then LSPosed, then Restart once to "
                      "activate them.")
-    _HINT_CONFLICT = ("App root and Magisk are both on. They both provide su and "
-                      "will fight; turn app root off.")
 
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -68,32 +69,16 @@ class InstancesPage(QWidget):
         layout.addLayout(banner_row)
         self.set_engine_locked_banner(False)
 
-        # Instances group box: a scroll area wraps the grid so large instance
-        # counts (20+) don't force the window taller than the screen.
+        # Instances group box: a table view over InstancesModel. It scrolls on
+        # its own and only paints the visible rows, so farms with hundreds of
+        # instances stay smooth.
         self.instance_group = QGroupBox("Instances")
         instance_group_layout = QVBoxLayout(self.instance_group)
-
-        self.instance_scroll_area = QScrollArea()
-        self.instance_scroll_area.setWidgetResizable(True)
-        self.instance_scroll_area.setVerticalScrollBarPolicy(Qt.ScrollBarAsNeeded)
-        self.instance_scroll_area.setHorizontalScrollBarPolicy(Qt.ScrollBarAsNeeded)
-
-        self.instance_container = QWidget()
-        self.instance_layout = QGridLayout(self.instance_container)
-        # One wide name column plus three narrow state columns. The name used to
-        # be printed twice (checkbox text and a separate label), which ate the
-        # width that made everything else feel cramped; the id is a tooltip now.
-        self.instance_layout.setColumnStretch(0, 1)
-        for _c in (1, 2, 3):
-            self.instance_layout.setColumnStretch(_c, 0)
-        self.instance_layout.setHorizontalSpacing(18)
-        self.instance_layout.setVerticalSpacing(4)
-        # Rows start at the top of the scroll area; without this the grid floats
-        # in the vertical middle once there are only a few instances.
-        self.instance_layout.setAlignment(Qt.AlignTop)
-
-        self.instance_scroll_area.setWidget(self.instance_container)
-        instance_group_layout.addWidget(self.instance_scroll_area)
+        self.model = InstancesModel(self)
+        self.model.checked_changed.connect(self._update)
+        self.table = InstanceGridView()
+        self.table.setModel(self.model)
+        instance_group_layout.addWidget(self.table)
         layout.addWidget(self.instance_group)
 
         # --- what you do to the instance itself -----------------------------
@@ -171,9 +156,6 @@ class InstancesPage(QWidget):
         root_layout.addWidget(self.hint_label)
         layout.addWidget(self.root_group)
 
-        self.checkboxes: dict[str, QCheckBox] = {}
-        self._instance_data: dict[str, dict] = {}
-        self._magisk: dict[str, dict | None] = {}
         self._busy = False
         self._update()
 
@@ -191,102 +173,32 @@ class InstancesPage(QWidget):
 
     def set_magisk_statuses(self, statuses: dict) -> None:
         """``statuses`` maps unique_id -> ``magisk_status()`` dict (or None)."""
-        self._magisk = dict(statuses)
-        self._refresh_rows()
+        self.model.set_magisk(statuses)
         self._update()
 
-    def _clear_grid(self) -> None:
-        while self.instance_layout.count():
-            item = self.instance_layout.takeAt(0)
-            if item and item.widget():
-                item.widget().deleteLater()
-
     def set_instances(self, instance_data: dict, preserve_selection: bool = True) -> None:
-        """Rebuild the grid from ``instance_data`` (unique_id -> dict with
-        at least ``root_enabled`` and ``rw_mode``)."""
-        previous_selection = (
-            {uid for uid, cb in self.checkboxes.items() if cb.isChecked()}
-            if preserve_selection else set()
-        )
-        self._instance_data = dict(instance_data)
-        self._build_rows(previous_selection)
+        """Sync the list with ``instance_data`` (unique_id -> dict with at least
+        ``root_enabled`` and ``rw_mode``); only rows that differ are touched."""
+        self.model.set_instances(instance_data, preserve_selection)
         self._update()
 
-    def _refresh_rows(self) -> None:
-        self._build_rows({uid for uid, cb in self.checkboxes.items() if cb.isChecked()})
-
-    def _build_rows(self, selected: set) -> None:
-        self._clear_grid()
-        self.checkboxes = {}
-
-        # Column headers, so "Root:" and "R/W:" aren't repeated on every row.
-        for col, title in ((0, "Instance"), (1, "Root"), (2, "R/W"), (3, "Magisk")):
-            header = QLabel(title)
-            header.setObjectName("InstanceHeader")
-            self.instance_layout.addWidget(header, 0, col)
-
-        for index, unique_id in enumerate(sorted(self._instance_data.keys())):
-            row = index + 1                      # row 0 is the header
-            data = self._instance_data[unique_id]
-            app_root = bool(data.get("root_enabled"))
-            rw_on = data.get("rw_mode") == constants.MODE_READWRITE
-            magisk = self._magisk.get(unique_id)
-
-            # Lead with the engine name, which is unique and stable. A display
-            # name only earns a place when the user renamed it from BlueStacks'
-            # generic default; otherwise every instance would read the same.
-            checkbox = QCheckBox(self._row_label(unique_id, data))
-            checkbox.setChecked(unique_id in selected)
-            checkbox.setToolTip(unique_id)
-            checkbox.toggled.connect(self._update)
-
-            root_label = QLabel(self._root_text(app_root, magisk))
-            # Styled by object name in the theme's QSS instead of a hard-coded
-            # colour, so it follows the light/dark palette like everything else.
-            root_label.setObjectName("RootOn" if (app_root or magisk) else "RootOff")
-            if app_root and magisk:
-                root_label.setToolTip(self._HINT_CONFLICT)
-            rw_label = QLabel("On" if rw_on else "Off")
-            rw_label.setObjectName("RwState")
-            magisk_label = QLabel(self._magisk_text(magisk))
-            magisk_label.setObjectName("RwState")
-            if magisk:
-                magisk_label.setToolTip(
-                    "Magisk %s (%s)" % (magisk.get("version", "?"),
-                                        ", ".join(magisk.get("components") or []) or "?"))
-
-            self.instance_layout.addWidget(checkbox, row, 0)
-            self.instance_layout.addWidget(root_label, row, 1)
-            self.instance_layout.addWidget(rw_label, row, 2)
-            self.instance_layout.addWidget(magisk_label, row, 3)
-            self.checkboxes[unique_id] = checkbox
-
-    @staticmethod
-    def _row_label(unique_id: str, data: dict) -> str:
-        name = data.get("original_name") or unique_id
-        display = (data.get("display_name") or "").strip()
-        if display and display != name and display not in constants.GENERIC_DISPLAY_NAMES:
-            return "%s  ·  %s" % (name, display)   # "Tiramisu64 · My Bot"
-        return name
-
-    @staticmethod
-    def _root_text(app_root: bool, magisk: dict | None) -> str:
-        if app_root and magisk:
-            return "App + Magisk"
-        if magisk:
-            return "Magisk"
-        return "App" if app_root else "Off"
-
-    @staticmethod
-    def _magisk_text(magisk: dict | None) -> str:
-        if not magisk:
-            return "-"
-        return "yes" if "manager" in (magisk.get("components") or []) else "no app"
+    def update_rows(self, rows: dict) -> None:
+        """Repaint just ``rows`` (unique_id -> data) in place; an id without a
+        row yet is added."""
+        if rows.keys() <= set(self.model.ids()):
+            self.model.update_rows(rows)
+        else:
+            current = {uid: self.model.row_data(uid) for uid in self.model.ids()}
+            self.model.set_instances({**current, **rows})
+        self._update()
 
     # --- selection -------------------------------------------------------
 
     def selected_ids(self) -> list[str]:
-        return [uid for uid, cb in self.checkboxes.items() if cb.isChecked()]
+        return self.model.checked_ids()
+
+    def set_ticked(self, unique_id: str, ticked: bool = True) -> None:
+        self.model.set_checked(unique_id, ticked)
 
     def selected_instance_id(self):
         """The single ticked instance, or None when it isn't exactly one.
@@ -299,17 +211,24 @@ class InstancesPage(QWidget):
 
     def selected_status(self) -> dict | None:
         uid = self.selected_instance_id()
-        return self._magisk.get(uid) if uid else None
+        return self.model.magisk(uid) if uid else None
 
     # --- derived UI ------------------------------------------------------
 
-    def _hint_text(self, uid, app_root, installed, manager) -> str:
+    def _fleet_installable(self, ids) -> bool:
+        """Several instances ticked and none has Magisk yet: one fleet install."""
+        return len(ids) > 1 and not any(self.model.magisk(i) for i in ids)
+
+    def _hint_text(self, uid, app_root, installed, manager, drifted=False,
+                   fleet=False) -> str:
         if uid is None:
-            return self._PICK_ONE
+            return self._HINT_FLEET if fleet else self._PICK_ONE
         if app_root and installed:
-            return self._HINT_CONFLICT
+            return HINT_CONFLICT
         if app_root:
             return self._HINT_APP
+        if drifted and not installed:
+            return HINT_SU_REVERTED
         if not installed:
             return self._HINT_INSTALL
         if not manager:
@@ -318,15 +237,19 @@ class InstancesPage(QWidget):
 
     def _update(self, *_args) -> None:
         busy = self._busy
-        any_ticked = bool(self.selected_ids())
+        ids = self.selected_ids()
+        any_ticked = bool(ids)
+        fleet = self._fleet_installable(ids)
         uid = self.selected_instance_id()
-        data = self._instance_data.get(uid) if uid else None
-        st = self._magisk.get(uid) if uid else None
+        data = self.model.row_data(uid) if uid else None
+        st = self.model.magisk(uid) if uid else None
         app_root = bool(data and data.get("root_enabled"))
         installed = bool(st)
         manager = installed and "manager" in (st.get("components") or [])
 
-        self.hint_label.setText(self._hint_text(uid, app_root, installed, manager))
+        drifted = bool(data and data.get("su_state") in SU_DRIFT)
+        self.hint_label.setText(
+            self._hint_text(uid, app_root, installed, manager, drifted, fleet))
 
         # Bulk actions work on every tick; single-instance actions need one.
         self.root_toggle_button.setEnabled(any_ticked and not busy)
@@ -335,9 +258,10 @@ class InstancesPage(QWidget):
         self.restart_button.setEnabled(uid is not None and not busy)
 
         # Show only the Magisk actions that apply, in flow order. A present but
-        # disabled button reads as "you could do this" when you can't.
+        # disabled button reads as "you could do this" when you can't. Install
+        # alone also takes a multi-tick, as one fleet install.
         one = uid is not None
-        show_install = one and not installed
+        show_install = (one and not installed) or fleet
         self.install_button.setVisible(show_install)
         self.update_button.setVisible(one and installed)
         self.uninstall_button.setVisible(one and installed)
@@ -20,6 +20,7 @@ from PyQt5.QtWidgets import QMessageBox
 import adb_handler
 import constants
 import instance_handler
+import jobs
 import lsposed_payload
 import magisk_payload
 import magisk_system
@@ -48,6 +49,10 @@ class MagiskController:
 
     def handle_install(self) -> None:
         w = self._window
+        ticked = [u for u in w.instances_page.selected_ids() if u in w.instance_data]
+        if len(ticked) > 1:
+            self._install_fleet(ticked)
+            return
         uid, instance = self._selected_instance()
         if instance is None:
             return
@@ -82,12 +87,9 @@ class MagiskController:
             return
         data_path = instance["data_path"]
 
-        def job(progress):
-            progress("Closing BlueStacks...", 0)
-            instance_handler.terminate_bluestacks()
-            QThread.msleep(constants.PROCESS_TERMINATION_WAIT_MS)
+        def run(progress, _cancelled):
             try:
-                results = magisk_system.install(data_path, progress=lambda m: progress(m, -1))
+                results = magisk_system.install(data_path, progress=progress)
             except magisk_system.RollbackFailedError as exc:
                 # Distinct from a plain install failure: the automatic /system
                 # rollback also failed, so the instance may be left half-installed
@@ -99,7 +101,50 @@ class MagiskController:
                     "restore this instance from a backup." % (exc, uid)) from exc
             return results[-1] if results else "Magisk installed."
 
-        w._run_async(job, "Installing Magisk into %s..." % uid)
+        w._run_batch([jobs.Job(jobs.KIND_MAGISK_INSTALL, uid, run,
+                               jobs.disk_locks(data_path, "root_vhd", "data_vhdx"))],
+                     "Installing Magisk into %s..." % uid)
+
+    def _install_fleet(self, uids) -> None:
+        """Install Magisk into several ticked instances as one fleet install:
+        each shared Root.vhd is written once, every Data.vhdx staged after."""
+        w = self._window
+        if (any(w.instance_data[u].get("patch_mode") for u in uids)
+                and w._engine_state() != "patched"):
+            QMessageBox.warning(
+                w, "Patch the engine first",
+                "Installing Magisk modifies the guest system images, which only "
+                "boot on a patched engine. Patch it from the Dashboard, then "
+                "try again.")
+            return
+        if not w._confirm(
+                "Install Magisk",
+                "Install full offline Magisk system-root into %d instances?" % len(uids),
+                "<p>%s</p>"
+                "<p>Writes Magisk into each instance's system and data images "
+                "while BlueStacks is shut down. Clones of one Android version "
+                "share a master Root.vhd, which is written once for all of them. "
+                "All BlueStacks processes close first.</p>"
+                "<p>When it finishes: start each instance, enable ADB, then click "
+                "<b>Install manager app</b> on it.</p>" % ", ".join(uids)):
+            return
+        uid_of = {w.instance_data[u]["data_path"]: u for u in uids}
+        locks = frozenset().union(*(jobs.disk_locks(d, "root_vhd", "data_vhdx")
+                                    for d in uid_of))
+
+        def run(progress, _cancelled):
+            outcomes = magisk_system.install_fleet(list(uid_of), progress=progress)
+            failed = ["%s (%s)" % (uid_of[o.instance_dir], o.message)
+                      for o in outcomes if not o.ok]
+            if failed:
+                raise RuntimeError("%d of %d installed. Failed: %s"
+                                   % (len(outcomes) - len(failed), len(outcomes),
+                                      "; ".join(failed)))
+            return "Magisk installed into %d instances." % len(outcomes)
+
+        w._run_batch([jobs.Job(jobs.KIND_MAGISK_INSTALL, "%d instances" % len(uids),
+                               run, locks)],
+                     "Installing Magisk into %d instances..." % len(uids))
 
     def handle_uninstall(self) -> None:
         w = self._window
@@ -118,14 +163,13 @@ class MagiskController:
             return
         data_path = instance["data_path"]
 
-        def job(progress):
-            progress("Closing BlueStacks...", 0)
-            instance_handler.terminate_bluestacks()
-            QThread.msleep(constants.PROCESS_TERMINATION_WAIT_MS)
-            results = magisk_system.uninstall(data_path, progress=lambda m: progress(m, -1))
+        def run(progress, _cancelled):
+            results = magisk_system.uninstall(data_path, progress=progress)
             return results[-1] if results else "Magisk removed."
 
-        w._run_async(job, "Removing Magisk from %s..." % uid)
+        w._run_batch([jobs.Job(jobs.KIND_MAGISK_UNINSTALL, uid, run,
+                               jobs.disk_locks(data_path, "root_vhd", "data_vhdx"))],
+                     "Removing Magisk from %s..." % uid)
 
     def handle_update(self) -> None:
         w = self._window
@@ -187,7 +231,7 @@ class MagiskController:
                     "\"Install Magisk\"." % (exc, uid)) from exc
             return results[-1] if results else "Magisk updated."
 
-        w._run_async(job, "Updating Magisk on %s..." % uid)
+        w._run_async(job, "Updating Magisk on %s..." % uid, cancellable=True)
 
     def _adb_and_port(self, instance):
         """(adb_exe, port) for an over-ADB action on a running instance, or
@@ -247,7 +291,11 @@ class MagiskController:
 
         w._run_async(job, "Removing the Magisk manager from %s..." % uid)
 
-    def handle_install_rezygisk(self) -> None:
+    def _install_module(self, label: str, fetch, activate: str) -> None:
+        """Install one module zip into the ticked instance: over ADB if it is
+        running when the job starts, else offline into its shut-down Data.vhdx.
+
+        ``activate`` is the closing advice, with a %s for "Reboot"/"Start"."""
         w = self._window
         uid, instance = self._selected_instance()
         if instance is None:
@@ -255,35 +303,32 @@ class MagiskController:
         adb_exe, port = self._adb_and_port(instance)
         if not adb_exe:
             return
+        target = [(uid, instance["config_path"], instance["original_name"])]
+        data_path = instance["data_path"]
 
         def job(progress):
             def relay(msg):
                 progress(msg, -1)
-            progress("Fetching ReZygisk...", -1)
-            zip_path = rezygisk_payload.fetch_module(self._cache_dir(), progress=relay)
-            msg = adb_handler.install_module(adb_exe, port, zip_path, progress=relay)
-            w.show_notice.emit("ReZygisk installed", msg)
-            return "%s Reboot the instance to activate Zygisk." % msg
+            progress("Fetching %s..." % label, -1)
+            zip_path = fetch(self._cache_dir(), progress=relay)
+            if uid in adb_handler.list_running_instances(adb_exe, target):
+                msg = adb_handler.install_module(adb_exe, port, zip_path, progress=relay)
+                step = "Reboot"
+            else:
+                progress("%s is shut down; installing %s offline..." % (uid, label), -1)
+                msg = "; ".join(magisk_system.install_modules_offline(
+                    data_path, [zip_path], progress=relay)) + "."
+                step = "Start"
+            w.show_notice.emit("%s installed" % label, msg)
+            return "%s %s" % (msg, activate % step)
 
-        w._run_async(job, "Installing ReZygisk into %s..." % uid)
+        w._run_async(job, "Installing %s into %s..." % (label, uid), cancellable=True)
 
-    def handle_install_lsposed(self) -> None:
-        w = self._window
-        uid, instance = self._selected_instance()
-        if instance is None:
-            return
-        adb_exe, port = self._adb_and_port(instance)
-        if not adb_exe:
-            return
+    def handle_install_rezygisk(self) -> None:
+        self._install_module("ReZygisk", rezygisk_payload.fetch_module,
+                             "%s the instance to activate Zygisk.")
 
-        def job(progress):
-            def relay(msg):
-                progress(msg, -1)
-            progress("Fetching LSPosed...", -1)
-            zip_path = lsposed_payload.fetch_module(self._cache_dir(), progress=relay)
-            msg = adb_handler.install_module(adb_exe, port, zip_path, progress=relay)
-            w.show_notice.emit("LSPosed installed", msg)
-            return ("%s Reboot the instance to activate it (needs ReZygisk); then "
-                    "manage modules from the LSPosed app." % msg)
-
-        w._run_async(job, "Installing LSPosed into %s..." % uid)
+    def handle_install_lsposed(self) -> None:
+        self._install_module("LSPosed", lsposed_payload.fetch_module,
+                             "%s the instance to activate it (needs ReZygisk); then "
+                             "manage modules from the LSPosed app.")
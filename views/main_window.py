@@ -2,6 +2,7 @@
 """Main application window: nav rail + Dashboard/Instances/Modules pages."""
 from __future__ import annotations
 
+import dataclasses
 import os
 import sys
 import logging
@@ -11,19 +12,21 @@ from PyQt5.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QStackedWidget, QPushButton,
     QMessageBox, QFileDialog, QApplication,
 )
-from PyQt5.QtCore import Qt, QTimer, QThread, QObject, pyqtSignal, pyqtSlot
+from PyQt5.QtCore import Qt, QEvent, QTimer, QThread, QObject, pyqtSignal, pyqtSlot
 from PyQt5.QtGui import QIcon
 
+import cancellation
 import constants
 import registry_handler
 import config_handler
 import instance_handler
+import jobs
+import fs_watch
 import root_persistence
-import integrity_patch
 import su_patch_offline
 import ext4_symlink
 import adb_handler
-import magisk_system
+import status_snapshot
 import admin
 
 from views.nav_rail import (
@@ -37,6 +40,7 @@ from views.modules_page import ModulesPage
 from views.privacy_page import PrivacyPage
 from views.privacy_controller import PrivacyController
 from views.progress import OperationProgressBar, step_percent
+from views.status_watcher import StatusWatcher
 from views import theme
 from views import engine_rules
 
@@ -53,19 +57,27 @@ def resource_path(relative_path):
 
 class _OpWorker(QObject):
     """Runs a blocking job(progress) on a worker thread, relaying progress
-    text and an optional percent complete (-1 for unknown)."""
+    text and an optional percent complete (-1 for unknown).
+
+    The job runs in the scope of ``cancel`` (a ``cancellation.CancelToken``),
+    so the offline disk operations under it stop once that is cancelled."""
     progress = pyqtSignal(str, int)
     done = pyqtSignal(bool, str)
 
-    def __init__(self, job):
+    def __init__(self, job, cancel=None):
         super().__init__()
         self._job = job
+        self._cancel = cancel
 
     @pyqtSlot()
     def run(self):
         try:
-            summary = self._job(self.progress.emit)
+            with cancellation.scope(self._cancel):
+                summary = self._job(self.progress.emit)
             self.done.emit(True, summary)
+        except cancellation.Cancelled:
+            logger.info("Background operation cancelled")
+            self.done.emit(True, "Cancelled.")
         except Exception as exc:  # noqa: BLE001
             logger.exception("Background operation failed")
             self.done.emit(False, str(exc))
@@ -74,9 +86,9 @@ class _OpWorker(QObject):
 class _RunningScanWorker(QObject):
     """Probes which instances are reachable over ADB, on a worker thread.
 
-    The probe shells out to adb once per instance (adb server start + a per-port
-    ``connect`` that blocks until it succeeds or times out), which can take
-    several seconds and must never run on the UI thread.
+    The probe TCP-checks every recorded port in parallel and only shells out to
+    adb (server start + ``connect``) for ports that accept, which can still take
+    a moment and must never run on the UI thread.
     """
     finished = pyqtSignal(list)  # sorted list of running unique_ids
 
@@ -95,6 +107,28 @@ class _RunningScanWorker(QObject):
             self.finished.emit([])
 
 
+class _StatusWorker(QObject):
+    """Collects a ``status_snapshot.Snapshot`` on a worker thread, so conf
+    parsing, ``.bstk`` reads and the engine PE scan never stall the window."""
+    finished = pyqtSignal(object)  # Snapshot, or None if the collection failed
+
+    def __init__(self, installations, previous, only, engine):
+        super().__init__()
+        self._installations = installations
+        self._previous = previous
+        self._only = only
+        self._engine = engine
+
+    @pyqtSlot()
+    def run(self):
+        try:
+            self.finished.emit(status_snapshot.collect(
+                self._installations, self._previous, self._only, self._engine))
+        except Exception:  # noqa: BLE001 - keep showing the last good snapshot
+            logger.exception("Status refresh failed")
+            self.finished.emit(None)
+
+
 class MainWindow(QWidget):
     """Main application window for toggling BlueStacks root and R/W settings."""
 
@@ -113,8 +147,18 @@ class MainWindow(QWidget):
         self._scan_thread = None
         self._scan_worker = None
         self._scan_pending = False
-        self.status_refresh_timer = QTimer(self)
-        self.status_refresh_timer.timeout.connect(self._on_status_timer)
+        self._batch = None   # the jobs.Batch the operation thread is running, if any
+        self._op_cancel = None   # cancels the running operation (cancellation.CancelToken)
+        self._close_pending = False   # close once the cancelled operation has unwound
+        # Background status collection (see _request_status_refresh).
+        self._snapshot = status_snapshot.EMPTY
+        self._status_thread = None
+        self._status_worker = None
+        self._status_queued = None
+        self._status_generation = 0   # bumped to discard a stale in-flight result
+        self._status_launched = 0
+        self.status_watcher = StatusWatcher(self)
+        self.status_watcher.changed.connect(self._on_status_changed)
         self.init_ui()
         QTimer.singleShot(0, self.initialize_paths_and_instances)
 
@@ -173,6 +217,7 @@ class MainWindow(QWidget):
         root_layout.addLayout(body, 1)
 
         self.progress_bar = OperationProgressBar()
+        self.progress_bar.cancel_requested.connect(self._cancel_operation)
         root_layout.addWidget(self.progress_bar)
 
         self.dashboard_page.patch_engine_requested.connect(self.handle_engine_button)
@@ -235,12 +280,11 @@ class MainWindow(QWidget):
             path_details.append(f"  - {inst['source']} v{ver}: {inst['user_path']}")
         self.dashboard_page.set_paths_text("\n".join(path_details))
 
-        # Populate instance_data BEFORE refreshing the patch UI: the Dashboard
-        # "N / M instances rooted" stat is derived from instance_data, so
-        # refreshing first would render "0 / 0" until the next timer tick.
-        self.update_instance_statuses(preserve_selection=False)
-        self._refresh_patch_ui()
-        self.status_refresh_timer.start(constants.REFRESH_INTERVAL_MS)
+        # The first snapshot fills the grid, the engine state and the rooted
+        # count together, and seeds the revert detection.
+        self._request_status_refresh(engine=True)
+        self.status_watcher.watch(self.installations)
+        self.status_watcher.start()
 
     def _refresh_patch_ui(self, state: str | None = None) -> None:
         has_patch_build = any(i.get("patch_mode") for i in self.installations)
@@ -253,7 +297,7 @@ class MainWindow(QWidget):
             text, color, tip, enabled = {
                 "patched": ("Engine patched (click to Undo)",
                             "#2e7d32", "Restores HD-Player.exe and HD-MultiInstanceManager.exe "
-                            "from the .prepatch.bak backups.", True),
+                            "from the backup store.", True),
                 "unpatched": ("Patch BlueStacks Engine (required for root)",
                               "#c62828", "Patches HD-Player.exe (and HD-MultiInstanceManager.exe) "
                               "to disable the integrity shutdown so rooted instances boot. Do "
@@ -276,25 +320,24 @@ class MainWindow(QWidget):
         self.dashboard_page.set_rooted_count(rooted, len(self.instance_data))
 
     def _engine_state(self) -> str:
-        states = [integrity_patch.installation_patched(i["install_path"])
-                  for i in self.installations
-                  if i.get("patch_mode") and i.get("install_path")
-                  and os.path.isdir(i["install_path"])]
-        if states and all(s is True for s in states):
-            return "patched"
-        if states and all(s is False for s in states):
-            return "unpatched"
-        if any(s is True for s in states):
-            return "partial"
-        return "unknown"
-
-    def _on_status_timer(self) -> None:
-        self.update_instance_statuses(preserve_selection=True)
-        # _engine_state() reads and byte-scans HD-Player.exe from disk; compute
-        # it once per tick and share it with both consumers.
-        state = self._engine_state()
-        self._refresh_patch_ui(state)
-        self._check_for_reverted_patch(state)
+        return status_snapshot.engine_state(self.installations)
+
+    def _on_status_changed(self, targets) -> None:
+        """Refresh only what the watcher saw change: the touched instances, a
+        whole installation (conf rewritten, instance added/removed), and/or
+        the engine state."""
+        scopes = {t.scope for t in targets}
+        engine = fs_watch.SCOPE_ENGINE in scopes
+        if fs_watch.SCOPE_INSTALLATION in scopes:
+            self._request_status_refresh(engine=engine)
+            # Instances may have come or gone: re-plan what is watched.
+            self.status_watcher.watch(self.installations)
+        elif fs_watch.SCOPE_INSTANCE in scopes:
+            self._request_status_refresh(
+                only={t.path for t in targets if t.scope == fs_watch.SCOPE_INSTANCE},
+                engine=engine)
+        elif engine:
+            self._request_status_refresh(only=(), engine=True)
 
     def _check_for_reverted_patch(self, current_state: str | None = None) -> None:
         if current_state is None:
@@ -319,78 +362,6 @@ class MainWindow(QWidget):
         else:
             self.handle_apply_patches()
 
-    def update_instance_data(self) -> None:
-        if not self.installations:
-            return
-
-        all_found_instances: dict[str, dict[str, Any]] = {}
-        for inst in self.installations:
-            source_id, config_path, data_path = inst["source"], inst["config_path"], inst["data_path"]
-            install_path = inst.get("install_path")
-            patch_mode = inst.get("patch_mode", False)
-            root_info = config_handler.get_complete_root_statuses(config_path)
-            instance_root_statuses = root_info['instance_statuses']
-            display_names = root_info.get('display_names', {})
-
-            disk_instances = set()
-            if os.path.isdir(data_path):
-                try:
-                    disk_instances = {
-                        entry for entry in os.listdir(data_path)
-                        if os.path.isdir(os.path.join(data_path, entry))
-                    }
-                except OSError:
-                    # Runs on the status-refresh timer; a PermissionError here
-                    # must not take down the refresh loop.
-                    logger.warning("Could not list %s", data_path, exc_info=True)
-            all_instance_names = set(instance_root_statuses.keys()) | disk_instances
-
-            for name in sorted(all_instance_names):
-                unique_id = f"{name} ({source_id})"
-                instance_dir_path = os.path.join(data_path, name)
-
-                rw_mode = constants.MODE_UNKNOWN
-                if os.path.isdir(instance_dir_path):
-                    is_readonly = instance_handler.is_instance_readonly(instance_dir_path)
-                    if is_readonly is True:
-                        rw_mode = constants.MODE_READONLY
-                    elif is_readonly is False:
-                        rw_mode = constants.MODE_READWRITE
-
-                individual_root_on = instance_root_statuses.get(name, False)
-                if patch_mode:
-                    effective_root_status = su_patch_offline.instance_root_state(instance_dir_path)
-                else:
-                    effective_root_status = individual_root_on
-                # A Magisk system-mode install roots via /system -- it never sets
-                # the bluestacks.conf root flag or the su-patch marker, so without
-                # this the dashboard reads "0 rooted" for a Magisk-rooted instance.
-                if not effective_root_status and \
-                        magisk_system.magisk_status(instance_dir_path) is not None:
-                    effective_root_status = True
-
-                all_found_instances[unique_id] = {
-                    "original_name": name,
-                    "config_path": config_path,
-                    "data_path": instance_dir_path,
-                    "install_path": install_path,
-                    "rw_mode": rw_mode,
-                    "root_enabled": effective_root_status,
-                    "individual_root_status": individual_root_on,
-                    "display_name": display_names.get(name, name),
-                    "patch_mode": patch_mode,
-                }
-
-        self.instance_data = {
-            uid: data for uid, data in all_found_instances.items()
-            if data["rw_mode"] != constants.MODE_UNKNOWN
-        }
-
-        logger.debug(f"Instance data updated. Displaying {len(self.instance_data)} instances.")
-
-    def update_instance_checkboxes(self, preserve_selection: bool = True) -> None:
-        self.instances_page.set_instances(self.instance_data, preserve_selection)
-
     def _toggle_single_instance_root(self, unique_id, progress=None):
         if self.instance_data[unique_id].get("patch_mode"):
             self._toggle_root_patchmode(unique_id, progress)
@@ -405,8 +376,8 @@ class MainWindow(QWidget):
         if turn_on:
             if progress:
                 progress("Part 1/2: enabling root access in bluestacks.conf...")
-            config_handler.modify_config_file(config_path, key, "1")
-            config_handler.modify_config_file(config_path, constants.FEATURE_ROOTING_KEY, "1")
+            config_handler.modify_config_settings(
+                config_path, {key: "1", constants.FEATURE_ROOTING_KEY: "1"})
             if progress:
                 progress("Part 2/2: patching guest su in Data.vhdx...")
             results = su_patch_offline.set_instance_root(instance["data_path"], True, progress)
@@ -436,17 +407,18 @@ class MainWindow(QWidget):
         is_currently_on = instance["root_enabled"]
         setting_key = f"{constants.INSTANCE_PREFIX}{original_name}{constants.ENABLE_ROOT_KEY}"
         if is_currently_on:
-            config_handler.modify_config_file(config_path, setting_key, "0")
+            edits = {setting_key: "0"}
             any_other_rooted = any(
                 d.get("individual_root_status", False)
                 for uid, d in self.instance_data.items()
                 if uid != unique_id and d["config_path"] == config_path)
             if not any_other_rooted:
-                config_handler.modify_config_file(config_path, constants.FEATURE_ROOTING_KEY, "0")
+                edits[constants.FEATURE_ROOTING_KEY] = "0"
+            config_handler.modify_config_settings(config_path, edits)
             self._set_classic_app_su(instance, False, progress)
         else:
-            config_handler.modify_config_file(config_path, setting_key, "1")
-            config_handler.modify_config_file(config_path, constants.FEATURE_ROOTING_KEY, "1")
+            config_handler.modify_config_settings(
+                config_path, {setting_key: "1", constants.FEATURE_ROOTING_KEY: "1"})
             self._set_classic_app_su(instance, True, progress)
         logger.info(f"Root toggle (conf) processed for {unique_id}")
 
@@ -460,6 +432,8 @@ class MainWindow(QWidget):
             else:
                 results = ext4_symlink.remove_su_symlink(instance["data_path"], progress)
             logger.info("app-su %s: %s", "ON" if turn_on else "OFF", " | ".join(results))
+        except cancellation.Cancelled:
+            raise
         except Exception as exc:  # noqa: BLE001
             logger.warning("app-su symlink step failed: %s", exc)
             if progress:
@@ -492,23 +466,28 @@ class MainWindow(QWidget):
                     % (", ".join(blocked), "" if len(blocked) > 1 else "s"))
                 return
 
-        total = len(selected_ids)
-
-        def job(progress):
-            progress("Closing BlueStacks...", 0)
-            logger.info("Terminating BlueStacks before %s of %d instance(s)", operation_name, total)
-            instance_handler.terminate_bluestacks()
-            QThread.msleep(constants.PROCESS_TERMINATION_WAIT_MS)
-            for idx, uid in enumerate(selected_ids, 1):
-                prefix = "Part %d/%d (%s)" % (idx, total, uid)
-                logger.info("---- %s: %s ----", prefix, operation_name)
-                pct = step_percent(idx - 1, total)
-                progress("%s: %s..." % (prefix, operation_name), pct)
-                operation_func(uid, lambda m, _p=prefix, _pct=pct: progress("%s: %s" % (_p, m), _pct))
-            return ("%s complete for %d instance(s). They're now closed. Start "
-                    "them from BlueStacks to use the change." % (operation_name, total))
+        if operation_name == "Root":
+            batch_jobs = [self._root_job(uid) for uid in selected_ids]
+        else:
+            batch_jobs = [self._rw_job(uid) for uid in selected_ids]
+        self._run_batch(batch_jobs, f"Toggling {operation_name}...")
 
-        self._run_async(job, f"Toggling {operation_name}...")
+    def _root_job(self, unique_id) -> jobs.Job:
+        instance = self.instance_data[unique_id]
+        # Patch-mode root flips su inside the instance's Data.vhdx; classic root
+        # adds the su symlink to Root.vhd, which clones share with their master.
+        disk = "data_vhdx" if instance.get("patch_mode") else "root_vhd"
+        return jobs.Job(
+            jobs.KIND_UNROOT if instance["root_enabled"] else jobs.KIND_ROOT, unique_id,
+            lambda progress, _cancelled: self._toggle_single_instance_root(unique_id, progress),
+            jobs.disk_locks(instance["data_path"], disk))
+
+    def _rw_job(self, unique_id) -> jobs.Job:
+        instance = self.instance_data[unique_id]
+        return jobs.Job(
+            jobs.KIND_RW, unique_id,
+            lambda progress, _cancelled: self._toggle_single_instance_rw(unique_id, progress),
+            jobs.instance_lock(instance["data_path"]))
 
     def handle_toggle_root(self):
         self._perform_operation(self._toggle_single_instance_root, "Root")
@@ -655,17 +634,55 @@ class MainWindow(QWidget):
         self.instances_page.set_busy(busy)
         self.privacy_page.set_busy(busy)
         if busy:
-            self.status_refresh_timer.stop()
+            self.status_watcher.stop()
 
-    def _run_async(self, job, start_text):
+    def _close_bluestacks(self) -> None:
+        logger.info("Terminating BlueStacks before the batch")
+        instance_handler.terminate_bluestacks()
+        QThread.msleep(constants.PROCESS_TERMINATION_WAIT_MS)
+
+    def _run_batch(self, batch_jobs, start_text) -> None:
+        """Run ``batch_jobs`` as one ``jobs.Batch`` on the operation thread.
+
+        BlueStacks is closed once for the whole batch, jobs on disjoint disks
+        run side by side, Cancel drops the jobs that haven't started and stops
+        the running ones, and the status line ends on a per-outcome summary.
+        """
+        batch = jobs.Batch(batch_jobs, shutdown=self._close_bluestacks)
+
+        def job(progress):
+            return jobs.summarize(batch.run(progress))
+
+        if self._run_async(job, start_text, cancellable=True):
+            self._batch = batch
+
+    def _cancel_operation(self) -> None:
+        """Cancel the running operation: each job rolls back what it wrote and
+        detaches its disk before it stops, which can take a few seconds."""
+        if self._op_cancel is not None:
+            self._op_cancel.cancel()
+        if self._batch is not None:
+            self._batch.cancel()
+        if getattr(self, "_op_thread", None) is not None:
+            self.progress_bar.set_progress("Cancelling: rolling back and detaching...", None)
+
+    def _run_async(self, job, start_text, cancellable=False) -> bool:
+        """Run ``job(progress)`` on the operation thread; False if one is running.
+
+        With ``cancellable`` the progress bar shows Cancel.  Either way the job
+        runs under a ``cancellation.CancelToken`` that closing the window
+        cancels.
+        """
         if getattr(self, "_op_thread", None) is not None:
             QMessageBox.information(self, "Busy", "An operation is already running.")
-            return
+            return False
         self._set_busy(True)
         self.progress_bar.start(start_text)
+        self.progress_bar.set_cancellable(cancellable)
         logger.info("==== %s ====", start_text)
+        self._op_cancel = cancellation.CancelToken()
         self._op_thread = QThread(self)
-        self._op_worker = _OpWorker(job)
+        self._op_worker = _OpWorker(job, self._op_cancel)
         self._op_worker.moveToThread(self._op_thread)
         self._op_thread.started.connect(self._op_worker.run)
         self._op_worker.progress.connect(self._on_async_progress)
@@ -676,6 +693,7 @@ class MainWindow(QWidget):
         self._op_worker.done.connect(self._op_worker.deleteLater)
         self._op_thread.finished.connect(self._cleanup_async)
         self._op_thread.start()
+        return True
 
     def _on_async_progress(self, msg, pct):
         self.progress_bar.set_progress(msg, None if pct < 0 else pct)
@@ -702,27 +720,34 @@ class MainWindow(QWidget):
         return box.exec_() == QMessageBox.Yes
 
     def _on_async_done(self, ok, summary):
+        self._batch = None
         self._set_busy(False)
         self.progress_bar.finish(summary if ok else f"Error: {summary}")
         logger.info("Operation finished (ok=%s): %s", ok, summary)
-        self.update_instance_statuses(preserve_selection=True)
+        # The engine state is read here, not by the background refresh: the
+        # operation just finished writing the binaries, and the "reverted"
+        # alert must clear (or stay clear) the moment it reports done.
         state = self._engine_state()
         self._refresh_patch_ui(state)
-        # A successful (re)patch clears any standing "reverted" alert right away
-        # instead of waiting for the next timer tick. We only ever CLEAR here:
-        # a user-initiated Undo (state now unpatched) must not re-raise the
-        # alert, and resyncing _last_engine_state keeps the next tick from
-        # misreading that deliberate change as an auto-revert.
+        # We only ever CLEAR the alert here: a user-initiated Undo (state now
+        # unpatched) must not re-raise it, and resyncing _last_engine_state
+        # keeps the next refresh from misreading that deliberate change as an
+        # auto-revert.
         if state == "patched":
             self.dashboard_page.set_update_reverted(False)
         self._last_engine_state = state
+        self._snapshot = dataclasses.replace(self._snapshot, engine_state=state)
+        # A collection still in flight started before the operation: drop it.
+        self._status_generation += 1
+        self._request_status_refresh()
         if self.nav_rail.current() == NAV_MODULES:
             self._refresh_running_instances()
         elif self.nav_rail.current() == NAV_INSTANCES:
             self.magisk_controller.refresh_statuses()
         elif self.nav_rail.current() == NAV_PRIVACY:
             self.privacy_controller.refresh_statuses()
-        self.status_refresh_timer.start(constants.REFRESH_INTERVAL_MS)
+        self.status_watcher.watch(self.installations)
+        self.status_watcher.start()
 
     def _cleanup_async(self):
         # The worker deletes itself via its done -> deleteLater connection.
@@ -730,6 +755,10 @@ class MainWindow(QWidget):
             self._op_thread.deleteLater()
         self._op_worker = None
         self._op_thread = None
+        self._op_cancel = None
+        # closeEvent cancelled this operation and is waiting for it to unwind.
+        if self._close_pending:
+            self.close()
 
     def _install_dirs_or_warn(self):
         if not admin.is_admin():
@@ -779,11 +808,8 @@ class MainWindow(QWidget):
             QThread.msleep(constants.PROCESS_TERMINATION_WAIT_MS)
             all_results = []
             for i, install_dir in enumerate(install_dirs, 1):
-                pct = step_percent(i - 1, total)
-                progress("Patching engine %d/%d: HD-Player.exe..." % (i, total), pct)
-                all_results.extend(integrity_patch.patch_installation(install_dir))
-                progress("Patching engine %d/%d: HD-MultiInstanceManager.exe..." % (i, total), pct)
-                all_results.extend(root_persistence.patch_root_persistence(install_dir))
+                progress("Patching engine %d/%d..." % (i, total), step_percent(i - 1, total))
+                all_results.extend(root_persistence.patch_engine(install_dir))
             for line in all_results:
                 logger.info("  %s", line)
             logger.info("Engine patched. Next: Toggle Root per instance, then start "
@@ -801,8 +827,8 @@ class MainWindow(QWidget):
                 "Undo Root Patch",
                 "Restore the original BlueStacks binaries?",
                 "<p>This restores <b>HD-Player.exe</b> and "
-                "<b>HD-MultiInstanceManager.exe</b> from their <b>.prepatch.bak</b> "
-                "backups, undoing the root patch.</p>"
+                "<b>HD-MultiInstanceManager.exe</b> from the backup store, undoing "
+                "the root patch.</p>"
                 "<p>All BlueStacks processes will be closed first.</p>"):
             return
 
@@ -815,30 +841,99 @@ class MainWindow(QWidget):
             all_results = []
             for i, install_dir in enumerate(install_dirs, 1):
                 progress("Restoring engine %d/%d..." % (i, total), step_percent(i - 1, total))
-                all_results.extend(integrity_patch.patch_installation(install_dir, restore=True))
-                all_results.extend(root_persistence.patch_root_persistence(install_dir, restore=True))
+                all_results.extend(root_persistence.patch_engine(install_dir, restore=True))
             for line in all_results:
                 logger.info("  %s", line)
             return "Engine binaries restored from backup."
 
         self._run_async(job, "Restoring BlueStacks engine...")
 
-    def update_instance_statuses(self, preserve_selection: bool = True):
-        self.update_instance_data()
-        self.update_instance_checkboxes(preserve_selection)
+    def _request_status_refresh(self, only=None, engine: bool = False) -> None:
+        """Collect fresh status on a worker thread and apply what changed.
+
+        ``only`` limits the re-read to those instance dirs and ``engine``
+        re-scans the engine binaries. Only one collection runs at a time;
+        requests arriving meanwhile are merged and run once it finishes.
+        """
+        request = {"only": None if only is None else set(only), "engine": engine}
+        if self._status_thread is not None:
+            queued = self._status_queued
+            if queued is None:
+                self._status_queued = request
+            else:
+                queued["only"] = (None if queued["only"] is None or request["only"] is None
+                                  else queued["only"] | request["only"])
+                queued["engine"] |= engine
+            return
+        self._status_queued = None
+        self._status_launched = self._status_generation
+        self._status_thread = QThread(self)
+        self._status_worker = _StatusWorker(
+            list(self.installations), self._snapshot, request["only"], engine)
+        self._status_worker.moveToThread(self._status_thread)
+        self._status_thread.started.connect(self._status_worker.run)
+        self._status_worker.finished.connect(self._on_status_collected)
+        self._status_worker.finished.connect(self._status_thread.quit)
+        # Delete the worker from inside its own still-running event loop (see
+        # _refresh_running_instances for why a post-stop deleteLater leaks).
+        self._status_worker.finished.connect(self._status_worker.deleteLater)
+        self._status_thread.finished.connect(self._cleanup_status)
+        self._status_thread.start()
+
+    def _on_status_collected(self, snapshot) -> None:
+        if snapshot is None or self._status_launched != self._status_generation:
+            return
+        delta = status_snapshot.diff(self._snapshot, snapshot)
+        self._snapshot = snapshot
+        if delta.rows_changed:
+            self.instance_data = snapshot.instance_data()
+            if delta.added or delta.removed:
+                self.instances_page.set_instances(self.instance_data)
+            else:
+                self.instances_page.update_rows(
+                    {uid: self.instance_data[uid] for uid in delta.changed})
+            logger.debug("Instance data updated. Displaying %d instances.",
+                         len(self.instance_data))
+        root_changed = delta.added or delta.removed or any(
+            "root_enabled" in fields for fields in delta.changed.values())
+        state = snapshot.engine_state
+        if delta.engine_changed or root_changed:
+            self._refresh_patch_ui(state)
+        if delta.engine_changed:
+            self._check_for_reverted_patch(state)
+
+    def _cleanup_status(self) -> None:
+        # The worker deletes itself via its finished -> deleteLater connection.
+        if self._status_thread is not None:
+            self._status_thread.deleteLater()
+        self._status_worker = None
+        self._status_thread = None
+        if self._status_queued is not None:
+            self._request_status_refresh(**self._status_queued)
+
+    def changeEvent(self, event):
+        if event.type() == QEvent.WindowStateChange:
+            # Nobody is looking: let the watcher's fallback poll back off further.
+            self.status_watcher.set_minimized(self.isMinimized())
+        super().changeEvent(event)
 
     def closeEvent(self, event):
         # A background engine/root operation writes real binaries and disk
         # images; tearing the app down mid-write can crash on exit or corrupt
-        # those files. Refuse to close until it finishes rather than killing it.
+        # those files. Cancel it instead: it rolls back and detaches its disks,
+        # and _cleanup_async closes the window once the thread has finished.
         if getattr(self, "_op_thread", None) is not None:
-            QMessageBox.warning(
-                self, "Operation in progress",
-                "A background operation is still running. Please wait for it to "
-                "finish before closing.")
+            self._close_pending = True
+            self._cancel_operation()
+            self.progress_bar.set_progress(
+                "Cancelling the running operation, then closing...", None)
             event.ignore()
             return
-        self.status_refresh_timer.stop()
+        self.status_watcher.stop()
+        self._status_queued = None
+        if self._status_thread is not None:
+            self._status_thread.quit()
+            self._status_thread.wait(5000)
         # Don't let a running ADB probe outlive the window (QThread would warn
         # "destroyed while still running"). It's bounded by adb's own timeout.
         self._scan_pending = False
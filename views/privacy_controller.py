@@ -21,6 +21,7 @@ from PyQt5.QtWidgets import QMessageBox
 import ad_settings
 import constants
 import instance_handler
+import jobs
 import telemetry_block
 
 
@@ -41,8 +42,9 @@ class PrivacyController:
     def refresh_statuses(self) -> None:
         """Fill the Privacy tab: global ad-switch state + per-instance blocks."""
         w = self._window
-        statuses = {uid: telemetry_block.status(data["data_path"])
-                    for uid, data in w.instance_data.items()}
+        by_dir = telemetry_block.statuses(
+            data["data_path"] for data in w.instance_data.values())
+        statuses = {uid: by_dir[data["data_path"]] for uid, data in w.instance_data.items()}
         w.privacy_page.set_instances(statuses)
 
         config_path = self._config_path()
@@ -165,14 +167,13 @@ class PrivacyController:
             return
         data_path = instance["data_path"]
 
-        def job(progress):
-            progress("Closing BlueStacks...", 0)
-            instance_handler.terminate_bluestacks()
-            QThread.msleep(constants.PROCESS_TERMINATION_WAIT_MS)
-            results = telemetry_block.apply(data_path, progress=lambda m: progress(m, -1))
+        def run(progress, _cancelled):
+            results = telemetry_block.apply(data_path, progress=progress)
             return results[-1] if results else "Trackers blocked."
 
-        w._run_async(job, "Blocking trackers in %s..." % uid)
+        w._run_batch([jobs.Job(jobs.KIND_HOSTS_BLOCK, uid, run,
+                               jobs.disk_locks(data_path, "root_vhd"))],
+                     "Blocking trackers in %s..." % uid)
 
     def handle_unblock(self) -> None:
         w = self._window
@@ -187,11 +188,10 @@ class PrivacyController:
             return
         data_path = instance["data_path"]
 
-        def job(progress):
-            progress("Closing BlueStacks...", 0)
-            instance_handler.terminate_bluestacks()
-            QThread.msleep(constants.PROCESS_TERMINATION_WAIT_MS)
-            results = telemetry_block.remove(data_path, progress=lambda m: progress(m, -1))
+        def run(progress, _cancelled):
+            results = telemetry_block.remove(data_path, progress=progress)
             return results[-1] if results else "Block removed."
 
-        w._run_async(job, "Removing the block from %s..." % uid)
+        w._run_batch([jobs.Job(jobs.KIND_HOSTS_UNBLOCK, uid, run,
+                               jobs.disk_locks(data_path, "root_vhd"))],
+                     "Removing the block from %s..." % uid)
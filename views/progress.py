@@ -3,7 +3,8 @@ from __future__ import annotations
 
 from typing import Optional
 
-from PyQt5.QtWidgets import QWidget, QVBoxLayout, QLabel, QProgressBar
+from PyQt5.QtCore import pyqtSignal
+from PyQt5.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QLabel, QProgressBar, QPushButton
 
 
 def step_percent(index: int, total: int) -> int:
@@ -23,6 +24,8 @@ class OperationProgressBar(QWidget):
     shows itself while an operation is running (determinate or
     indeterminate/busy)."""
 
+    cancel_requested = pyqtSignal()
+
     def __init__(self, parent: Optional[QWidget] = None):
         super().__init__(parent)
         layout = QVBoxLayout(self)
@@ -34,14 +37,31 @@ class OperationProgressBar(QWidget):
         self._bar = QProgressBar()
         self._bar.setTextVisible(False)
         self._bar.setVisible(False)
+        # Only batches can stop part-way (the jobs not started yet), so the
+        # button is shown on request rather than for every operation.
+        self._cancel = QPushButton("Cancel")
+        self._cancel.setVisible(False)
+        self._cancel.clicked.connect(self._on_cancel)
+        bar_row = QHBoxLayout()
+        bar_row.addWidget(self._bar, 1)
+        bar_row.addWidget(self._cancel)
         layout.addWidget(self._label)
-        layout.addWidget(self._bar)
+        layout.addLayout(bar_row)
 
     def start(self, text: str) -> None:
         self.show()  # Ensure parent is visible
         self._bar.setVisible(True)
+        self.set_cancellable(False)
         self.set_progress(text, None)
 
+    def set_cancellable(self, cancellable: bool) -> None:
+        self._cancel.setVisible(cancellable)
+        self._cancel.setEnabled(cancellable)
+
+    def _on_cancel(self) -> None:
+        self._cancel.setEnabled(False)   # one request is enough
+        self.cancel_requested.emit()
+
     def set_progress(self, text: str, pct: Optional[int]) -> None:
         self._label.setText(text)
         if pct is None:
@@ -53,5 +73,6 @@ class OperationProgressBar(QWidget):
     def finish(self, text: str) -> None:
         self._label.setText(text)
         self._bar.setVisible(False)
+        self.set_cancellable(False)
         self._bar.setRange(0, 100)
         self._bar.setValue(0)
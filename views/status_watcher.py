@@ -0,0 +1,118 @@
+"""Change-driven status refresh: tells MainWindow *what* changed, not "5 s passed".
+
+Wraps a ``QFileSystemWatcher`` over an ``fs_watch.WatchPlan`` plus a
+stat-snapshot poll for whatever the native watcher can't cover.  Events are
+debounced (a burst becomes one refresh) and folded into the set of
+``fs_watch.Target`` s they affect, which :attr:`StatusWatcher.changed` carries.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import time
+
+from PyQt5.QtCore import QObject, QFileSystemWatcher, QTimer, pyqtSignal
+
+import constants
+import fs_watch
+
+logger = logging.getLogger(__name__)
+
+
+class StatusWatcher(QObject):
+    changed = pyqtSignal(object)   # set[fs_watch.Target]
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._plan = fs_watch.WatchPlan([])
+        self._snapshot: dict = {}
+        self._pending: set[fs_watch.Target] = set()
+        self._first_pending = 0.0
+        self._running = False
+        self._minimized = False
+        self._native = QFileSystemWatcher(self)
+        self._native.fileChanged.connect(self._on_native)
+        self._native.directoryChanged.connect(self._on_native)
+        self._debounce = QTimer(self)
+        self._debounce.setSingleShot(True)
+        self._debounce.timeout.connect(self._flush)
+        self._poll = QTimer(self)
+        self._poll.setSingleShot(True)
+        self._poll.timeout.connect(self._on_poll)
+        self._backoff = fs_watch.Backoff(constants.REFRESH_INTERVAL_MS,
+                                         constants.WATCH_POLL_MAX_MS)
+
+    def watch(self, installations) -> None:
+        """(Re)build the watched set for ``installations``."""
+        self._plan = fs_watch.WatchPlan(installations)
+        old = self._native.files() + self._native.directories()
+        if old:
+            self._native.removePaths(old)
+        paths = self._plan.paths()
+        failed = self._native.addPaths(paths) if paths else []
+        # All watched natively: the poll is only a safety net for missed events.
+        base = constants.REFRESH_INTERVAL_MS if failed else constants.WATCH_SAFETY_POLL_MS
+        if failed:
+            logger.info("Polling %d path(s) the native watcher can't watch", len(failed))
+        self._backoff = fs_watch.Backoff(base, max(base, constants.WATCH_POLL_MAX_MS))
+        self._backoff.minimized = self._minimized
+        self._snapshot = self._plan.snapshot()
+        if self._running:
+            self._poll.start(self._backoff.reset())
+
+    def start(self) -> None:
+        self._running = True
+        self._snapshot = self._plan.snapshot()
+        self._poll.start(self._backoff.reset())
+
+    def stop(self) -> None:
+        """Pause (e.g. while a job is writing the disks). Queued changes are
+        dropped; the caller refreshes everything when it resumes."""
+        self._running = False
+        self._pending.clear()
+        self._debounce.stop()
+        self._poll.stop()
+
+    def set_minimized(self, minimized: bool) -> None:
+        self._minimized = minimized
+        self._backoff.minimized = minimized
+        if self._running:
+            self._poll.start(self._backoff.interval())
+
+    def _queue(self, targets) -> None:
+        if not self._running or not targets:
+            return
+        if not self._pending:
+            self._first_pending = time.monotonic()
+        self._pending.update(targets)
+        waited_ms = (time.monotonic() - self._first_pending) * 1000
+        if waited_ms >= constants.REFRESH_INTERVAL_MS:
+            self._flush()
+        else:
+            self._debounce.start(constants.WATCH_DEBOUNCE_MS)
+
+    def _on_native(self, path: str) -> None:
+        target = self._plan.target_of(path)
+        # A file replaced by rename drops out of the native watch; re-add it.
+        watched = self._native.files() + self._native.directories()
+        if path not in watched and os.path.exists(path):
+            self._native.addPath(path)
+        self._queue({target} if target else set())
+
+    def _on_poll(self) -> None:
+        snap = self._plan.snapshot()
+        changed = fs_watch.changed_paths(self._snapshot, snap)
+        self._snapshot = snap
+        targets = {t for t in map(self._plan.target_of, changed) if t is not None}
+        interval = self._backoff.reset() if targets else self._backoff.idle()
+        self._queue(targets)
+        if self._running:
+            self._poll.start(interval)
+
+    def _flush(self) -> None:
+        self._debounce.stop()
+        pending, self._pending = self._pending, set()
+        if pending:
+            # Native events already reported these; don't re-report on the next poll.
+            self._snapshot = self._plan.snapshot()
+            self.changed.emit(pending)